@@ -0,0 +1,88 @@
+"""add dashboard counters tables
+
+Revision ID: dashboard_counters
+Revises: refresh_token_user_session
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dashboard_counters'
+down_revision: Union[str, None] = 'refresh_token_user_session'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_COUNTS = """
+    COUNT(id),
+    COUNT(id) FILTER (WHERE est_active IS TRUE),
+    COUNT(id) FILTER (WHERE est_active IS FALSE),
+    COUNT(id) FILTER (WHERE type_compteur = 1),
+    COUNT(id) FILTER (WHERE type_compteur = 2),
+    COUNT(id) FILTER (WHERE etat_id = 13),
+    COUNT(id) FILTER (WHERE etat_id = 14),
+    COUNT(DISTINCT user_id) FILTER (WHERE est_proprietaire IS TRUE),
+    COUNT(DISTINCT user_id) FILTER (WHERE est_proprietaire IS FALSE),
+    now()
+"""
+
+_COLUMNS = """
+    scope, total_compteurs, compteurs_actifs, compteurs_inactifs, compteurs_woyofal,
+    compteurs_classique, demandes_traites, demandes_en_cours, owners, not_owners, updated_at
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema - Compteurs du dashboard maintenus par les écritures sur user_compteur."""
+    op.create_table(
+        'dashboard_compteur_stats',
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('total_compteurs', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('compteurs_actifs', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('compteurs_inactifs', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('compteurs_woyofal', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('compteurs_classique', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('demandes_traites', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('demandes_en_cours', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('owners', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('not_owners', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('scope'),
+    )
+    op.create_table(
+        'dashboard_owner_ref',
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('est_proprietaire', sa.Boolean(), nullable=False),
+        sa.Column('nb', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('scope', 'user_id', 'est_proprietaire'),
+    )
+
+    # Initialisation depuis les données existantes (la tâche reconcile_dashboard_counters corrige ensuite toute dérive)
+    op.execute(f"INSERT INTO dashboard_compteur_stats ({_COLUMNS}) SELECT '__global__', {_COUNTS} FROM user_compteur")
+    op.execute(
+        f"INSERT INTO dashboard_compteur_stats ({_COLUMNS}) SELECT nom_agence, {_COUNTS} "
+        "FROM user_compteur WHERE nom_agence IS NOT NULL GROUP BY nom_agence"
+    )
+    op.execute(
+        "INSERT INTO dashboard_owner_ref (scope, user_id, est_proprietaire, nb) "
+        "SELECT '__global__', user_id, est_proprietaire, COUNT(*) FROM user_compteur "
+        "WHERE user_id IS NOT NULL AND est_proprietaire IS NOT NULL GROUP BY user_id, est_proprietaire"
+    )
+    op.execute(
+        "INSERT INTO dashboard_owner_ref (scope, user_id, est_proprietaire, nb) "
+        "SELECT nom_agence, user_id, est_proprietaire, COUNT(*) FROM user_compteur "
+        "WHERE nom_agence IS NOT NULL AND user_id IS NOT NULL AND est_proprietaire IS NOT NULL "
+        "GROUP BY nom_agence, user_id, est_proprietaire"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema - Suppression des compteurs du dashboard."""
+    op.drop_table('dashboard_owner_ref')
+    op.drop_table('dashboard_compteur_stats')
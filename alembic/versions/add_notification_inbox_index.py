@@ -0,0 +1,30 @@
+"""add inbox index on notification (for_user_id, created_at, id)
+
+Revision ID: notification_inbox_index
+Revises: user_session_fcm_token_index
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'notification_inbox_index'
+down_revision: Union[str, None] = 'user_session_fcm_token_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - Index de la boîte de réception paginée (keyset sur created_at, id)."""
+    op.create_index(
+        'ix_notification_for_user_created', 'notification',
+        ['for_user_id', 'created_at', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema - Remove inbox index."""
+    op.drop_index('ix_notification_for_user_created', table_name='notification')
@@ -0,0 +1,27 @@
+"""add index on user_session.fcm_token
+
+Revision ID: user_session_fcm_token_index
+Revises: dashboard_counters
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'user_session_fcm_token_index'
+down_revision: Union[str, None] = 'dashboard_counters'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - Index fcm_token (déduplication des tokens lors des broadcasts)."""
+    op.create_index(op.f('ix_user_session_fcm_token'), 'user_session', ['fcm_token'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema - Remove fcm_token index."""
+    op.drop_index(op.f('ix_user_session_fcm_token'), table_name='user_session')
@@ -0,0 +1,46 @@
+"""add unique index on user_session.refresh_token_hash
+
+Revision ID: user_session_refresh_token_hash_index
+Revises: notification_inbox_index
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'user_session_refresh_token_hash_index'
+down_revision: Union[str, None] = 'notification_inbox_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema - Index unique refresh_token_hash (refresh par égalité du hash)."""
+    # Doublons éventuels : seule la session la plus récente garde son refresh token
+    op.execute(
+        """
+        UPDATE user_session SET refresh_token_hash = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY refresh_token_hash ORDER BY last_login DESC NULLS LAST, id DESC
+                ) AS rang
+                FROM user_session
+                WHERE refresh_token_hash IS NOT NULL
+            ) AS sessions
+            WHERE rang > 1
+        )
+        """
+    )
+    op.create_index(
+        op.f('ix_user_session_refresh_token_hash'), 'user_session',
+        ['refresh_token_hash'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema - Remove refresh_token_hash index."""
+    op.drop_index(op.f('ix_user_session_refresh_token_hash'), table_name='user_session')
@@ -7,11 +7,11 @@ from typing import Optional, Tuple
 import jwt
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from app.models.models import User, UserSession  
-from app.database import get_db_samaconso
+from app.database import get_async_db_samaconso
 from app.schemas.user_schemas import TokenData
 from ldap3 import SIMPLE, Server,Connection,ALL
 from app.config import LDAP_SEARCH_PASSWORD, LDAP_SEARCH_USER, LDAP_SERVER,LDAP_PORT,LDAP_BASE_DN,LDAP_USER_DN,LDAP_DOMAIN
@@ -102,7 +102,7 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 #Récupérer l'utilisateur connecté
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db_samaconso)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db_samaconso)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -116,7 +116,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if user_id is None:
             raise credentials_exception
         #token_data = TokenData(email=user_id)
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = await db.get(User, int(user_id))
         if user is None:
             raise credentials_exception
         
@@ -195,7 +195,7 @@ def get_client_ip(request: Request) -> str:
     return client_host if client_host else "unknown"
 
 #Sauvegarder refresh token en base
-def save_refresh_token(db: Session, user_id: int, refresh_token: str, device_model: Optional[str] = None, fcm_token: Optional[str] = None) -> UserSession:
+async def save_refresh_token(db: AsyncSession, user_id: int, refresh_token: str, device_model: Optional[str] = None, fcm_token: Optional[str] = None) -> UserSession:
     """
     Sauvegarde un refresh token hashé dans la table UserSession
     Retourne la session créée ou mise à jour
@@ -207,13 +207,16 @@ def save_refresh_token(db: Session, user_id: int, refresh_token: str, device_mod
     # Chercher une session active pour cet utilisateur et device
     existing_session = None
     if device_model:
-        existing_session = db.query(UserSession).filter(
-            and_(
-                UserSession.user_id == user_id,
-                UserSession.device_model == device_model,
-                UserSession.is_active == True
-            )
-        ).first()
+        result = await db.execute(
+            select(UserSession).where(
+                and_(
+                    UserSession.user_id == user_id,
+                    UserSession.device_model == device_model,
+                    UserSession.is_active == True
+                )
+            ).limit(1)
+        )
+        existing_session = result.scalars().first()
     
     if existing_session:
         # Mettre à jour la session existante
@@ -222,8 +225,8 @@ def save_refresh_token(db: Session, user_id: int, refresh_token: str, device_mod
         existing_session.last_login = datetime.now()
         if fcm_token:
             existing_session.fcm_token = fcm_token
-        db.commit()
-        db.refresh(existing_session)
+        await db.commit()
+        await db.refresh(existing_session)
         return existing_session
     else:
         # Créer une nouvelle session
@@ -237,59 +240,90 @@ def save_refresh_token(db: Session, user_id: int, refresh_token: str, device_mod
             last_login=datetime.now()
         )
         db.add(new_session)
-        db.commit()
-        db.refresh(new_session)
+        await db.commit()
+        await db.refresh(new_session)
         return new_session
 
 #Vérifier et récupérer refresh token de la base
-def verify_refresh_token_in_db(db: Session, user_id: int, refresh_token: str) -> Optional[UserSession]:
+async def verify_refresh_token_in_db(db: AsyncSession, user_id: int, refresh_token: str) -> Optional[UserSession]:
     """
     Vérifie si un refresh token existe et est valide pour un utilisateur
     Retourne la session si valide, None sinon
     """
-    # Chercher toutes les sessions actives pour cet utilisateur
-    sessions = db.query(UserSession).filter(
-        and_(
-            UserSession.user_id == user_id,
-            UserSession.is_active == True,
-            UserSession.refresh_token_hash.isnot(None),
-            UserSession.refresh_token_expires_at > datetime.now()
+    # Le hash SHA-256 est déterministe : recherche directe par l'index unique
+    result = await db.execute(
+        select(UserSession).where(
+            and_(
+                UserSession.refresh_token_hash == hash_refresh_token(refresh_token),
+                UserSession.user_id == user_id,
+                UserSession.is_active == True,
+                UserSession.refresh_token_expires_at > datetime.now()
+            )
+        ).limit(1)
+    )
+    return result.scalars().first()
+
+#Rotation du refresh token
+async def rotate_refresh_token(db: AsyncSession, refresh_token: str) -> Optional[Tuple[int, str]]:
+    """
+    Remplace un refresh token valide par un nouveau en un seul UPDATE ... RETURNING
+    Retourne (user_id, nouveau refresh token), None si le token est invalide ou expiré
+    Deux refresh simultanés avec le même token : un seul aboutit (ligne verrouillée par l'UPDATE)
+    Le commit reste à la charge de l'appelant
+    """
+    new_refresh_token = create_refresh_token()
+    now = datetime.now()
+    result = await db.execute(
+        update(UserSession)
+        .where(
+            and_(
+                UserSession.refresh_token_hash == hash_refresh_token(refresh_token),
+                UserSession.is_active == True,
+                UserSession.refresh_token_expires_at > now
+            )
         )
-    ).all()
-    
-    # Vérifier chaque session
-    for session in sessions:
-        if session.refresh_token_hash and verify_refresh_token(refresh_token, session.refresh_token_hash):
-            return session
-    
-    return None
+        .values(
+            refresh_token_hash=hash_refresh_token(new_refresh_token),
+            refresh_token_expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            last_login=now
+        )
+        .returning(UserSession.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    user_id = result.scalar_one_or_none()
+    if user_id is None:
+        return None
+    return user_id, new_refresh_token
 
 #Révoquer refresh token (logout)
-def revoke_refresh_token(db: Session, user_id: int, refresh_token: Optional[str] = None) -> bool:
+async def revoke_refresh_token(db: AsyncSession, user_id: int, refresh_token: Optional[str] = None) -> bool:
     """
     Révoque un refresh token spécifique ou tous les tokens d'un utilisateur
     Si refresh_token est None, révoque toutes les sessions de l'utilisateur
     """
     if refresh_token:
         # Révoquer seulement le token spécifique
-        session = verify_refresh_token_in_db(db, user_id, refresh_token)
+        session = await verify_refresh_token_in_db(db, user_id, refresh_token)
         if session:
             session.is_active = False
             session.refresh_token_hash = None
-            db.commit()
+            await db.commit()
             return True
     else:
         # Révoquer toutes les sessions de l'utilisateur
-        sessions = db.query(UserSession).filter(
-            and_(
-                UserSession.user_id == user_id,
-                UserSession.is_active == True
+        result = await db.execute(
+            select(UserSession).where(
+                and_(
+                    UserSession.user_id == user_id,
+                    UserSession.is_active == True
+                )
             )
-        ).all()
+        )
+        sessions = result.scalars().all()
         for session in sessions:
             session.is_active = False
             session.refresh_token_hash = None
-        db.commit()
+        await db.commit()
         return len(sessions) > 0
     
     return False
\ No newline at end of file
@@ -1,15 +1,224 @@
-from typing import Optional
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
 
+import orjson
+import redis
 from redis import asyncio as aioredis
 
-from app.config import REDIS_URL, REDIS_DEFAULT_TTL_SECONDS
+from app.config import (
+    CACHE_INVALIDATION_CHANNEL,
+    CACHE_LOCK_TIMEOUT,
+    CACHE_TAG_TTL,
+    CACHE_TTL_JITTER,
+    LOCAL_CACHE_ENABLED,
+    LOCAL_CACHE_MAX_ENTRIES,
+    LOCAL_CACHE_PREFIXES,
+    LOCAL_CACHE_TTL,
+    REDIS_URL,
+    REDIS_DEFAULT_TTL_SECONDS,
+)
+
+# Set Redis des clés de cache enregistrées sous un tag
+CACHE_TAG_KEY = "cache:tag:{tag}"
+# Marqueur de fraîcheur (TTL "soft") et verrou de recalcul d'une entrée
+CACHE_FRESH_KEY = "{key}:fresh"
+CACHE_LOCK_KEY = "{key}:lock"
+# Attente entre deux vérifications quand un autre processus recalcule l'entrée (s)
+CACHE_LOCK_POLL = 0.05
 
 
 redis_client: Optional[aioredis.Redis] = None
+# Client sans décodage des réponses, pour les valeurs binaires (app.cache_codec)
+redis_bytes_client: Optional[aioredis.Redis] = None
+sync_redis_client: Optional[redis.Redis] = None
+
+
+# ── Cache local (processus) devant Redis pour les données de référence ──────
+# Rôles, agences, types, états compteur, seuils : lus à chaque requête, modifiés
+# rarement. Les clés de ces préfixes (LOCAL_CACHE_PREFIXES) sont servies depuis
+# la mémoire du processus (LRU borné, TTL court) sans aller-retour Redis.
+# Toute écriture ou suppression via ce module est publiée sur
+# CACHE_INVALIDATION_CHANNEL : les autres processus retirent la clé de leur
+# cache local. Le TTL local borne l'écart si un message est perdu, et le cache
+# local est vidé à chaque (ré)abonnement.
+
+class LocalCache:
+    """LRU en mémoire, borné en nombre d'entrées, avec expiration par entrée"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._data[key] = (value, self._clock() + self.ttl_seconds)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+local_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL)
+# Valeurs binaires (cache_get_bytes / cache_set_bytes) à part : une même clé lue
+# via l'autre API ne doit jamais renvoyer des bytes à la place d'une str, ni l'inverse
+local_bytes_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL)
+_local_caches = (local_cache, local_bytes_cache)
+
+# Identifiant du processus : ses propres messages d'invalidation sont ignorés
+CACHE_NODE_ID = uuid.uuid4().hex
+
+# Succès / échecs par niveau de cache (compteurs du processus)
+_tier_stats: Dict[str, Dict[str, int]] = {
+    "local": {"hits": 0, "misses": 0},
+    "redis": {"hits": 0, "misses": 0, "errors": 0},
+}
+
+_invalidation_task: Optional[asyncio.Task] = None
+
+
+def is_local_key(key: str) -> bool:
+    """Clé de donnée de référence, servie par le cache local"""
+    return LOCAL_CACHE_ENABLED and key.startswith(LOCAL_CACHE_PREFIXES)
+
+
+def get_cache_tier_stats() -> Dict:
+    """Succès / échecs et taux de succès par niveau (local, redis)"""
+    tiers = {}
+    for tier, counters in _tier_stats.items():
+        total = counters["hits"] + counters["misses"]
+        tiers[tier] = {
+            **counters,
+            "hit_rate_percent": round(counters["hits"] / total * 100, 2) if total else 0.0,
+        }
+    tiers["local"].update({
+        "enabled": LOCAL_CACHE_ENABLED,
+        "entries": len(local_cache),
+        "bytes_entries": len(local_bytes_cache),
+        "max_entries": local_cache.max_entries,
+        "evictions": local_cache.evictions + local_bytes_cache.evictions,
+        "ttl_seconds": local_cache.ttl_seconds,
+    })
+    return tiers
+
+
+def _clear_local_caches() -> None:
+    for tier in _local_caches:
+        tier.clear()
+
+
+async def publish_invalidation(keys: Iterable[str]) -> None:
+    """Retire les clés du cache local et demande aux autres processus d'en faire autant"""
+    keys = [key for key in keys if is_local_key(key)]
+    if not keys:
+        return
+    for key in keys:
+        for tier in _local_caches:
+            tier.pop(key)
+    try:
+        await get_redis().publish(
+            CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": CACHE_NODE_ID, "keys": keys})
+        )
+    except Exception as e:
+        # Les autres processus garderont l'ancienne valeur au plus LOCAL_CACHE_TTL secondes
+        print(f"Cache invalidation publish error for keys {keys}: {e}")
+
+
+def apply_invalidation(message: str) -> int:
+    """Message d'invalidation reçu d'un autre processus : clés retirées du cache local"""
+    data = json.loads(message)
+    if data.get("origin") == CACHE_NODE_ID:
+        return 0
+    keys = data.get("keys", [])
+    for key in keys:
+        for tier in _local_caches:
+            tier.pop(key)
+    return len(keys)
+
+
+async def _listen_invalidations(client) -> None:
+    delay = 1
+    while True:
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # Messages manqués pendant la coupure : repartir d'un cache local vide
+            _clear_local_caches()
+            delay = 1
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                try:
+                    apply_invalidation(item["data"])
+                except Exception as e:
+                    print(f"Cache invalidation message ignored: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _clear_local_caches()
+            print(f"Cache invalidation subscription lost ({e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+async def start_cache_invalidation_listener() -> None:
+    """Écoute des invalidations du cache local (au démarrage de l'application)"""
+    global _invalidation_task
+    if not LOCAL_CACHE_ENABLED or _invalidation_task is not None:
+        return
+    _invalidation_task = asyncio.create_task(
+        _listen_invalidations(get_redis()), name="cache-invalidation-listen"
+    )
+
+
+async def stop_cache_invalidation_listener() -> None:
+    global _invalidation_task
+    if _invalidation_task is None:
+        return
+    _invalidation_task.cancel()
+    try:
+        await _invalidation_task
+    except (asyncio.CancelledError, Exception):
+        pass
+    _invalidation_task = None
+    _clear_local_caches()
 
 
 async def init_redis() -> None:
-    global redis_client
+    global redis_client, redis_bytes_client
+    if redis_bytes_client is None:
+        redis_bytes_client = aioredis.from_url(REDIS_URL, decode_responses=False)
     if redis_client is None:
         redis_client = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
         # simple ping to validate connection on startup
@@ -21,10 +230,13 @@ async def init_redis() -> None:
 
 
 async def close_redis() -> None:
-    global redis_client
+    global redis_client, redis_bytes_client
     if redis_client is not None:
         await redis_client.close()
         redis_client = None
+    if redis_bytes_client is not None:
+        await redis_bytes_client.close()
+        redis_bytes_client = None
 
 
 def get_redis() -> aioredis.Redis:
@@ -33,21 +245,59 @@ def get_redis() -> aioredis.Redis:
     return redis_client
 
 
+def get_redis_bytes() -> aioredis.Redis:
+    """Client renvoyant les valeurs en bytes (compression, msgpack)"""
+    if redis_bytes_client is None:
+        raise RuntimeError("Redis client not initialized. Call init_redis() on startup.")
+    return redis_bytes_client
+
+
+def get_sync_redis() -> redis.Redis:
+    """Client synchrone pour les workers Celery (pas de boucle asyncio)"""
+    global sync_redis_client
+    if sync_redis_client is None:
+        sync_redis_client = redis.Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    return sync_redis_client
+
+
 async def cache_get(key: str) -> Optional[str]:
+    local = is_local_key(key)
+    if local:
+        value = local_cache.get(key)
+        if value is not None:
+            _tier_stats["local"]["hits"] += 1
+            return value
+        _tier_stats["local"]["misses"] += 1
     try:
         client = get_redis()
-        return await client.get(key)
+        value = await client.get(key)
     except Exception as e:
+        _tier_stats["redis"]["errors"] += 1
         # Log l'erreur mais ne lève pas d'exception pour ne pas casser l'app
         print(f"Cache get error for key {key}: {e}")
         return None
+    _tier_stats["redis"]["hits" if value is not None else "misses"] += 1
+    if local and value is not None:
+        local_cache.set(key, value)
+    return value
+
+
+def jittered_ttl(ttl_seconds: int) -> int:
+    """TTL décalé aléatoirement (±CACHE_TTL_JITTER) : les entrées écrites ensemble n'expirent pas ensemble"""
+    if CACHE_TTL_JITTER <= 0:
+        return ttl_seconds
+    return max(1, round(ttl_seconds * random.uniform(1 - CACHE_TTL_JITTER, 1 + CACHE_TTL_JITTER)))
 
 
 async def cache_set(key: str, value: str, ttl_seconds: Optional[int] = None) -> bool:
     try:
         client = get_redis()
         ttl = ttl_seconds if ttl_seconds is not None else REDIS_DEFAULT_TTL_SECONDS
-        return await client.set(key, value, ex=ttl)
+        result = await client.set(key, value, ex=jittered_ttl(ttl))
+        if is_local_key(key):
+            await publish_invalidation([key])
+            local_cache.set(key, value)
+        return result
     except Exception as e:
         # Log l'erreur mais ne lève pas d'exception pour ne pas casser l'app
         print(f"Cache set error for key {key}: {e}")
@@ -57,9 +307,296 @@ async def cache_set(key: str, value: str, ttl_seconds: Optional[int] = None) ->
 async def cache_delete(key: str) -> int:
     try:
         client = get_redis()
-        return await client.delete(key)
+        deleted = await client.delete(key)
+        await publish_invalidation([key])
+        return deleted
     except Exception as e:
         # Log l'erreur mais ne lève pas d'exception pour ne pas casser l'app
         print(f"Cache delete error for key {key}: {e}")
         return 0
 
+
+
+async def cache_get_bytes(key: str) -> Optional[bytes]:
+    """Comme cache_get, pour une valeur binaire (voir app.cache_codec)"""
+    local = is_local_key(key)
+    if local:
+        value = local_bytes_cache.get(key)
+        if value is not None:
+            _tier_stats["local"]["hits"] += 1
+            return value
+        _tier_stats["local"]["misses"] += 1
+    try:
+        value = await get_redis_bytes().get(key)
+    except Exception as e:
+        _tier_stats["redis"]["errors"] += 1
+        print(f"Cache get error for key {key}: {e}")
+        return None
+    _tier_stats["redis"]["hits" if value is not None else "misses"] += 1
+    if local and value is not None:
+        local_bytes_cache.set(key, value)
+    return value
+
+
+async def cache_set_bytes(key: str, value: bytes, ttl_seconds: Optional[int] = None, tags: Iterable[str] = ()) -> bool:
+    """Comme cache_set_tagged, pour une valeur binaire"""
+    try:
+        ttl = ttl_seconds if ttl_seconds is not None else REDIS_DEFAULT_TTL_SECONDS
+        pipe = get_redis_bytes().pipeline(transaction=True)
+        pipe.set(key, value, ex=jittered_ttl(ttl))
+        _register_tags(pipe, key, tags, ttl)
+        await pipe.execute()
+        if is_local_key(key):
+            await publish_invalidation([key])
+            local_bytes_cache.set(key, value)
+        return True
+    except Exception as e:
+        print(f"Cache set error for key {key}: {e}")
+        return False
+
+
+# ── Invalidation par tags ───────────────────────────────────────────────────
+# Chaque entrée est enregistrée sous des tags (type d'entité, user_id, agence...)
+# stockés comme des sets Redis. Une écriture invalide les tags dont elle dépend
+# au lieu de supprimer des clés construites à la main dans chaque router.
+
+def cache_tag(entity: str, **scope) -> str:
+    """
+    Nom de tag : entité, suivie du périmètre éventuel
+
+    cache_tag("user_compteur") -> user_compteur
+    cache_tag("user_compteur", user_id=12) -> user_compteur:user_id=12
+    """
+    return ":".join([entity] + [f"{name}={value}" for name, value in sorted(scope.items())])
+
+
+async def cache_set_tagged(key: str, value: str, tags: Iterable[str] = (), ttl_seconds: Optional[int] = None) -> bool:
+    """Écrit une entrée et l'enregistre sous ses tags (une seule transaction)"""
+    try:
+        client = get_redis()
+        ttl = ttl_seconds if ttl_seconds is not None else REDIS_DEFAULT_TTL_SECONDS
+        pipe = client.pipeline(transaction=True)
+        pipe.set(key, value, ex=jittered_ttl(ttl))
+        _register_tags(pipe, key, tags, ttl)
+        await pipe.execute()
+        if is_local_key(key):
+            await publish_invalidation([key])
+            local_cache.set(key, value)
+        return True
+    except Exception as e:
+        # Log l'erreur mais ne lève pas d'exception pour ne pas casser l'app
+        print(f"Cache set error for key {key}: {e}")
+        return False
+
+
+def _register_tags(pipe, key: str, tags: Iterable[str], ttl: int) -> None:
+    for tag in tags:
+        tag_key = CACHE_TAG_KEY.format(tag=tag)
+        pipe.sadd(tag_key, key)
+        # Le set vit au moins aussi longtemps que les entrées qu'il référence
+        pipe.expire(tag_key, max(ttl, CACHE_TAG_TTL))
+
+
+async def invalidate_tags(*tags: str) -> int:
+    """
+    Supprime toutes les entrées enregistrées sous l'un des tags, et les tags eux-mêmes
+
+    Les sets sont surveillés (WATCH) : si une entrée est enregistrée pendant
+    l'invalidation, la transaction est rejouée et l'entrée est supprimée aussi.
+
+    Returns:
+        Nombre de clés de cache supprimées
+    """
+    tag_keys = [CACHE_TAG_KEY.format(tag=tag) for tag in tags]
+    if not tag_keys:
+        return 0
+
+    dropped = []
+
+    async def _drop(pipe) -> int:
+        members = list(await pipe.sunion(tag_keys))
+        dropped[:] = members
+        pipe.multi()
+        if members:
+            pipe.delete(*members)
+        pipe.delete(*tag_keys)
+        return len(members)
+
+    try:
+        client = get_redis()
+        deleted = await client.transaction(_drop, *tag_keys, value_from_callable=True)
+        await publish_invalidation(dropped)
+        return deleted
+    except Exception as e:
+        # Log l'erreur mais ne lève pas d'exception pour ne pas casser l'app
+        print(f"Cache invalidation error for tags {list(tags)}: {e}")
+        return 0
+
+
+# ── Recalcul unique (single-flight) et stale-while-revalidate ───────────────
+# À l'expiration d'une clé chaude, toutes les requêtes concurrentes ratent le
+# cache en même temps et interrogent PostgreSQL / SQL Server ensemble. Ici :
+# - dans un processus, les requêtes concurrentes sur une même clé attendent le
+#   même calcul (coalescence) ;
+# - entre processus, un verrou Redis (SET NX) désigne le seul qui recalcule,
+#   les autres attendent la valeur ;
+# - avec stale_ttl, l'entrée reste servie après son TTL "soft" (marqueur
+#   {key}:fresh) pendant qu'une seule requête la rafraîchit en arrière-plan ;
+# - les TTL sont décalés aléatoirement (jittered_ttl).
+
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Calculs en cours dans ce processus, par clé
+_inflight: Dict[str, asyncio.Task] = {}
+# Rafraîchissements en arrière-plan (référence gardée jusqu'à la fin de la tâche)
+_background: Set[asyncio.Task] = set()
+
+
+async def cache_get_or_set(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl_seconds: Optional[int] = None,
+    stale_ttl: int = 0,
+    tags: Iterable[str] = (),
+    raw: bool = False,
+) -> Any:
+    """
+    Valeur en cache, ou calculée une seule fois pour toutes les requêtes concurrentes
+
+    Args:
+        key: Clé de cache
+        compute: Coroutine sans argument produisant la valeur (sérialisable en JSON).
+                 Une exception n'est pas mise en cache et remonte à tous les appelants en attente.
+                 Le calcul est partagé par les requêtes en attente et se poursuit si celle qui
+                 l'a lancé se termine : il ne doit pas utiliser une ressource de la requête
+                 (session injectée par Depends, etc.) mais ouvrir la sienne
+                 (app.database.detached_async_session).
+        ttl_seconds: Durée de fraîcheur de l'entrée
+        stale_ttl: Durée pendant laquelle l'entrée périmée reste servie pendant son
+                   rafraîchissement en arrière-plan (0 = désactivé)
+        tags: Tags de l'entrée (voir invalidate_tags)
+        raw: Renvoyer le JSON encodé (str) sans le désérialiser, pour le servir
+             tel quel (app.cache_codec.JSONBytesResponse)
+
+    Returns:
+        Valeur désérialisée, ou son JSON si raw
+    """
+    ttl = ttl_seconds if ttl_seconds is not None else REDIS_DEFAULT_TTL_SECONDS
+    tags = tuple(tags)
+    try:
+        client = get_redis()
+        value, fresh = await client.mget([key, CACHE_FRESH_KEY.format(key=key)])
+    except Exception as e:
+        # Redis indisponible : calcul direct, comme un cache vide
+        print(f"Cache get error for key {key}: {e}")
+        result = await compute()
+        return _dumps(result) if raw else result
+
+    if value is not None:
+        if fresh is None and stale_ttl > 0 and key not in _inflight:
+            task = asyncio.create_task(_refresh(client, key, compute, ttl, stale_ttl, tags))
+            _track(key, task)
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+        return value if raw else orjson.loads(value)
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load(client, key, compute, ttl, stale_ttl, tags))
+        _track(key, task)
+    # shield : l'annulation d'un appelant n'interrompt pas le calcul attendu par les autres
+    result, encoded = await asyncio.shield(task)
+    return encoded if raw else result
+
+
+def _track(key: str, task: asyncio.Task) -> None:
+    _inflight[key] = task
+
+    def _done(finished):
+        if _inflight.get(key) is finished:
+            del _inflight[key]
+        if not finished.cancelled():
+            finished.exception()  # exception consommée (déjà remontée aux appelants)
+
+    task.add_done_callback(_done)
+
+
+def _dumps(result: Any) -> str:
+    return orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+async def _store(client, key: str, result: Any, ttl: int, stale_ttl: int, tags) -> str:
+    """Écrit l'entrée (et son marqueur de fraîcheur) ; renvoie le JSON écrit"""
+    encoded = _dumps(result)
+    try:
+        fresh_ttl = jittered_ttl(ttl)
+        pipe = client.pipeline(transaction=True)
+        pipe.set(key, encoded, ex=fresh_ttl + stale_ttl)
+        if stale_ttl > 0:
+            pipe.set(CACHE_FRESH_KEY.format(key=key), "1", ex=fresh_ttl)
+        _register_tags(pipe, key, tags, fresh_ttl + stale_ttl)
+        await pipe.execute()
+    except Exception as e:
+        print(f"Cache set error for key {key}: {e}")
+    return encoded
+
+
+async def _release(client, lock_key: str, token: str) -> None:
+    try:
+        await client.eval(_RELEASE_LOCK, 1, lock_key, token)
+    except Exception as e:
+        print(f"Cache lock release error for key {lock_key}: {e}")
+
+
+async def _acquire(client, lock_key: str, token: str) -> bool:
+    try:
+        return bool(await client.set(lock_key, token, nx=True, ex=CACHE_LOCK_TIMEOUT))
+    except Exception as e:
+        print(f"Cache lock error for key {lock_key}: {e}")
+        return True  # Redis en défaut : calculer sans verrou
+
+
+async def _load(client, key: str, compute, ttl: int, stale_ttl: int, tags) -> Tuple[Any, str]:
+    """Entrée absente : un seul processus recalcule, les autres attendent sa valeur (valeur, JSON)"""
+    lock_key = CACHE_LOCK_KEY.format(key=key)
+    token = uuid.uuid4().hex
+    deadline = asyncio.get_running_loop().time() + CACHE_LOCK_TIMEOUT
+    while True:
+        if await _acquire(client, lock_key, token):
+            try:
+                result = await compute()
+                return result, await _store(client, key, result, ttl, stale_ttl, tags)
+            finally:
+                await _release(client, lock_key, token)
+
+        await asyncio.sleep(CACHE_LOCK_POLL)
+        try:
+            value = await client.get(key)
+        except Exception:
+            value = None
+        if value is not None:
+            return orjson.loads(value), value
+        if asyncio.get_running_loop().time() >= deadline:
+            # Détenteur du verrou trop lent ou disparu : calcul sans verrou plutôt qu'une erreur
+            result = await compute()
+            return result, await _store(client, key, result, ttl, stale_ttl, tags)
+
+
+async def _refresh(client, key: str, compute, ttl: int, stale_ttl: int, tags) -> None:
+    """Entrée périmée servie : rafraîchissement par le seul détenteur du verrou"""
+    lock_key = CACHE_LOCK_KEY.format(key=key)
+    token = uuid.uuid4().hex
+    if not await _acquire(client, lock_key, token):
+        return  # déjà rafraîchie par un autre processus
+    try:
+        result = await compute()
+        await _store(client, key, result, ttl, stale_ttl, tags)
+    except Exception as e:
+        print(f"Cache refresh error for key {key}: {e}")
+    finally:
+        await _release(client, lock_key, token)
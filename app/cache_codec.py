@@ -0,0 +1,150 @@
+"""
+Codec des valeurs de cache
+
+Les valeurs écrites par ce module commencent par un en-tête de 3 octets :
+marqueur nul, format (JSON orjson ou msgpack) et compression (aucune, zstd,
+lz4). Au-dessus de CACHE_COMPRESSION_THRESHOLD octets la charge est
+compressée si la bibliothèque correspondante est installée.
+
+Une entrée JSON est servie telle quelle comme corps de réponse HTTP
+(JSONBytesResponse) : pas de json.loads suivi d'un ré-encodage par FastAPI.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import msgpack
+import orjson
+from fastapi import Response
+
+from app.cache import cache_get_bytes, cache_set_bytes
+from app.config import CACHE_COMPRESSION, CACHE_COMPRESSION_LEVEL, CACHE_COMPRESSION_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+# Une valeur JSON ne commence jamais par un octet nul : les anciennes entrées
+# (json.dumps sans en-tête) sont reconnues et traitées comme absentes.
+MARKER = b"\x00"
+FORMAT_JSON = b"j"
+FORMAT_MSGPACK = b"m"
+NO_COMPRESSION = b"-"
+
+
+class CodecError(ValueError):
+    """Entrée de cache illisible (ancien format, compression indisponible...)"""
+
+
+# Compresseurs disponibles : nom -> (octet d'en-tête, compresser, décompresser)
+COMPRESSORS: Dict[str, Tuple[bytes, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = (
+        b"z",
+        zstandard.ZstdCompressor(level=CACHE_COMPRESSION_LEVEL).compress,
+        zstandard.ZstdDecompressor().decompress,
+    )
+if lz4_frame is not None:
+    COMPRESSORS["lz4"] = (b"l", lz4_frame.compress, lz4_frame.decompress)
+
+if CACHE_COMPRESSION not in ("none", "") and CACHE_COMPRESSION not in COMPRESSORS:
+    logger.warning("Compression du cache %r indisponible (bibliothèque absente) : valeurs non compressées", CACHE_COMPRESSION)
+
+
+def dumps_json(value: Any) -> bytes:
+    """JSON compact par orjson (dates en ISO 8601, types inconnus via str)"""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def pack(payload: bytes, fmt: bytes = FORMAT_JSON) -> bytes:
+    """Ajoute l'en-tête et compresse la charge au-delà du seuil"""
+    compressor = COMPRESSORS.get(CACHE_COMPRESSION)
+    if compressor is not None and len(payload) >= CACHE_COMPRESSION_THRESHOLD:
+        flag, compress, _ = compressor
+        return MARKER + fmt + flag + compress(payload)
+    return MARKER + fmt + NO_COMPRESSION + payload
+
+
+def unpack(data: bytes) -> Tuple[bytes, bytes]:
+    """(format, charge décompressée) d'une valeur écrite par pack"""
+    if len(data) < 3 or data[:1] != MARKER:
+        raise CodecError("valeur sans en-tête de codec")
+    fmt, flag, payload = data[1:2], data[2:3], data[3:]
+    if flag == NO_COMPRESSION:
+        return fmt, payload
+    for header, _, decompress in COMPRESSORS.values():
+        if header == flag:
+            return fmt, decompress(payload)
+    raise CodecError(f"compression {flag!r} indisponible")
+
+
+def encode(value: Any, fmt: bytes = FORMAT_JSON) -> bytes:
+    if fmt == FORMAT_MSGPACK:
+        return pack(msgpack.packb(value, default=str, use_bin_type=True), FORMAT_MSGPACK)
+    return pack(dumps_json(value), FORMAT_JSON)
+
+
+def decode(data: bytes) -> Any:
+    fmt, payload = unpack(data)
+    if fmt == FORMAT_MSGPACK:
+        return msgpack.unpackb(payload, raw=False)
+    if fmt == FORMAT_JSON:
+        return orjson.loads(payload)
+    raise CodecError(f"format {fmt!r} inconnu")
+
+
+def to_json_bytes(data: bytes) -> bytes:
+    """Corps JSON d'une entrée : sans désérialisation si elle est stockée en JSON"""
+    fmt, payload = unpack(data)
+    if fmt == FORMAT_JSON:
+        return payload
+    return dumps_json(decode(data))
+
+
+class JSONBytesResponse(Response):
+    """Réponse dont le corps est déjà du JSON encodé"""
+    media_type = "application/json"
+
+
+async def cached_json(key: str) -> Optional[bytes]:
+    """Corps JSON en cache pour la clé, ou None (absent, ancien format, illisible)"""
+    data = await cache_get_bytes(key)
+    if data is None:
+        return None
+    try:
+        return to_json_bytes(data)
+    except Exception as e:
+        logger.warning("Entrée de cache %s ignorée : %s", key, e)
+        return None
+
+
+async def cache_json(
+    key: str,
+    value: Any,
+    ttl_seconds: Optional[int] = None,
+    tags: Iterable[str] = (),
+) -> bytes:
+    """Met la valeur en cache en JSON et renvoie le corps encodé, prêt à servir"""
+    body = dumps_json(value)
+    await cache_set_bytes(key, pack(body), ttl_seconds, tags)
+    return body
+
+
+_CACHE_MISS_FLAG = b'"cache_hit":false}'
+_CACHE_HIT_FLAG = b'"cache_hit":true}'
+
+
+def mark_cache_hit(body: bytes) -> bytes:
+    """Passe à true le drapeau cache_hit, dernier champ de l'objet, sans décoder le corps"""
+    if body.endswith(_CACHE_MISS_FLAG):
+        return body[:-len(_CACHE_MISS_FLAG)] + _CACHE_HIT_FLAG
+    return body
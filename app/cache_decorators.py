@@ -1,65 +1,324 @@
-import json
+import base64
+import dataclasses
+import datetime
+import enum
 import functools
-from typing import Optional, Callable, Any
-from app.cache import cache_get, cache_set
+import hashlib
+import inspect
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from typing import Optional, Callable, Any, Dict, Iterable, List, Tuple
+
+import msgpack
+import orjson
+from fastapi import BackgroundTasks, HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.cache import cache_get, cache_set_tagged, get_redis, invalidate_tags, publish_invalidation
+from app.cache_codec import dumps_json
+
+logger = logging.getLogger(__name__)
+
+
+def _format_templates(templates: Iterable[str], signature: inspect.Signature, args, kwargs) -> List[str]:
+    """Remplit les gabarits ("user_compteur:user_id={user_id}") avec les arguments de l'appel"""
+    templates = list(templates)
+    if not templates:
+        return []
+    bound = signature.bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    return [template.format(**bound.arguments) for template in templates]
+
+
+# ── Clés de cache stables ───────────────────────────────────────────────────
+# La clé ne dépend que de la valeur des arguments retenus : encodage canonique
+# (JSON trié, types normalisés) haché en BLAKE2b. Identique d'un worker et d'un
+# redémarrage à l'autre, contrairement à hash() qui est salé par processus.
 
+# Arguments injectés par FastAPI, sans effet sur le résultat : jamais dans la clé
+IGNORED_ARG_TYPES = (Session, AsyncSession, Request, Response, BackgroundTasks)
 
-def cached(key_prefix: str, ttl_seconds: Optional[int] = None):
+
+def _canonical(value: Any) -> Any:
+    """Forme canonique JSON d'un argument ; TypeError si la valeur n'a pas de forme stable"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, enum.Enum):
+        return _canonical(value.value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, BaseModel):
+        return _canonical(value.model_dump(mode="json"))
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _canonical(dataclasses.asdict(value))
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        items = [_canonical(v) for v in value]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    # Pas de repr() : il contient souvent une adresse mémoire (clé différente à chaque appel)
+    raise TypeError(f"argument de type {type(value).__name__} sans encodage stable pour la clé de cache")
+
+
+def _key_arguments(
+    signature: inspect.Signature,
+    args,
+    kwargs,
+    include: Optional[Tuple[str, ...]],
+    exclude: Tuple[str, ...],
+) -> Dict[str, Any]:
+    """Arguments (liés par nom, valeurs par défaut comprises) qui entrent dans la clé"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {
+        name: value
+        for name, value in bound.arguments.items()
+        if (include is None or name in include)
+        and name not in exclude
+        and not isinstance(value, IGNORED_ARG_TYPES)
+    }
+
+
+def make_cache_key(key_prefix: str, arguments: Dict[str, Any]) -> str:
+    """
+    Clé de cache : préfixe suivi du hachage BLAKE2b (128 bits) de l'encodage canonique des arguments.
+    Sans argument retenu, la clé est le préfixe lui-même (ex: "type_demande:all").
+    """
+    if not arguments:
+        return key_prefix
+    encoded = json.dumps(_canonical(arguments), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{key_prefix}:{digest}"
+
+
+# ── Sérialiseurs ────────────────────────────────────────────────────────────
+# Le client Redis décode les réponses en texte (decode_responses=True) :
+# chaque sérialiseur produit une chaîne, msgpack est donc encodé en base64.
+
+class Serializer:
+    name = "json"
+
+    def dumps(self, value: Any) -> str:
+        return json.dumps(value, default=str)
+
+    def loads(self, data: str) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    name = "orjson"
+
+    def dumps(self, value: Any) -> str:
+        return dumps_json(value).decode("utf-8")
+
+    def loads(self, data: str) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> str:
+        return base64.b64encode(msgpack.packb(value, default=str, use_bin_type=True)).decode("ascii")
+
+    def loads(self, data: str) -> Any:
+        return msgpack.unpackb(base64.b64decode(data), raw=False)
+
+
+SERIALIZERS: Dict[str, Serializer] = {
+    serializer.name: serializer for serializer in (Serializer(), OrjsonSerializer(), MsgpackSerializer())
+}
+
+
+# ── Cache négatif ───────────────────────────────────────────────────────────
+# Un résultat absent (None) ou une HTTPException "introuvable" est mémorisé
+# quelques secondes : une recherche répétée d'un compteur inexistant ne
+# redescend pas jusqu'à la base. Le marqueur ne peut pas commencer une valeur
+# sérialisée (JSON, base64).
+NEGATIVE_MARKER = "\x00neg:"
+
+
+def _negative_entry(error: Optional[HTTPException]) -> str:
+    if error is None:
+        return NEGATIVE_MARKER
+    return NEGATIVE_MARKER + json.dumps({"status_code": error.status_code, "detail": error.detail}, default=str)
+
+
+def _replay_negative(entry: str) -> None:
+    """Rejoue une entrée négative : None, ou relève l'HTTPException mémorisée"""
+    payload = entry[len(NEGATIVE_MARKER):]
+    if payload:
+        error = json.loads(payload)
+        raise HTTPException(status_code=error["status_code"], detail=error["detail"])
+    return None
+
+
+# ── Métriques par préfixe ───────────────────────────────────────────────────
+
+_prefix_stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+    "hits": 0,
+    "negative_hits": 0,
+    "misses": 0,
+    "errors": 0,
+    "hit_seconds": 0.0,
+    "miss_seconds": 0.0,
+})
+
+
+def get_cached_stats() -> Dict[str, Dict]:
+    """Succès / échecs / latences moyennes (ms) du décorateur cached, par préfixe de clé"""
+    report = {}
+    for prefix, counters in _prefix_stats.items():
+        hits = counters["hits"] + counters["negative_hits"]
+        misses = counters["misses"]
+        total = hits + misses
+        report[prefix] = {
+            "hits": counters["hits"],
+            "negative_hits": counters["negative_hits"],
+            "misses": misses,
+            "errors": counters["errors"],
+            "hit_rate_percent": round(hits / total * 100, 2) if total else 0.0,
+            "avg_hit_ms": round(counters["hit_seconds"] / hits * 1000, 3) if hits else 0.0,
+            "avg_miss_ms": round(counters["miss_seconds"] / misses * 1000, 3) if misses else 0.0,
+        }
+    return report
+
+
+def cached(
+    key_prefix: str,
+    ttl_seconds: Optional[int] = None,
+    tags: Iterable[str] = (),
+    include: Optional[Iterable[str]] = None,
+    exclude: Iterable[str] = (),
+    serializer: str = "orjson",
+    negative_ttl: Optional[int] = None,
+    negative_status: Iterable[int] = (404,),
+):
     """
     Décorateur pour mettre en cache les résultats des fonctions.
-    
+
     Args:
         key_prefix: Préfixe pour la clé de cache
         ttl_seconds: TTL personnalisé (optionnel)
+        tags: Tags de l'entrée, gabarits remplis avec les arguments
+              (ex: "user_compteur:user_id={user_id}", voir app.cache.cache_tag)
+        include: Seuls arguments pris en compte dans la clé (tous par défaut)
+        exclude: Arguments exclus de la clé (sessions, Request, Response et
+                 BackgroundTasks le sont toujours)
+        serializer: "orjson", "json" ou "msgpack" (voir SERIALIZERS)
+        negative_ttl: Si défini, un résultat None ou une HTTPException de statut
+                      negative_status est mis en cache pendant negative_ttl secondes
+        negative_status: Statuts HTTP mis en cache négatif
     """
+    tags = tuple(tags)
+    include = tuple(include) if include is not None else None
+    exclude = tuple(exclude)
+    negative_status = frozenset(negative_status)
+    codec = SERIALIZERS[serializer]
+
     def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        unknown = (set(include or ()) | set(exclude)) - set(signature.parameters)
+        if unknown:
+            raise ValueError(f"cached({key_prefix!r}) : arguments inconnus {sorted(unknown)} pour {func.__qualname__}")
+        stats = _prefix_stats[key_prefix]
+
         @functools.wraps(func)
         async def wrapper(*args, **kwargs) -> Any:
-            # Génère une clé unique basée sur les arguments
-            cache_key = f"{key_prefix}:{hash(str(args) + str(kwargs))}"
-            
-            # Tente de récupérer depuis le cache
+            started = time.perf_counter()
             try:
-                cached_result = await cache_get(cache_key)
-                if cached_result:
-                    return json.loads(cached_result)
-            except Exception:
-                pass
-            
+                cache_key = make_cache_key(key_prefix, _key_arguments(signature, args, kwargs, include, exclude))
+            except TypeError as e:
+                # Argument sans encodage stable : appel non mis en cache plutôt qu'une clé fausse
+                stats["errors"] += 1
+                logger.warning("cached(%s) : %s, à exclure ou à convertir", key_prefix, e)
+                return await func(*args, **kwargs)
+
+            # Tente de récupérer depuis le cache
+            entry = await cache_get(cache_key)
+            if entry is not None:
+                if entry.startswith(NEGATIVE_MARKER):
+                    stats["negative_hits"] += 1
+                    stats["hit_seconds"] += time.perf_counter() - started
+                    return _replay_negative(entry)
+                try:
+                    result = codec.loads(entry)
+                    stats["hits"] += 1
+                    stats["hit_seconds"] += time.perf_counter() - started
+                    return result
+                except Exception as e:
+                    # Entrée illisible (autre sérialiseur, format changé) : recalculée
+                    stats["errors"] += 1
+                    logger.warning("cached(%s) : entrée %s illisible : %s", key_prefix, cache_key, e)
+
             # Exécute la fonction si pas en cache
-            result = await func(*args, **kwargs)
-            
-            # Met en cache le résultat
+            stats["misses"] += 1
+            resolved_tags = _format_templates(tags, signature, args, kwargs)
             try:
-                await cache_set(cache_key, json.dumps(result, default=str), ttl_seconds)
-            except Exception:
-                pass
-            
+                result = await func(*args, **kwargs)
+            except HTTPException as e:
+                if negative_ttl is not None and e.status_code in negative_status:
+                    await cache_set_tagged(cache_key, _negative_entry(e), resolved_tags, negative_ttl)
+                raise
+            finally:
+                stats["miss_seconds"] += time.perf_counter() - started
+
+            # Met en cache le résultat, enregistré sous ses tags
+            try:
+                if result is not None:
+                    await cache_set_tagged(cache_key, codec.dumps(result), resolved_tags, ttl_seconds)
+                elif negative_ttl is not None:
+                    await cache_set_tagged(cache_key, _negative_entry(None), resolved_tags, negative_ttl)
+            except Exception as e:
+                stats["errors"] += 1
+                logger.warning("cached(%s) : mise en cache de %s impossible : %s", key_prefix, cache_key, e)
+
             return result
         return wrapper
     return decorator
 
 
-def cache_invalidate(*keys: str):
+def cache_invalidate(*keys: str, tags: Iterable[str] = ()):
     """
-    Décorateur pour invalider des clés de cache après l'exécution d'une fonction.
-    
+    Décorateur pour invalider des clés et des tags de cache après l'exécution d'une fonction.
+
     Args:
-        *keys: Clés de cache à invalider
+        *keys: Clés de cache à invalider (gabarits remplis avec les arguments)
+        tags: Tags à invalider (gabarits remplis avec les arguments)
     """
+    tags = tuple(tags)
+
     def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
         @functools.wraps(func)
         async def wrapper(*args, **kwargs) -> Any:
             result = await func(*args, **kwargs)
-            
-            # Invalide les clés spécifiées
-            from app.cache import cache_delete
+
+            # Invalide les clés et les tags spécifiés
             try:
-                for key in keys:
-                    await cache_delete(key)
+                resolved_keys = _format_templates(keys, signature, args, kwargs)
+                if resolved_keys:
+                    await get_redis().delete(*resolved_keys)
+                    await publish_invalidation(resolved_keys)
+                resolved_tags = _format_templates(tags, signature, args, kwargs)
+                if resolved_tags:
+                    await invalidate_tags(*resolved_tags)
             except Exception:
                 pass
-            
+
             return result
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -1,10 +1,17 @@
 """
 Utilitaires de monitoring et gestion du cache Redis
 """
-from app.cache import get_redis
-from app.config import CACHE_KEYS
+from app.cache import get_cache_tier_stats, get_redis, get_redis_bytes, publish_invalidation
+from app.cache_decorators import get_cached_stats
+from app.config import (
+    CACHE_KEYS,
+    CACHE_SCAN_COUNT,
+    CACHE_SCAN_MAX_CALLS,
+    CACHE_SCAN_MAX_PAGE_SIZE,
+    CACHE_SCAN_PAGE_SIZE,
+)
 import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 
 async def get_cache_stats() -> Dict:
@@ -34,22 +41,123 @@ async def get_cache_stats() -> Dict:
             stats["hit_rate_percent"] = round((hits / total) * 100, 2)
         else:
             stats["hit_rate_percent"] = 0.0
+
+        # Succès / échecs du processus par niveau (cache local, Redis)
+        stats["tiers"] = get_cache_tier_stats()
+        # Succès / échecs / latences du décorateur cached, par préfixe
+        stats["decorators"] = get_cached_stats()
             
         return stats
     except Exception as e:
         return {"error": f"Failed to get cache stats: {e}"}
 
 
-async def get_cache_keys_by_pattern(pattern: str = "*") -> List[str]:
+# ── Parcours des clés par SCAN ──────────────────────────────────────────────
+# KEYS parcourt tout l'espace de clés en une commande et bloque Redis (aussi
+# broker Celery) pendant ce temps. SCAN avance par lots de CACHE_SCAN_COUNT ;
+# chaque requête fait au plus CACHE_SCAN_MAX_CALLS appels et renvoie un
+# curseur pour reprendre. Le curseur "i:c" désigne le motif i et la position
+# SCAN c, ce qui permet de paginer sur plusieurs motifs.
+
+def _parse_scan_cursor(cursor: Optional[str], patterns: Sequence[str]) -> Tuple[int, int]:
+    if not cursor:
+        return 0, 0
+    try:
+        index, position = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        raise ValueError(f"Curseur invalide: {cursor!r}")
+    if not 0 <= index < len(patterns) or position < 0:
+        raise ValueError(f"Curseur invalide: {cursor!r}")
+    return index, position
+
+
+async def scan_keys(
+    patterns: Sequence[str],
+    cursor: Optional[str] = None,
+    limit: int = CACHE_SCAN_PAGE_SIZE,
+) -> Tuple[List[str], Optional[str]]:
     """
-    Récupère toutes les clés correspondant au pattern
+    Une page de clés correspondant aux motifs, par SCAN.
+
+    La page peut dépasser légèrement limit (un lot SCAN n'est pas coupé) ou
+    être plus courte si la borne d'appels est atteinte. Une clé peut
+    réapparaître d'une page à l'autre (garantie de SCAN).
+
+    Returns:
+        (clés, curseur suivant) ; curseur None quand le parcours est terminé
+    """
+    index, position = _parse_scan_cursor(cursor, patterns)
+    client = get_redis()
+    keys: List[str] = []
+    calls = 0
+    while index < len(patterns) and len(keys) < limit and calls < CACHE_SCAN_MAX_CALLS:
+        position, batch = await client.scan(cursor=position, match=patterns[index], count=CACHE_SCAN_COUNT)
+        calls += 1
+        keys.extend(batch)
+        if position == 0:
+            index += 1
+    next_cursor = f"{index}:{position}" if index < len(patterns) else None
+    return list(dict.fromkeys(keys)), next_cursor
+
+
+async def get_cache_keys_by_pattern(
+    pattern: str = "*",
+    cursor: Optional[str] = None,
+    limit: int = CACHE_SCAN_PAGE_SIZE,
+) -> Dict:
+    """
+    Récupère une page des clés correspondant au pattern
     """
     try:
-        client = get_redis()
-        keys = await client.keys(pattern)
-        return keys
+        keys, next_cursor = await scan_keys([pattern], cursor, min(limit, CACHE_SCAN_MAX_PAGE_SIZE))
+        return {"keys": keys, "next_cursor": next_cursor, "complete": next_cursor is None}
+    except ValueError as e:
+        return {"error": str(e)}
     except Exception as e:
-        return []
+        return {"keys": [], "next_cursor": None, "complete": True}
+
+
+async def inspect_cache_keys(
+    patterns: Sequence[str],
+    cursor: Optional[str] = None,
+    limit: int = CACHE_SCAN_PAGE_SIZE,
+    preview_chars: int = 100,
+) -> Dict:
+    """
+    Une page de clés avec TTL, taille et aperçu (endpoints /cache/inspect).
+    Les valeurs ne sont pas lues en entier : STRLEN et GETRANGE en un seul pipeline,
+    sur le client binaire (valeurs compressées, voir app.cache_codec).
+    preview_chars=0 masque le contenu (has_content seulement).
+    """
+    keys, next_cursor = await scan_keys(patterns, cursor, min(limit, CACHE_SCAN_MAX_PAGE_SIZE))
+    contents = {}
+    if keys:
+        pipe = get_redis_bytes().pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+            pipe.strlen(key)
+            if preview_chars:
+                pipe.getrange(key, 0, preview_chars - 1)
+        results = await pipe.execute(raise_on_error=False)
+        step = 3 if preview_chars else 2
+        for position, key in enumerate(keys):
+            ttl, size, *preview = results[position * step:(position + 1) * step]
+            error = next((r for r in (ttl, size, *preview) if isinstance(r, Exception)), None)
+            if error is not None:
+                # Clé non chaîne (set de tags...) ou expirée entre-temps
+                contents[key] = {"error": str(error)}
+            elif size:
+                contents[key] = {"ttl_seconds": ttl, "size_bytes": size}
+                if preview_chars:
+                    contents[key]["preview"] = preview[0].decode("utf-8", "replace")
+                else:
+                    contents[key]["has_content"] = True
+    return {
+        "keys": keys,
+        "contents": contents,
+        "next_cursor": next_cursor,
+        "complete": next_cursor is None,
+    }
 
 
 async def get_cache_key_info(key: str) -> Dict:
@@ -67,18 +175,21 @@ async def get_cache_key_info(key: str) -> Dict:
         # Récupérer les informations
         ttl = await client.ttl(key)
         key_type = await client.type(key)
-        value = await client.get(key)
         
         info = {
             "key": key,
             "type": key_type,
             "ttl_seconds": ttl,
-            "size_bytes": len(value.encode('utf-8')) if value else 0,
+            "size_bytes": 0,
         }
         
         # Ajouter des infos spécifiques selon le type
         if key_type == "string":
-            info["value_preview"] = value[:100] + "..." if len(value) > 100 else value
+            # Lecture binaire : la valeur peut être compressée (app.cache_codec)
+            value = await get_redis_bytes().get(key) or b""
+            info["size_bytes"] = len(value)
+            preview = value[:100].decode("utf-8", "replace")
+            info["value_preview"] = preview + "..." if len(value) > 100 else preview
             
         return info
     except Exception as e:
@@ -145,20 +256,23 @@ async def warm_up_cache(db_session) -> Dict[str, int]:
     return results
 
 
-async def flush_cache_by_pattern(pattern: str) -> Dict[str, int]:
+async def flush_cache_by_pattern(pattern: str, cursor: Optional[str] = None) -> Dict:
     """
-    Supprime toutes les clés correspondant au pattern
+    Supprime les clés correspondant au pattern, au plus CACHE_SCAN_MAX_PAGE_SIZE
+    par appel : rappeler avec next_cursor tant que complete est faux.
+    UNLINK libère la mémoire hors du thread principal de Redis.
     """
     try:
         client = get_redis()
-        keys = await client.keys(pattern)
-        
+        keys, next_cursor = await scan_keys([pattern], cursor, CACHE_SCAN_MAX_PAGE_SIZE)
+        deleted = 0
+        for start in range(0, len(keys), CACHE_SCAN_COUNT):
+            deleted += await client.unlink(*keys[start:start + CACHE_SCAN_COUNT])
         if keys:
-            deleted = await client.delete(*keys)
-            return {"deleted": deleted, "keys": keys}
-        else:
-            return {"deleted": 0, "keys": []}
-            
+            await publish_invalidation(keys)
+        return {"deleted": deleted, "keys": keys, "next_cursor": next_cursor, "complete": next_cursor is None}
+    except ValueError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Failed to flush cache: {e}"}
 
@@ -1,5 +1,11 @@
 from celery import Celery
-from app.config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND
+from app.config import (
+    CELERY_BROKER_URL,
+    CELERY_RESULT_BACKEND,
+    DASHBOARD_RECONCILE_INTERVAL,
+    SIMULATEUR_CACHE_ENABLED,
+    SIMULATEUR_SIC_POLL_INTERVAL,
+)
 
 # Configuration Celery avec Redis comme broker ET backend de résultats
 # RabbitMQ a été retiré de l'architecture (2026-06-09) — voir BUG-003 dans docs/ERREURS.md
@@ -12,7 +18,10 @@ celery_app = Celery(
         "app.tasks.test_tasks",          # Tâches de test basiques
         "app.tasks.simple_tasks",        # Tâches simplifiées sans DB
         "app.tasks.notification_tasks",  # 🔥 PRODUCTION: Firebase + DB
-        "app.tasks.batch_tasks"          # 🔥 PRODUCTION: Batch processing
+        "app.tasks.batch_tasks",         # 🔥 PRODUCTION: Batch processing
+        "app.tasks.dashboard_tasks",     # Recalcul périodique des compteurs dashboard
+        "app.tasks.sms_tasks",           # SMS en file (OTP, envois groupés)
+        "app.tasks.simulateur_tasks"     # Invalidation du cache des simulations (achats SIC)
     ]
 )
 
@@ -54,6 +63,10 @@ celery_app.conf.update(
         "send_urgent_notification": {"queue": "urgent"},
         "send_batch_notifications": {"queue": "high_priority"},
         "send_broadcast_notifications": {"queue": "low_priority"},
+        "reconcile_dashboard_counters": {"queue": "low_priority"},
+        "send_sms": {"queue": "urgent"},
+        "send_bulk_sms": {"queue": "normal"},
+        "invalidate_simulations_from_sic": {"queue": "low_priority"},
     },
     
     # Configuration des queues avec priorités
@@ -63,6 +76,14 @@ celery_app.conf.update(
     # Monitoring
     worker_send_task_events=True,
     task_send_sent_event=True,
+
+    # Tâches périodiques (celery beat)
+    beat_schedule={
+        "reconcile-dashboard-counters": {
+            "task": "reconcile_dashboard_counters",
+            "schedule": DASHBOARD_RECONCILE_INTERVAL,
+        },
+    },
 )
 
 # Configuration PRODUCTION avec toutes les queues et priorités
@@ -109,5 +130,28 @@ celery_app.conf.task_routes.update({
     'send_broadcast_notifications': {
         'queue': 'low_priority',
         'priority': 3
+    },
+    'reconcile_dashboard_counters': {
+        'queue': 'low_priority',
+        'priority': 2
+    },
+    'send_sms': {
+        'queue': 'urgent',
+        'priority': 8
+    },
+    'send_bulk_sms': {
+        'queue': 'normal',
+        'priority': 5
+    },
+    'invalidate_simulations_from_sic': {
+        'queue': 'low_priority',
+        'priority': 3
+    }
+})
+
+# Cache des simulations (opt-in) : recherche périodique des achats réels dans SIC
+if SIMULATEUR_CACHE_ENABLED:
+    celery_app.conf.beat_schedule["invalidate-simulations-from-sic"] = {
+        "task": "invalidate_simulations_from_sic",
+        "schedule": SIMULATEUR_SIC_POLL_INTERVAL,
     }
-})
\ No newline at end of file
@@ -50,6 +50,28 @@ import os
 # Redis
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 REDIS_DEFAULT_TTL_SECONDS = int(os.getenv("REDIS_DEFAULT_TTL_SECONDS", "300"))
+CACHE_TAG_TTL = int(os.getenv("CACHE_TAG_TTL", "86400"))  # durée de vie min. des sets de tags (≥ plus long TTL d'entrée)
+CACHE_TTL_JITTER = float(os.getenv("CACHE_TTL_JITTER", "0.1"))   # décalage aléatoire des TTL (±10%)
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "600"))       # entrée périmée servie pendant son rafraîchissement (s)
+CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", "30"))  # verrou de recalcul d'une entrée (s)
+CACHE_NEGATIVE_TTL = int(os.getenv("CACHE_NEGATIVE_TTL", "60"))  # résultat absent / 404 mis en cache (s)
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "none").lower()  # none, zstd (paquet zstandard) ou lz4 (paquet lz4)
+CACHE_COMPRESSION_THRESHOLD = int(os.getenv("CACHE_COMPRESSION_THRESHOLD", "4096"))  # taille min. compressée (octets)
+CACHE_COMPRESSION_LEVEL = int(os.getenv("CACHE_COMPRESSION_LEVEL", "3"))  # niveau zstd
+
+# Cache local (mémoire du processus) devant Redis pour les données de référence
+LOCAL_CACHE_ENABLED = os.getenv("LOCAL_CACHE_ENABLED", "True").lower() in ("true", "1", "yes")
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1000"))  # entrées max (LRU)
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "300"))               # durée max d'une entrée locale (s)
+LOCAL_CACHE_PREFIXES = tuple(os.getenv(
+    "LOCAL_CACHE_PREFIXES",
+    "roles:,role:,agences:,agence:,type_compteur:,type_demande:,type_notification:,etat_compteur:,seuil_tarif:"
+).split(","))                                                              # préfixes des clés de référence
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")  # canal pub/sub
+CACHE_SCAN_COUNT = int(os.getenv("CACHE_SCAN_COUNT", "500"))            # clés examinées par appel SCAN (COUNT)
+CACHE_SCAN_MAX_CALLS = int(os.getenv("CACHE_SCAN_MAX_CALLS", "50"))     # appels SCAN max par requête d'inspection / flush
+CACHE_SCAN_PAGE_SIZE = int(os.getenv("CACHE_SCAN_PAGE_SIZE", "100"))    # clés par page par défaut
+CACHE_SCAN_MAX_PAGE_SIZE = int(os.getenv("CACHE_SCAN_MAX_PAGE_SIZE", "1000"))  # clés par page max (et par flush)
 REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "10"))
 REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
 
@@ -101,12 +123,14 @@ CACHE_KEYS = {
     "NOTIFICATIONS_ALL": "notifications:all",
     "NOTIFICATIONS_BY_USER": "notifications:user:{user_id}",
     "NOTIFICATIONS_UNREAD": "notifications:unread:user:{user_id}",
+    "NOTIFICATIONS_UNREAD_GLOBAL": "notifications:unread:global",
     
     # Postpaid & SIC - données externes
     "POSTPAID_TOP6_BILLS": "postpaid:top6bills:{numCC}",
     "POSTPAID_BILLS_BY_METER": "postpaid:bills:meter:{meter}",
     "SIC_CUSTOMER_BY_METER": "sic:customer:meter:{meter}",
     "SIC_CUSTOMER_BY_PHONE": "sic:customer:phone:{phone}",
+    "SIMULATEUR_TRIAL": "simulateur:trial:{meter}:{amount}:{day}",
 
     # Abonnement - suivi des demandes d'abonnement
     "AVIS_BY_NUM": "abonnement:avis:{num_avis}:{telephone}",
@@ -143,6 +167,7 @@ CACHE_TTL = {
     
     # Données très dynamiques - 1 minute
     "NOTIFICATIONS": 60,        # notifications
+    "NOTIFICATIONS_UNREAD": 86400,  # compteurs de non lues (reconstruits depuis la base à expiration)
     
     # Données externes - 30 secondes
     "EXTERNAL_APIs": 30,        # SIC, Postpaid
@@ -151,11 +176,78 @@ CACHE_TTL = {
     "AVIS": 300,                # étapes d'un avis d'abonnement
 }
 
+# Pools de connexions SQL Server (SIC, HISTH2MC, BI_ODS)
+SQLSERVER_POOL_SIZE = int(os.getenv("SQLSERVER_POOL_SIZE", "10"))            # connexions max par source
+SQLSERVER_POOL_TIMEOUT = float(os.getenv("SQLSERVER_POOL_TIMEOUT", "10"))     # attente max d'une connexion (s)
+SQLSERVER_POOL_RECYCLE = int(os.getenv("SQLSERVER_POOL_RECYCLE", "1800"))     # âge max d'une connexion (s)
+SQLSERVER_POOL_PING_IDLE = int(os.getenv("SQLSERVER_POOL_PING_IDLE", "30"))   # test SELECT 1 si inactive depuis (s)
+SQLSERVER_EXECUTOR_WORKERS = int(os.getenv("SQLSERVER_EXECUTOR_WORKERS", str(SQLSERVER_POOL_SIZE)))  # threads par source
+SQLSERVER_EXECUTOR_MAX_QUEUE = int(os.getenv("SQLSERVER_EXECUTOR_MAX_QUEUE", "50"))  # requêtes en attente avant 503
+SQLSERVER_QUERY_TIMEOUT = float(os.getenv("SQLSERVER_QUERY_TIMEOUT", "30"))          # délai max d'une requête (s)
+
+# Pool de connexions PostgreSQL samaconso (moteur synchrone et moteur asyncpg)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))          # connexions permanentes par processus
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))    # connexions temporaires au-delà du pool
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # attente max d'une connexion (s)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # âge max d'une connexion (s)
+
+# Envoi FCM concurrent (HTTP/2) des notifications en lot
+FCM_CONCURRENCY = int(os.getenv("FCM_CONCURRENCY", "100"))        # requêtes simultanées par lot
+FCM_RATE_LIMIT = float(os.getenv("FCM_RATE_LIMIT", "500"))        # messages/seconde max, tous workers confondus (0 = illimité)
+FCM_MAX_RETRIES = int(os.getenv("FCM_MAX_RETRIES", "3"))          # réessais sur 429/5xx
+FCM_RETRY_BACKOFF = float(os.getenv("FCM_RETRY_BACKOFF", "0.5"))  # délai du premier réessai (s)
+FCM_REQUEST_TIMEOUT = float(os.getenv("FCM_REQUEST_TIMEOUT", "5"))  # délai max d'une requête (s)
+
+# Passerelle SMS Orange SMS Pro (SOAP)
+SMS_WSDL_URL = os.getenv("SMS_WSDL_URL", "http://10.101.2.86:8080/OrangeSmsPro/OSPWebService?wsdl")
+SMS_WSDL_CACHE_PATH = os.getenv("SMS_WSDL_CACHE_PATH", "/tmp/samaconso_sms_wsdl.db")  # cache disque du WSDL (SQLite)
+SMS_WSDL_CACHE_TTL = int(os.getenv("SMS_WSDL_CACHE_TTL", "86400"))    # durée de validité du WSDL en cache (s)
+SMS_POOL_SIZE = int(os.getenv("SMS_POOL_SIZE", "10"))                 # connexions HTTP gardées ouvertes / envois simultanés
+SMS_TIMEOUT = float(os.getenv("SMS_TIMEOUT", "10"))                   # délai max d'un appel SOAP (s)
+SMS_RATE_LIMIT = os.getenv("SMS_RATE_LIMIT", "10/s")                  # débit des envois en file, par worker Celery
+SMS_BULK_MAX = int(os.getenv("SMS_BULK_MAX", "1000"))                 # SMS max par requête d'envoi groupé
+
+# Simulateur XMLVend (mTLS) : session partagée, endpoint SOAP mis en cache
+XMLVEND_ENDPOINT_TTL = float(os.getenv("XMLVEND_ENDPOINT_TTL", "3600"))  # durée de vie de l'endpoint résolu depuis le WSDL (s)
+XMLVEND_POOL_SIZE = int(os.getenv("XMLVEND_POOL_SIZE", "10"))            # connexions keep-alive et appels simultanés
+XMLVEND_TIMEOUT = float(os.getenv("XMLVEND_TIMEOUT", "60"))              # délai max d'un appel SOAP (s)
+XMLVEND_WSDL_TIMEOUT = float(os.getenv("XMLVEND_WSDL_TIMEOUT", "30"))    # délai max du téléchargement du WSDL (s)
+XMLVEND_BATCH_CONCURRENCY = int(os.getenv("XMLVEND_BATCH_CONCURRENCY", "5"))  # simulations simultanées par lot (défaut)
+XMLVEND_BATCH_MAX = int(os.getenv("XMLVEND_BATCH_MAX", "200"))                # simulations max par lot
+
+# Cache des simulations d'achat (opt-in) : même compteur, même montant, même jour tarifaire
+SIMULATEUR_CACHE_ENABLED = os.getenv("SIMULATEUR_CACHE_ENABLED", "False").lower() in ("true", "1", "yes")
+SIMULATEUR_CACHE_TTL = int(os.getenv("SIMULATEUR_CACHE_TTL", "300"))                     # durée de vie d'une simulation (s)
+SIMULATEUR_SIC_POLL_INTERVAL = int(os.getenv("SIMULATEUR_SIC_POLL_INTERVAL", "60"))      # recherche des achats réels dans SIC (s)
+
+# Broadcast FCM : vagues de chunks ajustées selon les 429, le taux de succès et la file Celery
+BROADCAST_MIN_CHUNK = int(os.getenv("BROADCAST_MIN_CHUNK", "100"))                  # tokens par chunk (min)
+BROADCAST_MAX_CHUNK = int(os.getenv("BROADCAST_MAX_CHUNK", "1000"))                 # tokens par chunk (max)
+BROADCAST_WAVE_CHUNKS = int(os.getenv("BROADCAST_WAVE_CHUNKS", "5"))                # chunks publiés par vague
+BROADCAST_BASE_INTERVAL = float(os.getenv("BROADCAST_BASE_INTERVAL", "2"))          # délai min entre vagues (s)
+BROADCAST_MAX_INTERVAL = float(os.getenv("BROADCAST_MAX_INTERVAL", "60"))           # délai max entre vagues (s)
+BROADCAST_TARGET_QUEUE_DEPTH = int(os.getenv("BROADCAST_TARGET_QUEUE_DEPTH", "20"))  # file low_priority tolérée
+
+# Backplane WebSocket (Redis pub/sub entre processus uvicorn et workers)
+WS_BACKPLANE_ENABLED = os.getenv("WS_BACKPLANE_ENABLED", "True").lower() in ("true", "1", "yes")
+WS_PRESENCE_TTL = int(os.getenv("WS_PRESENCE_TTL", "30"))                  # expiration de la présence d'un nœud (s)
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "10"))    # rafraîchissement de la présence (s)
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))                 # délai max d'un envoi sur une socket (s)
+WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "100"))   # messages en attente par connexion
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")  # "drop_oldest" ou "disconnect"
+
+# Boîte de réception paginée (GET /notifications/user/{user_id}/inbox)
+NOTIFICATIONS_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_PAGE_SIZE", "20"))           # taille de page par défaut
+NOTIFICATIONS_MAX_PAGE_SIZE = int(os.getenv("NOTIFICATIONS_MAX_PAGE_SIZE", "100"))  # taille de page maximale
+
 # Celery Configuration
 # Redis comme broker ET backend (plus de RabbitMQ — voir BUG-003 dans docs/ERREURS.md)
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", REDIS_URL)
 
+# Recalcul complet des compteurs du dashboard (celery beat), en secondes
+DASHBOARD_RECONCILE_INTERVAL = int(os.getenv("DASHBOARD_RECONCILE_INTERVAL", "3600"))
+
 # File de publication générique (utilisée par /utils/publish)
 REDIS_PUBLISH_QUEUE = os.getenv("REDIS_PUBLISH_QUEUE", "samaconso.queue")
 
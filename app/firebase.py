@@ -7,6 +7,7 @@ from google.auth.transport.requests import Request
 import requests
 from datetime import datetime, timedelta
 import threading
+import asyncio
 import os
 
 # Désactiver les warnings SSL (nécessaire avec proxy Senelec)
@@ -15,6 +16,16 @@ import warnings
 warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
 from app.schemas.notification_schemas import PushNotification
+from app.services.fcm_sender import RATE_LIMIT_KEY, FcmSender, RedisTokenBucket
+from app.config import (
+    FCM_CONCURRENCY,
+    FCM_RATE_LIMIT,
+    FCM_MAX_RETRIES,
+    FCM_RETRY_BACKOFF,
+    FCM_REQUEST_TIMEOUT,
+    REDIS_URL,
+)
+from redis import asyncio as aioredis
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -146,79 +157,67 @@ async def send_pushNotification(data: PushNotification):
 
 def send_batch_pushNotifications(notifications_batch: list):
     """
-    Envoi de notifications FCM en batch (jusqu'à 500 par batch selon FCM)
-    BEAUCOUP plus rapide que les envois individuels
+    Envoi de notifications FCM en batch
+    Les messages sont envoyés en parallèle sur une connexion HTTP/2 (FcmSender) :
+    concurrence bornée, quota messages/seconde partagé entre workers et réessais sur 429/5xx
 
     Args:
         notifications_batch: Liste de dict avec {token, title, body}
 
     Returns:
-        dict avec statistiques d'envoi (success_count, failure_count, responses)
+        dict avec statistiques d'envoi (success_count, failure_count, responses,
+        throttled_count, dead_tokens)
     """
     if not notifications_batch:
-        return {"success_count": 0, "failure_count": 0, "responses": []}
+        return {"success_count": 0, "failure_count": 0, "responses": [], "throttled_count": 0, "dead_tokens": {}}
 
     # Récupérer les credentials en cache
-    session, access_token, project_id = _get_cached_credentials()
+    _session, access_token, project_id = _get_cached_credentials()
 
-    # FCM accepte jusqu'à 500 messages par batch
-    # https://firebase.google.com/docs/cloud-messaging/send-message#send-a-batch-of-messages
-    max_batch_size = 500
-    all_results = {
-        "success_count": 0,
-        "failure_count": 0,
-        "responses": []
-    }
+    # Appelé depuis les workers Celery (synchrones) : boucle et moteur d'envoi du processus
+    loop = _get_fcm_loop()
+    return loop.run_until_complete(_get_fcm_sender(project_id, access_token).send_all(notifications_batch))
 
-    # Diviser en chunks de 500 max
-    for i in range(0, len(notifications_batch), max_batch_size):
-        chunk = notifications_batch[i:i + max_batch_size]
-
-        # Préparer les messages pour ce chunk
-        messages = []
-        for notif in chunk:
-            messages.append({
-                "message": {
-                    "token": notif["token"],
-                    "notification": {
-                        "title": notif["title"],
-                        "body": notif["body"],
-                    },
-                    "android": {
-                        "priority": "high"
-                    }
-                }
-            })
-
-        # Envoi en parallèle avec session pooling
-        # Note: FCM ne supporte pas le vrai batch API v1, mais on peut envoyer en parallèle
-        # avec une session réutilisée pour de meilleures performances
-        url = f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; UTF-8",
-        }
 
-        # Envoi séquentiel optimisé avec session réutilisée
-        for msg in messages:
-            try:
-                response = session.post(url, headers=headers, json=msg, timeout=5)
-                if response.status_code == 200:
-                    all_results["success_count"] += 1
-                    all_results["responses"].append({"status": "success", "code": 200})
-                else:
-                    all_results["failure_count"] += 1
-                    all_results["responses"].append({
-                        "status": "failed",
-                        "code": response.status_code,
-                        "error": response.text[:100]  # Limiter la taille
-                    })
-            except Exception as e:
-                all_results["failure_count"] += 1
-                all_results["responses"].append({
-                    "status": "error",
-                    "error": str(e)[:100]
-                })
-
-    return all_results
+# ============= Moteur d'envoi FCM par processus worker =============
+# Une boucle asyncio et un FcmSender par processus (pool Celery "solo" : une tâche
+# à la fois) : la connexion HTTP/2 et sa poignée de main TLS servent à tous les lots,
+# et le quota (RedisTokenBucket) est commun à tous les workers du projet.
+_fcm_runtime = {
+    "loop": None,
+    "sender": None,
+}
 
+def _get_fcm_loop() -> asyncio.AbstractEventLoop:
+    loop = _fcm_runtime["loop"]
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _fcm_runtime["loop"] = loop
+    return loop
+
+def _get_fcm_sender(project_id: str, access_token: str) -> FcmSender:
+    """FcmSender du processus (créé au premier lot), avec le jeton OAuth2 courant"""
+    sender = _fcm_runtime["sender"]
+    if sender is None:
+        # FCM v1 n'a pas d'API batch : un message par requête, multiplexées en HTTP/2
+        bucket = None
+        if FCM_RATE_LIMIT > 0:
+            bucket = RedisTokenBucket(
+                aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True),
+                RATE_LIMIT_KEY.format(project_id=project_id),
+                FCM_RATE_LIMIT,
+            )
+        sender = FcmSender(
+            send_url=f"https://fcm.googleapis.com/v1/projects/{project_id}/messages:send",
+            access_token=access_token,
+            concurrency=FCM_CONCURRENCY,
+            rate_limit=FCM_RATE_LIMIT,
+            max_retries=FCM_MAX_RETRIES,
+            backoff_base=FCM_RETRY_BACKOFF,
+            timeout=FCM_REQUEST_TIMEOUT,
+            verify=False,  # proxy Senelec
+            bucket=bucket,
+        )
+        _fcm_runtime["sender"] = sender
+    sender.access_token = access_token
+    return sender
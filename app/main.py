@@ -13,7 +13,7 @@ from app.routers.user_compteur_routers import user_compteur_router
 from app.routers.user_session_routers import user_session_router
 from app.routers.type_notification_routers import type_notification_router
 from app.routers.notification_routers import notification_router
-from app.routers.websocket_routers import websocket_router
+from app.routers.websocket_routers import websocket_router, get_websocket_backplane
 from app.routers.dashboard_routers import dashboard_router
 from app.routers.agence_routers import agence_router
 from app.routers.type_demande_routers import type_demande_router
@@ -23,15 +23,23 @@ from app.routers.seuil_tarif_routers import seuil_tarif_router
 # from app.routers.simulateur_routers_old import simulateur_router
 # from app.routers.simulateur_routers_v2 import simulateur_router_v2
 # from app.routers.simulateur_routers_v3 import simulateur_router_v3
-from app.routers.simulateur_routers import simulateur_router
+from app.routers.simulateur_routers import simulateur_router, close_xmlvend_client
 from app.routers.logs_routers import logs_router
 from app.routers.abonnement_routers import abonnement_router
 from app.firebase import *
-from app.cache import init_redis, close_redis, get_redis
+from app.cache import (
+    init_redis,
+    close_redis,
+    get_redis,
+    start_cache_invalidation_listener,
+    stop_cache_invalidation_listener,
+)
+from app.database import get_sqlserver_pool_stats, close_sqlserver_pools, async_engine
 from app.routers.utils_routers import utils_router
 from app.logging_config import init_logging, get_logger
 from app.middleware.logging_middleware import RequestLoggingMiddleware, SecurityLoggingMiddleware
 from app.services.minio_service import init_minio_service
+from app.services.sms_gateway import close_sms_gateway
 from app import config
 import requests
 import os
@@ -142,6 +150,15 @@ async def on_startup() -> None:
         main_logger.error(f"❌ Redis initialization failed: {e}")
         raise
 
+    try:
+        await get_websocket_backplane().start(get_redis())
+    except Exception as e:
+        main_logger.warning(f"⚠️ WebSocket backplane unavailable, local delivery only: {e}")
+
+    try:
+        await start_cache_invalidation_listener()
+    except Exception as e:
+        main_logger.warning(f"⚠️ Local cache invalidation unavailable: {e}")
 
     # Initialisation MinIO (avec timeout pour éviter de bloquer le démarrage)
     try:
@@ -179,12 +196,46 @@ async def on_startup() -> None:
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
     main_logger.info("🔄 Shutting down application services...")
+
+    try:
+        await get_websocket_backplane().stop()
+    except Exception as e:
+        main_logger.error(f"❌ Error stopping WebSocket backplane: {e}")
+
+    try:
+        await stop_cache_invalidation_listener()
+    except Exception as e:
+        main_logger.error(f"❌ Error stopping cache invalidation listener: {e}")
     
     try:
         await close_redis()
         main_logger.info("✅ Redis connection closed successfully")
     except Exception as e:
         main_logger.error(f"❌ Error closing Redis connection: {e}")
+
+    try:
+        close_sqlserver_pools()
+        main_logger.info("✅ SQL Server connection pools closed")
+    except Exception as e:
+        main_logger.error(f"❌ Error closing SQL Server pools: {e}")
+
+    try:
+        await async_engine.dispose()
+        main_logger.info("✅ PostgreSQL async connection pool closed")
+    except Exception as e:
+        main_logger.error(f"❌ Error closing PostgreSQL async pool: {e}")
+
+    try:
+        close_sms_gateway()
+        main_logger.info("✅ SMS gateway client closed")
+    except Exception as e:
+        main_logger.error(f"❌ Error closing SMS gateway client: {e}")
+
+    try:
+        close_xmlvend_client()
+        main_logger.info("✅ XMLVend client closed")
+    except Exception as e:
+        main_logger.error(f"❌ Error closing XMLVend client: {e}")
     
     
     main_logger.info("🏁 Application shutdown completed")
@@ -227,6 +278,12 @@ async def health_broker():
         return {"status": "error", "detail": str(e)}
 
 
+@app.get("/health/sqlserver")
+async def health_sqlserver():
+    """Statistiques des pools de connexions SQL Server (SIC, HISTH2MC, BI_ODS)"""
+    return {"status": "ok", "pools": get_sqlserver_pool_stats()}
+
+
 @app.get("/health/logs")
 async def health_logs():
     """Endpoint pour vérifier le système de logs"""
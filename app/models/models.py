@@ -1,6 +1,6 @@
 from datetime import datetime
 from app.database import Base, engine
-from sqlalchemy import Column, DateTime, Double,String, Integer,ForeignKey,Boolean
+from sqlalchemy import Column, DateTime, Double,String, Integer,ForeignKey,Boolean,Index
 from sqlalchemy.orm import relationship
 
 
@@ -95,8 +95,8 @@ class  UserSession(Base):
     id = Column(Integer, primary_key=True,autoincrement=True)
     user_id = Column(Integer, ForeignKey("user.id"))
     device_model  = Column(String,nullable=True)
-    fcm_token = Column(String,nullable=True)
-    refresh_token_hash = Column(String,nullable=True)  # Hash du refresh token pour sécurité
+    fcm_token = Column(String,nullable=True,index=True)
+    refresh_token_hash = Column(String,nullable=True,unique=True,index=True)  # Hash SHA-256 du refresh token (recherche par égalité)
     refresh_token_expires_at = Column(DateTime(timezone=True),nullable=True)  # Date d'expiration du refresh token
     is_active = Column(Boolean, default=True)
     last_login = Column(DateTime, default=datetime.now())
@@ -107,6 +107,10 @@ class  UserSession(Base):
 
 class Notification(Base):
     __tablename__ = 'notification'
+    __table_args__ = (
+        # Boîte de réception paginée (keyset sur created_at, id) par destinataire
+        Index('ix_notification_for_user_created', 'for_user_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True,autoincrement=True)
     type_notification_id = Column(Integer,ForeignKey('type_notification.id'),nullable=True)
@@ -178,5 +182,30 @@ class SeuilTarif(Base):
     created_at  = Column(DateTime(timezone=True), nullable=False, default=datetime.now())
 
 
+
+class DashboardCompteurStats(Base):
+    """Compteurs du dashboard maintenus à chaque écriture sur user_compteur (une ligne par agence + une globale)"""
+    __tablename__ = 'dashboard_compteur_stats'
+    scope = Column(String, primary_key=True)  # nom_agence, ou '__global__'
+    total_compteurs = Column(Integer, nullable=False, default=0)
+    compteurs_actifs = Column(Integer, nullable=False, default=0)
+    compteurs_inactifs = Column(Integer, nullable=False, default=0)
+    compteurs_woyofal = Column(Integer, nullable=False, default=0)
+    compteurs_classique = Column(Integer, nullable=False, default=0)
+    demandes_traites = Column(Integer, nullable=False, default=0)
+    demandes_en_cours = Column(Integer, nullable=False, default=0)
+    owners = Column(Integer, nullable=False, default=0)
+    not_owners = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class DashboardOwnerRef(Base):
+    """Nombre de liaisons par (périmètre, utilisateur, propriétaire) : permet de maintenir les COUNT DISTINCT owners"""
+    __tablename__ = 'dashboard_owner_ref'
+    scope = Column(String, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    est_proprietaire = Column(Boolean, primary_key=True)
+    nb = Column(Integer, nullable=False, default=0)
+
 # Les tables sont gérées par Alembic (alembic upgrade head)
 # Ne jamais appeler create_all ici — voir BUG-002 dans docs/ERREURS.md
\ No newline at end of file
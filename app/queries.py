@@ -259,6 +259,12 @@ from HEXING_SENELECBILL_ALHDL2 b, HEXING_INFOS_ADMINISTRATIVES_NEW a
 where a.[N° COMPTEUR] = ? and a.[N° COMPTEUR] = b.NUMERO_COMPTEUR and a.POC = b.POLICE
 order by b.DATE_TRANSACTION desc"""
 
+# Compteurs woyofal ayant un achat réel depuis une date (invalidation du cache des simulations)
+woyofalPurchasesSinceQuery = """select NUMERO_COMPTEUR, max(DATE_TRANSACTION) as DERNIERE_TRANSACTION
+from HEXING_SENELECBILL_ALHDL2
+where DATE_TRANSACTION >= ?
+group by NUMERO_COMPTEUR"""
+
 
 verifierSiCompteurWoyofalExiste = """select poc, tel,[N° CLIENT] as id_client,ADRESSE as adresse,usage,CLIENT as nomClient,agence from HEXING_INFOS_ADMINISTRATIVES_NEW where [N° COMPTEUR] = ?"""
 
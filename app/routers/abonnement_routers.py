@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Query, status
-from app.database import get_db_connection_avis,get_db_connection_postpaid
+from app.database import sqlserver_fetch_all
 from app.schemas.abonnement_schemas import AvisResponseSchema, ClientSchema, EtapeSchema
 from app.cache import cache_get, cache_set
 from app.config import CACHE_KEYS, CACHE_TTL
@@ -72,6 +72,18 @@ def _build_response(rows, num_avis: str) -> AvisResponseSchema:
     )
 
 
+async def _fetch_avis_rows(num_avis: str):
+    """Lit les étapes de l'avis dans BI_ODS (hors boucle asyncio)."""
+    try:
+        return await sqlserver_fetch_all("avis", AVIS_QUERY, (num_avis,), as_dict=False)
+    except pyodbc.Error as e:
+        logger.error(f"Erreur SQL Server pour avis {num_avis}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur lors de la récupération des données."
+        )
+
+
 @abonnement_router.get("/avis/details/{num_avis}", response_model=AvisResponseSchema)
 async def get_avis_par_numero(num_avis: str):
     """
@@ -89,48 +101,25 @@ async def get_avis_par_numero(num_avis: str):
     except Exception:
         pass
 
-    conn = get_db_connection_avis()
-    if not conn:
-        logger.error("Impossible de se connecter à BI_ODS")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erreur de connexion à la base de données."
-        )
+    rows = await _fetch_avis_rows(num_avis)
+
+    if not rows:
+        logger.info(f"Avis {num_avis} non trouvé en base")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERR_NOT_FOUND)
+
+    response = _build_response(rows, num_avis)
 
     try:
-        cursor = conn.cursor()
-        cursor.execute(AVIS_QUERY, num_avis)
-        rows = cursor.fetchall()
-
-        if not rows:
-            logger.info(f"Avis {num_avis} non trouvé en base")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERR_NOT_FOUND)
-
-        response = _build_response(rows, num_avis)
-
-        try:
-            await cache_set(
-                cache_key,
-                json.dumps(response.model_dump(), default=str),
-                CACHE_TTL["AVIS"]
-            )
-            logger.info(f"Cache SET pour avis {num_avis} sans téléphone (TTL={CACHE_TTL['AVIS']}s)")
-        except Exception:
-            pass
-
-        return response
-
-    except HTTPException:
-        raise
-    except pyodbc.Error as e:
-        logger.error(f"Erreur SQL Server pour avis {num_avis}: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erreur lors de la récupération des données."
+        await cache_set(
+            cache_key,
+            json.dumps(response.model_dump(), default=str),
+            CACHE_TTL["AVIS"]
         )
-    finally:
-        cursor.close()
-        conn.close()
+        logger.info(f"Cache SET pour avis {num_avis} sans téléphone (TTL={CACHE_TTL['AVIS']}s)")
+    except Exception:
+        pass
+
+    return response
 
 
 @abonnement_router.get("/avis/{num_avis}", response_model=AvisResponseSchema)
@@ -162,51 +151,28 @@ async def get_avis(
     except Exception:
         pass
 
-    conn = get_db_connection_avis()
-    if not conn:
-        logger.error("Impossible de se connecter à BI_ODS")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erreur de connexion à la base de données."
-        )
+    rows = await _fetch_avis_rows(num_avis)
+
+    if not rows:
+        logger.info(f"Avis {num_avis} non trouvé en base")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERR_NOT_FOUND)
+
+    # Vérification de la paire (avis, téléphone) : même message d'erreur
+    db_phone = _normalize_phone(rows[0].TELEPHONE or "")
+    if not db_phone or db_phone != telephone_normalise:
+        logger.info(f"Téléphone non correspondant pour avis {num_avis}")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERR_NOT_FOUND)
+
+    response = _build_response(rows, num_avis)
 
     try:
-        cursor = conn.cursor()
-        cursor.execute(AVIS_QUERY, num_avis)
-        rows = cursor.fetchall()
-
-        if not rows:
-            logger.info(f"Avis {num_avis} non trouvé en base")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERR_NOT_FOUND)
-
-        # Vérification de la paire (avis, téléphone) : même message d'erreur
-        db_phone = _normalize_phone(rows[0].TELEPHONE or "")
-        if not db_phone or db_phone != telephone_normalise:
-            logger.info(f"Téléphone non correspondant pour avis {num_avis}")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERR_NOT_FOUND)
-
-        response = _build_response(rows, num_avis)
-
-        try:
-            await cache_set(
-                cache_key,
-                json.dumps(response.model_dump(), default=str),
-                CACHE_TTL["AVIS"]
-            )
-            logger.info(f"Cache SET pour avis {num_avis} (TTL={CACHE_TTL['AVIS']}s)")
-        except Exception:
-            pass
-
-        return response
-
-    except HTTPException:
-        raise
-    except pyodbc.Error as e:
-        logger.error(f"Erreur SQL Server pour avis {num_avis}: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erreur lors de la récupération des données."
+        await cache_set(
+            cache_key,
+            json.dumps(response.model_dump(), default=str),
+            CACHE_TTL["AVIS"]
         )
-    finally:
-        cursor.close()
-        conn.close()
+        logger.info(f"Cache SET pour avis {num_avis} (TTL={CACHE_TTL['AVIS']}s)")
+    except Exception:
+        pass
+
+    return response
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException,status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException,status, Query
 import json
 from sqlalchemy.orm import Session
 from app.auth import get_current_user
@@ -6,7 +7,8 @@ from app.database import get_db_samaconso
 from app.models.models import Agence
 from app.schemas.agence_schemas import AgenceCreateSchemas, AgenceUpdateSchemas
 from app.cache import cache_get, cache_set, cache_delete
-from app.config import CACHE_KEYS
+from app.cache_utils import inspect_cache_keys
+from app.config import CACHE_KEYS, CACHE_SCAN_MAX_PAGE_SIZE, CACHE_SCAN_PAGE_SIZE
 
 
 agence_router = APIRouter(prefix="/agence",tags=["agence"])
@@ -118,7 +120,10 @@ async def delete_role(agence_id:int,db: Session = Depends(get_db_samaconso)):
 
 
 @agence_router.get("/cache/inspect")
-async def inspect_agence_cache():
+async def inspect_agence_cache(
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    limit: int = Query(CACHE_SCAN_PAGE_SIZE, ge=1, le=CACHE_SCAN_MAX_PAGE_SIZE),
+):
     """Endpoint pour inspecter le cache Redis des agences"""
     try:
         from app.cache import get_redis
@@ -127,44 +132,26 @@ async def inspect_agence_cache():
         # Vérifier la connexion
         await client.ping()
         
-        # Récupérer toutes les clés d'agences
-        agence_keys = await client.keys("agence*")
+        # Clés parcourues par SCAN, une page par appel (jamais KEYS, qui bloque Redis)
+        page = await inspect_cache_keys(["agence*"], cursor, limit, preview_chars=200)
         
         cache_info = {
             "redis_connected": True,
-            "agence_cache_keys": [],
-            "cache_contents": {}
+            "agence_cache_keys": page["keys"],
+            "cache_contents": page["contents"],
+            "next_cursor": page["next_cursor"],
+            "complete": page["complete"]
         }
         
-        for key in agence_keys:
-            key_str = key.decode() if isinstance(key, bytes) else key
-            cache_info["agence_cache_keys"].append(key_str)
-            
-            # Récupérer le contenu de chaque clé
-            value = await client.get(key_str)
-            ttl = await client.ttl(key_str)
-            
-            if value:
-                try:
-                    parsed_value = json.loads(value)
-                    cache_info["cache_contents"][key_str] = {
-                        "data_preview": str(parsed_value)[:200] + "..." if len(str(parsed_value)) > 200 else parsed_value,
-                        "ttl_seconds": ttl,
-                        "size_bytes": len(value)
-                    }
-                except json.JSONDecodeError:
-                    cache_info["cache_contents"][key_str] = {
-                        "raw_data": str(value)[:200] + "..." if len(str(value)) > 200 else value,
-                        "ttl_seconds": ttl,
-                        "size_bytes": len(str(value))
-                    }
-        
         return {
             "status": 200,
             "message": "Cache inspection successful",
             "cache_info": cache_info
         }
         
+    except ValueError as e:
+        # Curseur invalide
+        return {"status": 400, "message": str(e)}
     except Exception as e:
         return {
             "status": 500,
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Body, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import or_,and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_,select
 from typing import List
 from datetime import datetime, timedelta
-from app.models.models import User, UserSession
-from app.database import get_db_samaconso
+from app.models.models import User
+from app.database import get_async_db_samaconso
 from app.auth import *
-from app.config import REFRESH_TOKEN_EXPIRE_DAYS
+from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from app.schemas.user_schemas import *
 from app.logging_config import get_logger, log_api_request, log_security
 
@@ -38,9 +39,9 @@ auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
 
 @auth_router.post("/token", summary="Login with OAuth2")
-def login_with_oauth2(
+async def login_with_oauth2(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db_samaconso),
+    db: AsyncSession = Depends(get_async_db_samaconso),
     request: Request = None
 ):
     logger.info(f"🔐 Login attempt | Username: {form_data.username[:20]}... | Method: OAuth2")
@@ -52,20 +53,21 @@ def login_with_oauth2(
 
     if username and password:
         # Authenticate with login & password
-        user = db.query(User).filter(or_(User.login == username,User.phoneNumber==username)).first()
+        result = await db.execute(select(User).where(or_(User.login == username,User.phoneNumber==username)))
+        user = result.scalars().first()
         if not user:
             logger.warning(f"⚠️ Login failed - User not found | Username: {username} | IP: {client_ip}")
             log_security("User not found", None, client_ip, f"Username: {username}")
             raise HTTPException(status_code=400, detail="Invalid login or password")
         if user.login == username:
         # Password-based authentication
-            if not verify_password(password, user.password):
+            if not await run_in_threadpool(verify_password, password, user.password):
                 logger.warning(f"⚠️ Login failed - Invalid password | User ID: {user.id} | IP: {client_ip}")
                 log_security("Invalid password", user.id, client_ip, f"Username: {username}")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         elif user.phoneNumber == username:
         # Code-based authentication
-            if not verify_password(password, user.codePin):
+            if not await run_in_threadpool(verify_password, password, user.codePin):
                 logger.warning(f"⚠️ Login failed - Invalid PIN code | User ID: {user.id} | IP: {client_ip}")
                 log_security("Invalid PIN code", user.id, client_ip, f"Phone: {username}")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
@@ -79,7 +81,7 @@ def login_with_oauth2(
         access_token, refresh_token = create_token_pair(user.id)
         
         # Sauvegarder le refresh token en base (hashé)
-        save_refresh_token(db, user.id, refresh_token, device_model=None, fcm_token=None)
+        await save_refresh_token(db, user.id, refresh_token, device_model=None, fcm_token=None)
         
         # Log de succès
         logger.info(f"✅ Login successful | User ID: {user.id} | Username: {username} | IP: {client_ip}")
@@ -99,9 +101,9 @@ def login_with_oauth2(
 
 
 @auth_router.post("/token-json", summary="Login with json")
-def login_with_json(
+async def login_with_json(
     json_data: UserLoginRequestSchema = Body(...),
-    db: Session = Depends(get_db_samaconso),
+    db: AsyncSession = Depends(get_async_db_samaconso),
     request: Request = None
 ):
     username = json_data.username
@@ -113,20 +115,21 @@ def login_with_json(
 
     if username and password:
         # Authenticate with login & password
-        user = db.query(User).filter(or_(User.login == username, User.phoneNumber == username)).first()
+        result = await db.execute(select(User).where(or_(User.login == username, User.phoneNumber == username)))
+        user = result.scalars().first()
         if not user:
             logger.warning(f"⚠️ Login failed - User not found | Username: {username} | IP: {client_ip}")
             log_security("User not found", None, client_ip, f"Username: {username}, Method: JSON")
             raise HTTPException(status_code=404, detail="Compte inexistant")
         if user.login == username:
             # Password-based authentication
-            if not verify_password(password, user.password):
+            if not await run_in_threadpool(verify_password, password, user.password):
                 logger.warning(f"⚠️ Login failed - Invalid password | User ID: {user.id} | IP: {client_ip}")
                 log_security("Invalid password", user.id, client_ip, f"Username: {username}, Method: JSON")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         elif user.phoneNumber == username:
             # Code-based authentication
-            if not verify_password(password, user.codePin):
+            if not await run_in_threadpool(verify_password, password, user.codePin):
                 logger.warning(f"⚠️ Login failed - Invalid PIN | User ID: {user.id} | IP: {client_ip}")
                 log_security("Invalid PIN code", user.id, client_ip, f"Phone: {username}, Method: JSON")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
@@ -139,7 +142,7 @@ def login_with_json(
         access_token, refresh_token = create_token_pair(user.id)
 
         # Sauvegarder le refresh token en base (hashé)
-        save_refresh_token(db, user.id, refresh_token, device_model=json_data.device_model, fcm_token=json_data.fcm_token)
+        await save_refresh_token(db, user.id, refresh_token, device_model=json_data.device_model, fcm_token=json_data.fcm_token)
 
         logger.info(f"✅ Login successful | User ID: {user.id} | Username: {username} | IP: {client_ip}")
         log_security("Successful login", user.id, client_ip, f"Method: JSON, Username: {username}")
@@ -160,9 +163,9 @@ def login_with_json(
 
 
 @auth_router.post("/token-json-v2", summary="Login with json v2")
-def login_with_json_v2(
+async def login_with_json_v2(
     json_data: UserLoginSchema = Body(...),
-    db: Session = Depends(get_db_samaconso)
+    db: AsyncSession = Depends(get_async_db_samaconso)
 ):
     #logger.debug(f"Received json data: username={json_data.username}, password={json_data.password}")
 
@@ -171,29 +174,30 @@ def login_with_json_v2(
 
     if username and password:
         # Authenticate with login & password
-        user = db.query(User).filter(or_(User.login == username,User.phoneNumber==username)).first()
+        result = await db.execute(select(User).where(or_(User.login == username,User.phoneNumber==username)))
+        user = result.scalars().first()
         if not user:
         
             raise HTTPException(status_code=400, detail="Invalid login or password")
         if user.login == username:
             if user.ldap:
         # Password-based authentication
-                connected = authenticate_ldap(username=username,password=password)
+                connected = await run_in_threadpool(authenticate_ldap, username, password)
                 if not connected:
                 #   logger.debug("Password verification failed")
                     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         
-            elif not verify_password(password, user.password):
+            elif not await run_in_threadpool(verify_password, password, user.password):
            # logger.debug("Unexpected login condition")
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid login method")
 
         # Password-based authentication
-           # if not verify_password(password, user.password):
+           # if not await run_in_threadpool(verify_password, password, user.password):
              #   logger.debug("Password verification failed")
                 #raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         elif user.phoneNumber == username:
         # Code-based authentication
-            if not verify_password(password, user.codePin):
+            if not await run_in_threadpool(verify_password, password, user.codePin):
               #  logger.debug("Code verification failed")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
             # Clear OTP after successful login
@@ -210,8 +214,9 @@ def login_with_json_v2(
         
         
         # Sauvegarder le refresh token en base (hashé)
-        save_refresh_token(db, user.id, refresh_token, device_model=device_model, fcm_token=fcm_token)
-        user = db.query(User).filter(or_(User.login == username,User.phoneNumber==username)).first()
+        await save_refresh_token(db, user.id, refresh_token, device_model=device_model, fcm_token=fcm_token)
+        result = await db.execute(select(User).where(or_(User.login == username,User.phoneNumber==username)))
+        user = result.scalars().first()
         return {
             "status_code": status.HTTP_200_OK,
             "user": UserResponseSchema.model_validate(user).model_dump(),
@@ -228,9 +233,9 @@ def login_with_json_v2(
 
 
 @auth_router.post("/ldap-json", summary="Login with ldap")
-def login_with_ldap(
+async def login_with_ldap(
     json_data: UserLoginSchema = Body(...),
-    db: Session = Depends(get_db_samaconso)
+    db: AsyncSession = Depends(get_async_db_samaconso)
 ):
     #logger.debug(f"Received json data: username={json_data.username}, password={json_data.password}")
 
@@ -240,18 +245,19 @@ def login_with_ldap(
 
     if username and password:
         # Authenticate with login & password
-        user = db.query(User).filter(User.login == username).first()
+        result = await db.execute(select(User).where(User.login == username))
+        user = result.scalars().first()
         if not user:
         
             raise HTTPException(status_code=400, detail="Invalid login or password")
         if user.ldap:
         # Password-based authentication
-            connected = authenticate_ldap(username=username,password=password)
+            connected = await run_in_threadpool(authenticate_ldap, username, password)
             if not connected:
              #   logger.debug("Password verification failed")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
       
-        elif not verify_password(password, user.password):
+        elif not await run_in_threadpool(verify_password, password, user.password):
            # logger.debug("Unexpected login condition")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid login method")
 
@@ -263,8 +269,9 @@ def login_with_ldap(
         fcm_token = getattr(json_data, 'fcm_token', None)
         
         # Sauvegarder le refresh token en base (hashé)
-        save_refresh_token(db, user.id, refresh_token, device_model=device_model, fcm_token=fcm_token)
-        user = db.query(User).filter(or_(User.login == username,User.phoneNumber==username)).first()
+        await save_refresh_token(db, user.id, refresh_token, device_model=device_model, fcm_token=fcm_token)
+        result = await db.execute(select(User).where(or_(User.login == username,User.phoneNumber==username)))
+        user = result.scalars().first()
         return {
             "status_code": status.HTTP_200_OK,
             "user": UserResponseSchema.model_validate(user).model_dump(),
@@ -279,9 +286,9 @@ def login_with_ldap(
    
 
 @auth_router.post("/refresh", summary="Refresh access token")
-def refresh_access_token(
+async def refresh_access_token(
     token_data: RefreshTokenSchema = Body(...),
-    db: Session = Depends(get_db_samaconso),
+    db: AsyncSession = Depends(get_async_db_samaconso),
     request: Request = None
 ):
     """
@@ -302,51 +309,39 @@ def refresh_access_token(
             detail="Refresh token is required"
         )
     
-    # Chercher une session valide avec ce refresh token
-    # On doit parcourir toutes les sessions car le token est hashé
-    active_sessions = db.query(UserSession).filter(
-        and_(
-            UserSession.is_active == True,
-            UserSession.refresh_token_hash.isnot(None),
-            UserSession.refresh_token_expires_at > datetime.now()
-        )
-    ).all()
-    
-    valid_session = None
-    for session in active_sessions:
-        if session.refresh_token_hash and verify_refresh_token(refresh_token, session.refresh_token_hash):
-            valid_session = session
-            break
+    # Rotation atomique : UPDATE ... RETURNING sur l'index unique du hash
+    rotated = await rotate_refresh_token(db, refresh_token)
     
-    if not valid_session:
+    if not rotated:
         logger.warning(f"⚠️ Refresh failed - Invalid refresh token | IP: {client_ip}")
         log_security("Invalid refresh token", None, client_ip, "Token verification failed")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token"
         )
+    user_id, new_refresh_token = rotated
     
     # Vérifier que l'utilisateur existe toujours
-    user = db.query(User).filter(User.id == valid_session.user_id).first()
+    user = await db.get(User, user_id)
     if not user or not user.is_activate:
-        logger.warning(f"⚠️ Refresh failed - User not found or inactive | User ID: {valid_session.user_id} | IP: {client_ip}")
-        log_security("Refresh failed - user inactive", valid_session.user_id, client_ip, "User inactive")
+        # Annuler la rotation : l'ancien refresh token reste en place
+        await db.rollback()
+        logger.warning(f"⚠️ Refresh failed - User not found or inactive | User ID: {user_id} | IP: {client_ip}")
+        log_security("Refresh failed - user inactive", user_id, client_ip, "User inactive")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive"
         )
+    await db.commit()
     
-    # Générer une nouvelle paire de tokens
-    new_access_token, new_refresh_token = create_token_pair(user.id)
-    
-    # Remplacer l'ancien refresh token par le nouveau (rotation de tokens)
-    valid_session.refresh_token_hash = hash_refresh_token(new_refresh_token)
-    valid_session.refresh_token_expires_at = datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    valid_session.last_login = datetime.now()
-    db.commit()
+    # Nouvel access token (le nouveau refresh token est déjà enregistré)
+    new_access_token = create_access_token(
+        data={"sub": str(user_id)},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
     
-    logger.info(f"✅ Token refreshed successfully | User ID: {user.id} | IP: {client_ip}")
-    log_security("Token refreshed", user.id, client_ip, "Refresh successful")
+    logger.info(f"✅ Token refreshed successfully | User ID: {user_id} | IP: {client_ip}")
+    log_security("Token refreshed", user_id, client_ip, "Refresh successful")
     
     return {
         "access_token": new_access_token,
@@ -356,9 +351,9 @@ def refresh_access_token(
 
 
 @auth_router.post("/logout", summary="Logout and revoke refresh token")
-def logout(
+async def logout(
     token_data: RefreshTokenOptionalSchema = Body(...),
-    db: Session = Depends(get_db_samaconso),
+    db: AsyncSession = Depends(get_async_db_samaconso),
     request: Request = None,
     current_user: User = Depends(get_current_user)
 ):
@@ -373,7 +368,7 @@ def logout(
     client_ip = request.client.host if request and request.client else "unknown"
     
     # Révoquer le refresh token (ou tous les tokens si None)
-    revoked = revoke_refresh_token(db, current_user.id, refresh_token)
+    revoked = await revoke_refresh_token(db, current_user.id, refresh_token)
     
     if revoked:
         logger.info(f"✅ Logout successful | User ID: {current_user.id} | IP: {client_ip}")
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 import json
 from sqlalchemy.orm import Session
 from app.auth import get_current_user
@@ -6,7 +7,8 @@ from app.models.models import Compteur
 from app.schemas.compteur_schemas import CompteurCreateSchema 
 from app.database import get_db_samaconso
 from app.cache import cache_get, cache_set, cache_delete
-from app.config import CACHE_KEYS, CACHE_TTL
+from app.cache_utils import inspect_cache_keys
+from app.config import CACHE_KEYS, CACHE_TTL, CACHE_SCAN_MAX_PAGE_SIZE, CACHE_SCAN_PAGE_SIZE
 
 compteur_router = APIRouter(prefix="/compteur", tags=["Compteur"])
 
@@ -179,7 +181,10 @@ async def delete_etat(compteur_id: int, db: Session = Depends(get_db_samaconso))
     }
 
 @compteur_router.get("/cache/inspect")
-async def inspect_compteur_cache():
+async def inspect_compteur_cache(
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    limit: int = Query(CACHE_SCAN_PAGE_SIZE, ge=1, le=CACHE_SCAN_MAX_PAGE_SIZE),
+):
     """Inspecter l'état du cache des compteurs"""
     from app.cache import redis_client
     
@@ -187,38 +192,24 @@ async def inspect_compteur_cache():
         if not redis_client:
             return {"status": 500, "message": "Redis non disponible"}
         
-        # Rechercher toutes les clés de compteurs
-        compteur_patterns = ["compteurs:*", "compteur:*"]
-        compteur_keys = []
-        
-        for pattern in compteur_patterns:
-            keys = await redis_client.keys(pattern)
-            compteur_keys.extend([key.decode() if isinstance(key, bytes) else key for key in keys])
-        
-        cache_contents = {}
-        for key in compteur_keys:
-            try:
-                ttl = await redis_client.ttl(key)
-                content = await redis_client.get(key)
-                if content:
-                    cache_contents[key] = {
-                        "ttl_seconds": ttl,
-                        "size_bytes": len(content),
-                        "preview": content[:100].decode() if isinstance(content, bytes) else str(content)[:100]
-                    }
-            except Exception as e:
-                cache_contents[key] = {"error": str(e)}
+        # Clés parcourues par SCAN, une page par appel (jamais KEYS, qui bloque Redis)
+        page = await inspect_cache_keys(["compteurs:*", "compteur:*"], cursor, limit)
         
         return {
             "status": 200,
             "message": "Cache inspection successful",
             "cache_info": {
                 "redis_connected": True,
-                "compteur_cache_keys": compteur_keys,
-                "cache_contents": cache_contents
+                "compteur_cache_keys": page["keys"],
+                "cache_contents": page["contents"],
+                "next_cursor": page["next_cursor"],
+                "complete": page["complete"]
             }
         }
         
+    except ValueError as e:
+        # Curseur invalide
+        return {"status": 400, "message": str(e)}
     except Exception as e:
         return {
             "status": 500,
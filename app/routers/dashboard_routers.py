@@ -1,75 +1,66 @@
-from app.database import get_db_samaconso
+from app.database import get_async_db_samaconso
 from app.models.models import Agence, Compteur, User, UserCompteur
+from app.services.dashboard_service import DASHBOARD_CACHE_TAG, read_dashboard_stats
+from app.cache import cache_get, cache_set_tagged
+from app.config import CACHE_KEYS, CACHE_TTL
 from fastapi import APIRouter, Depends, HTTPException,status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
 
 dashboard_router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
 @dashboard_router.get("/")
-def dashboard(db:Session=Depends(get_db_samaconso)):
-           compteurs = db.query(UserCompteur).all()
-           total_compteurs = len(compteurs)
-           compteurs_actifs = sum(1 for compteur in compteurs if compteur.est_active == True)
-           compteurs_inactifs = sum(1 for compteur in compteurs if compteur.est_active == False)
-           compteurs_woyofal = sum(1 for compteur in compteurs if compteur.type_compteur == 1)
-           compteurs_classique = sum(1 for compteur in compteurs if compteur.type_compteur == 2)
-           demandes_traites = sum(1 for compteur in compteurs if compteur.etat_id==13)
-           demandes_en_cours = sum(1 for compteur in compteurs if compteur.etat_id==14)
-           owners = len(set(compteur.user_id for compteur in compteurs if compteur.est_proprietaire==True))
-           not_owners = len(set(compteur.user_id for compteur in compteurs if compteur.est_proprietaire==False))
-           users = db.query(User).all()
-           total_users= len(users)
-        
-           return { "status_code":status.HTTP_200_OK,
-                     "total_compteurs": total_compteurs,
-                     "compteurs_actifs": compteurs_actifs,
-                     "compteurs_inactifs": compteurs_inactifs,
-                     "compteurs_woyofal": compteurs_woyofal,
-                     "compteurs_classique": compteurs_classique,
-                     "demandes_traites": demandes_traites,
-                     "demandes_en_cours": demandes_en_cours,
-                     "owners": owners,
-                    "not_owners": not_owners,
-                    "total_users":total_users,
-                    }
-   
+async def dashboard(db:AsyncSession=Depends(get_async_db_samaconso)):
+           cache_key = CACHE_KEYS["DASHBOARD_STATS"]
+           try:
+               cached = await cache_get(cache_key)
+               if cached:
+                   return json.loads(cached)
+           except Exception:
+               pass
+
+           stats = await read_dashboard_stats(db)
+           response = {"status_code":status.HTTP_200_OK, **stats}
+
+           try:
+               await cache_set_tagged(cache_key, json.dumps(response), [DASHBOARD_CACHE_TAG], ttl_seconds=CACHE_TTL["DASHBOARD"])
+           except Exception:
+               pass
+           return response
+
 
 
 @dashboard_router.get("/{user_id}")
-def dashboard(user_id:int,db:Session=Depends(get_db_samaconso)):
-   compteurs:any=None
-   user = db.query(User).filter(User.id==user_id).first()
+async def dashboard_user(user_id:int,db:AsyncSession=Depends(get_async_db_samaconso)):
+   cache_key = CACHE_KEYS["DASHBOARD_USER_STATS"].format(user_id=user_id)
+   try:
+       cached = await cache_get(cache_key)
+       if cached:
+           return json.loads(cached)
+   except Exception:
+       pass
+
+   user = await db.get(User, user_id)
    if user:
        role = user.role
        #Admin
        if(role==2):
-           compteurs = db.query(UserCompteur).all()
-        
+           stats = await read_dashboard_stats(db)
+
+       #Chef d'agence : compteurs de son agence uniquement
        elif(role==3):
-           agence = db.query(Agence).filter(Agence.id==user.id_agence).first()
-           compteurs = db.query(UserCompteur).filter(UserCompteur.nom_agence==agence.nom_corrige).all()
-       total_compteurs = len(compteurs)
-       compteurs_actifs = sum(1 for compteur in compteurs if compteur.est_active == True)
-       compteurs_inactifs = sum(1 for compteur in compteurs if compteur.est_active == False)
-       compteurs_woyofal = sum(1 for compteur in compteurs if compteur.type_compteur == 1)
-       compteurs_classique = sum(1 for compteur in compteurs if compteur.type_compteur == 2)
-       demandes_traites = sum(1 for compteur in compteurs if compteur.etat_id==13)
-       demandes_en_cours = sum(1 for compteur in compteurs if compteur.etat_id==14)
-       owners = len(set(compteur.user_id for compteur in compteurs if compteur.est_proprietaire==True))
-       not_owners = len(set(compteur.user_id for compteur in compteurs if compteur.est_proprietaire==False))
-       users = db.query(User).all()
-       total_users= len(users)
-        
-       return { "status_code":status.HTTP_200_OK,
-                     "total_compteurs": total_compteurs,
-                     "compteurs_actifs": compteurs_actifs,
-                     "compteurs_inactifs": compteurs_inactifs,
-                     "compteurs_woyofal": compteurs_woyofal,
-                     "compteurs_classique": compteurs_classique,
-                     "demandes_traites": demandes_traites,
-                     "demandes_en_cours": demandes_en_cours,
-                     "owners": owners,
-                    "not_owners": not_owners,
-                    "total_users":total_users,
-                    }
-   return {"status_code":status.HTTP_404_NOT_FOUND,"message":"Utilisateur non trouvé"}
\ No newline at end of file
+           agence = await db.get(Agence, user.id_agence) if user.id_agence is not None else None
+           if agence is None:
+               return {"status_code":status.HTTP_404_NOT_FOUND,"message":"Agence non trouvée"}
+           stats = await read_dashboard_stats(db, nom_agence=agence.nom_corrige)
+
+       else:
+           return {"status_code":status.HTTP_403_FORBIDDEN,"message":"Rôle non autorisé"}
+
+       response = {"status_code":status.HTTP_200_OK, **stats}
+       try:
+           await cache_set_tagged(cache_key, json.dumps(response), [DASHBOARD_CACHE_TAG], ttl_seconds=CACHE_TTL["DASHBOARD"])
+       except Exception:
+           pass
+       return response
+   return {"status_code":status.HTTP_404_NOT_FOUND,"message":"Utilisateur non trouvé"}
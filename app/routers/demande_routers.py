@@ -1,12 +1,14 @@
 # routers/demande.py
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 import json
 from sqlalchemy.orm import Session
 from app.models.models import Demande
 from app.schemas.demande_schemas import *
 from app.database import get_db_samaconso
 from app.cache import cache_get, cache_set, cache_delete
-from app.config import CACHE_KEYS, CACHE_TTL
+from app.cache_utils import inspect_cache_keys
+from app.config import CACHE_KEYS, CACHE_TTL, CACHE_SCAN_MAX_PAGE_SIZE, CACHE_SCAN_PAGE_SIZE
 
 demande_router = APIRouter(prefix="/demandes", tags=["Demandes"])
 
@@ -218,7 +220,10 @@ async def delete_demande(demande_id: int, db: Session = Depends(get_db_samaconso
     }
 
 @demande_router.get("/cache/inspect")
-async def inspect_demande_cache():
+async def inspect_demande_cache(
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    limit: int = Query(CACHE_SCAN_PAGE_SIZE, ge=1, le=CACHE_SCAN_MAX_PAGE_SIZE),
+):
     """Inspecter l'état du cache des demandes"""
     from app.cache import redis_client
     
@@ -226,38 +231,24 @@ async def inspect_demande_cache():
         if not redis_client:
             return {"status": 500, "message": "Redis non disponible"}
         
-        # Rechercher toutes les clés de demandes
-        demande_patterns = ["demandes:*", "demande:*"]
-        demande_keys = []
-        
-        for pattern in demande_patterns:
-            keys = await redis_client.keys(pattern)
-            demande_keys.extend([key.decode() if isinstance(key, bytes) else key for key in keys])
-        
-        cache_contents = {}
-        for key in demande_keys:
-            try:
-                ttl = await redis_client.ttl(key)
-                content = await redis_client.get(key)
-                if content:
-                    cache_contents[key] = {
-                        "ttl_seconds": ttl,
-                        "size_bytes": len(content),
-                        "preview": content[:100].decode() if isinstance(content, bytes) else str(content)[:100]
-                    }
-            except Exception as e:
-                cache_contents[key] = {"error": str(e)}
+        # Clés parcourues par SCAN, une page par appel (jamais KEYS, qui bloque Redis)
+        page = await inspect_cache_keys(["demandes:*", "demande:*"], cursor, limit)
         
         return {
             "status": 200,
             "message": "Cache inspection successful",
             "cache_info": {
                 "redis_connected": True,
-                "demande_cache_keys": demande_keys,
-                "cache_contents": cache_contents
+                "demande_cache_keys": page["keys"],
+                "cache_contents": page["contents"],
+                "next_cursor": page["next_cursor"],
+                "complete": page["complete"]
             }
         }
         
+    except ValueError as e:
+        # Curseur invalide
+        return {"status": 400, "message": str(e)}
     except Exception as e:
         return {
             "status": 500,
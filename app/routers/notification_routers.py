@@ -1,24 +1,48 @@
-from fastapi import APIRouter, Depends, status
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
-from app.database import get_db_samaconso
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy import DateTime, Integer, String, and_, insert, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import detached_async_session, get_async_db_samaconso
 from app.models.models import Agence, Notification, User, UserCompteur, UserSession
 from app.schemas.notification_schemas import (
     NotificationCreateSchema,
     NotificationUserAgenceCreateSchema,
     NotificationAllAgenceCreateSchema,
     NotificationAllUserCreateSchema,
+    NotificationBulkSchema,
     NotificationfromCompteurSchema
 )
-from app.cache import cache_get, cache_set, cache_delete
-from app.config import CACHE_KEYS
+from app.cache import cache_get, cache_get_or_set, cache_set_tagged, get_redis
+from app.cache_codec import JSONBytesResponse
+from app.config import CACHE_KEYS, NOTIFICATIONS_MAX_PAGE_SIZE, NOTIFICATIONS_PAGE_SIZE
 
 # Imports Celery
 from app.tasks.notification_tasks import send_single_notification, send_urgent_notification
 from app.tasks.batch_tasks import send_broadcast_notifications
+from app.services.broadcast_service import AUDIENCE_ALL_AGENCES, AUDIENCE_ALL_USERS, build_broadcast_descriptor
+from app.services.broadcast_scheduler import PROGRESS_KEY as BROADCAST_PROGRESS_KEY, summarize_progress
+from app.services.fcm_token_service import METRICS_KEY as FCM_TOKEN_METRICS_KEY, summarize_pruning_metrics
+from app.services.notification_inbox import (
+    NOTIFICATIONS_CACHE_TAG,
+    adjust_unread,
+    adjust_unread_many,
+    bulk_delete,
+    bulk_mark_read,
+    bulk_scope,
+    fetch_inbox_page,
+    get_unread_count,
+    invalidate_notification_caches,
+    notification_list_tags,
+)
 
 # Import WebSocket functions
-from app.routers.websocket_routers import notify_user_via_websocket
+from app.routers.websocket_routers import (
+    get_websocket_backplane,
+    notify_notifications_updated_via_websocket,
+    notify_user_via_websocket,
+    notify_users_via_websocket,
+)
 
 # Import Idempotency middleware
 from app.middleware.idempotency import check_notification_idempotency, IdempotencyManager
@@ -33,7 +57,7 @@ logger = logging.getLogger(__name__)
 notification_router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 @notification_router.post("/")
-async def create_notif(data: NotificationCreateSchema, db: Session = Depends(get_db_samaconso)):
+async def create_notif(data: NotificationCreateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Création de notification - Version simplifiée sans logs verbeux"""
     try:
         # Vérification d'idempotence (empêcher les doublons)
@@ -70,17 +94,22 @@ async def create_notif(data: NotificationCreateSchema, db: Session = Depends(get
             is_read=data.is_read
         )
         db.add(notif)
-        db.commit()
-        db.refresh(notif)
+        await db.commit()
+        await db.refresh(notif)
+        if not notif.is_read:
+            await adjust_unread(notif.for_user_id, 1)
         
         # Récupération des sessions actives
-        user_sessions = db.query(UserSession).filter(
-            and_(
-                UserSession.user_id == data.for_user_id,
-                UserSession.is_active,
-                UserSession.fcm_token.isnot(None)
+        result = await db.execute(
+            select(UserSession).where(
+                and_(
+                    UserSession.user_id == data.for_user_id,
+                    UserSession.is_active,
+                    UserSession.fcm_token.isnot(None)
+                )
             )
-        ).all()
+        )
+        user_sessions = result.scalars().all()
 
         task_ids = []
 
@@ -128,29 +157,32 @@ async def create_notif(data: NotificationCreateSchema, db: Session = Depends(get
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur création notification"}
 
 @notification_router.post("/agence/users")
-async def create_notification_for_user_in_agence(data: NotificationUserAgenceCreateSchema, db: Session = Depends(get_db_samaconso)):
+async def create_notification_for_user_in_agence(data: NotificationUserAgenceCreateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Notification pour utilisateurs d'une agence - Version optimisée avec requêtes SQL groupées"""
     try:
         # Vérification agence
-        agence = db.query(Agence).filter(Agence.id == data.id_agence).first()
+        agence = await db.get(Agence, data.id_agence)
         if not agence:
             return {"status": status.HTTP_404_NOT_FOUND, "message": "Agence introuvable"}
 
         # OPTIMISATION : Récupérer utilisateurs ET sessions en une seule requête avec jointure
-        user_sessions_data = db.query(
-            User.id.label('user_id'),
-            UserSession.fcm_token
-        ).outerjoin(
-            UserSession,
-            and_(
-                UserSession.user_id == User.id,
-                UserSession.is_active,
-                UserSession.fcm_token.isnot(None),
-                UserSession.fcm_token != ''
+        result = await db.execute(
+            select(
+                User.id.label('user_id'),
+                UserSession.fcm_token
+            ).outerjoin(
+                UserSession,
+                and_(
+                    UserSession.user_id == User.id,
+                    UserSession.is_active,
+                    UserSession.fcm_token.isnot(None),
+                    UserSession.fcm_token != ''
+                )
+            ).where(
+                User.id_agence == data.id_agence
             )
-        ).filter(
-            User.id_agence == data.id_agence
-        ).all()
+        )
+        user_sessions_data = result.all()
 
         if not user_sessions_data:
             return {"status": status.HTTP_404_NOT_FOUND, "message": "Aucun utilisateur dans cette agence"}
@@ -176,8 +208,9 @@ async def create_notification_for_user_in_agence(data: NotificationUserAgenceCre
                 is_read=False
             ))
 
-        db.bulk_save_objects(notifications_to_create)
-        db.commit()
+        db.add_all(notifications_to_create)
+        await db.commit()
+        await adjust_unread_many(users_dict.keys(), 1)
 
         # Préparer les notifications FCM pour envoi groupé
         notifications_batch = []
@@ -224,112 +257,87 @@ async def create_notification_for_user_in_agence(data: NotificationUserAgenceCre
 
     except Exception as e:
         logger.error(f"Agence notification failed: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur notification agence"}
 
 @notification_router.post("/all_agences")
-async def create_notification_for_all_agences(data: NotificationAllAgenceCreateSchema, db: Session = Depends(get_db_samaconso)):
-    """Notification pour toutes les agences - Version optimisée avec requêtes SQL groupées"""
+async def create_notification_for_all_agences(data: NotificationAllAgenceCreateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
+    """
+    Notification pour toutes les agences
+    Les notifications in-app sont insérées en une requête INSERT ... SELECT et l'envoi FCM
+    est délégué au worker (descripteur de broadcast) : aucun destinataire n'est chargé ici
+    """
     try:
-        # OPTIMISATION : Une seule requête pour tous les utilisateurs de toutes les agences avec leurs sessions
-        user_sessions_data = db.query(
-            User.id.label('user_id'),
-            User.id_agence,
-            UserSession.fcm_token
-        ).outerjoin(
-            UserSession,
-            and_(
-                UserSession.user_id == User.id,
-                UserSession.is_active,
-                UserSession.fcm_token.isnot(None),
-                UserSession.fcm_token != ''
-            )
-        ).filter(
-            User.id_agence.isnot(None)  # Utilisateurs ayant une agence
-        ).all()
-
-        if not user_sessions_data:
+        now = datetime.now()
+        result = await db.execute(
+            insert(Notification).from_select(
+                ["type_notification_id", "event_id", "by_user_id", "for_user_id",
+                 "title", "body", "is_read", "created_at", "updated_at"],
+                select(
+                    literal(data.type_notification_id, Integer),
+                    literal(data.event_id, Integer),
+                    literal(data.by_user_id, Integer),
+                    User.id,
+                    literal(data.title, String),
+                    literal(data.body, String),
+                    literal(False),
+                    literal(now, DateTime),
+                    literal(now, DateTime),
+                ).where(User.id_agence.isnot(None))  # Utilisateurs ayant une agence
+            ).returning(Notification.for_user_id)
+        )
+        recipient_ids = result.scalars().all()
+        total_users = len(recipient_ids)
+        if not total_users:
+            await db.rollback()
             return {"status": status.HTTP_404_NOT_FOUND, "message": "Aucun utilisateur dans les agences"}
-
-        # Organiser les données par utilisateur
-        users_dict = {}
-        agences_set = set()
-        for user_id, agence_id, fcm_token in user_sessions_data:
-            if user_id not in users_dict:
-                users_dict[user_id] = set()
-            if fcm_token:
-                users_dict[user_id].add(fcm_token)
-            agences_set.add(agence_id)
-
-        # OPTIMISATION : Créer toutes les notifications en un seul batch
-        notifications_to_create = []
-        for user_id in users_dict.keys():
-            notifications_to_create.append(Notification(
-                type_notification_id=data.type_notification_id,
-                event_id=data.event_id,
-                by_user_id=data.by_user_id,
-                for_user_id=user_id,
-                title=data.title,
-                body=data.body,
-                is_read=False
-            ))
-
-        if notifications_to_create:
-            db.bulk_save_objects(notifications_to_create)
-            db.commit()
-
-        # Préparer les notifications FCM pour envoi groupé
-        user_tokens = [
-            {"user_id": uid, "tokens": list(tokens)}
-            for uid, tokens in users_dict.items() if tokens
-        ]
-
-        # WebSocket pour chaque utilisateur (en parallèle)
-        for user_id in users_dict.keys():
-            try:
-                await notify_user_via_websocket(
-                    user_id, data.title, data.body,
+        await db.commit()
+        await adjust_unread_many(recipient_ids, 1)
+
+        # WebSocket : seuls les utilisateurs connectés (sur l'ensemble du cluster) sont concernés
+        connected = await get_websocket_backplane().connected_user_ids()
+        if connected:
+            connected_in_agences = (await db.execute(
+                select(User.id).where(User.id.in_(connected), User.id_agence.isnot(None))
+            )).scalars().all()
+            if connected_in_agences:
+                await notify_users_via_websocket(
+                    list(connected_in_agences), data.title, data.body,
                     None, data.event_id
                 )
-            except Exception:
-                continue
 
-        # Lancer l'envoi groupé via Celery
-        if user_tokens:
-            task_result = send_broadcast_notifications.delay({
-                "title": data.title,
-                "body": data.body,
-                "event_id": data.event_id,
-                "user_tokens": user_tokens,
-                "chunk_size": 100
-            })
-            batch_task_id = str(task_result.id)
-        else:
-            batch_task_id = None
+        # Lancer l'envoi groupé via Celery (le worker parcourt les sessions)
+        task_result = send_broadcast_notifications.delay(build_broadcast_descriptor(
+            data.title, data.body, AUDIENCE_ALL_AGENCES, event_id=data.event_id
+        ))
 
         # Récupérer les noms des agences pour le retour
-        agences_names = db.query(Agence.nom).filter(Agence.id.in_(agences_set)).all()
-        agences_list = [name[0] for name in agences_names]
+        agences_list = (await db.execute(
+            select(Agence.nom).where(Agence.id.in_(select(User.id_agence).where(User.id_agence.isnot(None))))
+        )).scalars().all()
 
         return {
             "status": status.HTTP_201_CREATED,
-            "message": f"Notifications créées pour {len(users_dict)} utilisateurs dans {len(agences_set)} agences",
-            "total_users": len(users_dict),
-            "total_agences": len(agences_set),
-            "total_tokens": sum(len(tokens) for tokens in users_dict.values()),
-            "batch_task_id": batch_task_id,
-            "agences_processed": agences_list,
+            "message": f"Notifications créées pour {total_users} utilisateurs dans {len(agences_list)} agences",
+            "total_users": total_users,
+            "total_agences": len(agences_list),
+            "batch_task_id": str(task_result.id),
+            "agences_processed": list(agences_list),
             "processing": "asynchronous"
         }
 
     except Exception as e:
         logger.error(f"All agences notification failed: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur notification toutes agences"}
 
 @notification_router.post("/all_users")
-async def create_notification_for_all_users(data: NotificationAllUserCreateSchema, db: Session = Depends(get_db_samaconso)):
-    """Notification pour tous les utilisateurs - Version optimisée avec requête SQL groupée"""
+async def create_notification_for_all_users(data: NotificationAllUserCreateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
+    """
+    Notification pour tous les utilisateurs
+    Une notification globale est créée et seul le descripteur du broadcast est publié :
+    le worker parcourt les sessions actives par pages (tokens dédupliqués en SQL)
+    """
     try:
         # Créer UNE SEULE notification globale (sans for_user_id spécifique)
         global_notification = Notification(
@@ -344,81 +352,29 @@ async def create_notification_for_all_users(data: NotificationAllUserCreateSchem
 
         try:
             db.add(global_notification)
-            db.commit()
-            db.refresh(global_notification)
+            await db.commit()
+            await db.refresh(global_notification)
+            await adjust_unread(None, 1)  # compteur global, partagé par tous les utilisateurs
             logger.info(f"Created global notification ID={global_notification.id} for broadcast")
         except Exception as e:
             logger.error(f"Failed to create global notification: {str(e)}")
-            db.rollback()
+            await db.rollback()
             return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Failed to create global notification"}
 
-        # OPTIMISATION : Une seule requête SQL avec jointure au lieu de N requêtes
-        # Récupérer tous les utilisateurs actifs avec leurs sessions en UNE requête
-        active_sessions = db.query(
-            UserSession.user_id,
-            UserSession.fcm_token
-        ).join(
-            User, UserSession.user_id == User.id
-        ).filter(
-            and_(
-                User.is_activate,
-                UserSession.is_active,
-                UserSession.fcm_token.isnot(None),
-                UserSession.fcm_token != ''
-            )
-        ).all()
-
-        if not active_sessions:
-            return {
-                "status": status.HTTP_404_NOT_FOUND,
-                "message": "Aucun utilisateur actif avec token FCM trouvé",
-                "global_notification_id": global_notification.id
-            }
-
-        # Organiser les tokens par utilisateur avec déduplication
-        user_tokens_dict = {}
-        for user_id, fcm_token in active_sessions:
-            if user_id not in user_tokens_dict:
-                user_tokens_dict[user_id] = set()
-            user_tokens_dict[user_id].add(fcm_token)
-
-        # Convertir en format attendu par Celery
-        user_tokens = [
-            {"user_id": user_id, "tokens": list(tokens)}
-            for user_id, tokens in user_tokens_dict.items()
-        ]
-
-        # Calculer les statistiques de déduplication
-        total_unique_tokens = sum(len(tokens) for tokens in user_tokens_dict.values())
-        total_sessions_before_dedup = len(active_sessions)
-        duplicate_sessions = total_sessions_before_dedup - total_unique_tokens
-
-        logger.info(f"Broadcast notification: {len(user_tokens)} users, {total_unique_tokens} unique tokens, {duplicate_sessions} duplicates removed")
-
-        # Préparer les données pour Celery avec les tokens FCM
-        broadcast_data = {
-            "title": data.title,
-            "body": data.body,
-            "event_id": data.event_id,
-            "user_tokens": user_tokens,
-            "chunk_size": 100  # Augmenté de 50 à 100 pour plus d'efficacité
-        }
-
-        # Lancer la tâche Celery pour l'envoi FCM
-        task_result = send_broadcast_notifications.delay(broadcast_data)
+        # Lancer la tâche Celery pour l'envoi FCM (descripteur uniquement) ;
+        # le worker pousse aussi la notification aux utilisateurs connectés en WebSocket
+        task_result = send_broadcast_notifications.delay(build_broadcast_descriptor(
+            data.title, data.body, AUDIENCE_ALL_USERS, event_id=data.event_id,
+            notification_id=global_notification.id
+        ))
 
         return {
             "status": status.HTTP_202_ACCEPTED,
-            "message": f"Notification broadcast créée pour {len(user_tokens)} utilisateurs",
+            "message": "Notification broadcast programmée pour tous les utilisateurs actifs",
             "batch_task_id": str(task_result.id),
-            "total_users": len(user_tokens),
-            "total_sessions_found": total_sessions_before_dedup,
-            "total_unique_tokens": total_unique_tokens,
-            "duplicate_sessions_removed": duplicate_sessions,
-            "avg_tokens_per_user": round(total_unique_tokens / len(user_tokens), 2) if user_tokens else 0,
             "global_notification_id": global_notification.id,
             "processing": "asynchronous",
-            "note": "Optimisé avec requête SQL groupée et Celery, tokens dédupliqués"
+            "note": "Destinataires parcourus par le worker (pagination keyset), tokens dédupliqués en SQL"
         }
 
     except Exception as e:
@@ -427,11 +383,22 @@ async def create_notification_for_all_users(data: NotificationAllUserCreateSchem
 
 @notification_router.get("/tasks/{task_id}/status")
 async def get_task_status(task_id: str):
-    """Vérifier le statut d'une tâche Celery"""
+    """
+    Vérifier le statut d'une tâche Celery
+    Pour un broadcast (batch_task_id), inclut la progression : chunks publiés/terminés,
+    envoyés, échecs, 429 et ETA
+    """
     try:
         from app.celery_app import celery_app
         
         result = celery_app.AsyncResult(task_id)
+
+        progress = None
+        try:
+            raw = await get_redis().hgetall(BROADCAST_PROGRESS_KEY.format(broadcast_id=task_id))
+            progress = summarize_progress(raw)
+        except Exception as e:
+            logger.warning(f"Broadcast progress unavailable for {task_id}: {str(e)}")
         
         return {
             "task_id": task_id,
@@ -439,7 +406,8 @@ async def get_task_status(task_id: str):
             "result": result.result if result.ready() else None,
             "info": result.info,
             "ready": result.ready(),
-            "successful": result.successful() if result.ready() else None
+            "successful": result.successful() if result.ready() else None,
+            "progress": progress
         }
         
     except Exception as e:
@@ -450,23 +418,25 @@ async def get_task_status(task_id: str):
             "message": str(e)
         }
 
+@notification_router.get("/fcm/token-hygiene")
+async def get_fcm_token_hygiene():
+    """Métriques de désactivation des tokens FCM morts (UNREGISTERED / INVALID_ARGUMENT)"""
+    try:
+        raw = await get_redis().hgetall(FCM_TOKEN_METRICS_KEY)
+        return {"status": status.HTTP_200_OK, **summarize_pruning_metrics(raw)}
+    except Exception as e:
+        logger.error(f"FCM token hygiene metrics failed: {str(e)}")
+        return {"status": status.HTTP_503_SERVICE_UNAVAILABLE, "message": "Métriques indisponibles"}
+
 @notification_router.get("/")
-async def get_all_notifications(db: Session = Depends(get_db_samaconso)):
+async def get_all_notifications():
     """Récupérer toutes les notifications - Version simplifiée"""
-    try:
-        cache_key = CACHE_KEYS["NOTIFICATIONS_ALL"]
-        
-        # Tentative cache
-        try:
-            cached = await cache_get(cache_key)
-            if cached:
-                return json.loads(cached)
-        except Exception:
-            pass
+    # Session propre au calcul : il est partagé par les requêtes en attente et peut survivre à celle qui l'a lancé
+    async def load():
+        async with detached_async_session() as db:
+            result = await db.execute(select(Notification).order_by(Notification.created_at.desc()))
+            notifications = result.scalars().all()
 
-        # Base de données
-        notifications = db.query(Notification).order_by(Notification.created_at.desc()).all()
-        
         notifications_data = []
         for notif in notifications:
             # Gestion du cas où updated_at pourrait ne pas exister (pour les anciens enregistrements)
@@ -475,7 +445,7 @@ async def get_all_notifications(db: Session = Depends(get_db_samaconso)):
                 updated_at_str = notif.updated_at.strftime("%d/%m/%Y %H:%M:%S")
             else:
                 updated_at_str = notif.created_at.strftime("%d/%m/%Y %H:%M:%S")
-            
+
             notifications_data.append({
                 "id": notif.id,
                 "type_notification_id": notif.type_notification_id,
@@ -489,29 +459,29 @@ async def get_all_notifications(db: Session = Depends(get_db_samaconso)):
                 "updated_at": updated_at_str
             })
 
-        result = {
+        return {
             "status": status.HTTP_200_OK,
             "results": len(notifications_data),
             "notifications": notifications_data
         }
 
-        # Cache simple
-        try:
-            await cache_set(cache_key, json.dumps(result), ttl_seconds=300)
-        except Exception:
-            pass
-
-        return result
+    try:
+        # Clé chaude : une seule requête recalcule la liste à l'expiration (les autres attendent).
+        # JSON servi tel quel, sans décodage / ré-encodage
+        body = await cache_get_or_set(
+            CACHE_KEYS["NOTIFICATIONS_ALL"], load, ttl_seconds=300, tags=[NOTIFICATIONS_CACHE_TAG], raw=True
+        )
+        return JSONBytesResponse(body)
 
     except Exception as e:
         logger.error(f"Get all notifications failed: {str(e)}")
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur récupération notifications"}
 
 @notification_router.get("/user/{user_id}")
-async def get_notifications_for_user(user_id: int, db: Session = Depends(get_db_samaconso)):
+async def get_notifications_for_user(user_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Notifications pour utilisateur - Version simplifiée"""
     try:
-        cache_key = f"notifications:user:{user_id}"
+        cache_key = CACHE_KEYS["NOTIFICATIONS_BY_USER"].format(user_id=user_id)
         
         # Tentative cache
         try:
@@ -522,12 +492,15 @@ async def get_notifications_for_user(user_id: int, db: Session = Depends(get_db_
             pass
 
         # Récupérer les notifications spécifiques à l'utilisateur ET les notifications globales
-        notifications = db.query(Notification).filter(
-            or_(
-                Notification.for_user_id == user_id,    # Notifications spécifiques
-                Notification.for_user_id.is_(None)      # Notifications globales (for_user_id = NULL)
-            )
-        ).order_by(Notification.created_at.desc()).all()
+        result = await db.execute(
+            select(Notification).where(
+                or_(
+                    Notification.for_user_id == user_id,    # Notifications spécifiques
+                    Notification.for_user_id.is_(None)      # Notifications globales (for_user_id = NULL)
+                )
+            ).order_by(Notification.created_at.desc())
+        )
+        notifications = result.scalars().all()
 
         notifications_data = []
         for notif in notifications:
@@ -549,11 +522,8 @@ async def get_notifications_for_user(user_id: int, db: Session = Depends(get_db_
             "notifications": notifications_data
         }
 
-        # Cache simple
-        try:
-            await cache_set(cache_key, json.dumps(result), ttl_seconds=180)
-        except Exception:
-            pass
+        # Cache tagué : invalidé avec les notifications de l'utilisateur et les globales
+        await cache_set_tagged(cache_key, json.dumps(result), notification_list_tags(user_id), ttl_seconds=180)
 
         return result
 
@@ -561,26 +531,126 @@ async def get_notifications_for_user(user_id: int, db: Session = Depends(get_db_
         logger.error(f"Get user notifications failed for user {user_id}: {str(e)}")
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur récupération notifications utilisateur"}
 
+@notification_router.get("/user/{user_id}/inbox")
+async def get_notifications_inbox(
+    user_id: int,
+    limit: int = Query(NOTIFICATIONS_PAGE_SIZE, ge=1, le=NOTIFICATIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db_samaconso)
+):
+    """
+    Boîte de réception paginée (du plus récent au plus ancien)
+    Passer next_cursor de la réponse précédente pour obtenir la page suivante
+    """
+    try:
+        page = await fetch_inbox_page(db, user_id, limit, cursor)
+        return {
+            "status": status.HTTP_200_OK,
+            "user_id": user_id,
+            "results": len(page["notifications"]),
+            **page,
+            "unread_count": await get_unread_count(db, user_id)
+        }
+
+    except ValueError:
+        return {"status": status.HTTP_400_BAD_REQUEST, "message": "Curseur invalide"}
+    except Exception as e:
+        logger.error(f"Get inbox failed for user {user_id}: {str(e)}")
+        return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur récupération boîte de réception"}
+
+@notification_router.get("/user/{user_id}/unread-count")
+async def get_unread_notifications_count(user_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
+    """Nombre de notifications non lues (badge) - compteur Redis, reconstruit depuis la base si absent"""
+    try:
+        return {
+            "status": status.HTTP_200_OK,
+            "user_id": user_id,
+            "unread_count": await get_unread_count(db, user_id)
+        }
+
+    except Exception as e:
+        logger.error(f"Unread count failed for user {user_id}: {str(e)}")
+        return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur comptage notifications non lues"}
+
+@notification_router.put("/bulk/read")
+async def mark_notifications_as_read_bulk(data: NotificationBulkSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
+    """
+    Marquer plusieurs notifications comme lues en une requête
+    Parmi celles de user_id : par liste d'ids, ou toutes (optionnellement avant `before`)
+    """
+    try:
+        changed = await bulk_mark_read(db, bulk_scope(data.ids, data.user_id, data.before))
+
+        await invalidate_notification_caches(changed.keys())
+        await notify_notifications_updated_via_websocket(
+            "read", {user_id: ids for user_id, ids in changed.items() if user_id is not None}
+        )
+
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "Notifications marquées comme lues",
+            "updated": sum(len(ids) for ids in changed.values()),
+            "users": len(changed)
+        }
+
+    except ValueError as e:
+        return {"status": status.HTTP_400_BAD_REQUEST, "message": str(e)}
+    except Exception as e:
+        logger.error(f"Bulk mark read failed: {str(e)}")
+        await db.rollback()
+        return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur marquage notifications"}
+
+@notification_router.post("/bulk/delete")
+async def delete_notifications_bulk(data: NotificationBulkSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
+    """
+    Supprimer plusieurs notifications en une requête
+    Parmi celles de user_id : par liste d'ids, ou toutes (optionnellement avant `before`)
+    """
+    try:
+        changed = await bulk_delete(db, bulk_scope(data.ids, data.user_id, data.before))
+
+        await invalidate_notification_caches(changed.keys())
+        await notify_notifications_updated_via_websocket(
+            "deleted", {user_id: ids for user_id, ids in changed.items() if user_id is not None}
+        )
+
+        deleted = sum(len(ids) for ids in changed.values())
+        # Log critique pour suppression
+        logger.warning(f"Notifications deleted in bulk: {deleted} rows, {len(changed)} users")
+
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "Notifications supprimées",
+            "deleted": deleted,
+            "users": len(changed)
+        }
+
+    except ValueError as e:
+        return {"status": status.HTTP_400_BAD_REQUEST, "message": str(e)}
+    except Exception as e:
+        logger.error(f"Bulk delete failed: {str(e)}")
+        await db.rollback()
+        return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur suppression notifications"}
+
 @notification_router.put("/{notification_id}/read")
-async def mark_notification_as_read(notification_id: int, db: Session = Depends(get_db_samaconso)):
+async def mark_notification_as_read(notification_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Marquer notification comme lue - Version simplifiée"""
     try:
-        notification = db.query(Notification).filter(Notification.id == notification_id).first()
+        notification = await db.get(Notification, notification_id)
         if not notification:
             return {"status": status.HTTP_404_NOT_FOUND, "message": "Notification introuvable"}
 
+        was_unread = not notification.is_read
         notification.is_read = True
         # Mise à jour de updated_at seulement si le champ existe
         if hasattr(notification, 'updated_at'):
             notification.updated_at = datetime.now()
-        db.commit()
+        await db.commit()
+        if was_unread:
+            await adjust_unread(notification.for_user_id, -1)
 
         # Invalidation cache
-        try:
-            await cache_delete(CACHE_KEYS["NOTIFICATIONS_ALL"])
-            await cache_delete(f"notifications:user:{notification.for_user_id}")
-        except Exception:
-            pass
+        await invalidate_notification_caches([notification.for_user_id])
 
         return {
             "status": status.HTTP_200_OK,
@@ -593,23 +663,22 @@ async def mark_notification_as_read(notification_id: int, db: Session = Depends(
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur marquage notification"}
 
 @notification_router.delete("/{notification_id}")
-async def delete_notification(notification_id: int, db: Session = Depends(get_db_samaconso)):
+async def delete_notification(notification_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Supprimer notification - Version simplifiée"""
     try:
-        notification = db.query(Notification).filter(Notification.id == notification_id).first()
+        notification = await db.get(Notification, notification_id)
         if not notification:
             return {"status": status.HTTP_404_NOT_FOUND, "message": "Notification introuvable"}
 
         user_id = notification.for_user_id
-        db.delete(notification)
-        db.commit()
+        was_unread = not notification.is_read
+        await db.delete(notification)
+        await db.commit()
+        if was_unread:
+            await adjust_unread(user_id, -1)
 
         # Invalidation cache
-        try:
-            await cache_delete(CACHE_KEYS["NOTIFICATIONS_ALL"])
-            await cache_delete(f"notifications:user:{user_id}")
-        except Exception:
-            pass
+        await invalidate_notification_caches([user_id])
 
         # Log critique pour suppression
         logger.warning(f"Notification deleted: ID={notification_id}, User={user_id}")
@@ -625,13 +694,16 @@ async def delete_notification(notification_id: int, db: Session = Depends(get_db
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur suppression notification"}
 
 @notification_router.post("/compteur")
-async def create_notification_from_compteur(data: NotificationfromCompteurSchema, db: Session = Depends(get_db_samaconso)):
+async def create_notification_from_compteur(data: NotificationfromCompteurSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Notification depuis compteur - Version simplifiée"""
     try:
         # Récupérer l'utilisateur associé au compteur
-        user_compteur = db.query(UserCompteur).filter(
-            UserCompteur.numero_compteur == data.numero_compteur
-        ).first()
+        result = await db.execute(
+            select(UserCompteur).where(
+                UserCompteur.numero_compteur == data.numero_compteur
+            ).limit(1)
+        )
+        user_compteur = result.scalars().first()
         
         if not user_compteur:
             return {"status": status.HTTP_404_NOT_FOUND, "message": "Compteur non associé à un utilisateur"}
@@ -646,17 +718,21 @@ async def create_notification_from_compteur(data: NotificationfromCompteurSchema
             is_read=False
         )
         db.add(notif)
-        db.commit()
-        db.refresh(notif)
+        await db.commit()
+        await db.refresh(notif)
+        await adjust_unread(notif.for_user_id, 1)
 
         # Sessions actives pour envoi
-        user_sessions = db.query(UserSession).filter(
-            and_(
-                UserSession.user_id == user_compteur.user_id,
-                UserSession.is_active,
-                UserSession.fcm_token.isnot(None)
+        result = await db.execute(
+            select(UserSession).where(
+                and_(
+                    UserSession.user_id == user_compteur.user_id,
+                    UserSession.is_active,
+                    UserSession.fcm_token.isnot(None)
+                )
             )
-        ).all()
+        )
+        user_sessions = result.scalars().all()
 
         task_ids = []
         unique_tokens = set()
@@ -697,7 +773,7 @@ async def create_notification_from_compteur(data: NotificationfromCompteurSchema
         return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": "Erreur notification compteur"}
 
 # Fonction helper pour compatibilité
-def for_user_notif(type_notification_id: int, title: str, body: str, for_user_id: int, event_id: int, db: Session):
+async def for_user_notif(type_notification_id: int, title: str, body: str, for_user_id: int, event_id: int, db: AsyncSession):
     """Helper function simplifiée pour créer notification"""
     try:
         # Création notification
@@ -711,17 +787,21 @@ def for_user_notif(type_notification_id: int, title: str, body: str, for_user_id
             is_read=False
         )
         db.add(notif)
-        db.commit()
-        db.refresh(notif)
+        await db.commit()
+        await db.refresh(notif)
+        await adjust_unread(for_user_id, 1)
 
         # Sessions actives
-        user_sessions = db.query(UserSession).filter(
-            and_(
-                UserSession.user_id == for_user_id,
-                UserSession.is_active,
-                UserSession.fcm_token.isnot(None)
+        result = await db.execute(
+            select(UserSession).where(
+                and_(
+                    UserSession.user_id == for_user_id,
+                    UserSession.is_active,
+                    UserSession.fcm_token.isnot(None)
+                )
             )
-        ).all()
+        )
+        user_sessions = result.scalars().all()
 
         # Envoi notifications
         task_ids = []
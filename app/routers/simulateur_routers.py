@@ -6,22 +6,20 @@
 # - Si le WSDL fournit un host "placeholder"/non résoluble, on force un endpoint override
 
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from pathlib import Path
 from datetime import datetime
-from typing import Optional
-import logging, random, tempfile, os, ssl, socket
-from xml.etree import ElementTree as ET
-import xmltodict
-from urllib.parse import urlparse, urlunparse
+from typing import List, Optional
+import asyncio, json, logging, random, os, ssl
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.ssl_ import create_urllib3_context
-
-from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, NoEncryption
 from cryptography.hazmat.primitives.serialization.pkcs12 import load_key_and_certificates
 
+from app.config import XMLVEND_BATCH_CONCURRENCY, XMLVEND_BATCH_MAX, XMLVEND_POOL_SIZE
+from app.services.simulation_cache import cached_simulation, get_simulation_cache_stats
+from app.services.xmlvend_client import XmlVendClient
+from app.services.xmlvend_parser import parse_trial_credit_vend_response
+
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -49,88 +47,26 @@ logging.basicConfig(level=logging.INFO)
 simulateur_router = APIRouter(prefix="/simulateur", tags=["simulateur"])
 
 # -----------------------------------------------------------------------------
-# Adapter HTTPS : TLS1.2 + SECLEVEL=0 + PFX
+# Client XMLVend du processus (session mTLS, endpoint en cache)
 # -----------------------------------------------------------------------------
-class Pkcs12TLS12LegacyAdapter(HTTPAdapter):
-    __slots__ = ("_ssl_context", "_certfile", "_keyfile", "_tmp_files")
-
-    def __init__(self, pkcs12_filename: str, pkcs12_password: str, **kwargs):
-        certfile, keyfile, tmp_files = self._pfx_to_temp_pems(pkcs12_filename, pkcs12_password)
-        ctx = self._build_ssl_context(certfile, keyfile)
-        self._ssl_context = ctx
-        self._certfile = certfile
-        self._keyfile = keyfile
-        self._tmp_files = tmp_files
-        super().__init__(**kwargs)
-
-    @staticmethod
-    def _pfx_to_temp_pems(pkcs12_filename: str, pkcs12_password: str):
-        with open(pkcs12_filename, "rb") as f:
-            pfx = f.read()
-        key, cert, add_certs = load_key_and_certificates(pfx, pkcs12_password.encode("utf-8"))
-        if cert is None or key is None:
-            raise RuntimeError("PFX invalide: certificat ou clé absents")
-
-        tmp_files = []
-        cert_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pem")
-        cert_tmp.write(cert.public_bytes(Encoding.PEM))
-        if add_certs:
-            for c in add_certs:
-                cert_tmp.write(c.public_bytes(Encoding.PEM))
-        cert_tmp.flush()
-        tmp_files.append(cert_tmp.name)
-
-        key_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pem")
-        key_tmp.write(key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()))
-        key_tmp.flush()
-        tmp_files.append(key_tmp.name)
-
-        return cert_tmp.name, key_tmp.name, tmp_files
-
-    @staticmethod
-    def _build_ssl_context(certfile: str, keyfile: str) -> ssl.SSLContext:
-        ctx = create_urllib3_context()
-        # Permettre TLS 1.0+ pour compatibilité avec les vieux serveurs XMLVend
-        if hasattr(ssl, "TLSVersion"):
-            try:
-                ctx.minimum_version = ssl.TLSVersion.TLSv1
-            except (AttributeError, ssl.SSLError):
-                # TLSv1 peut être désactivé à la compile — fallback TLS 1.2
-                ctx.minimum_version = ssl.TLSVersion.TLSv1_2
-        # OpenSSL 3.0: autoriser la renégociation legacy (vieux serveurs Java/C++)
-        if hasattr(ssl, "OP_LEGACY_SERVER_CONNECT"):
-            ctx.options |= ssl.OP_LEGACY_SERVER_CONNECT
-        # Algorithmes très permissifs pour serveurs legacy
-        for ciphers in ("ALL:!NULL:!eNULL:@SECLEVEL=0", "DEFAULT:@SECLEVEL=0"):
-            try:
-                ctx.set_ciphers(ciphers)
-                break
-            except ssl.SSLError:
-                continue
-        ctx.load_cert_chain(certfile=certfile, keyfile=keyfile)
-        # DEV: pas de vérif serveur; PROD: fournissez un CA bundle (session.verify=...).
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        return ctx
-
-    def init_poolmanager(self, *args, **kwargs):
-        kwargs["ssl_context"] = self._ssl_context
-        return super().init_poolmanager(*args, **kwargs)
-
-    def proxy_manager_for(self, *args, **kwargs):
-        if "ssl_context" not in kwargs:
-            kwargs["ssl_context"] = self._ssl_context
-        return super().proxy_manager_for(*args, **kwargs)
-
-    def close(self):
-        try:
-            for p in getattr(self, "_tmp_files", []) or []:
-                try:
-                    Path(p).unlink(missing_ok=True)
-                except Exception:
-                    pass
-        finally:
-            return super().close()
+_xmlvend_client: Optional[XmlVendClient] = None
+
+def get_xmlvend_client() -> XmlVendClient:
+    global _xmlvend_client
+    if _xmlvend_client is None:
+        _xmlvend_client = XmlVendClient(
+            wsdl_url=SOAP_WSDL_URL,
+            pfx_path=CERTIFICATE_PATH,
+            pfx_password=CERTIFICATE_PASSWORD,
+            endpoint_override=XMLVEND_ENDPOINT,
+        )
+    return _xmlvend_client
+
+def close_xmlvend_client() -> None:
+    global _xmlvend_client
+    if _xmlvend_client is not None:
+        _xmlvend_client.close()
+        _xmlvend_client = None
 
 # -----------------------------------------------------------------------------
 # Modèles
@@ -139,6 +75,11 @@ class TrialCreditVendRequest(BaseModel):
     meter_no: str
     amount: float
 
+class TrialCreditVendBatchRequest(BaseModel):
+    items: List[TrialCreditVendRequest] = Field(..., min_length=1, max_length=XMLVEND_BATCH_MAX)
+    # Borné par le pool de connexions XMLVend : au-delà, les appels attendraient une connexion
+    concurrency: Optional[int] = Field(None, ge=1, le=XMLVEND_POOL_SIZE)
+
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
@@ -190,265 +131,9 @@ def create_soap_request(meter_no: str, amount: float, date_time: str, unique_num
 #    </soapenv:Body>
 # </soapenv:Envelope>"""
 
-def _extract_endpoint_from_wsdl(wsdl_xml: str) -> Optional[str]:
-    try:
-        ns = {
-            "wsdl": "http://schemas.xmlsoap.org/wsdl/",
-            "soap": "http://schemas.xmlsoap.org/wsdl/soap/",
-            "soap12": "http://schemas.xmlsoap.org/wsdl/soap12/",
-        }
-        root = ET.fromstring(wsdl_xml)
-        for addr in root.findall(".//wsdl:service/wsdl:port/soap:address", ns):
-            loc = addr.get("location")
-            if loc:
-                return loc
-        for addr in root.findall(".//wsdl:service/wsdl:port/soap12:address", ns):
-            loc = addr.get("location")
-            if loc:
-                return loc
-    except Exception:
-        pass
-    return None
-
-_PLACEHOLDER_TOKENS = ("manufacturer", "placeholder", "example", "changeme")
-
-def _is_resolvable(hostname: str) -> bool:
-    try:
-        socket.getaddrinfo(hostname, None)
-        return True
-    except Exception:
-        return False
-
-def _compute_fallback_endpoint() -> str:
-    """
-    Fallback robuste:
-    - si XMLVEND_ENDPOINT est défini (env), on l'utilise,
-    - sinon: on prend schéma+netloc du WSDL et on force le path '/xmlvend'
-    """
-    if XMLVEND_ENDPOINT:
-        return XMLVEND_ENDPOINT
-    pu = urlparse(SOAP_WSDL_URL)
-    base = pu._replace(path="/xmlvend", params="", query="", fragment="")
-    return urlunparse(base)
-
-def _sanitize_endpoint(wsdl_endpoint: Optional[str]) -> str:
-    """
-    Si le WSDL fournit un endpoint "clean" et résoluble → le garder.
-    Sinon → fallback (env XMLVEND_ENDPOINT, ou base du WSDL /xmlvend).
-    """
-    # 1) priorité à XMLVEND_ENDPOINT si fourni
-    if XMLVEND_ENDPOINT:
-        return XMLVEND_ENDPOINT
-
-    if not wsdl_endpoint:
-        return _compute_fallback_endpoint()
-
-    ep = urlparse(wsdl_endpoint)
-    host = (ep.hostname or "").lower()
-
-    # bloquer hosts manifestement placeholders ou non résolubles
-    if any(tok in host for tok in _PLACEHOLDER_TOKENS) or not _is_resolvable(host):
-        return _compute_fallback_endpoint()
-
-    return wsdl_endpoint
-
 def parse_soap_response(xml_content: str, request_date_time: str, unique_number: str, http_status: int) -> dict:
-    try:
-        parsed_xml = xmltodict.parse(xml_content)
-        body = parsed_xml["SOAP-ENV:Envelope"]["SOAP-ENV:Body"]["ns3:trialCreditVendResp"]
-        json_result = {
-            "success": http_status == 200,
-            "http_status": http_status,
-            "error": None,
-            "device_info": {
-                "client_id": {
-                    "ean": body.get("ns2:clientID", {}).get("@ean"),
-                    "type": body.get("ns2:clientID", {}).get("@xsi:type")
-                },
-                "server_id": {
-                    "ean": body.get("ns2:serverID", {}).get("@ean"),
-                    "type": body.get("ns2:serverID", {}).get("@xsi:type")
-                },
-                "terminal_id": {
-                    "id": body.get("ns2:terminalID", {}).get("@id"),
-                    "type": body.get("ns2:terminalID", {}).get("@xsi:type")
-                }
-            },
-            "transaction_info": {
-                "response_date_time": body["ns2:respDateTime"],
-                "request_date_time": request_date_time,
-                "unique_number": unique_number,
-                "receipt_no": body["ns3:creditVendReceipt"]["@receiptNo"],
-                "display_header": body.get("ns2:dispHeader")
-            },
-            "utility": {
-                "name": body.get("ns2:utility", {}).get("@name"),
-                "address": body.get("ns2:utility", {}).get("@address")
-            },
-            "vendor": {
-                "name": body.get("ns2:vendor", {}).get("@name"),
-                "address": body.get("ns2:vendor", {}).get("@address")
-            },
-            "client": {
-                "account_no": body["ns2:custVendDetail"]["@accNo"],
-                "name": body["ns2:custVendDetail"]["@name"].strip(),
-                "address": body["ns2:custVendDetail"]["@address"],
-                "location_ref": body["ns2:custVendDetail"]["@locRef"],
-                "days_since_last_purchase": int(body["ns2:custVendDetail"]["@daysLastPurchase"]),
-                "available_credit": {
-                    "currency": body["ns2:clientStatus"]["ns2:availCredit"]["@symbol"],
-                    "value": float(body["ns2:clientStatus"]["ns2:availCredit"]["@value"])
-                }
-            }
-        }
-        
-        # Extract transaction list
-        tx_list = body["ns3:creditVendReceipt"]["ns3:transactions"]["ns3:tx"]
-        if isinstance(tx_list, dict):
-            tx_list = [tx_list]  # Force list if single element
-        
-        # Find different transaction types
-        credit_tx = next((tx for tx in tx_list if "CreditVendTx" in tx["@xsi:type"]), None)
-        debt_recovery_tx = next((tx for tx in tx_list if "DebtRecoveryTx" in tx["@xsi:type"]), None)
-        service_charges = [tx for tx in tx_list if "ServiceChrgTx" in tx["@xsi:type"]]
-        
-        # Extract meter and purchase details
-        if credit_tx:
-            meter_detail = credit_tx["ns3:creditTokenIssue"]["ns2:meterDetail"]
-            json_result["meter"] = {
-                "number": meter_detail["@msno"],
-                "sgc": meter_detail["@sgc"],
-                "krn": meter_detail["@krn"],
-                "ti": meter_detail["@ti"],
-                "meter_type": {
-                    "at": meter_detail.get("ns2:meterType", {}).get("@at"),
-                    "tt": meter_detail.get("ns2:meterType", {}).get("@tt")
-                },
-                "max_vend_amount": float(meter_detail["ns2:maxVendAmt"]),
-                "min_vend_amount": float(meter_detail["ns2:minVendAmt"]),
-                "max_vend_energy": float(meter_detail["ns2:maxVendEng"]),
-                "min_vend_energy": float(meter_detail["ns2:minVendEng"])
-            }
-            
-            units = credit_tx["ns3:creditTokenIssue"]["ns2:units"]
-            json_result["purchase"] = {
-                "receipt_no": credit_tx.get("@receiptNo"),
-                "amount": {
-                    "value": float(credit_tx["ns3:amt"]["@value"]),
-                    "currency": credit_tx["ns3:amt"]["@symbol"]
-                },
-                "units": {
-                    "value": float(units["@value"]),
-                    "unit": units["@siUnit"]
-                },
-                "tariff": {
-                    "name": credit_tx.get("ns3:tariff", {}).get("ns2:name")
-                },
-                "resource_type": credit_tx["ns3:creditTokenIssue"].get("ns2:resource", {}).get("@xsi:type")
-            }
-            
-            # Extract STS token (the real token!)
-            token_issue = credit_tx["ns3:creditTokenIssue"]
-            if "ns2:token" in token_issue:
-                token = token_issue["ns2:token"]
-                json_result["token"] = {
-                    "type": token.get("@xsi:type"),
-                    "sts_cipher": token.get("ns2:stsCipher", ""),
-                    "description": token_issue.get("ns2:desc")
-                }
-            
-            # Extract credit steps (tariff breakdown)
-            if "ns3:creditStep" in credit_tx:
-                json_result["credit_steps"] = []
-                steps = credit_tx["ns3:creditStep"]["ns3:creditStepTx"]
-                if isinstance(steps, dict):
-                    steps = [steps]
-                for step in steps:
-                    # Handle empty/None values for stepE (can be empty for last step)
-                    step_end_value = step.get("ns2:stepE")
-                    step_end = None if not step_end_value or step_end_value == "" else int(step_end_value)
-                    
-                    step_begin_value = step.get("ns2:stepB", 0)
-                    step_begin = 0 if not step_begin_value or step_begin_value == "" else int(step_begin_value)
-                    
-                    json_result["credit_steps"].append({
-                        "step_begin": step_begin,
-                        "step_end": step_end,  # Can be None for unlimited last step
-                        "price_per_unit": float(step.get("ns2:price", 0)),
-                        "amount": {
-                            "value": float(step.get("ns2:amt", {}).get("@value", 0)),
-                            "currency": step.get("ns2:amt", {}).get("@symbol")
-                        },
-                        "units": {
-                            "value": float(step.get("ns2:units", {}).get("@value", 0)),
-                            "unit": step.get("ns2:units", {}).get("@siUnit")
-                        }
-                    })
-        
-        # Extract debt recovery (includes BALANCE!)
-        if debt_recovery_tx:
-            json_result["debt_recovery"] = {
-                "account_no": debt_recovery_tx.get("ns3:accNo"),
-                "description": debt_recovery_tx.get("ns3:accDesc"),
-                "amount": {
-                    "value": float(debt_recovery_tx["ns3:amt"]["@value"]),
-                    "currency": debt_recovery_tx["ns3:amt"]["@symbol"]
-                },
-                "balance": {
-                    "value": float(debt_recovery_tx.get("ns3:balance", {}).get("@value", 0)),
-                    "currency": debt_recovery_tx.get("ns3:balance", {}).get("@symbol")
-                },
-                "tariff": {
-                    "name": debt_recovery_tx.get("ns3:tariff", {}).get("ns2:name")
-                }
-            }
-        
-        # Extract service charges
-        json_result["service_charges"] = []
-        for tx in service_charges:
-            json_result["service_charges"].append({
-                "type": "ServiceCharge",
-                "account_no": tx.get("ns3:accNo"),
-                "description": tx.get("ns3:accDesc"),
-                "amount": {
-                    "value": float(tx["ns3:amt"]["@value"]),
-                    "currency": tx["ns3:amt"]["@symbol"]
-                },
-                "tariff": {
-                    "name": tx.get("ns3:tariff", {}).get("ns2:name")
-                }
-            })
-        
-        # Extract transaction totals
-        transactions = body["ns3:creditVendReceipt"]["ns3:transactions"]
-        json_result["transaction_totals"] = {
-            "less_round": {
-                "value": float(transactions.get("ns3:lessRound", {}).get("@value", 0)),
-                "currency": transactions.get("ns3:lessRound", {}).get("@symbol")
-            },
-            "tender_amount": {
-                "value": float(transactions.get("ns3:tenderAmt", {}).get("@value", 0)),
-                "currency": transactions.get("ns3:tenderAmt", {}).get("@symbol")
-            },
-            "change": {
-                "value": float(transactions.get("ns3:change", {}).get("@value", 0)),
-                "currency": transactions.get("ns3:change", {}).get("@symbol")
-            }
-        }
-        return  json_result
-        # {
-        #     "success": http_status == 200,
-        #     "http_status": http_status,
-        #     "transaction_info": {
-        #         "response_date_time": body["ns2:respDateTime"],
-        #         "request_date_time": request_date_time,
-        #         "unique_number": unique_number,
-        #         "receipt_no": body["ns3:creditVendReceipt"]["@receiptNo"],
-        #         "display_header": body.get("ns2:dispHeader")
-        #     }
-        # }
-    except Exception as e:
-        return {"success": False, "http_status": http_status, "error": f"parse error: {e}", "raw": xml_content}
+    # Parsing lxml en une passe, schéma de réponse inchangé (voir app/services/xmlvend_parser.py)
+    return parse_trial_credit_vend_response(xml_content, request_date_time, unique_number, http_status)
 
 # -----------------------------------------------------------------------------
 # Endpoint principal
@@ -457,50 +142,46 @@ class _ReqModel(BaseModel):
     meter_no: str
     amount: float
 
+SOAP_HEADERS = {
+    "Content-Type": "text/xml; charset=utf-8",
+    "SOAPAction": SOAP_SERVICE_NAME,
+    "Accept": "text/xml",
+}
+
+async def _trial_credit_vend(meter_no: str, amount: float, unique_number: Optional[str] = None) -> dict:
+    """Une simulation : requête SOAP, POST sur la session partagée, réponse parsée"""
+    date_time = generate_datetime()
+    unique_number = unique_number or generate_unique_number()
+
+    # Construire la requête SOAP
+    soap_xml = create_soap_request(
+        meter_no=meter_no,
+        amount=amount,
+        date_time=date_time,
+        unique_number=unique_number
+    )
+
+    # POST sur la session mTLS partagée (endpoint en cache), hors de la boucle asyncio
+    resp, endpoint_url = await get_xmlvend_client().post_async(soap_xml, SOAP_HEADERS)
+    parsed = parse_soap_response(resp.text, date_time, unique_number, resp.status_code)
+    parsed["endpoint_used"] = endpoint_url
+    parsed["openssl_version"] = getattr(ssl, "OPENSSL_VERSION", None)
+    return parsed
+
+async def _simulate(meter_no: str, amount: float, unique_number: Optional[str] = None) -> dict:
+    """Simulation servie depuis le cache si activé (même compteur, montant et jour), sinon calculée"""
+    result, cache_hit = await cached_simulation(
+        meter_no, amount, lambda: _trial_credit_vend(meter_no, amount, unique_number)
+    )
+    return {**result, "cache_hit": cache_hit}
+
 @simulateur_router.post("/trial-credit-vend-request")
 async def trial_credit_vend_request(request: _ReqModel):
     try:
         if not CERTIFICATE_PATH.exists():
             raise FileNotFoundError(f"Client certificate not found: {CERTIFICATE_PATH}")
 
-        date_time = generate_datetime()
-        unique_number = generate_unique_number()
-
-        # Session Requests avec adapter PFX + TLS1.2 + SECLEVEL=0
-        session = requests.Session()
-        session.verify = False  # PROD: mettre un CA bundle ici
-        session.mount("https://", Pkcs12TLS12LegacyAdapter(
-            pkcs12_filename=str(CERTIFICATE_PATH),
-            pkcs12_password=CERTIFICATE_PASSWORD
-        ))
-
-        # 1) GET WSDL (mTLS actif)
-        wsdl_resp = session.get(SOAP_WSDL_URL, timeout=30)
-        wsdl_resp.raise_for_status()
-
-        # 2) Endpoint SOAP: WSDL → sanitize → fallback si non résoluble
-        endpoint_raw = _extract_endpoint_from_wsdl(wsdl_resp.text)
-        endpoint_url = _sanitize_endpoint(endpoint_raw)
-        logger.info(f"SOAP endpoint selected: {endpoint_url}")
-
-        # 3) Construire & POSTer la requête SOAP
-        soap_xml = create_soap_request(
-            meter_no=request.meter_no,
-            amount=request.amount,
-            date_time=date_time,
-            unique_number=unique_number
-        )
-        headers = {
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": SOAP_SERVICE_NAME,
-            "Accept": "text/xml",
-        }
-
-        resp = session.post(endpoint_url, data=soap_xml, headers=headers, timeout=60)
-        parsed = parse_soap_response(resp.text, date_time, unique_number, resp.status_code)
-        parsed["endpoint_used"] = endpoint_url
-        parsed["openssl_version"] = getattr(ssl, "OPENSSL_VERSION", None)
-        return parsed
+        return await _simulate(request.meter_no, request.amount)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail={
@@ -512,6 +193,48 @@ async def trial_credit_vend_request(request: _ReqModel):
             "xmlvend_endpoint_env": XMLVEND_ENDPOINT or None
         })
 
+@simulateur_router.post("/trial-credit-vend-batch")
+async def trial_credit_vend_batch(request: TrialCreditVendBatchRequest):
+    """
+    Simulations en lot sur la connexion XMLVend partagée, au plus `concurrency`
+    à la fois. Résultats streamés en NDJSON (une ligne par compteur) dans
+    l'ordre d'arrivée ; `index` renvoie à la position dans `items`. Un échec
+    est rapporté sur sa ligne (success=false) sans interrompre le lot.
+    """
+    if not CERTIFICATE_PATH.exists():
+        raise HTTPException(status_code=500, detail={
+            "error": f"Client certificate not found: {CERTIFICATE_PATH}",
+            "error_type": "FileNotFoundError",
+            "certificate_path": str(CERTIFICATE_PATH),
+            "certificate_exists": False,
+        })
+
+    semaphore = asyncio.Semaphore(request.concurrency or XMLVEND_BATCH_CONCURRENCY)
+    # msgID = dateTime (minute) + uniqueNumber : numéros distincts dans le lot
+    unique_numbers = [str(n) for n in random.sample(range(10000, 100000), len(request.items))]
+
+    async def run(index: int, item: TrialCreditVendRequest) -> dict:
+        async with semaphore:
+            try:
+                result = await _simulate(item.meter_no, item.amount, unique_numbers[index])
+            except Exception as e:
+                logger.warning(f"Simulation en lot {item.meter_no}: {type(e).__name__}: {e}")
+                result = {"success": False, "error": str(e), "error_type": type(e).__name__}
+        return {"index": index, "meter_no": item.meter_no, "amount": item.amount, **result}
+
+    async def stream():
+        tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(request.items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                yield json.dumps(line, default=str, ensure_ascii=False) + "\n"
+        finally:
+            # Client déconnecté : les simulations restantes sont abandonnées
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 # -----------------------------------------------------------------------------
 # Utilitaires
 # -----------------------------------------------------------------------------
@@ -523,7 +246,9 @@ async def root():
         "certificate_path": str(CERTIFICATE_PATH),
         "certificate_exists": CERTIFICATE_PATH.exists(),
         "wsdl": SOAP_WSDL_URL,
-        "xmlvend_endpoint_env": XMLVEND_ENDPOINT or None
+        "xmlvend_endpoint_env": XMLVEND_ENDPOINT or None,
+        "xmlvend_client": get_xmlvend_client().stats(),
+        "simulation_cache": get_simulation_cache_stats()
     }
 
 
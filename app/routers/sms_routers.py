@@ -1,40 +1,29 @@
-from fastapi import APIRouter, FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from zeep import Client
+from fastapi import APIRouter, HTTPException, status
 
-from app.schemas.user_schemas import UserSendSmsSchema
+from app.schemas.user_schemas import SmsBulkSchema, UserSendSmsSchema
+from app.services.sms_gateway import get_sms_gateway
+from app.tasks.sms_tasks import send_bulk_sms
 
 sms_router = APIRouter(prefix="/sms",tags=["sms"])
 
-SOAP_WSDL_URL = "http://10.101.2.86:8080/OrangeSmsPro/OSPWebService?wsdl"
-
-
 
 @sms_router.post("/sendsms/")
 async def call_sms_service(smsParams: UserSendSmsSchema):
     try:
-        # Create SOAP client
-        client = Client(SOAP_WSDL_URL)
-
-        # Call the SOAP method (replace 'YourSoapMethod' with the actual method name)
-        response = client.service.sendOneSMS(smsParams.telephone, smsParams.message)
-        r = str(response)
-
-        response_data = eval(response)  # This is unsafe in production, consider JSON parsing
-            
-            # Extract status code and text
-        responses = response_data.get("responses", {}).get("response", [])
-        if responses:
-                status = responses[0].get("status", {})
-                status_code = status.get("status_CODE")
-                status_text = status.get("status_TEXT")
-        
-        return {
-            "response": r.replace('\\', ''),
-            "status_code": status_code,
-            "status_text": status_text
-        }
+        # Client SOAP persistant (WSDL en cache, connexions réutilisées), appel hors de la boucle asyncio
+        result = await get_sms_gateway().send_async(smsParams.telephone, smsParams.message)
+        return result.as_response()
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@sms_router.post("/bulk/", status_code=status.HTTP_202_ACCEPTED)
+async def send_bulk(bulkParams: SmsBulkSchema):
+    """Envoi groupé : mis en file Celery (débit limité par SMS_RATE_LIMIT), réponse immédiate"""
+    try:
+        task = send_bulk_sms.delay([m.model_dump() for m in bulkParams.messages])
+        return {"status": "queued", "task_id": task.id, "queued": len(bulkParams.messages)}
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -5,6 +5,7 @@ from app.models.models import TypeDemande, TypeDemande
 from app.schemas.type_demande_schemas import  TypeDemandeCreateSchema,TypeDemandeResponseSchema
 from app.database import get_db_samaconso
 from app.cache import cache_get, cache_set, cache_delete
+from app.cache_decorators import cached
 from app.config import CACHE_KEYS
 
 type_demande_router = APIRouter(prefix="/type_demande", tags=["TypeDemande"])
@@ -32,30 +33,22 @@ async def create(data:TypeDemandeCreateSchema, db: Session = Depends(get_db_sama
         pass
     return {"status":status.HTTP_200_OK,"type_demande":payload}
 
-@type_demande_router.get("/")
-async def list_all(db: Session = Depends(get_db_samaconso)):
-    cache_key_all = "type_demande:all"
-    try:
-        cached = await cache_get(cache_key_all)
-        if cached:
-            data = json.loads(cached)
-            return {"status":status.HTTP_200_OK,"type_demandes":data}
-    except Exception:
-        pass
-    rows= db.query(TypeDemande).all()
-    payload = []
-    for r in rows:
-        payload.append({
+@cached(CACHE_KEYS["TYPE_DEMANDE_ALL"])
+async def _list_type_demandes(db: Session) -> list:
+    rows = db.query(TypeDemande).all()
+    return [
+        {
             "id": r.id,
             "label": r.label,
             "created_at": r.created_at.strftime("%d/%m/%Y %H:%M:%S") if r.created_at else None,
             "updated_at": r.updated_at.strftime("%d/%m/%Y %H:%M:%S") if r.updated_at else None,
-        })
-    try:
-        await cache_set(cache_key_all, json.dumps(payload))
-    except Exception:
-        pass
-    return {"status":status.HTTP_200_OK,"type_demandes":payload}
+        }
+        for r in rows
+    ]
+
+@type_demande_router.get("/")
+async def list_all(db: Session = Depends(get_db_samaconso)):
+    return {"status":status.HTTP_200_OK,"type_demandes":await _list_type_demandes(db)}
 
 @type_demande_router.get("/{type_id}")
 def get_one(type_id:int,db: Session = Depends(get_db_samaconso)):
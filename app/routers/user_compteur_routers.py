@@ -1,21 +1,37 @@
 from typing import Counter
 from fastapi import APIRouter, Depends, HTTPException,status
 import json
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session,joinedload
 from app.models.models import Agence, Compteur, Notification, User, UserCompteur
 from app.routers.notification_routers import  for_user_notif
 from app.schemas.postpaid_schemas import NumCCParamSchema
 from app.schemas.sic_schemas import TransactionsByMeterPoc
 from app.schemas.user_compteur_schemas import ActivateUserCompteur, UserCompteurCreateSchema, UserCompteurCreateSchemaV2,UserCompteurUpdate,CompteurWoyofalResponseSchema,CompteurPostpaidResponseSchema
-from app.database import get_db_connection_postpaid, get_db_samaconso,get_db_connection_sic
-from app.cache import cache_get, cache_set, cache_delete
+from app.database import get_async_db_samaconso, run_sqlserver, sqlserver_fetch_all
+from app.cache import cache_get, cache_get_bytes, cache_set_tagged, cache_tag, invalidate_tags
+from app.cache_codec import JSONBytesResponse, cache_json, cached_json
 from app.config import CACHE_KEYS, CACHE_TTL
 from app.queries import * 
+from app.services.dashboard_service import DASHBOARD_CACHE_TAG, apply_user_compteur_change, snapshot_user_compteur
 import pyodbc
 
 user_compteur_router = APIRouter(prefix="/user_compteur", tags=["UserCompteur"])
 
+
+# Tags : la liste complète dépend de toutes les liaisons, les listes d'un utilisateur de ses seules liaisons
+USER_COMPTEUR_TAG = cache_tag("user_compteur")
+
+
+def _user_tag(user_id) -> str:
+    return cache_tag("user_compteur", user_id=user_id)
+
+
+async def _invalidate_user_compteur_cache(user_id) -> None:
+    """Invalide les listes user_compteur (toutes celles de l'utilisateur) et les statistiques du dashboard"""
+    await invalidate_tags(USER_COMPTEUR_TAG, _user_tag(user_id), DASHBOARD_CACHE_TAG)
+
 @user_compteur_router.get("/cache/inspect")
 async def inspect_cache():
     """🔍 Inspection du cache pour User Compteur"""
@@ -41,7 +57,8 @@ async def inspect_cache():
     
     for key in test_keys:
         try:
-            cached = await cache_get(key)
+            # Lecture binaire : la liste complète peut être compressée (app.cache_codec)
+            cached = await cache_get_bytes(key)
             if cached:
                 active_keys.append({
                     "key": key,
@@ -57,7 +74,7 @@ async def inspect_cache():
     return cache_info
 
 @user_compteur_router.post("/")
-async def create(data: UserCompteurCreateSchema, db: Session = Depends(get_db_samaconso)):
+async def create(data: UserCompteurCreateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
     
     ##TODO: Vérifier si le numéro de téléphone de l'utilisateur est celui enregistré dans 
     ## la base du commercial, si tel est le cas faire l'ajout rendre is_active à true et mettre l'état validé
@@ -65,26 +82,24 @@ async def create(data: UserCompteurCreateSchema, db: Session = Depends(get_db_sa
 
     db_obj = UserCompteur(**data.model_dump())
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
-    try:
-        await cache_delete(CACHE_KEYS["USER_COMPTEURS"].format(user_id="all"))
-        await cache_delete(CACHE_KEYS["USER_COMPTEURS"].format(user_id=db_obj.user_id))
-    except Exception:
-        pass
+    await db.flush()
+    await apply_user_compteur_change(db, None, snapshot_user_compteur(db_obj))
+    await db.commit()
+    await db.refresh(db_obj)
+    await _invalidate_user_compteur_cache(db_obj.user_id)
     return db_obj
 
 @user_compteur_router.post("/ajoutercompteur")
-async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_db_samaconso)):
+async def createv2(data: UserCompteurCreateSchemaV2, db: AsyncSession = Depends(get_async_db_samaconso)):
     id_compteur:int = 0
     is_owner:bool = False
     active:bool = False
     defaut:bool = False
-    user = db.query(User).filter(User.phoneNumber==data.telephone).first()
+    user = (await db.execute(select(User).where(User.phoneNumber==data.telephone))).scalars().first()
     if not user:
         HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="Utilisateur non enregistré")
     
-    userCompteurExist = db.query(UserCompteur).filter(and_(UserCompteur.numero_compteur==data.numero_compteur
+    userCompteurExist = select(UserCompteur).where(and_(UserCompteur.numero_compteur==data.numero_compteur
                                             ,UserCompteur.user_id==user.id))
     if userCompteurExist : 
          HTTPException(status_code=status.HTTP_409_CONFLICT,detail="Liaison entre utilisateur et compteur déjà enregistrée")
@@ -100,7 +115,7 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
         ## Si les numéros de téléphone correspondent insérer dans la table UserCompteur et l'activer
         ## Sinon l'ajouter et le rendre inactif
 
-        compteurTrouve = verifierCompteur(data.numero_compteur,data.type_compteur)
+        compteurTrouve = await verifierCompteur(data.numero_compteur,data.type_compteur)
         if compteurTrouve.status == 0:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail="Erreur connexion base de données")
         if compteurTrouve.status == 404:
@@ -109,19 +124,19 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
         if compteurTrouve.status == 200:
             
             #Ajouter le compteur dans la base
-            compteur_woyofal = db.query(Compteur).filter(and_(Compteur.numero==data.numero_compteur, Compteur.type_compteur==data.type_compteur)).first()
+            compteur_woyofal = (await db.execute(
+                select(Compteur).where(and_(Compteur.numero==data.numero_compteur, Compteur.type_compteur==data.type_compteur))
+            )).scalars().first()
             if not compteur_woyofal:
                 created_compteur = Compteur(numero=data.numero_compteur,type_compteur=data.type_compteur)
 
                 db.add(created_compteur)
-                db.commit()
-                db.refresh(created_compteur)
+                await db.commit()
+                await db.refresh(created_compteur)
                 id_compteur = created_compteur.id
 
                 try:
-                    conn = get_db_connection_sic()
-                    conn.execute(insertCompteur, (data.numero_compteur, data.type_compteur))
-                    conn.commit()
+                    await run_sqlserver("sic", _insert_compteur_sic, data.numero_compteur, data.type_compteur)
                 
                 except Exception as e:
                     print(f"Erreur lors de l'ajout du compteur : {e}")
@@ -140,12 +155,12 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
             agenceARechercher = compteurTrouve.agence.lower().replace(" ","")
             agenceARechercher = f"%{agenceARechercher}%"
 
-            agence_db = db.query(Agence).filter(
+            agence_db = (await db.execute(select(Agence).where(
                 func.replace(func.lower(Agence.nom)," ","").like(agenceARechercher)
-            ).first()
+            ))).scalars().first()
 
-            userACompteur  = db.query(UserCompteur).filter(UserCompteur.user_id==user.id).all()
-            if len(userACompteur)==0:
+            userACompteur  = (await db.execute(select(UserCompteur.id).where(UserCompteur.user_id==user.id).limit(1))).first()
+            if userACompteur is None:
                 defaut=True
 
             userCompteur = UserCompteurCreateSchema(
@@ -171,25 +186,28 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
             
             userCompteurDbObj = UserCompteur(**userCompteur.model_dump())
             db.add(userCompteurDbObj)
-            db.commit()
-            db.refresh(userCompteurDbObj)
+            await db.flush()
+            await apply_user_compteur_change(db, None, snapshot_user_compteur(userCompteurDbObj))
+            await db.commit()
+            await db.refresh(userCompteurDbObj)
 
             #Envoyer notification au propriétaire
             if(is_owner==False):
 
               
-                user_compteur_owner = db.query(UserCompteur).filter(and_(UserCompteur.est_proprietaire==True,UserCompteur.numero_compteur==data.numero_compteur,
-                                                                         UserCompteur.poc==compteurTrouve.poc)).first()
+                user_compteur_owner = (await db.execute(select(UserCompteur).where(and_(UserCompteur.est_proprietaire==True,UserCompteur.numero_compteur==data.numero_compteur,
+                                                                         UserCompteur.poc==compteurTrouve.poc)))).scalars().first()
                 if(user_compteur_owner):
 
                     title:str = f"{user.firstName} {user.lastName}"
                     body :str = f"souhaite accéder au compteur n° {data.numero_compteur} situé à adresse : {compteurTrouve.adresse}"
                     type_notification_id:int = 1
                     # Send notification via Celery (async)
-                    for_user_notif(type_notification_id=type_notification_id,title=title,body=body,for_user_id=user_compteur_owner.user_id,event_id=userCompteurDbObj.id,db=db)
+                    await for_user_notif(type_notification_id=type_notification_id,title=title,body=body,for_user_id=user_compteur_owner.user_id,event_id=userCompteurDbObj.id,db=db)
 
                 
             
+            await _invalidate_user_compteur_cache(user.id)
             return userCompteurDbObj
 
     ### Ajout compteur postpaiement
@@ -200,7 +218,7 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
         ## Si les numéros de téléphone correspondent insérer dans la table UserCompteur et l'activer
         ## Sinon l'ajouter et le rendre inactif
 
-        compteurPostpaidTrouve = verifierCompteur(data.numero_compteur,data.type_compteur)
+        compteurPostpaidTrouve = await verifierCompteur(data.numero_compteur,data.type_compteur)
         if compteurPostpaidTrouve.status == 0:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail="Erreur connexion base de données")
         if compteurPostpaidTrouve.status == 404:
@@ -209,18 +227,18 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
         if compteurPostpaidTrouve.status == 200:
             
             #Ajouter le compteur dans la base
-            compteur_postpaid= db.query(Compteur).filter(and_(Compteur.numero==data.numero_compteur, Compteur.type_compteur==data.type_compteur)).first()
+            compteur_postpaid= (await db.execute(
+                select(Compteur).where(and_(Compteur.numero==data.numero_compteur, Compteur.type_compteur==data.type_compteur))
+            )).scalars().first()
             if not compteur_postpaid:
                 compteur_postpaid = Compteur(numero=data.numero_compteur,type_compteur=data.type_compteur)
                 db.add(compteur_postpaid)
-                db.commit()
-                db.refresh(compteur_postpaid)
+                await db.commit()
+                await db.refresh(compteur_postpaid)
                 id_compteur = compteur_postpaid.id
 
                 try:
-                    conn = get_db_connection_sic()
-                    conn.execute(insertCompteur, (data.numero_compteur, data.type_compteur))
-                    conn.commit()
+                    await run_sqlserver("sic", _insert_compteur_sic, data.numero_compteur, data.type_compteur)
                 
                 except Exception as e:
                     print(f"Erreur lors de l'ajout du compteur : {e}")
@@ -239,16 +257,16 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
 
 
 
-        userACompteur  = db.query(UserCompteur).filter(UserCompteur.user_id==user.id).all()
-        if len(userACompteur)==0:
+        userACompteur  = (await db.execute(select(UserCompteur.id).where(UserCompteur.user_id==user.id).limit(1))).first()
+        if userACompteur is None:
             defaut=True
         
         agenceARechercher = compteurPostpaidTrouve.agence.lower().replace(" ","")
         agenceARechercher = f"%{agenceARechercher}%"
 
-        agence_db = db.query(Agence).filter(
+        agence_db = (await db.execute(select(Agence).where(
                 func.replace(func.lower(Agence.nom)," ","").like(agenceARechercher)
-            ).first()
+            ))).scalars().first()
 
         agence_id:int = None
         agence_nom:str = None
@@ -280,37 +298,37 @@ async def createv2(data: UserCompteurCreateSchemaV2, db: Session = Depends(get_d
         
         userCompteurDbObj = UserCompteur(**userCompteur.model_dump())
         db.add(userCompteurDbObj)
-        db.commit()
-        db.refresh(userCompteurDbObj)
+        await db.flush()
+        await apply_user_compteur_change(db, None, snapshot_user_compteur(userCompteurDbObj))
+        await db.commit()
+        await db.refresh(userCompteurDbObj)
 
         if(is_owner==False):
 
               
-            user_compteur_owner = db.query(UserCompteur).filter(and_(UserCompteur.est_proprietaire==True,UserCompteur.numero_compteur==data.numero_compteur)).first()
+            user_compteur_owner = (await db.execute(select(UserCompteur).where(and_(UserCompteur.est_proprietaire==True,UserCompteur.numero_compteur==data.numero_compteur)))).scalars().first()
             if(user_compteur_owner):
 
                 title:str = f"{user.firstName} {user.lastName}"
                 body :str = f"souhaite accéder au compteur n° {data.numero_compteur} situé à adresse : {compteurTrouve.adresse}"
                 type_notification_id:int = 1
                 # Send notification via Celery (async)
-                for_user_notif(type_notification_id=type_notification_id,title=title,body=body,for_user_id=user_compteur_owner.user_id,event_id=userCompteurDbObj.id,db=db)
+                await for_user_notif(type_notification_id=type_notification_id,title=title,body=body,for_user_id=user_compteur_owner.user_id,event_id=userCompteurDbObj.id,db=db)
 
                 
 
+        await _invalidate_user_compteur_cache(user.id)
         return userCompteurDbObj
 
 
 
 @user_compteur_router.get("/")
-async def list_all(db: Session = Depends(get_db_samaconso)):
+async def list_all(db: AsyncSession = Depends(get_async_db_samaconso)):
     key_all = CACHE_KEYS["USER_COMPTEURS"].format(user_id="all")
-    try:
-        cached = await cache_get(key_all)
-        if cached:
-            return json.loads(cached)
-    except Exception:
-        pass
-    rows = db.query(UserCompteur).order_by(UserCompteur.created_at.desc()).all()
+    cached = await cached_json(key_all)
+    if cached is not None:
+        return JSONBytesResponse(cached)
+    rows = (await db.execute(select(UserCompteur).order_by(UserCompteur.created_at.desc()))).scalars().all()
     payload = [
         {
             "id": r.id,
@@ -326,15 +344,12 @@ async def list_all(db: Session = Depends(get_db_samaconso)):
         }
         for r in rows
     ]
-    try:
-        await cache_set(key_all, json.dumps(payload), ttl_seconds=CACHE_TTL["COMPTEURS"])
-    except Exception:
-        pass
-    return payload
+    body = await cache_json(key_all, payload, ttl_seconds=CACHE_TTL["COMPTEURS"], tags=[USER_COMPTEUR_TAG])
+    return JSONBytesResponse(body)
 
 
 @user_compteur_router.get("/usercompteur/{id}")
-async def list_all_user_compteur(id:int,db: Session = Depends(get_db_samaconso)):
+async def list_all_user_compteur(id:int,db: AsyncSession = Depends(get_async_db_samaconso)):
     key = CACHE_KEYS["USER_COMPTEURS"].format(user_id=id)
     try:
         cached = await cache_get(key)
@@ -342,7 +357,9 @@ async def list_all_user_compteur(id:int,db: Session = Depends(get_db_samaconso))
             return {"compteurs": json.loads(cached)}
     except Exception:
         pass
-    compteurs =  db.query(UserCompteur).filter(UserCompteur.user_id==id).order_by(UserCompteur.created_at.desc()).all()
+    compteurs =  (await db.execute(
+        select(UserCompteur).where(UserCompteur.user_id==id).order_by(UserCompteur.created_at.desc())
+    )).scalars().all()
     payload = [
         {
             "id": r.id,
@@ -359,13 +376,13 @@ async def list_all_user_compteur(id:int,db: Session = Depends(get_db_samaconso))
         for r in compteurs
     ]
     try:
-        await cache_set(key, json.dumps(payload), ttl_seconds=CACHE_TTL["COMPTEURS"])
+        await cache_set_tagged(key, json.dumps(payload), [_user_tag(id)], ttl_seconds=CACHE_TTL["COMPTEURS"])
     except Exception:
         pass
     return {"compteurs":payload}
 
 @user_compteur_router.get("/usercompteuractive/{id}")
-async def list_all_user_compteur_active(id:int,db: Session = Depends(get_db_samaconso)):
+async def list_all_user_compteur_active(id:int,db: AsyncSession = Depends(get_async_db_samaconso)):
     key = f"user_compteur:active:user:{id}"
     try:
         cached = await cache_get(key)
@@ -374,9 +391,9 @@ async def list_all_user_compteur_active(id:int,db: Session = Depends(get_db_sama
     except Exception:
         pass
         
-    compteurs =  db.query(UserCompteur).filter(and_(UserCompteur.user_id==id,UserCompteur.est_active==True)).options(
+    compteurs =  (await db.execute(select(UserCompteur).where(and_(UserCompteur.user_id==id,UserCompteur.est_active==True)).options(
         joinedload(UserCompteur.user),joinedload(UserCompteur.active_par_user),joinedload(UserCompteur.autorise_par_user)
-    ).order_by(UserCompteur.created_at.desc()).all()
+    ).order_by(UserCompteur.created_at.desc()))).scalars().all()
     
     # Sérialisation manuelle des objets avec relations
     payload = []
@@ -404,27 +421,31 @@ async def list_all_user_compteur_active(id:int,db: Session = Depends(get_db_sama
         payload.append(compteur_data)
     
     try:
-        await cache_set(key, json.dumps(payload), ttl_seconds=CACHE_TTL["COMPTEURS"])
+        await cache_set_tagged(key, json.dumps(payload), [_user_tag(id)], ttl_seconds=CACHE_TTL["COMPTEURS"])
     except Exception:
         pass
         
     return {"compteurs":payload}
 
 @user_compteur_router.get("/usercompteurinactive/{id}")
-async def list_all_user_compteur_inactive(id:int,db: Session = Depends(get_db_samaconso)):
-    compteurs =  db.query(UserCompteur).filter(and_(UserCompteur.user_id==id,UserCompteur.est_active==False)).order_by(UserCompteur.created_at.desc()).all()
+async def list_all_user_compteur_inactive(id:int,db: AsyncSession = Depends(get_async_db_samaconso)):
+    compteurs =  (await db.execute(
+        select(UserCompteur).where(and_(UserCompteur.user_id==id,UserCompteur.est_active==False)).order_by(UserCompteur.created_at.desc())
+    )).scalars().all()
     return {"compteurs":compteurs}
 
 @user_compteur_router.get("/proprietaireactive/{user_id}")
-async def list_all_usercompteur_a_activer(user_id:int,db: Session = Depends(get_db_samaconso)):
-    compteurs = db.query(UserCompteur).filter(and_(UserCompteur.user_id==user_id,UserCompteur.est_proprietaire==True)).order_by(UserCompteur.created_at.desc()).all()
+async def list_all_usercompteur_a_activer(user_id:int,db: AsyncSession = Depends(get_async_db_samaconso)):
+    compteurs = (await db.execute(
+        select(UserCompteur).where(and_(UserCompteur.user_id==user_id,UserCompteur.est_proprietaire==True)).order_by(UserCompteur.created_at.desc())
+    )).scalars().all()
     if not compteurs:
         return {"status":404,"detail":"Pas de user compteur"}
     compteursAactiver = []
     for c in compteurs:
         autres_compteurs = []
         if c.type_compteur==1:
-            autres_compteurs = db.query(UserCompteur).filter(
+            autres_compteurs = (await db.execute(select(UserCompteur).where(
                 and_(
                     UserCompteur.numero_compteur == c.numero_compteur,
                     UserCompteur.poc == c.poc,
@@ -433,15 +454,15 @@ async def list_all_usercompteur_a_activer(user_id:int,db: Session = Depends(get_
                 )
             ).options(
                 joinedload(UserCompteur.user)
-            ).order_by(UserCompteur.created_at.desc()).all()
+            ).order_by(UserCompteur.created_at.desc()))).scalars().all()
         else:
-            autres_compteurs = db.query(UserCompteur).filter(
+            autres_compteurs = (await db.execute(select(UserCompteur).where(
                 and_(UserCompteur.numero_compteur==c.numero_compteur,
                 UserCompteur.user_id!=user_id,
                 UserCompteur.est_proprietaire==False)
             ).options(
                 joinedload(UserCompteur.user)
-            ).order_by(UserCompteur.created_at.desc()).all()
+            ).order_by(UserCompteur.created_at.desc()))).scalars().all()
 
         for autre_c in autres_compteurs:
             compteur_data = {
@@ -473,114 +494,119 @@ async def list_all_usercompteur_a_activer(user_id:int,db: Session = Depends(get_
     return {"status":200,"compteurs": compteursAactiver}
 
 @user_compteur_router.put("/{user_compteur_id}")
-async def update_etat(user_compteur_id:int,compteur_update : UserCompteurUpdate,db: Session = Depends(get_db_samaconso)):
-    user_compteur_db = db.query(UserCompteur).filter(UserCompteur.id == user_compteur_id).first()
+async def update_etat(user_compteur_id:int,compteur_update : UserCompteurUpdate,db: AsyncSession = Depends(get_async_db_samaconso)):
+    user_compteur_db = await db.get(UserCompteur, user_compteur_id)
     if not user_compteur_db:
         raise HTTPException(status_code=404, detail="User Compteur not found")
+    before = snapshot_user_compteur(user_compteur_db)
     for key, value in compteur_update.model_dump(exclude_unset=True).items():
         setattr(user_compteur_db, key, value)
-    db.commit()
-    db.refresh(user_compteur_db)
-    try:
-        await cache_delete(CACHE_KEYS["USER_COMPTEURS"].format(user_id="all"))
-        await cache_delete(CACHE_KEYS["USER_COMPTEURS"].format(user_id=user_compteur_db.user_id))
-    except Exception:
-        pass
+    await apply_user_compteur_change(db, before, snapshot_user_compteur(user_compteur_db))
+    await db.commit()
+    await db.refresh(user_compteur_db)
+    await _invalidate_user_compteur_cache(user_compteur_db.user_id)
     return user_compteur_db
 
 @user_compteur_router.delete("/{user_compteur_id}")
-async def delete_etat(user_compteur_id:int,db: Session = Depends(get_db_samaconso)):
-    user_compteur_db = db.query(UserCompteur).filter(UserCompteur.id == user_compteur_id).first()
+async def delete_etat(user_compteur_id:int,db: AsyncSession = Depends(get_async_db_samaconso)):
+    user_compteur_db = await db.get(UserCompteur, user_compteur_id)
     if not user_compteur_db:
         raise HTTPException(status_code=404, detail="User Compteur not found")
     uid = user_compteur_db.user_id
-    db.delete(user_compteur_db)
-    db.commit()
-    try:
-        await cache_delete(CACHE_KEYS["USER_COMPTEURS"].format(user_id="all"))
-        await cache_delete(CACHE_KEYS["USER_COMPTEURS"].format(user_id=uid))
-    except Exception:
-        pass
+    before = snapshot_user_compteur(user_compteur_db)
+    await db.delete(user_compteur_db)
+    await apply_user_compteur_change(db, before, None)
+    await db.commit()
+    await _invalidate_user_compteur_cache(uid)
     return {"message": "Etat deleted successfully"}
 
 
 @user_compteur_router.get("usercompteurtransactionsmens/{user_id}")
-async def recup_user_compteur_cons_trans(user_id:int,db:Session=Depends(get_db_samaconso)):
+async def recup_user_compteur_cons_trans(user_id:int,db:AsyncSession=Depends(get_async_db_samaconso)):
     # user_compteur_db = db.query(UserCompteur).filter(and_(UserCompteur.user_id == user_id,UserCompteur.est_active==True)).first()
-    user_compteur_db = db.query(UserCompteur).filter(and_(UserCompteur.user_id==user_id,UserCompteur.est_active==True)).first()
+    compteurs = (await db.execute(select(UserCompteur).where(and_(UserCompteur.user_id==user_id,UserCompteur.est_active==True)))).scalars().all()
+    user_compteur_db = compteurs[0] if compteurs else None
     if not user_compteur_db:
         return {"status_code":404, "detail":"Cet utilisateur n'a pas de compteur actif"}
-    compteurs = db.query(UserCompteur).filter(and_(UserCompteur.user_id==user_id,UserCompteur.est_active==True)).all()
     #Récupération des consommations suivants le type de compteur :
     if user_compteur_db.type_compteur ==1 : 
         meter=user_compteur_db.numero_compteur
         poc=user_compteur_db.poc
-        top_10_woyofal_transactions=get_top_10_woyofal_transactions(data=TransactionsByMeterPoc(meter=meter,poc=poc))
-        consommations_mensuelles_woyofal = get_woyofal_transactions_month(trans=TransactionsByMeterPoc(meter=meter,poc=poc))
+        top_10_woyofal_transactions=await get_top_10_woyofal_transactions(data=TransactionsByMeterPoc(meter=meter,poc=poc))
+        consommations_mensuelles_woyofal = await get_woyofal_transactions_month(trans=TransactionsByMeterPoc(meter=meter,poc=poc))
        
         return {"status":status.HTTP_200_OK,"type_compteur":user_compteur_db.type_compteur,"compteur":user_compteur_db,"top_10_transactions":top_10_woyofal_transactions,"consommations_mensuelles":consommations_mensuelles_woyofal,"factures_annee_en_cours":[],"six_dernieres_factures":[],"compteurs":compteurs}
     elif user_compteur_db.type_compteur ==2 :
         numCC = user_compteur_db.numero_compteur
-        factures_annee_en_cours = get_postpaid_bills_current_year(numCC)
-        six_dernieres_factures = get_six_dernieres_factures(numCC)
+        factures_annee_en_cours = await get_postpaid_bills_current_year(numCC)
+        six_dernieres_factures = await get_six_dernieres_factures(numCC)
         return {"status":status.HTTP_200_OK,"type_compteur":user_compteur_db.type_compteur,"compteur":user_compteur_db,"top_10_transactions":[],"consommations_mensuelles":[],"factures_annee_en_cours":factures_annee_en_cours,"six_dernieres_factures":six_dernieres_factures,"compteurs":compteurs}
     return
 
 @user_compteur_router.get("compteurtransactionsmens/{user_compteur_id}")
-async def recup_compteur_cons_trans(user_compteur_id:int,db:Session=Depends(get_db_samaconso)):
-    user_compteur_db = db.query(UserCompteur).filter(and_(UserCompteur.id == user_compteur_id,UserCompteur.est_active==True)).first()
+async def recup_compteur_cons_trans(user_compteur_id:int,db:AsyncSession=Depends(get_async_db_samaconso)):
+    user_compteur_db = (await db.execute(
+        select(UserCompteur).where(and_(UserCompteur.id == user_compteur_id,UserCompteur.est_active==True))
+    )).scalars().first()
     if not user_compteur_db:
         raise HTTPException(status_code=404, detail="Id not found")
-    compteurs = db.query(UserCompteur).filter(and_(UserCompteur.user_id==user_compteur_db.user_id,UserCompteur.est_active==True)).all()
+    compteurs = (await db.execute(
+        select(UserCompteur).where(and_(UserCompteur.user_id==user_compteur_db.user_id,UserCompteur.est_active==True))
+    )).scalars().all()
     #Récupération des consommations suivants le type de compteur :
     if user_compteur_db.type_compteur ==1 : 
         meter=user_compteur_db.numero_compteur
         poc=user_compteur_db.poc
-        top_10_woyofal_transactions=get_top_10_woyofal_transactions(data=TransactionsByMeterPoc(meter=meter,poc=poc))
-        consommations_mensuelles_woyofal = get_woyofal_transactions_month(trans=TransactionsByMeterPoc(meter=meter,poc=poc))
+        top_10_woyofal_transactions=await get_top_10_woyofal_transactions(data=TransactionsByMeterPoc(meter=meter,poc=poc))
+        consommations_mensuelles_woyofal = await get_woyofal_transactions_month(trans=TransactionsByMeterPoc(meter=meter,poc=poc))
 
         return {"status":status.HTTP_200_OK,"type_compteur":user_compteur_db.type_compteur,"compteur":user_compteur_db,"top_10_transactions":top_10_woyofal_transactions,"consommations_mensuelles":consommations_mensuelles_woyofal,"factures_annee_en_cours":[],"six_dernieres_factures":[],"compteurs":compteurs}
     elif user_compteur_db.type_compteur ==2 :
         numCC = user_compteur_db.numero_compteur
-        factures_annee_en_cours = get_postpaid_bills_current_year(numCC)
-        six_dernieres_factures = get_six_dernieres_factures(numCC)
+        factures_annee_en_cours = await get_postpaid_bills_current_year(numCC)
+        six_dernieres_factures = await get_six_dernieres_factures(numCC)
         return {"status":status.HTTP_200_OK,"type_compteur":user_compteur_db.type_compteur,"compteur":user_compteur_db,"top_10_transactions":[],"consommations_mensuelles":[],"factures_annee_en_cours":factures_annee_en_cours,"six_dernieres_factures":six_dernieres_factures,"compteurs":compteurs}
     return
 
 @user_compteur_router.get("/useragence/{user_id}")
-async def list_all_for_user(user_id:int,db: Session = Depends(get_db_samaconso)):
-    user = db.query(User).filter(User.id==user_id).first()
+async def list_all_for_user(user_id:int,db: AsyncSession = Depends(get_async_db_samaconso)):
+    user = await db.get(User, user_id)
     if(user):
         if user.role==2:
-             return db.query(UserCompteur).all()
+             return (await db.execute(select(UserCompteur))).scalars().all()
         
         if user.role==3:
-            return db.query(UserCompteur).filter(UserCompteur.id_agence==user.id_agence).all()
+            return (await db.execute(select(UserCompteur).where(UserCompteur.id_agence==user.id_agence))).scalars().all()
     
     return 
 
 @user_compteur_router.put("activerCompteur/{user_compteur_id}")
-async def validerCompteur(user_compteur_id:int,data:ActivateUserCompteur,db:Session=Depends(get_db_samaconso)):
-    user_db = db.query(User).filter(and_(User.id == data.activated_by_user)).first()
+async def validerCompteur(user_compteur_id:int,data:ActivateUserCompteur,db:AsyncSession=Depends(get_async_db_samaconso)):
+    user_db = await db.get(User, data.activated_by_user)
     if user_db is None:
         return {"status":status.HTTP_404_NOT_FOUND,"detail":"user not found"}
-    user_compteur_db = db.query(UserCompteur).filter(and_(UserCompteur.id == data.user_compteur_id)).first()
+    user_compteur_db = await db.get(UserCompteur, data.user_compteur_id)
     if user_compteur_db is None:
         return {"status":status.HTTP_404_NOT_FOUND,"detail":"user compteur not found"}
+    before = snapshot_user_compteur(user_compteur_db)
     user_compteur_db.est_active = data.activate
     user_compteur_db.active_par = data.activated_by_user
+    await apply_user_compteur_change(db, before, snapshot_user_compteur(user_compteur_db))
 
-    db.commit()
-    db.refresh(user_compteur_db)
+    await db.commit()
+    await db.refresh(user_compteur_db)
 
-    from_user = db.query(User).filter(User.id==user_compteur_db.user_id).first()
+    from_user = await db.get(User, user_compteur_db.user_id)
 
-    notifications = db.query(Notification).filter(and_(Notification.event_id==user_compteur_db.id,Notification.type_notification_id==1)).all()
+    notifications = (await db.execute(
+        select(Notification).where(and_(Notification.event_id==user_compteur_db.id,Notification.type_notification_id==1))
+    )).scalars().all()
     
+    # Un seul commit pour toutes les notifications mises à jour
     for notification in notifications:
         notification.type_notification_id=3
-        db.commit()
-        db.refresh(notification)
+    if notifications:
+        await db.commit()
 
     if(from_user):
 
@@ -588,14 +614,17 @@ async def validerCompteur(user_compteur_id:int,data:ActivateUserCompteur,db:Sess
                 body :str = f"compteur n° {user_compteur_db.numero_compteur} situé à adresse : {user_compteur_db.adresse}"
                 type_notification_id:int = 3
                 # Send notification via Celery (async)
-                for_user_notif(type_notification_id=type_notification_id,title=title,body=body,for_user_id=from_user.id,event_id=user_compteur_db.id,db=db)
+                await for_user_notif(type_notification_id=type_notification_id,title=title,body=body,for_user_id=from_user.id,event_id=user_compteur_db.id,db=db)
 
+    await _invalidate_user_compteur_cache(user_compteur_db.user_id)
     return {"status":status.HTTP_200_OK,"user_compteur":user_compteur_db}
  
 @user_compteur_router.get("compteuraccordpar/{user_id}")
-async def compteur_accorde_par_user(user_id:int,db:Session=Depends(get_db_samaconso)):
+async def compteur_accorde_par_user(user_id:int,db:AsyncSession=Depends(get_async_db_samaconso)):
 
-    user_compteurs = db.query(UserCompteur).filter(or_(UserCompteur.active_par==user_id,UserCompteur.autorise_par==user_id)).order_by(UserCompteur.created_at.desc()).options( joinedload(UserCompteur.user)).all()
+    user_compteurs = (await db.execute(
+        select(UserCompteur).where(or_(UserCompteur.active_par==user_id,UserCompteur.autorise_par==user_id)).order_by(UserCompteur.created_at.desc()).options( joinedload(UserCompteur.user))
+    )).scalars().all()
     
     if not user_compteurs:
         return {"status":status.HTTP_404_NOT_FOUND,"message":"Pas de compteurs accordés"}
@@ -604,57 +633,38 @@ async def compteur_accorde_par_user(user_id:int,db:Session=Depends(get_db_samaco
 
 
 
-def  verifierCompteur(numero:str,type:int):
-       
+async def verifierCompteur(numero:str,type:int):
+
         if type==1:
-            conn = get_db_connection_sic()
-            if not conn:
-                return CompteurWoyofalResponseSchema(status=0,tel=None,poc=None,id_client=None,adresse=None,tarif=None,nom_client=None,agence=None)
-            
             try:
-                cursor = conn.cursor()
-                result = cursor.execute(verifierSiCompteurWoyofalExiste,(numero,))
-            
-                #compteur = result.fetchone()
-                row = result.fetchone()
-                if not row:
-                    return CompteurWoyofalResponseSchema(status=404,tel=None,poc=None,id_client=None,adresse=None,tarif=None,nom_client=None,agence=None)
-                compteur = {col[0]: value for col, value in zip(cursor.description, row)}            
-
-                return CompteurWoyofalResponseSchema(status=200,tel=compteur["tel"],poc=compteur["poc"],id_client=compteur["id_client"],adresse=compteur["adresse"],tarif=compteur["usage"],nom_client=compteur["nomClient"],agence=compteur["agence"])
-            
+                rows = await sqlserver_fetch_all("sic", verifierSiCompteurWoyofalExiste, (numero,))
             except pyodbc.Error as e:
                 print(f"Erreur DB : {e}")
                 return CompteurWoyofalResponseSchema(status=0,tel=None,poc=None,id_client=None,tarif=None,nom_client=None,agence=None)
-            
-            finally:
-                cursor.close()
-                conn.close()
-        
+
+            if not rows:
+                return CompteurWoyofalResponseSchema(status=404,tel=None,poc=None,id_client=None,adresse=None,tarif=None,nom_client=None,agence=None)
+            compteur = rows[0]
+
+            return CompteurWoyofalResponseSchema(status=200,tel=compteur["tel"],poc=compteur["poc"],id_client=compteur["id_client"],adresse=compteur["adresse"],tarif=compteur["usage"],nom_client=compteur["nomClient"],agence=compteur["agence"])
+
         elif type==2:
-            conn = get_db_connection_sic()
-            if not conn:
-                return CompteurPostpaidResponseSchema(status=0,tel=None,numCC=None,id_partenaire=None,adresse=None,tarif=None,nom_client=None,agence=None)
-            
             try:
-                cursor = conn.cursor()
-                result = cursor.execute(verifierSiCompteurClassiqueExiste,(numero))
-            
-                #compteur = result.fetchone()
-                row = result.fetchone()
-                if not row:
-                    return CompteurPostpaidResponseSchema(status=404,tel=None,numCC=None,id_partenaire=None,adresse=None,tarif=None,nom_client=None,agence=None)
-                compteur = {col[0]: value for col, value in zip(cursor.description, row)}            
-
-                return CompteurPostpaidResponseSchema(status=200,tel=compteur["TELEPHONE"],numCC=compteur["COMPTE CONTRAT"],id_partenaire=compteur["N PARTENAIRE"],adresse=compteur["ADRESSE"],tarif=compteur["TARIF"],nom_client=compteur["CLIENT"],agence=compteur["AGENCE"])
-            
+                rows = await sqlserver_fetch_all("sic", verifierSiCompteurClassiqueExiste, (numero,))
             except pyodbc.Error as e:
                 print(f"Erreur DB : {e}")
                 return  CompteurPostpaidResponseSchema(status=0,tel=None,numCC=None,id_partenaire=None,adresse=None,tarif=None,nom_client=None,agence=None)
-            
-            finally:
-                cursor.close()
-                conn.close()
+
+            if not rows:
+                return CompteurPostpaidResponseSchema(status=404,tel=None,numCC=None,id_partenaire=None,adresse=None,tarif=None,nom_client=None,agence=None)
+            compteur = rows[0]
+
+            return CompteurPostpaidResponseSchema(status=200,tel=compteur["TELEPHONE"],numCC=compteur["COMPTE CONTRAT"],id_partenaire=compteur["N PARTENAIRE"],adresse=compteur["ADRESSE"],tarif=compteur["TARIF"],nom_client=compteur["CLIENT"],agence=compteur["AGENCE"])
+
+
+def _insert_compteur_sic(conn, numero_compteur: str, type_compteur: int):
+    conn.execute(insertCompteur, (numero_compteur, type_compteur))
+    conn.commit()
 
 
 def verifierCompteurClassique():
@@ -674,132 +684,53 @@ def updateUserCompterWhenOwnerFound(numero:str,owner_id:int,db: Session):
 
     
 
-def get_top_10_woyofal_transactions(data:TransactionsByMeterPoc):
+async def get_top_10_woyofal_transactions(data:TransactionsByMeterPoc):
 
-    conn = get_db_connection_sic()
-    if not conn:
-        return {"error": "Database connection failed"}
-    
     try:
-        cursor = conn.cursor()
-        # Example SELECT query
-        cursor.execute(top10TransactionsQuery,(data.meter,data.poc))
-        rows = cursor.fetchall()
-        if not rows:
-            return
-        columns = [column[0] for column in cursor.description]
-        transactions= [dict(zip(columns, row)) for row in rows]
-        arrondi = 0
-        montant = sum(transaction["MONTANT_TTC"] for transaction in transactions) 
-        for transaction in transactions:
-            if transaction["ARRONDI"] is not None:
-                arrondi += transaction["ARRONDI"]
-        energie_globale = sum(transaction["ENERGIE_VENDUE"] for transaction in transactions) 
-        montant_global = montant
-        
-        if arrondi>0:
-            montant_global = montant-arrondi
-        # Convert results to a list of dictionaries
-       # customer = [{ "first name": row.CUSTOMER_FirstNAME, "name": row.CUSTOMER_NAME} for row in rows]
-       
-        
-        return transactions
-    
+        transactions = await sqlserver_fetch_all("sic", top10TransactionsQuery, (data.meter,data.poc))
     except pyodbc.Error as e:
-        return 
-    
-    finally:
-        cursor.close()
-        conn.close()
+        return
+    if not transactions:
+        return
 
+    return transactions
 
 
 
-def get_woyofal_transactions_month(trans:TransactionsByMeterPoc):
 
+async def get_woyofal_transactions_month(trans:TransactionsByMeterPoc):
 
-    conn = get_db_connection_sic()
-    if not conn:
-        return {"error": "Database connection failed"}
-    
     try:
-        cursor = conn.cursor()
-        # Example SELECT query
-        cursor.execute(getTransactionsByMonthMeterPoc,(trans.meter,trans.poc))
-        rows = cursor.fetchall()
-        if not rows:
-            return
-        columns = [column[0] for column in cursor.description]
-        transactions= [dict(zip(columns, row)) for row in rows]
-        montant_global = sum(transaction["Total TTC"] for transaction in transactions)
-        energie_globale = sum(transaction["Total énergie"] for transaction in transactions) 
-
-
-        # Convert results to a list of dictionaries
-       # customer = [{ "first name": row.CUSTOMER_FirstNAME, "name": row.CUSTOMER_NAME} for row in rows]
-       
-        
-        return transactions
-    
+        transactions = await sqlserver_fetch_all("sic", getTransactionsByMonthMeterPoc, (trans.meter,trans.poc))
     except pyodbc.Error as e:
         return
-    
-    finally:
-        cursor.close()
-        conn.close()
+    if not transactions:
+        return
 
+    return transactions
 
 
-def get_postpaid_bills_current_year(numCC:str):
 
-    conn = get_db_connection_postpaid()
-    if not conn:
-        return {"error": "Database connection failed"}
-    
+async def get_postpaid_bills_current_year(numCC:str):
+
     try:
-        cursor = conn.cursor()
-        # Example SELECT query
-        cursor.execute(getBillsByMonth,(numCC,))
-        rows = cursor.fetchall()
-        if not rows:
-            return
-        columns = [column[0] for column in cursor.description]
-        transactions = [dict(zip(columns, row)) for row in rows] 
-        
-        return transactions
-    
+        transactions = await sqlserver_fetch_all("postpaid", getBillsByMonth, (numCC,))
     except pyodbc.Error as e:
         return
-    
-    finally:
-        cursor.close()
-        conn.close()
+    if not transactions:
+        return
 
+    return transactions
 
 
-def get_six_dernieres_factures(numCC:str):
 
-    conn = get_db_connection_postpaid()
-    if not conn:
-        return {"error": "Database connection failed"}
-    
+async def get_six_dernieres_factures(numCC:str):
+
     try:
-        cursor = conn.cursor()
-        # Example SELECT query
-        cursor.execute(sixLastBills,(numCC,))
-        rows = cursor.fetchall()
-        if not rows:
-            return
-        columns = [column[0] for column in cursor.description]
-        transactions = [dict(zip(columns, row)) for row in rows]
-        #montant_global = sum(transaction["MONTANT"] for transaction in transactions)
-        #energie_globale = sum(transaction["CONSOMMATION TOTALE"] for transaction in transactions) 
-        
-        return transactions
-    
+        transactions = await sqlserver_fetch_all("postpaid", sixLastBills, (numCC,))
     except pyodbc.Error as e:
-        return 
-    
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+        return
+    if not transactions:
+        return
+
+    return transactions
@@ -1,9 +1,10 @@
+from typing import Optional
 from datetime import timedelta, datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 import json
 from sqlalchemy import and_
 from sqlalchemy.orm import Session
-from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, CACHE_KEYS
+from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, CACHE_KEYS, CACHE_SCAN_MAX_PAGE_SIZE, CACHE_SCAN_PAGE_SIZE
 from app.database import get_db_samaconso
 from app.models.models import User, UserSession
 from app.schemas.user_schemas import (
@@ -14,6 +15,8 @@ from app.schemas.user_schemas import (
 )
 from app.auth import create_access_token, get_current_user, get_password_hash
 from app.cache import cache_get, cache_set, cache_delete
+from app.cache_codec import JSONBytesResponse, cache_json, cached_json, mark_cache_hit
+from app.cache_utils import inspect_cache_keys
 
 # Logging simplifié - seulement les erreurs critiques
 import logging
@@ -89,14 +92,10 @@ async def get_all_users(db: Session = Depends(get_db_samaconso)):
     """Récupérer tous les utilisateurs - Version simplifiée"""
     cache_key_all = CACHE_KEYS["USERS_ALL"]
     
-    # Tentative cache
-    try:
-        cached = await cache_get(cache_key_all)
-        if cached:
-            data = json.loads(cached)
-            return {"status": 200, "results": len(data), "users": data, "cache_hit": True}
-    except Exception:
-        pass
+    # Tentative cache : corps JSON servi tel quel, sans décodage
+    cached = await cached_json(cache_key_all)
+    if cached is not None:
+        return JSONBytesResponse(mark_cache_hit(cached))
 
     try:
         utilisateurs = db.query(User).all()
@@ -117,13 +116,13 @@ async def get_all_users(db: Session = Depends(get_db_samaconso)):
                 "updated_at": u.updated_at.strftime("%d/%m/%Y %H:%M:%S"),
             })
         
-        # Cache simple
-        try:
-            await cache_set(cache_key_all, json.dumps(users_data), ttl_seconds=900)
-        except Exception:
-            pass
-        
-        return {"status": 200, "results": len(users_data), "users": users_data, "cache_hit": False}
+        # Réponse complète mise en cache (cache_hit en dernier, voir mark_cache_hit)
+        body = await cache_json(
+            cache_key_all,
+            {"status": 200, "results": len(users_data), "users": users_data, "cache_hit": False},
+            ttl_seconds=900,
+        )
+        return JSONBytesResponse(body)
         
     except Exception as e:
         logger.error(f"Get all users failed: {str(e)}")
@@ -383,7 +382,10 @@ async def logout_user(logout, db: Session = Depends(get_db_samaconso)):
         raise HTTPException(status_code=500, detail="Logout failed")
 
 @user_router.get("/cache/inspect")
-async def inspect_user_cache():
+async def inspect_user_cache(
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    limit: int = Query(CACHE_SCAN_PAGE_SIZE, ge=1, le=CACHE_SCAN_MAX_PAGE_SIZE),
+):
     """Inspection cache - Version simplifiée"""
     try:
         from app.cache import redis_client
@@ -391,38 +393,25 @@ async def inspect_user_cache():
         if not redis_client:
             return {"status": 500, "message": "Redis non disponible"}
         
-        user_patterns = ["users:*", "user_sessions:*"]
-        user_keys = []
-        
-        for pattern in user_patterns:
-            keys = await redis_client.keys(pattern)
-            user_keys.extend([key.decode() if isinstance(key, bytes) else key for key in keys])
-        
-        cache_contents = {}
-        for key in user_keys:
-            try:
-                ttl = await redis_client.ttl(key)
-                content = await redis_client.get(key)
-                if content:
-                    cache_contents[key] = {
-                        "ttl_seconds": ttl,
-                        "size_bytes": len(content),
-                        "has_content": True
-                    }
-            except Exception as e:
-                cache_contents[key] = {"error": str(e)}
+        # Clés parcourues par SCAN, une page par appel (jamais KEYS, qui bloque Redis)
+        page = await inspect_cache_keys(["users:*", "user_sessions:*"], cursor, limit, preview_chars=0)
         
         return {
             "status": 200,
             "message": "Cache inspection successful",
             "cache_info": {
                 "redis_connected": True,
-                "user_cache_keys": user_keys,
-                "cache_contents": cache_contents,
+                "user_cache_keys": page["keys"],
+                "cache_contents": page["contents"],
+                "next_cursor": page["next_cursor"],
+                "complete": page["complete"],
                 "security_note": "Contenu masqué pour la sécurité"
             }
         }
         
+    except ValueError as e:
+        # Curseur invalide
+        return {"status": 400, "message": str(e)}
     except Exception as e:
         logger.error(f"Cache inspection failed: {str(e)}")
         return {"status": 500, "message": f"Erreur inspection cache: {str(e)}"}
\ No newline at end of file
@@ -1,17 +1,18 @@
 
 
 from fastapi import status, APIRouter, Depends, HTTPException
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from app.models.models import UserSession
 from app.schemas.user_session_schemas import (
     UserSessionCreateSchema, 
     UserSessionUpdateSchema
 )
-from app.database import get_db_samaconso
-from app.cache import cache_get, cache_set, cache_delete
+from app.database import detached_async_session, get_async_db_samaconso
+from app.cache import cache_get, cache_get_or_set, cache_set, cache_delete
 from app.config import CACHE_KEYS, CACHE_TTL
+import asyncio
 import json
 
 user_session_router = APIRouter(prefix="/user-sessions", tags=["User Sessions"])
@@ -57,17 +58,20 @@ async def inspect_cache():
     return cache_info
 
 @user_session_router.post("/")
-async def create_user_session(session: UserSessionCreateSchema, db: Session = Depends(get_db_samaconso)):
+async def create_user_session(session: UserSessionCreateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Créer une session utilisateur avec déduplication de tokens FCM"""
     
     # 1. Désactiver toutes les sessions existantes avec le même token/utilisateur (BATCH)
-    existing_sessions = db.query(UserSession).filter(
-        and_(
-            UserSession.fcm_token == session.fcm_token,
-            UserSession.user_id == session.user_id,
-            UserSession.is_active
+    result = await db.execute(
+        select(UserSession).where(
+            and_(
+                UserSession.fcm_token == session.fcm_token,
+                UserSession.user_id == session.user_id,
+                UserSession.is_active
+            )
         )
-    ).all()
+    )
+    existing_sessions = result.scalars().all()
     
     # Désactivation en batch (plus efficace)
     for user_session in existing_sessions:
@@ -78,8 +82,8 @@ async def create_user_session(session: UserSessionCreateSchema, db: Session = De
     db.add(db_session)
     
     # 3. Commit unique pour toutes les modifications
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     
     # 4. Invalidation du cache
     try:
@@ -90,33 +94,28 @@ async def create_user_session(session: UserSessionCreateSchema, db: Session = De
     return db_session
 
 @user_session_router.get("/")
-async def get_all_user_sessions(db: Session = Depends(get_db_samaconso)):
-    key_all = CACHE_KEYS["USER_SESSIONS_ALL"]
-    try:
-        cached = await cache_get(key_all)
-        if cached:
-            return json.loads(cached)
-    except Exception:
-        pass
-    rows = db.query(UserSession).all()
-    payload = []
-    for s in rows:
-        payload.append({
-            "id": s.id,
-            "user_id": s.user_id,
-            "device_model": s.device_model,
-            "fcm_token": s.fcm_token,  # Token complet pour compatibilité
-            "is_active": s.is_active,
-            "last_login": s.last_login.strftime("%d/%m/%Y %H:%M:%S") if s.last_login else None,
-        })
-    try:
-        await cache_set(key_all, json.dumps(payload), ttl_seconds=CACHE_TTL["USER_SESSIONS"])
-    except Exception:
-        pass
-    return payload
+async def get_all_user_sessions():
+    # Session propre au calcul : il est partagé par les requêtes en attente et peut survivre à celle qui l'a lancé
+    async def load():
+        async with detached_async_session() as db:
+            rows = (await db.execute(select(UserSession))).scalars().all()
+        payload = []
+        for s in rows:
+            payload.append({
+                "id": s.id,
+                "user_id": s.user_id,
+                "device_model": s.device_model,
+                "fcm_token": s.fcm_token,  # Token complet pour compatibilité
+                "is_active": s.is_active,
+                "last_login": s.last_login.strftime("%d/%m/%Y %H:%M:%S") if s.last_login else None,
+            })
+        return payload
+
+    # Clé chaude : une seule requête recalcule la liste à l'expiration (les autres attendent)
+    return await cache_get_or_set(CACHE_KEYS["USER_SESSIONS_ALL"], load, CACHE_TTL["USER_SESSIONS"])
 
 @user_session_router.get("/{session_id}")
-async def get_user_session(session_id: int, db: Session = Depends(get_db_samaconso)):
+async def get_user_session(session_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
     key = CACHE_KEYS["USER_SESSION_BY_ID"].format(id=session_id)
     try:
         cached = await cache_get(key)
@@ -125,7 +124,7 @@ async def get_user_session(session_id: int, db: Session = Depends(get_db_samacon
     except Exception:
         pass
     
-    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+    session = await db.get(UserSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -146,15 +145,15 @@ async def get_user_session(session_id: int, db: Session = Depends(get_db_samacon
     return session_data
 
 @user_session_router.put("/{session_id}")
-async def update_user_session(session_id: int, updates: UserSessionUpdateSchema, db: Session = Depends(get_db_samaconso)):
-    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+async def update_user_session(session_id: int, updates: UserSessionUpdateSchema, db: AsyncSession = Depends(get_async_db_samaconso)):
+    session = await db.get(UserSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
     for key, value in updates.model_dump(exclude_unset=True).items():
         setattr(session, key, value)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    await db.refresh(session)
     
     # Invalidation du cache
     try:
@@ -166,13 +165,13 @@ async def update_user_session(session_id: int, updates: UserSessionUpdateSchema,
     return session
 
 @user_session_router.delete("/{session_id}")
-async def delete_user_session(session_id: int, db: Session = Depends(get_db_samaconso)):
-    session = db.query(UserSession).filter(UserSession.id == session_id).first()
+async def delete_user_session(session_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
+    session = await db.get(UserSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    db.delete(session)
-    db.commit()
+    await db.delete(session)
+    await db.commit()
     
     # Invalidation du cache
     try:
@@ -187,7 +186,7 @@ async def delete_user_session(session_id: int, db: Session = Depends(get_db_sama
 @user_session_router.post("/register-token", status_code=status.HTTP_201_CREATED)
 async def register_fcm_token(
     payload: UserSessionCreateSchema,
-    db: Session = Depends(get_db_samaconso)
+    db: AsyncSession = Depends(get_async_db_samaconso)
 ):
     """
     Enregistrer un token FCM avec déduplication intelligente et limite de sessions
@@ -201,7 +200,6 @@ async def register_fcm_token(
     """
     from sqlalchemy.exc import OperationalError, DisconnectionError
     from datetime import timedelta
-    import time
 
     MAX_SESSIONS_PER_USER = 2  # Configurable: max sessions actives par utilisateur
     SESSION_CLEANUP_DAYS = 30  # Nettoyer sessions > 30 jours
@@ -213,32 +211,38 @@ async def register_fcm_token(
             # ========== ÉTAPE 1: Nettoyer les sessions de TOUS les utilisateurs ayant ce token ==========
             # Important: Un token FCM appartient à UN SEUL appareil, mais peut être réutilisé
             # si l'utilisateur se déconnecte et qu'un autre se connecte sur le même appareil
-            sessions_with_same_token = db.query(UserSession).filter(
-                and_(
-                    UserSession.fcm_token == payload.fcm_token,
-                    UserSession.is_active.is_(True)
+            result = await db.execute(
+                select(UserSession).where(
+                    and_(
+                        UserSession.fcm_token == payload.fcm_token,
+                        UserSession.is_active.is_(True)
+                    )
                 )
-            ).all()
+            )
+            sessions_with_same_token = result.scalars().all()
 
             # Désactiver toutes les sessions utilisant ce token (pour TOUS les utilisateurs)
             for session in sessions_with_same_token:
                 session.is_active = False
 
             # ========== ÉTAPE 2: Vérifier si session existe déjà pour CET utilisateur ==========
-            existing_session = db.query(UserSession).filter(
-                and_(
-                    UserSession.user_id == payload.user_id,
-                    UserSession.fcm_token == payload.fcm_token
+            result = await db.execute(
+                select(UserSession).where(
+                    and_(
+                        UserSession.user_id == payload.user_id,
+                        UserSession.fcm_token == payload.fcm_token
+                    )
                 )
-            ).first()
+            )
+            existing_session = result.scalars().first()
 
             if existing_session:
                 # Réactiver et mettre à jour la session existante
                 existing_session.device_model = payload.device_model
                 existing_session.last_login = datetime.now()
                 existing_session.is_active = True
-                db.commit()
-                db.refresh(existing_session)
+                await db.commit()
+                await db.refresh(existing_session)
 
                 # Invalidation du cache
                 try:
@@ -254,12 +258,15 @@ async def register_fcm_token(
                 }
 
             # ========== ÉTAPE 3: Limiter le nombre de sessions actives par utilisateur ==========
-            active_user_sessions = db.query(UserSession).filter(
-                and_(
-                    UserSession.user_id == payload.user_id,
-                    UserSession.is_active.is_(True)
-                )
-            ).order_by(UserSession.last_login.desc()).all()
+            result = await db.execute(
+                select(UserSession).where(
+                    and_(
+                        UserSession.user_id == payload.user_id,
+                        UserSession.is_active.is_(True)
+                    )
+                ).order_by(UserSession.last_login.desc())
+            )
+            active_user_sessions = result.scalars().all()
 
             # Si on a déjà MAX_SESSIONS_PER_USER sessions, désactiver les plus anciennes
             if len(active_user_sessions) >= MAX_SESSIONS_PER_USER:
@@ -271,13 +278,16 @@ async def register_fcm_token(
             # ========== ÉTAPE 4: Nettoyer automatiquement les vieilles sessions (bonus) ==========
             cutoff_date = datetime.now() - timedelta(days=SESSION_CLEANUP_DAYS)
 
-            old_sessions = db.query(UserSession).filter(
-                and_(
-                    UserSession.user_id == payload.user_id,
-                    UserSession.last_login < cutoff_date,
-                    UserSession.is_active.is_(True)
+            result = await db.execute(
+                select(UserSession).where(
+                    and_(
+                        UserSession.user_id == payload.user_id,
+                        UserSession.last_login < cutoff_date,
+                        UserSession.is_active.is_(True)
+                    )
                 )
-            ).all()
+            )
+            old_sessions = result.scalars().all()
 
             old_sessions_count = len(old_sessions)
             for old_session in old_sessions:
@@ -292,8 +302,8 @@ async def register_fcm_token(
                 is_active=True
             )
             db.add(new_session)
-            db.commit()
-            db.refresh(new_session)
+            await db.commit()
+            await db.refresh(new_session)
 
             # ========== ÉTAPE 6: Invalidation du cache ==========
             try:
@@ -315,11 +325,11 @@ async def register_fcm_token(
 
         except (OperationalError, DisconnectionError) as e:
             # Gestion des erreurs de connexion DB
-            db.rollback()
+            await db.rollback()
             
             if attempt < MAX_RETRIES - 1:
-                # Attendre avant le prochain essai
-                time.sleep(RETRY_DELAY * (attempt + 1))  # Backoff exponentiel
+                # Attendre avant le prochain essai (sans bloquer la boucle)
+                await asyncio.sleep(RETRY_DELAY * (attempt + 1))  # Backoff exponentiel
                 continue
             else:
                 # Dernier essai échoué
@@ -330,7 +340,7 @@ async def register_fcm_token(
                 
         except Exception as e:
             # Autres erreurs
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail=f"Erreur lors de l'enregistrement du token FCM: {str(e)}"
@@ -341,7 +351,7 @@ async def register_fcm_token(
 async def logout_user_session(
     user_id: int,
     fcm_token: str = None,
-    db: Session = Depends(get_db_samaconso)
+    db: AsyncSession = Depends(get_async_db_samaconso)
 ):
     """
     Déconnexion utilisateur - Désactive la session avec le token FCM fourni
@@ -356,17 +366,20 @@ async def logout_user_session(
     try:
         if fcm_token:
             # Déconnexion d'un appareil spécifique
-            session_to_logout = db.query(UserSession).filter(
-                and_(
-                    UserSession.user_id == user_id,
-                    UserSession.fcm_token == fcm_token,
-                    UserSession.is_active
+            result = await db.execute(
+                select(UserSession).where(
+                    and_(
+                        UserSession.user_id == user_id,
+                        UserSession.fcm_token == fcm_token,
+                        UserSession.is_active
+                    )
                 )
-            ).first()
+            )
+            session_to_logout = result.scalars().first()
 
             if session_to_logout:
                 session_to_logout.is_active = False
-                db.commit()
+                await db.commit()
 
                 # Invalidation du cache
                 try:
@@ -389,18 +402,21 @@ async def logout_user_session(
                 }
         else:
             # Déconnexion de TOUS les appareils de l'utilisateur
-            all_user_sessions = db.query(UserSession).filter(
-                and_(
-                    UserSession.user_id == user_id,
-                    UserSession.is_active
+            result = await db.execute(
+                select(UserSession).where(
+                    and_(
+                        UserSession.user_id == user_id,
+                        UserSession.is_active
+                    )
                 )
-            ).all()
+            )
+            all_user_sessions = result.scalars().all()
 
             deactivated_count = len(all_user_sessions)
             for session in all_user_sessions:
                 session.is_active = False
 
-            db.commit()
+            await db.commit()
 
             # Invalidation du cache
             try:
@@ -423,11 +439,11 @@ async def logout_user_session(
 
 
 @user_session_router.get("/debug/tokens/duplicates")
-async def debug_duplicate_tokens(db: Session = Depends(get_db_samaconso)):
+async def debug_duplicate_tokens(db: AsyncSession = Depends(get_async_db_samaconso)):
     """Debug: Identifier les tokens FCM dupliqués entre utilisateurs"""
     try:
         # Récupérer toutes les sessions actives
-        sessions = db.query(UserSession).filter(UserSession.is_active.is_(True)).all()
+        sessions = (await db.execute(select(UserSession).where(UserSession.is_active.is_(True)))).scalars().all()
         
         # Grouper par token FCM
         token_users = {}
@@ -480,10 +496,10 @@ async def debug_duplicate_tokens(db: Session = Depends(get_db_samaconso)):
 
 
 @user_session_router.get("/debug/user/{user_id}/sessions")
-async def debug_user_sessions(user_id: int, db: Session = Depends(get_db_samaconso)):
+async def debug_user_sessions(user_id: int, db: AsyncSession = Depends(get_async_db_samaconso)):
     """Debug: Voir toutes les sessions d'un utilisateur spécifique"""
     try:
-        sessions = db.query(UserSession).filter(UserSession.user_id == user_id).all()
+        sessions = (await db.execute(select(UserSession).where(UserSession.user_id == user_id))).scalars().all()
         
         if not sessions:
             return {
@@ -534,12 +550,13 @@ async def debug_user_sessions(user_id: int, db: Session = Depends(get_db_samacon
 
 
 @user_session_router.post("/cleanup/inactive")
-async def cleanup_inactive_sessions(db: Session = Depends(get_db_samaconso)):
+async def cleanup_inactive_sessions(db: AsyncSession = Depends(get_async_db_samaconso)):
     """Nettoyer les sessions inactives (maintenance)"""
     try:
-        # Compter les sessions inactives
-        inactive_sessions = db.query(UserSession).filter(UserSession.is_active.is_(False)).all()
-        inactive_count = len(inactive_sessions)
+        # Compter les sessions inactives (COUNT côté base, sans charger les lignes)
+        inactive_count = await db.scalar(
+            select(func.count()).select_from(UserSession).where(UserSession.is_active.is_(False))
+        )
         
         if inactive_count == 0:
             return {
@@ -549,8 +566,8 @@ async def cleanup_inactive_sessions(db: Session = Depends(get_db_samaconso)):
             }
         
         # Supprimer les sessions inactives
-        db.query(UserSession).filter(UserSession.is_active.is_(False)).delete()
-        db.commit()
+        await db.execute(delete(UserSession).where(UserSession.is_active.is_(False)))
+        await db.commit()
         
         # Invalidation du cache
         try:
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Query, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Query, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.cache import cache_get, cache_set
@@ -11,7 +13,7 @@ from app.cache_utils import (
     cache_health_check
 )
 from app.cache import get_redis
-from app.config import REDIS_PUBLISH_QUEUE
+from app.config import CACHE_SCAN_MAX_PAGE_SIZE, REDIS_PUBLISH_QUEUE
 from app.database import get_db_samaconso
 
 
@@ -51,10 +53,16 @@ async def check_cache_health():
 
 
 @utils_router.get("/cache/keys")
-async def list_cache_keys(pattern: str = Query("*", description="Pattern pour filtrer les clés")):
-    """Liste les clés de cache selon un pattern"""
-    keys = await get_cache_keys_by_pattern(pattern)
-    return {"pattern": pattern, "count": len(keys), "keys": keys[:50]}  # Limité à 50 pour éviter surcharge
+async def list_cache_keys(
+    pattern: str = Query("*", description="Pattern pour filtrer les clés"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente"),
+    limit: int = Query(50, ge=1, le=CACHE_SCAN_MAX_PAGE_SIZE),
+):
+    """Liste les clés de cache selon un pattern, page par page (SCAN)"""
+    page = await get_cache_keys_by_pattern(pattern, cursor, limit)
+    if "error" in page:
+        raise HTTPException(status_code=400, detail=page["error"])
+    return {"pattern": pattern, "count": len(page["keys"]), **page}
 
 
 @utils_router.get("/cache/key/{key_name}")
@@ -70,9 +78,15 @@ async def warmup_cache(db: Session = Depends(get_db_samaconso)):
 
 
 @utils_router.delete("/cache/flush")
-async def flush_cache(pattern: str = Query("*", description="Pattern des clés à supprimer")):
-    """Supprime les clés de cache selon un pattern (ATTENTION: opération destructive)"""
+async def flush_cache(
+    pattern: str = Query("*", description="Pattern des clés à supprimer"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par l'appel précédent"),
+):
+    """
+    Supprime les clés de cache selon un pattern (ATTENTION: opération destructive).
+    Travail borné par appel : rappeler avec next_cursor tant que complete est faux.
+    """
     if pattern == "*":
         return {"error": "Utilisation du pattern '*' interdite pour des raisons de sécurité. Utilisez un pattern plus spécifique."}
-    return await flush_cache_by_pattern(pattern)
+    return await flush_cache_by_pattern(pattern, cursor)
 
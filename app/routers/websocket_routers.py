@@ -6,7 +6,8 @@ Gestionnaire dédié aux connexions WebSocket pour l'API Samaconso
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from sqlalchemy import and_
 from sqlalchemy.orm import Session
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
+import asyncio
 import json
 import logging
 from datetime import datetime
@@ -15,7 +16,10 @@ from app.database import get_db_samaconso
 from app.models.models import Notification, User, UserSession
 from app.auth import decode_access_token
 from app.cache import cache_delete
-from app.config import CACHE_KEYS
+from app.config import CACHE_KEYS, WS_OUTBOUND_QUEUE_SIZE, WS_SEND_TIMEOUT, WS_SLOW_CONSUMER_POLICY
+from app.services.ws_delivery import DeliveryTracker, Outbox, serialize_message
+from app.services.ws_backplane import WebSocketBackplane, build_notification_message
+from app.services.notification_inbox import invalidate_notification_caches
 
 logger = logging.getLogger(__name__)
 
@@ -23,11 +27,20 @@ websocket_router = APIRouter(prefix="/ws", tags=["websockets"])
 
 
 class ConnectionManager:
-    """Gestionnaire des connexions WebSocket"""
+    """
+    Gestionnaire des connexions WebSocket
+    Chaque connexion a une file sortante bornée et sa propre tâche d'écriture (Outbox) :
+    un client lent ne retarde plus les autres
+    """
     
     def __init__(self):
         # Dictionnaire: user_id -> liste de connexions WebSocket
         self.active_connections: Dict[int, List[WebSocket]] = {}
+        self._outboxes: Dict[WebSocket, Outbox] = {}
+        # Rapport du dernier broadcast (latences p50/p95/p99, remis, abandonnés)
+        self.last_broadcast: Optional[dict] = None
+        # Rapports de remise en cours (deliver_nowait)
+        self._reports: Set[asyncio.Task] = set()
         
     async def connect(self, websocket: WebSocket, user_id: int):
         """Accepter une nouvelle connexion WebSocket pour un utilisateur"""
@@ -35,10 +48,25 @@ class ConnectionManager:
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
+        self._open_outbox(websocket, user_id)
         logger.info(f"User {user_id} connected via WebSocket. Total connections: {len(self.active_connections[user_id])}")
+
+    def _open_outbox(self, websocket: WebSocket, user_id: int) -> Outbox:
+        outbox = Outbox(
+            websocket,
+            on_failure=lambda: self.disconnect(websocket, user_id),
+            max_queue=WS_OUTBOUND_QUEUE_SIZE,
+            send_timeout=WS_SEND_TIMEOUT,
+            policy=WS_SLOW_CONSUMER_POLICY,
+        )
+        self._outboxes[websocket] = outbox
+        return outbox
         
     def disconnect(self, websocket: WebSocket, user_id: int):
         """Déconnecter un WebSocket d'un utilisateur"""
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox is not None:
+            outbox.close()
         if user_id in self.active_connections:
             if websocket in self.active_connections[user_id]:
                 self.active_connections[user_id].remove(websocket)
@@ -47,29 +75,85 @@ class ConnectionManager:
                 # Supprimer la liste si elle est vide
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
+
+    def _enqueue(self, message: dict, user_ids: List[int]) -> DeliveryTracker:
+        """Sérialise une fois et met en file sur chaque connexion, sans attendre"""
+        text = serialize_message(message)
+        targets = [
+            (user_id, websocket)
+            for user_id in user_ids
+            # Copier la liste pour éviter les modifications concurrentes
+            for websocket in list(self.active_connections.get(user_id, []))
+        ]
+        tracker = DeliveryTracker(len(targets))
+        for user_id, websocket in targets:
+            outbox = self._outboxes.get(websocket) or self._open_outbox(websocket, user_id)
+            outbox.offer(text, tracker)
+        return tracker
+
+    async def _deliver(self, message: dict, user_ids: List[int]) -> dict:
+        """Met en file sur chaque connexion et attend la remise (bornée)"""
+        tracker = self._enqueue(message, user_ids)
+        # Marge au-delà du délai d'envoi : un envoi expiré est compté en échec, pas en attente
+        await tracker.wait(WS_SEND_TIMEOUT * 1.5)
+        return tracker.report()
+
+    def reply(self, websocket: WebSocket, message: dict) -> None:
+        """
+        Réponse à une connexion (confirmation, pong, notifications initiales...)
+        Passe par sa file sortante : même délai d'envoi, même ordre que les autres messages
+        """
+        outbox = self._outboxes.get(websocket)
+        if outbox is not None:
+            outbox.offer(serialize_message(message), DeliveryTracker(1))
+
+    def deliver_nowait(self, message: dict, user_ids: Optional[List[int]] = None) -> DeliveryTracker:
+        """
+        Remise sans attendre les envois (écoute du backplane) : une socket lente
+        ne retarde pas les messages suivants. Le rapport est journalisé en tâche de fond.
+
+        Args:
+            user_ids: Destinataires, None pour tous les utilisateurs connectés
+        """
+        broadcast = user_ids is None
+        tracker = self._enqueue(message, list(self.active_connections.keys()) if broadcast else user_ids)
+        task = asyncio.create_task(self._report_when_settled(tracker, broadcast))
+        # Référence conservée jusqu'à la fin de la tâche (sinon collectable en cours de route)
+        self._reports.add(task)
+        task.add_done_callback(self._reports.discard)
+        return tracker
+
+    async def _report_when_settled(self, tracker: DeliveryTracker, broadcast: bool) -> None:
+        await tracker.wait(WS_SEND_TIMEOUT * 1.5)
+        report = tracker.report()
+        if broadcast:
+            self._record_broadcast(report)
+        elif report["failed"] or report["dropped"]:
+            logger.warning(
+                f"Remise WebSocket: {report['delivered']}/{report['recipients']} remis, "
+                f"{report['dropped']} abandonnés, {report['failed']} échecs"
+            )
+
+    def _record_broadcast(self, report: dict) -> None:
+        self.last_broadcast = {**report, "at": datetime.utcnow().isoformat()}
+        logger.info(
+            f"Broadcast WebSocket: {report['delivered']}/{report['recipients']} remis, "
+            f"{report['dropped']} abandonnés, {report['failed']} échecs, p95={report['p95_ms']}ms"
+        )
                     
     async def send_personal_message(self, message: dict, user_id: int):
         """Envoyer un message à toutes les connexions d'un utilisateur spécifique"""
         if user_id in self.active_connections:
-            # Copier la liste pour éviter les modifications concurrentes
-            connections = self.active_connections[user_id].copy()
-            disconnected_sockets = []
-            
-            for websocket in connections:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    logger.warning(f"Failed to send message to user {user_id}: {str(e)}")
-                    disconnected_sockets.append(websocket)
-                    
-            # Nettoyer les connexions fermées
-            for websocket in disconnected_sockets:
-                self.disconnect(websocket, user_id)
+            return await self._deliver(message, [user_id])
                 
     async def send_broadcast_message(self, message: dict):
-        """Envoyer un message à tous les utilisateurs connectés"""
-        for user_id in list(self.active_connections.keys()):
-            await self.send_personal_message(message, user_id)
+        """
+        Envoyer un message à tous les utilisateurs connectés
+        Écritures en parallèle ; retourne (et conserve) le rapport de latence du broadcast
+        """
+        report = await self._deliver(message, list(self.active_connections.keys()))
+        self._record_broadcast(report)
+        return report
             
     def get_user_connections_count(self, user_id: int) -> int:
         """Obtenir le nombre de connexions actives pour un utilisateur"""
@@ -87,6 +171,9 @@ class ConnectionManager:
 # Instance globale du gestionnaire
 manager = ConnectionManager()
 
+# Backplane Redis : remise inter-processus et présence partagée (démarré dans main.on_startup)
+backplane = WebSocketBackplane(manager)
+
 
 async def authenticate_websocket(token: str, db: Session) -> User:
     """Authentifier un utilisateur via le token JWT pour WebSocket"""
@@ -135,14 +222,14 @@ async def send_initial_notifications(websocket: WebSocket, user_id: int, db: Ses
                     "created_at": notif.created_at.strftime("%d/%m/%Y %H:%M:%S") if notif.created_at else None,
                 })
             
-            await websocket.send_json({
+            manager.reply(websocket, {
                 "type": "initial_notifications",
                 "notifications": notifications_data,
                 "count": len(notifications_data),
                 "timestamp": datetime.utcnow().isoformat()
             })
         else:
-            await websocket.send_json({
+            manager.reply(websocket, {
                 "type": "no_notifications",
                 "message": "Aucune notification non lue",
                 "timestamp": datetime.utcnow().isoformat()
@@ -166,22 +253,18 @@ async def mark_notification_read_ws(notif_id: int, user_id: int, db: Session, we
             notif.is_read = True
             db.commit()
             
-            # Invalider le cache
-            try:
-                await cache_delete(CACHE_KEYS["NOTIFICATIONS_ALL"])
-                await cache_delete(CACHE_KEYS["NOTIFICATIONS_BY_USER"].format(user_id=user_id))
-                await cache_delete(CACHE_KEYS["NOTIFICATIONS_UNREAD"].format(user_id=user_id))
-            except Exception:
-                pass
+            # Invalider le cache (listes par tags, compteur reconstruit à la prochaine lecture)
+            await invalidate_notification_caches([user_id])
+            await cache_delete(CACHE_KEYS["NOTIFICATIONS_UNREAD"].format(user_id=user_id))
             
-            await websocket.send_json({
+            manager.reply(websocket, {
                 "type": "notification_marked_read",
                 "notification_id": notif_id,
                 "status": "success",
                 "timestamp": datetime.utcnow().isoformat()
             })
         else:
-            await websocket.send_json({
+            manager.reply(websocket, {
                 "type": "error",
                 "message": "Notification non trouvée ou non autorisée",
                 "notification_id": notif_id,
@@ -190,7 +273,7 @@ async def mark_notification_read_ws(notif_id: int, user_id: int, db: Session, we
             
     except Exception as e:
         logger.error(f"Erreur lors du marquage de la notification: {str(e)}")
-        await websocket.send_json({
+        manager.reply(websocket, {
             "type": "error",
             "message": f"Erreur: {str(e)}",
             "notification_id": notif_id,
@@ -230,13 +313,14 @@ async def websocket_notifications_endpoint(websocket: WebSocket, user_id: int):
     
     # Connexion réussie
     await manager.connect(websocket, user_id)
+    await backplane.register(user_id)
     
     try:
         # Envoyer les notifications existantes non lues
         await send_initial_notifications(websocket, user_id, db)
         
         # Envoyer un message de confirmation de connexion
-        await websocket.send_json({
+        manager.reply(websocket, {
             "type": "connection_confirmed",
             "message": f"Connecté aux notifications pour l'utilisateur {user_id}",
             "user_id": user_id,
@@ -250,7 +334,7 @@ async def websocket_notifications_endpoint(websocket: WebSocket, user_id: int):
                 message = await websocket.receive_json()
                 
                 if message.get("type") == "ping":
-                    await websocket.send_json({
+                    manager.reply(websocket, {
                         "type": "pong",
                         "timestamp": datetime.utcnow().isoformat()
                     })
@@ -277,21 +361,36 @@ async def websocket_notifications_endpoint(websocket: WebSocket, user_id: int):
         logger.error(f"Erreur WebSocket pour user {user_id}: {str(e)}")
     finally:
         manager.disconnect(websocket, user_id)
+        await backplane.unregister(user_id)
         db.close()
 
 
 @websocket_router.get("/status")
 async def websocket_status():
-    """Obtenir le statut des connexions WebSocket"""
+    """Obtenir le statut des connexions WebSocket (tout le cluster si le backplane est actif)"""
+    local_connections = {
+        user_id: len(connections) 
+        for user_id, connections in manager.active_connections.items()
+    }
+    cluster = await backplane.cluster_status()
+    if cluster is None:
+        return {
+            "status": "active",
+            "scope": "local",
+            "node_id": backplane.node_id,
+            "total_connections": manager.get_total_connections(),
+            "connected_users": len(manager.active_connections),
+            "connected_user_ids": manager.get_connected_users(),
+            "connections_per_user": local_connections,
+            "last_broadcast": manager.last_broadcast
+        }
     return {
         "status": "active",
-        "total_connections": manager.get_total_connections(),
-        "connected_users": len(manager.active_connections),
-        "connected_user_ids": manager.get_connected_users(),
-        "connections_per_user": {
-            user_id: len(connections) 
-            for user_id, connections in manager.active_connections.items()
-        }
+        "scope": "cluster",
+        "node_id": backplane.node_id,
+        **cluster,
+        "local_connections": manager.get_total_connections(),
+        "last_broadcast": manager.last_broadcast
     }
 
 
@@ -299,22 +398,12 @@ async def notify_user_via_websocket(user_id: int, title: str, body: str, notific
     """
     Fonction utilitaire pour envoyer une notification via WebSocket
     À appeler depuis les autres endpoints de création de notifications
+    Passe par le backplane : l'utilisateur est joint quel que soit son processus
     """
     try:
-        notification_data = {
-            "id": notification_id,
-            "title": title,
-            "body": body,
-            "event_id": event_id,
-            "created_at": datetime.utcnow().strftime("%d/%m/%Y %H:%M:%S")
-        }
-
-        message = {
-            "type": "new_notification",
-            "notification": notification_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await manager.send_personal_message(message, user_id)
+        message = build_notification_message(title, body, notification_id, event_id)
+        if not await backplane.publish(message, [user_id]):
+            await manager.send_personal_message(message, user_id)
         logger.info(f"Notification WebSocket envoyée à l'utilisateur {user_id}")
         return True
     except Exception as e:
@@ -322,6 +411,22 @@ async def notify_user_via_websocket(user_id: int, title: str, body: str, notific
         return False
 
 
+async def notify_users_via_websocket(user_ids: List[int], title: str, body: str, notification_id: int = None, event_id: int = None):
+    """
+    Même notification à plusieurs utilisateurs : une seule publication backplane
+    (un message par nœud hébergeant des destinataires), repli local sinon
+    """
+    try:
+        message = build_notification_message(title, body, notification_id, event_id)
+        if not await backplane.publish(message, user_ids):
+            await manager._deliver(message, user_ids)
+        logger.info(f"Notification WebSocket envoyée à {len(user_ids)} utilisateurs")
+        return True
+    except Exception as e:
+        logger.error(f"Erreur envoi notification WebSocket pour {len(user_ids)} utilisateurs: {str(e)}")
+        return False
+
+
 async def broadcast_notification_via_websocket(notification_data: dict, user_ids: List[int] = None):
     """
     Diffuser une notification à plusieurs utilisateurs ou tous les utilisateurs connectés
@@ -333,13 +438,14 @@ async def broadcast_notification_via_websocket(notification_data: dict, user_ids
             "timestamp": datetime.utcnow().isoformat()
         }
         
-        if user_ids:
-            # Envoyer à des utilisateurs spécifiques
-            for user_id in user_ids:
-                await manager.send_personal_message(message, user_id)
-        else:
-            # Diffusion générale
-            await manager.send_broadcast_message(message)
+        if not await backplane.publish(message, user_ids or None):
+            if user_ids:
+                # Envoyer à des utilisateurs spécifiques
+                for user_id in user_ids:
+                    await manager.send_personal_message(message, user_id)
+            else:
+                # Diffusion générale
+                await manager.send_broadcast_message(message)
             
         logger.info(f"Notification diffusée via WebSocket à {len(user_ids) if user_ids else 'tous les'} utilisateurs")
         return True
@@ -348,7 +454,36 @@ async def broadcast_notification_via_websocket(notification_data: dict, user_ids
         return False
 
 
+async def notify_notifications_updated_via_websocket(action: str, changed: Dict[int, List[int]]):
+    """
+    Un seul événement par utilisateur après un traitement en lot (lues / supprimées)
+
+    Args:
+        action: "read" ou "deleted"
+        changed: Ids des notifications modifiées, par utilisateur
+    """
+    timestamp = datetime.utcnow().isoformat()
+    for user_id, notification_ids in changed.items():
+        message = {
+            "type": "notifications_bulk_update",
+            "action": action,
+            "notification_ids": notification_ids,
+            "count": len(notification_ids),
+            "timestamp": timestamp
+        }
+        try:
+            if not await backplane.publish(message, [user_id]):
+                await manager.send_personal_message(message, user_id)
+        except Exception as e:
+            logger.error(f"Erreur événement WebSocket {action} pour user {user_id}: {str(e)}")
+
+
 # Fonction pour obtenir le manager depuis d'autres modules
 def get_websocket_manager():
     """Obtenir l'instance du gestionnaire WebSocket"""
-    return manager
\ No newline at end of file
+    return manager
+
+
+def get_websocket_backplane():
+    """Obtenir le backplane WebSocket du processus"""
+    return backplane
\ No newline at end of file
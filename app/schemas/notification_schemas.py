@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class NotificationBaseSchema(BaseModel):
     type_notification_id :Optional[int] = None
@@ -53,6 +54,13 @@ class NotificationAllUserCreateSchema(BaseModel):
     is_read : Optional[bool] =False
 
 
+class NotificationBulkSchema(BaseModel):
+    """Sélection d'un traitement en lot, parmi les notifications de user_id : liste d'ids, ou toutes (avant `before`)"""
+    ids : Optional[List[int]] = Field(default=None, max_length=1000)
+    user_id : Optional[int] = None
+    before : Optional[datetime] = None
+
+
 class NotificationResponseSchema(BaseModel):
     id: int
     type_notification_id :Optional[int] = None
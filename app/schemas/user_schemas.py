@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
+from app.config import SMS_BULK_MAX
+
 
 class UserBaseSchema(BaseModel):
     firstName:Optional[str]
@@ -67,6 +69,10 @@ class UserListResponseSchema():
 class UserSendSmsSchema(BaseModel):
     telephone: str
     message: str
+
+
+class SmsBulkSchema(BaseModel):
+    messages: List[UserSendSmsSchema] = Field(..., min_length=1, max_length=SMS_BULK_MAX)
     
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,196 @@
+"""
+Ordonnancement adaptatif et suivi des broadcasts
+
+Au lieu d'espacer les chunks de 10 s fixes (countdown=idx*10, soit près de
+3 h pour 100k utilisateurs), le broadcast avance par vagues : chaque vague
+publie quelques chunks puis se reprogramme. La taille des chunks et le délai
+avant la vague suivante sont ajustés selon ce qui a été observé depuis la
+vague précédente :
+- des 429 FCM → chunks divisés par deux, délai doublé ;
+- une file Celery chargée → délai proportionnel à la profondeur de file ;
+- un taux de succès élevé et une file fluide → chunks agrandis, délai minimal.
+
+La progression (chunks publiés/terminés, envoyés, échecs, 429, ETA) est tenue
+dans un hash Redis par broadcast, alimenté par les workers.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.config import (
+    BROADCAST_BASE_INTERVAL,
+    BROADCAST_MAX_CHUNK,
+    BROADCAST_MAX_INTERVAL,
+    BROADCAST_MIN_CHUNK,
+    BROADCAST_TARGET_QUEUE_DEPTH,
+    BROADCAST_WAVE_CHUNKS,
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = "broadcast:progress:{broadcast_id}"
+PROGRESS_TTL_SECONDS = 604800  # 7 jours, comme les métriques de batch
+
+# Taux de succès au-delà duquel les chunks peuvent grossir
+HEALTHY_SUCCESS_RATE = 0.95
+
+
+@dataclass
+class WavePlan:
+    """Décision pour la vague suivante"""
+    chunk_size: int
+    chunks: int
+    delay: float
+    reason: str
+
+
+class AdaptiveBroadcastScheduler:
+    """Calcule la taille des chunks et l'espacement des vagues à partir des observations"""
+
+    def __init__(
+        self,
+        min_chunk: int = BROADCAST_MIN_CHUNK,
+        max_chunk: int = BROADCAST_MAX_CHUNK,
+        wave_chunks: int = BROADCAST_WAVE_CHUNKS,
+        base_interval: float = BROADCAST_BASE_INTERVAL,
+        max_interval: float = BROADCAST_MAX_INTERVAL,
+        target_queue_depth: int = BROADCAST_TARGET_QUEUE_DEPTH,
+    ):
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.wave_chunks = wave_chunks
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.target_queue_depth = target_queue_depth
+
+    def plan(
+        self,
+        chunk_size: int,
+        delay: float,
+        sent: int,
+        failed: int,
+        throttled: int,
+        queue_depth: int,
+    ) -> WavePlan:
+        """
+        Args:
+            chunk_size: Taille des chunks de la vague précédente
+            delay: Délai appliqué avant la vague précédente (s)
+            sent, failed, throttled: Observés depuis la vague précédente
+            queue_depth: Messages en attente dans la file des chunks
+        """
+        if throttled:
+            return WavePlan(
+                chunk_size=max(self.min_chunk, chunk_size // 2),
+                chunks=self.wave_chunks,
+                delay=min(self.max_interval, max(self.base_interval, delay) * 2),
+                reason="throttled",
+            )
+
+        if queue_depth > self.target_queue_depth:
+            backlog = queue_depth / max(1, self.target_queue_depth)
+            return WavePlan(
+                chunk_size=chunk_size,
+                chunks=self.wave_chunks,
+                delay=min(self.max_interval, self.base_interval * backlog),
+                reason="queue_backlog",
+            )
+
+        attempted = sent + failed
+        if attempted and sent / attempted >= HEALTHY_SUCCESS_RATE:
+            return WavePlan(
+                chunk_size=min(self.max_chunk, int(chunk_size * 1.5)),
+                chunks=self.wave_chunks,
+                delay=self.base_interval,
+                reason="healthy",
+            )
+
+        return WavePlan(chunk_size=chunk_size, chunks=self.wave_chunks, delay=self.base_interval, reason="steady")
+
+
+# ── Progression (hash Redis) ─────────────────────────────────────────────────
+
+def start_progress(client, broadcast_id: str, estimated_tokens: Optional[int] = None) -> None:
+    key = PROGRESS_KEY.format(broadcast_id=broadcast_id)
+    now = time.time()
+    client.hset(key, mapping={
+        "status": "running",
+        "started_at": now,
+        "updated_at": now,
+        "estimated_tokens": estimated_tokens if estimated_tokens is not None else -1,
+        "chunks_scheduled": 0,
+        "chunks_done": 0,
+        "tokens_scheduled": 0,
+        "sent": 0,
+        "failed": 0,
+        "throttled": 0,
+        "all_scheduled": 0,
+    })
+    client.expire(key, PROGRESS_TTL_SECONDS)
+
+
+def record_scheduled(client, broadcast_id: str, tokens: int, chunk_size: int, delay: float) -> None:
+    key = PROGRESS_KEY.format(broadcast_id=broadcast_id)
+    pipe = client.pipeline()
+    pipe.hincrby(key, "chunks_scheduled", 1)
+    pipe.hincrby(key, "tokens_scheduled", tokens)
+    pipe.hset(key, mapping={"chunk_size": chunk_size, "interval": delay, "updated_at": time.time()})
+    pipe.execute()
+
+
+def record_all_scheduled(client, broadcast_id: str) -> None:
+    client.hset(PROGRESS_KEY.format(broadcast_id=broadcast_id), mapping={"all_scheduled": 1, "updated_at": time.time()})
+
+
+def record_chunk_done(client, broadcast_id: str, sent: int, failed: int, throttled: int) -> None:
+    key = PROGRESS_KEY.format(broadcast_id=broadcast_id)
+    pipe = client.pipeline()
+    pipe.hincrby(key, "chunks_done", 1)
+    pipe.hincrby(key, "sent", sent)
+    pipe.hincrby(key, "failed", failed)
+    pipe.hincrby(key, "throttled", throttled)
+    pipe.hset(key, "updated_at", time.time())
+    pipe.execute()
+
+
+def read_counters(client, broadcast_id: str) -> Dict[str, int]:
+    """sent/failed/throttled cumulés (pour calculer les deltas entre vagues)"""
+    sent, failed, throttled = client.hmget(PROGRESS_KEY.format(broadcast_id=broadcast_id), "sent", "failed", "throttled")
+    return {"sent": int(sent or 0), "failed": int(failed or 0), "throttled": int(throttled or 0)}
+
+
+def summarize_progress(raw: Dict[str, str], now: Optional[float] = None) -> Optional[Dict]:
+    """Progression lisible (statut, compteurs, ETA en secondes) à partir du hash Redis"""
+    if not raw:
+        return None
+    now = now if now is not None else time.time()
+    ints = {
+        field: int(float(raw.get(field, 0) or 0))
+        for field in ("chunks_scheduled", "chunks_done", "tokens_scheduled", "sent", "failed", "throttled", "estimated_tokens")
+    }
+    processed = ints["sent"] + ints["failed"]
+    all_scheduled = raw.get("all_scheduled") == "1"
+    completed = all_scheduled and ints["chunks_done"] >= ints["chunks_scheduled"]
+
+    total = ints["tokens_scheduled"] if all_scheduled else max(ints["estimated_tokens"], ints["tokens_scheduled"])
+    elapsed = now - float(raw.get("started_at", now))
+    eta = None
+    if completed:
+        eta = 0
+    elif processed and elapsed > 0 and total > processed:
+        eta = round((total - processed) / (processed / elapsed))
+
+    return {
+        "status": "completed" if completed else raw.get("status", "running"),
+        "chunks_scheduled": ints["chunks_scheduled"],
+        "chunks_done": ints["chunks_done"],
+        "total_tokens": total if total >= 0 else None,
+        "sent": ints["sent"],
+        "failed": ints["failed"],
+        "throttled": ints["throttled"],
+        "chunk_size": int(float(raw["chunk_size"])) if raw.get("chunk_size") else None,
+        "interval": float(raw["interval"]) if raw.get("interval") else None,
+        "elapsed_seconds": round(elapsed),
+        "eta_seconds": eta,
+    }
@@ -0,0 +1,118 @@
+"""
+Destinataires des notifications broadcast
+
+Les routes n'envoient plus la liste des tokens dans le message Celery : elles
+publient un descripteur (titre, corps, audience) et le worker parcourt les
+sessions par pagination keyset sur user_session.id. La mémoire de l'API et la
+taille des messages du broker restent constantes quel que soit le nombre de
+destinataires.
+
+Un même token FCM peut figurer dans plusieurs sessions (reconnexions) : seule
+la session active la plus récente portant ce token est retenue, directement
+en SQL.
+"""
+import logging
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.orm import Session, aliased
+
+from app.models.models import User, UserSession
+
+logger = logging.getLogger(__name__)
+
+# Audiences supportées par le descripteur de broadcast
+AUDIENCE_ALL_USERS = "all_users"        # utilisateurs activés
+AUDIENCE_ALL_AGENCES = "all_agences"    # utilisateurs rattachés à une agence
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def _audience_filter(audience: Dict):
+    kind = audience.get("type")
+    if kind == AUDIENCE_ALL_USERS:
+        return User.is_activate.is_(True)
+    if kind == AUDIENCE_ALL_AGENCES:
+        return User.id_agence.isnot(None)
+    raise ValueError(f"Audience de broadcast inconnue: {kind}")
+
+
+def recipients_query(audience: Dict, after_id: int = 0, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """
+    Page de destinataires (session_id, user_id, fcm_token) après la session `after_id`
+
+    Args:
+        audience: Filtre d'audience ({"type": "all_users"} ou {"type": "all_agences"})
+        after_id: Dernier user_session.id de la page précédente (0 pour la première)
+        limit: Nombre de sessions par page (None = toutes)
+    """
+    newer = aliased(UserSession)
+    return (
+        select(UserSession.id, UserSession.user_id, UserSession.fcm_token)
+        .join(User, UserSession.user_id == User.id)
+        .where(
+            UserSession.id > after_id,
+            UserSession.is_active.is_(True),
+            UserSession.fcm_token.isnot(None),
+            UserSession.fcm_token != '',
+            _audience_filter(audience),
+            # Déduplication : une session plus récente porte déjà ce token
+            ~exists().where(and_(
+                newer.fcm_token == UserSession.fcm_token,
+                newer.is_active.is_(True),
+                newer.id > UserSession.id,
+            )),
+        )
+        .order_by(UserSession.id)
+        .limit(limit)
+    )
+
+
+def count_recipients(db: Session, audience: Dict) -> int:
+    """Nombre total de destinataires (estimation de progression, calculée une fois par le worker)"""
+    query = recipients_query(audience, limit=None).order_by(None)
+    return db.execute(select(func.count()).select_from(query.subquery())).scalar_one()
+
+
+def iter_recipient_pages(
+    db: Session,
+    audience: Dict,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    after_id: int = 0,
+) -> Iterator[List[Dict]]:
+    """
+    Parcourt les destinataires par pages de `page_size` sessions
+
+    Yields:
+        Liste de {"session_id", "user_id", "token"} (au plus page_size éléments)
+    """
+    while True:
+        rows = db.execute(recipients_query(audience, after_id, page_size)).all()
+        if not rows:
+            return
+        yield [
+            {"session_id": session_id, "user_id": user_id, "token": token}
+            for session_id, user_id, token in rows
+        ]
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1][0]
+
+
+def build_broadcast_descriptor(
+    title: Optional[str],
+    body: Optional[str],
+    audience_type: str,
+    event_id: Optional[int] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    notification_id: Optional[int] = None,
+) -> Dict:
+    """Message Celery d'un broadcast : quelques champs, indépendamment du nombre de destinataires"""
+    return {
+        "title": title,
+        "body": body,
+        "event_id": event_id,
+        "notification_id": notification_id,
+        "audience": {"type": audience_type},
+        "page_size": page_size,
+    }
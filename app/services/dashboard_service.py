@@ -0,0 +1,324 @@
+"""
+Statistiques du dashboard
+
+Les compteurs (global et par agence) sont maintenus dans la table
+dashboard_compteur_stats : chaque écriture sur user_compteur applique son delta
+dans la même transaction, et une tâche périodique les recalcule pour corriger
+toute dérive. La lecture est donc une simple lecture de ligne.
+Les propriétaires distincts sont suivis via dashboard_owner_ref (nombre de
+liaisons par utilisateur) : owners/not_owners ne changent que lorsqu'un
+utilisateur passe de 0 à 1 liaison, ou de 1 à 0.
+
+compute_dashboard_stats (requête agrégée COUNT ... FILTER / COUNT DISTINCT)
+sert au recalcul et de repli tant que les compteurs n'ont pas été initialisés.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.cache import cache_tag, invalidate_tags
+from app.models.models import Agence, DashboardCompteurStats, DashboardOwnerRef, User, UserCompteur
+
+logger = logging.getLogger(__name__)
+
+# Etats de demande suivis par le dashboard
+ETAT_DEMANDE_TRAITEE = 13
+ETAT_DEMANDE_EN_COURS = 14
+
+# Tag des statistiques en cache (globales et par utilisateur)
+DASHBOARD_CACHE_TAG = cache_tag("dashboard")
+
+# Périmètre de la ligne globale dans dashboard_compteur_stats
+GLOBAL_SCOPE = "__global__"
+
+# Colonnes maintenues par delta (owners/not_owners sont dérivés de dashboard_owner_ref)
+COUNTER_COLUMNS = (
+    "total_compteurs",
+    "compteurs_actifs",
+    "compteurs_inactifs",
+    "compteurs_woyofal",
+    "compteurs_classique",
+    "demandes_traites",
+    "demandes_en_cours",
+)
+STAT_COLUMNS = COUNTER_COLUMNS + ("owners", "not_owners")
+
+
+async def compute_dashboard_stats(db: AsyncSession, nom_agence: Optional[str] = None) -> Dict[str, int]:
+    """
+    Calcule les statistiques compteurs/utilisateurs en un aller-retour.
+
+    Args:
+        db: Session asynchrone
+        nom_agence: Restreint les compteurs à une agence (chef d'agence), None = tous
+    """
+    total_users = select(func.count(User.id)).scalar_subquery()
+
+    stmt = select(
+        func.count(UserCompteur.id).label("total_compteurs"),
+        func.count(UserCompteur.id).filter(UserCompteur.est_active.is_(True)).label("compteurs_actifs"),
+        func.count(UserCompteur.id).filter(UserCompteur.est_active.is_(False)).label("compteurs_inactifs"),
+        func.count(UserCompteur.id).filter(UserCompteur.type_compteur == 1).label("compteurs_woyofal"),
+        func.count(UserCompteur.id).filter(UserCompteur.type_compteur == 2).label("compteurs_classique"),
+        func.count(UserCompteur.id).filter(UserCompteur.etat_id == ETAT_DEMANDE_TRAITEE).label("demandes_traites"),
+        func.count(UserCompteur.id).filter(UserCompteur.etat_id == ETAT_DEMANDE_EN_COURS).label("demandes_en_cours"),
+        func.count(func.distinct(UserCompteur.user_id)).filter(UserCompteur.est_proprietaire.is_(True)).label("owners"),
+        func.count(func.distinct(UserCompteur.user_id)).filter(UserCompteur.est_proprietaire.is_(False)).label("not_owners"),
+        total_users.label("total_users"),
+    ).select_from(UserCompteur)
+
+    if nom_agence is not None:
+        stmt = stmt.where(UserCompteur.nom_agence == nom_agence)
+
+    row = (await db.execute(stmt)).mappings().one()
+    return {key: int(value or 0) for key, value in row.items()}
+
+
+async def invalidate_dashboard_cache() -> None:
+    """Invalide les statistiques globales et celles de tous les utilisateurs (tag dashboard)"""
+    await invalidate_tags(DASHBOARD_CACHE_TAG)
+
+
+# ── Compteurs maintenus ──────────────────────────────────────────────────────
+
+def snapshot_user_compteur(user_compteur: UserCompteur) -> Dict:
+    """Attributs d'une liaison qui influent sur les statistiques (à prendre avant et après modification)"""
+    return {
+        "nom_agence": user_compteur.nom_agence,
+        "user_id": user_compteur.user_id,
+        "est_active": user_compteur.est_active,
+        "est_proprietaire": user_compteur.est_proprietaire,
+        "type_compteur": user_compteur.type_compteur,
+        "etat_id": user_compteur.etat_id,
+    }
+
+
+def _scopes(snapshot: Dict) -> List[str]:
+    scopes = [GLOBAL_SCOPE]
+    if snapshot["nom_agence"] is not None:
+        scopes.append(snapshot["nom_agence"])
+    return scopes
+
+
+def _contribution(snapshot: Dict) -> Dict[str, int]:
+    """Contribution d'une liaison aux compteurs, selon les mêmes règles que compute_dashboard_stats"""
+    return {
+        "total_compteurs": 1,
+        "compteurs_actifs": int(snapshot["est_active"] is True),
+        "compteurs_inactifs": int(snapshot["est_active"] is False),
+        "compteurs_woyofal": int(snapshot["type_compteur"] == 1),
+        "compteurs_classique": int(snapshot["type_compteur"] == 2),
+        "demandes_traites": int(snapshot["etat_id"] == ETAT_DEMANDE_TRAITEE),
+        "demandes_en_cours": int(snapshot["etat_id"] == ETAT_DEMANDE_EN_COURS),
+    }
+
+
+def _insert(db: AsyncSession):
+    """INSERT ... ON CONFLICT du dialecte courant (PostgreSQL en production, SQLite en test)"""
+    if db.bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+
+async def _add_to_stats(db: AsyncSession, scope: str, deltas: Dict[str, int]) -> None:
+    insert = _insert(db)
+    now = datetime.now()
+    stmt = insert(DashboardCompteurStats).values(scope=scope, updated_at=now, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DashboardCompteurStats.scope],
+        set_={
+            **{col: getattr(DashboardCompteurStats, col) + stmt.excluded[col] for col in deltas},
+            "updated_at": now,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def _add_to_owner_ref(db: AsyncSession, scope: str, user_id: int, est_proprietaire: bool, delta: int) -> int:
+    """Ajoute `delta` au nombre de liaisons et retourne le nouveau nombre"""
+    insert = _insert(db)
+    stmt = insert(DashboardOwnerRef).values(
+        scope=scope, user_id=user_id, est_proprietaire=est_proprietaire, nb=delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DashboardOwnerRef.scope, DashboardOwnerRef.user_id, DashboardOwnerRef.est_proprietaire],
+        set_={"nb": DashboardOwnerRef.nb + stmt.excluded.nb},
+    ).returning(DashboardOwnerRef.nb)
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def apply_user_compteur_change(db: AsyncSession, before: Optional[Dict], after: Optional[Dict]) -> None:
+    """
+    Répercute une écriture sur user_compteur dans les compteurs du dashboard.
+    À appeler avant le commit de l'écriture : les deux changements sont atomiques.
+
+    Les tables de compteurs sont modifiées dans l'ordre dashboard_owner_ref puis
+    dashboard_compteur_stats (celui du verrou de reconcile_dashboard_counters) :
+    pendant un recalcul, l'écriture attend sa fin puis applique son delta sur les
+    valeurs recalculées.
+
+    Args:
+        before: snapshot_user_compteur avant modification (None pour une création)
+        after: snapshot_user_compteur après modification (None pour une suppression)
+    """
+    if before == after:
+        return
+
+    stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    refs: Dict[Tuple[str, int, bool], int] = defaultdict(int)
+
+    for snapshot, sign in ((before, -1), (after, 1)):
+        if snapshot is None:
+            continue
+        for scope in _scopes(snapshot):
+            for col, value in _contribution(snapshot).items():
+                stats[scope][col] += sign * value
+            if snapshot["user_id"] is not None and snapshot["est_proprietaire"] is not None:
+                refs[(scope, snapshot["user_id"], bool(snapshot["est_proprietaire"]))] += sign
+
+    for (scope, user_id, est_proprietaire), delta in refs.items():
+        if delta == 0:
+            continue
+        nb = await _add_to_owner_ref(db, scope, user_id, est_proprietaire, delta)
+        previous = nb - delta
+        col = "owners" if est_proprietaire else "not_owners"
+        if previous <= 0 < nb:
+            stats[scope][col] += 1
+        elif nb <= 0 < previous:
+            stats[scope][col] -= 1
+        if nb <= 0:
+            await db.execute(
+                delete(DashboardOwnerRef).where(
+                    DashboardOwnerRef.scope == scope,
+                    DashboardOwnerRef.user_id == user_id,
+                    DashboardOwnerRef.est_proprietaire == est_proprietaire,
+                )
+            )
+
+    for scope, deltas in stats.items():
+        deltas = {col: value for col, value in deltas.items() if value}
+        if deltas:
+            await _add_to_stats(db, scope, deltas)
+
+
+async def read_dashboard_stats(db: AsyncSession, nom_agence: Optional[str] = None) -> Dict[str, int]:
+    """
+    Lit les compteurs maintenus (une ligne) et le nombre d'utilisateurs.
+    Repli sur la requête agrégée si les compteurs n'ont pas encore été initialisés.
+    """
+    scope = nom_agence if nom_agence is not None else GLOBAL_SCOPE
+    stmt = select(
+        *[getattr(DashboardCompteurStats, col) for col in STAT_COLUMNS],
+        select(func.count(User.id)).scalar_subquery().label("total_users"),
+    ).where(DashboardCompteurStats.scope == scope)
+    row = (await db.execute(stmt)).mappings().first()
+    if row is None:
+        return await compute_dashboard_stats(db, nom_agence=nom_agence)
+    return {key: int(value or 0) for key, value in row.items()}
+
+
+# ── Recalcul complet ─────────────────────────────────────────────────────────
+
+def _aggregate_by_scope(db: Session) -> Dict[str, Dict[str, int]]:
+    counts = [
+        func.count(UserCompteur.id).label("total_compteurs"),
+        func.count(UserCompteur.id).filter(UserCompteur.est_active.is_(True)).label("compteurs_actifs"),
+        func.count(UserCompteur.id).filter(UserCompteur.est_active.is_(False)).label("compteurs_inactifs"),
+        func.count(UserCompteur.id).filter(UserCompteur.type_compteur == 1).label("compteurs_woyofal"),
+        func.count(UserCompteur.id).filter(UserCompteur.type_compteur == 2).label("compteurs_classique"),
+        func.count(UserCompteur.id).filter(UserCompteur.etat_id == ETAT_DEMANDE_TRAITEE).label("demandes_traites"),
+        func.count(UserCompteur.id).filter(UserCompteur.etat_id == ETAT_DEMANDE_EN_COURS).label("demandes_en_cours"),
+        func.count(func.distinct(UserCompteur.user_id)).filter(UserCompteur.est_proprietaire.is_(True)).label("owners"),
+        func.count(func.distinct(UserCompteur.user_id)).filter(UserCompteur.est_proprietaire.is_(False)).label("not_owners"),
+    ]
+    result: Dict[str, Dict[str, int]] = {}
+    row = db.execute(select(*counts)).mappings().one()
+    result[GLOBAL_SCOPE] = {col: int(row[col] or 0) for col in STAT_COLUMNS}
+    rows = db.execute(
+        select(UserCompteur.nom_agence, *counts)
+        .where(UserCompteur.nom_agence.isnot(None))
+        .group_by(UserCompteur.nom_agence)
+    ).mappings().all()
+    for row in rows:
+        result[row["nom_agence"]] = {col: int(row[col] or 0) for col in STAT_COLUMNS}
+    return result
+
+
+def _aggregate_owner_refs(db: Session) -> Iterable[Dict]:
+    base = (
+        UserCompteur.user_id.isnot(None),
+        UserCompteur.est_proprietaire.isnot(None),
+    )
+    for row in db.execute(
+        select(UserCompteur.user_id, UserCompteur.est_proprietaire, func.count().label("nb"))
+        .where(*base)
+        .group_by(UserCompteur.user_id, UserCompteur.est_proprietaire)
+    ):
+        yield {"scope": GLOBAL_SCOPE, "user_id": row.user_id, "est_proprietaire": row.est_proprietaire, "nb": row.nb}
+    for row in db.execute(
+        select(UserCompteur.nom_agence, UserCompteur.user_id, UserCompteur.est_proprietaire, func.count().label("nb"))
+        .where(UserCompteur.nom_agence.isnot(None), *base)
+        .group_by(UserCompteur.nom_agence, UserCompteur.user_id, UserCompteur.est_proprietaire)
+    ):
+        yield {"scope": row.nom_agence, "user_id": row.user_id, "est_proprietaire": row.est_proprietaire, "nb": row.nb}
+
+
+def _lock_counter_tables(db: Session) -> None:
+    """
+    Verrou EXCLUSIVE sur les tables de compteurs jusqu'au commit (PostgreSQL) :
+    les lectures du dashboard continuent, les deltas des écritures sur user_compteur
+    attendent la fin du recalcul. Une écriture dont le delta est déjà appliqué est
+    attendue avant l'agrégat, qui la voit donc ; une écriture bloquée n'est pas
+    encore validée, l'agrégat ne la voit pas et son delta s'applique après.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    tables = ", ".join(model.__tablename__ for model in (DashboardOwnerRef, DashboardCompteurStats))
+    db.execute(text(f"LOCK TABLE {tables} IN EXCLUSIVE MODE"))
+
+
+def reconcile_dashboard_counters(db: Session) -> Dict[str, int]:
+    """
+    Recalcule entièrement les compteurs depuis user_compteur et remplace les tables
+    dashboard_compteur_stats / dashboard_owner_ref dans une seule transaction,
+    sous verrou (_lock_counter_tables) : aucun delta concurrent n'est perdu.
+    Une ligne (éventuellement à zéro) est créée pour chaque agence connue.
+
+    Returns:
+        Nombre de périmètres corrigés (valeurs différentes de celles stockées) et total
+    """
+    zero = {col: 0 for col in STAT_COLUMNS}
+    now = datetime.now()
+    try:
+        _lock_counter_tables(db)
+        computed = _aggregate_by_scope(db)
+        refs = list(_aggregate_owner_refs(db))
+        for (nom_corrige,) in db.execute(select(Agence.nom_corrige)):
+            computed.setdefault(nom_corrige, dict(zero))
+
+        stored = {
+            row.scope: {col: getattr(row, col) for col in STAT_COLUMNS}
+            for row in db.execute(select(DashboardCompteurStats)).scalars()
+        }
+        drifted = sum(1 for scope, values in computed.items() if stored.get(scope) != values)
+        drifted += sum(1 for scope in stored if scope not in computed)
+
+        db.execute(delete(DashboardOwnerRef))
+        db.execute(delete(DashboardCompteurStats))
+        db.add_all(DashboardCompteurStats(scope=scope, updated_at=now, **values) for scope, values in computed.items())
+        db.add_all(DashboardOwnerRef(**ref) for ref in refs)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if drifted:
+        logger.warning(f"Compteurs dashboard recalculés : {drifted} périmètre(s) corrigé(s)")
+    return {"scopes": len(computed), "drifted": drifted}
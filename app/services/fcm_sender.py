@@ -0,0 +1,331 @@
+"""
+Envoi concurrent des notifications FCM (API HTTP v1) sur HTTP/2
+
+L'API v1 n'accepte qu'un message par requête : envoyer un lot en série coûte
+un aller-retour par message. Le moteur multiplexe les requêtes sur une
+connexion HTTP/2 (httpx + h2), avec :
+- une concurrence bornée (sémaphore),
+- un seau à jetons pour rester sous le quota FCM (messages/seconde) : partagé
+  dans Redis par tous les workers du projet (RedisTokenBucket), les chunks d'un
+  broadcast s'exécutant en parallèle sur plusieurs workers,
+- des réessais avec backoff exponentiel sur 429 et 5xx (Retry-After respecté).
+
+Le client HTTP (connexion TLS / HTTP/2) est ouvert au premier lot et réutilisé
+par les lots suivants du même FcmSender.
+
+Le résultat garde la forme historique de send_batch_pushNotifications :
+{"success_count", "failure_count", "responses"} (réponses dans l'ordre d'entrée),
+complétée par "throttled_count" (réponses 429 reçues, réessais compris) qui
+sert à l'ordonnancement des broadcasts, et "dead_tokens" (token → code FCM)
+pour les tokens désinstallés ou invalides, à désactiver en base.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Codes pour lesquels FCM recommande de réessayer
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Seau à jetons partagé du quota FCM d'un projet
+RATE_LIMIT_KEY = "fcm:ratelimit:{project_id}"
+
+# Codes d'erreur FCM signalant un token à ne plus utiliser
+UNREGISTERED = "UNREGISTERED"
+INVALID_ARGUMENT = "INVALID_ARGUMENT"
+
+
+def classify_fcm_error(response: httpx.Response) -> Tuple[Optional[str], bool]:
+    """
+    Code d'erreur FCM d'une réponse en échec et si le token est mort
+
+    UNREGISTERED : application désinstallée / token expiré.
+    INVALID_ARGUMENT ne vise le token que si le message ou la violation le désigne
+    (sinon c'est le payload qui est en cause et le token reste valide).
+    """
+    try:
+        error = response.json().get("error", {})
+    except ValueError:
+        return None, False
+    if not isinstance(error, dict):
+        return None, False
+
+    code = error.get("status")
+    token_field = False
+    for detail in error.get("details", []) or []:
+        if detail.get("errorCode"):
+            code = detail["errorCode"]
+        for violation in detail.get("fieldViolations", []) or []:
+            if violation.get("field") == "message.token":
+                token_field = True
+
+    if code == UNREGISTERED:
+        return code, True
+    if code == INVALID_ARGUMENT:
+        return code, token_field or "registration token" in str(error.get("message", "")).lower()
+    return code, False
+
+
+class TokenBucket:
+    """Seau à jetons asynchrone : `rate` jetons/seconde, rafale de `capacity` jetons"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Remplit le seau selon l'horloge Redis (commune à tous les workers) et accorde
+# au plus ARGV[3] jetons ; sans jeton disponible, renvoie le délai d'attente (s)
+_TAKE_TOKENS = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local granted = math.min(tonumber(ARGV[3]), math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+if granted > 0 then
+    return {granted, '0'}
+end
+return {0, tostring((1 - tokens) / rate)}
+"""
+
+
+class RedisTokenBucket:
+    """
+    Seau à jetons partagé dans Redis : un seul quota pour tous les workers d'un projet FCM
+
+    Les jetons sont réservés par paquets (1/20 s de débit) pour limiter les allers-retours.
+    Redis indisponible : repli sur un seau local au processus.
+    """
+
+    def __init__(self, client, key: str, rate: float, capacity: Optional[float] = None, batch: Optional[int] = None):
+        """
+        Args:
+            client: Client Redis asynchrone (decode_responses=True)
+            key: Clé du seau (RATE_LIMIT_KEY)
+            rate: Jetons par seconde pour l'ensemble des workers
+            capacity: Rafale maximale (par défaut une seconde de débit)
+            batch: Jetons réservés par aller-retour Redis
+        """
+        self.client = client
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.batch = batch or max(1, int(rate / 20))
+        self.fallback = TokenBucket(rate, self.capacity)
+        self._reserved = 0
+        self._degraded = False
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            try:
+                while self._reserved == 0:
+                    granted, wait = await self.client.eval(
+                        _TAKE_TOKENS, 1, self.key, self.rate, self.capacity, self.batch
+                    )
+                    self._reserved = int(granted)
+                    if not self._reserved:
+                        await asyncio.sleep(float(wait))
+            except Exception as e:
+                if not self._degraded:
+                    logger.warning(f"Quota FCM partagé indisponible, quota local au processus: {e}")
+                    self._degraded = True
+            else:
+                self._degraded = False
+                self._reserved -= 1
+                return
+        await self.fallback.acquire()
+
+
+def build_fcm_message(notif: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload FCM v1 d'une notification {token, title, body}"""
+    return {
+        "message": {
+            "token": notif["token"],
+            "notification": {
+                "title": notif["title"],
+                "body": notif["body"],
+            },
+            "android": {
+                "priority": "high"
+            }
+        }
+    }
+
+
+class FcmSender:
+    """Envoi d'un lot de notifications FCM avec concurrence, quota et réessais"""
+
+    def __init__(
+        self,
+        send_url: str,
+        access_token: str,
+        concurrency: int = 100,
+        rate_limit: float = 500.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        timeout: float = 5.0,
+        verify: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        sleep: Callable[[float], Any] = asyncio.sleep,
+        bucket: Optional[Any] = None,
+    ):
+        """
+        Args:
+            send_url: URL messages:send du projet Firebase
+            access_token: Jeton OAuth2 (scope firebase.messaging)
+            concurrency: Requêtes simultanées (flux HTTP/2) au maximum
+            rate_limit: Messages par seconde au maximum (0 = pas de limite), si bucket n'est pas fourni
+            max_retries: Réessais par message sur 429/5xx/erreur réseau
+            backoff_base: Délai du premier réessai (secondes), doublé à chaque tentative
+            timeout: Délai maximal d'une requête (secondes)
+            verify: Vérification du certificat (désactivée derrière le proxy Senelec)
+            transport: Transport httpx (tests)
+            bucket: Limiteur de débit partagé (RedisTokenBucket) ; par défaut un seau
+                    local de rate_limit messages/seconde, conservé d'un lot à l'autre
+        """
+        self.send_url = send_url
+        # Renouvelé par l'appelant à l'expiration du jeton OAuth2
+        self.access_token = access_token
+        self.concurrency = concurrency
+        self.bucket = bucket if bucket is not None else (TokenBucket(rate_limit) if rate_limit > 0 else None)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.verify = verify
+        self.transport = transport
+        self._sleep = sleep
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.access_token}",
+            "Content-Type": "application/json; UTF-8",
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Client HTTP/2 ouvert au premier lot puis réutilisé (une poignée de main TLS)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                verify=self.verify,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        # Backoff exponentiel avec jitter pour ne pas resynchroniser les réessais
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def _send_one(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        message: Dict[str, Any],
+        stats: Dict[str, int],
+    ) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            response = None
+            try:
+                async with semaphore:
+                    response = await client.post(self.send_url, headers=self.headers, json=message)
+                if response.status_code == 200:
+                    return {"status": "success", "code": 200}
+                if response.status_code == 429:
+                    stats["throttled"] += 1
+                if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    error_code, dead_token = classify_fcm_error(response)
+                    result = {
+                        "status": "failed",
+                        "code": response.status_code,
+                        "error": response.text[:100],  # Limiter la taille
+                        "error_code": error_code
+                    }
+                    if dead_token:
+                        result["dead_token"] = True
+                    return result
+            except httpx.HTTPError as e:
+                if attempt >= self.max_retries:
+                    return {"status": "error", "error": str(e)[:100]}
+            await self._sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def send_all(self, notifications: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Envoie toutes les notifications {token, title, body}
+
+        Returns:
+            dict avec statistiques d'envoi (success_count, failure_count, responses,
+            throttled_count, dead_tokens)
+        """
+        if not notifications:
+            return {"success_count": 0, "failure_count": 0, "responses": [], "throttled_count": 0, "dead_tokens": {}}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stats = {"throttled": 0}
+        client = self._get_client()
+
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            self._send_one(client, semaphore, build_fcm_message(notif), stats)
+            for notif in notifications
+        ))
+
+        success_count = sum(1 for r in responses if r["status"] == "success")
+        dead_tokens = {
+            notif["token"]: r["error_code"]
+            for notif, r in zip(notifications, responses) if r.get("dead_token")
+        }
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"FCM: {len(responses)} messages en {elapsed:.2f}s "
+            f"({success_count} succès, {len(responses) - success_count} échecs)"
+        )
+        return {
+            "success_count": success_count,
+            "failure_count": len(responses) - success_count,
+            "responses": list(responses),
+            "throttled_count": stats["throttled"],
+            "dead_tokens": dead_tokens,
+        }
@@ -0,0 +1,77 @@
+"""
+Hygiène des tokens FCM
+
+Les tokens signalés morts par FCM (UNREGISTERED, INVALID_ARGUMENT sur le token)
+sont désactivés en une seule requête par chunk :
+    UPDATE user_session SET is_active = false WHERE fcm_token = ANY(:tokens)
+au lieu d'un SELECT + UPDATE par token. Sans cela, chaque broadcast renvoie
+vers ces tokens et consomme du quota FCM pour rien.
+
+Les métriques cumulées sont tenues dans le hash Redis fcm:token_hygiene.
+"""
+import logging
+import time
+from collections import Counter
+from typing import Dict, Iterable
+
+from sqlalchemy import String, and_, func, literal, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from app.models.models import UserSession
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = "fcm:token_hygiene"
+
+
+def deactivate_fcm_tokens(db: Session, tokens: Iterable[str]) -> int:
+    """
+    Désactive en une requête toutes les sessions actives portant l'un des tokens
+
+    Returns:
+        Nombre de sessions désactivées
+    """
+    tokens = sorted({t for t in tokens if t})
+    if not tokens:
+        return 0
+
+    if db.bind.dialect.name == "postgresql":
+        token_match = UserSession.fcm_token == func.any(literal(tokens, ARRAY(String)))
+    else:
+        token_match = UserSession.fcm_token.in_(tokens)
+
+    result = db.execute(
+        update(UserSession)
+        .where(and_(token_match, UserSession.is_active.is_(True)))
+        .values(is_active=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def record_pruning_metrics(client, dead_tokens: Dict[str, str], deactivated: int) -> None:
+    """Cumule les tokens morts détectés (par code FCM) et les sessions désactivées"""
+    pipe = client.pipeline()
+    pipe.hincrby(METRICS_KEY, "chunks_pruned", 1)
+    pipe.hincrby(METRICS_KEY, "dead_tokens", len(dead_tokens))
+    pipe.hincrby(METRICS_KEY, "sessions_deactivated", deactivated)
+    for code, count in Counter(dead_tokens.values()).items():
+        pipe.hincrby(METRICS_KEY, f"code:{code}", count)
+    pipe.hset(METRICS_KEY, "last_pruned_at", time.time())
+    pipe.execute()
+
+
+def summarize_pruning_metrics(raw: Dict[str, str]) -> Dict:
+    """Métriques lisibles à partir du hash Redis"""
+    return {
+        "chunks_pruned": int(raw.get("chunks_pruned", 0)),
+        "dead_tokens": int(raw.get("dead_tokens", 0)),
+        "sessions_deactivated": int(raw.get("sessions_deactivated", 0)),
+        "by_error_code": {
+            field.split(":", 1)[1]: int(value)
+            for field, value in raw.items() if field.startswith("code:")
+        },
+        "last_pruned_at": float(raw["last_pruned_at"]) if raw.get("last_pruned_at") else None,
+    }
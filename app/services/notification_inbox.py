@@ -0,0 +1,300 @@
+"""
+Boîte de réception paginée et compteur de notifications non lues
+
+GET /notifications/user/{user_id} charge et sérialise tout l'historique de
+l'utilisateur. Pour les clients mobiles :
+- la boîte de réception est paginée par curseur (keyset sur created_at, id,
+  du plus récent au plus ancien) : coût constant quelle que soit la page ;
+- le badge lit un compteur Redis en O(1) au lieu de compter les lignes.
+
+Le compteur est tenu en deux clés : une par utilisateur (notifications
+adressées à l'utilisateur) et une globale (notifications for_user_id = NULL,
+visibles par tous). Le nombre de non lues d'un utilisateur est leur somme.
+Les clés sont incrémentées à la création, décrémentées au marquage comme lue
+(ou à la suppression d'une non lue) et reconstruites depuis PostgreSQL quand
+elles sont absentes. Un incrément sur une clé absente est ignoré : la
+reconstruction suivante part de la base, ce qui évite tout écart. Le TTL
+borne la dérive éventuelle (reconstruction au plus tard à expiration).
+
+Marquage comme lues et suppression en lot : une seule requête UPDATE/DELETE
+... RETURNING, qui donne les lignes réellement modifiées par destinataire
+(ajustement des compteurs, invalidation du cache une fois par utilisateur).
+"""
+import base64
+import binascii
+import json
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import cache_tag, get_redis, invalidate_tags
+from app.config import CACHE_KEYS, CACHE_TTL
+from app.models.models import Notification
+
+logger = logging.getLogger(__name__)
+
+UNREAD_USER_KEY = CACHE_KEYS["NOTIFICATIONS_UNREAD"]
+UNREAD_GLOBAL_KEY = CACHE_KEYS["NOTIFICATIONS_UNREAD_GLOBAL"]
+
+# Tag de la liste complète (GET /notifications/) : invalidée à toute modification
+NOTIFICATIONS_CACHE_TAG = cache_tag("notifications")
+
+# Incrément atomique uniquement si la clé existe (sinon reconstruction depuis la base), plancher à 0
+_ADJUST_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if value < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    value = 0
+end
+return value
+"""
+
+
+def unread_key(user_id: Optional[int]) -> str:
+    """Clé du compteur : par utilisateur, ou globale pour for_user_id = NULL"""
+    if user_id is None:
+        return UNREAD_GLOBAL_KEY
+    return UNREAD_USER_KEY.format(user_id=user_id)
+
+
+def notification_list_tag(user_id: Optional[int]) -> str:
+    """Tag des listes contenant les notifications de user_id (None = globales, présentes dans toutes les listes)"""
+    return cache_tag("notifications", user_id="global" if user_id is None else user_id)
+
+
+def notification_list_tags(user_id: int) -> List[str]:
+    """Tags de la liste d'un utilisateur (GET /notifications/user/{user_id}) : les siennes et les globales"""
+    return [notification_list_tag(user_id), notification_list_tag(None)]
+
+
+def inbox_filter(user_id: int):
+    """Notifications visibles par l'utilisateur : les siennes et les globales"""
+    return or_(
+        Notification.for_user_id == user_id,
+        Notification.for_user_id.is_(None),
+    )
+
+
+def encode_cursor(created_at: datetime, notification_id: int) -> str:
+    """Curseur opaque (position de la dernière notification renvoyée)"""
+    raw = json.dumps({"c": created_at.isoformat(), "i": notification_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Position (created_at, id) d'un curseur
+
+    Raises:
+        ValueError: curseur invalide
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["c"]), int(data["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Curseur invalide: {cursor}") from e
+
+
+def inbox_page_query(user_id: int, limit: int, after: Optional[Tuple[datetime, int]] = None):
+    """
+    Page de la boîte de réception, du plus récent au plus ancien
+
+    Args:
+        user_id: Destinataire
+        limit: Nombre de lignes à lire
+        after: Position (created_at, id) de la dernière notification de la page précédente
+    """
+    query = select(Notification).where(inbox_filter(user_id))
+    if after is not None:
+        query = query.where(tuple_(Notification.created_at, Notification.id) < tuple_(*after))
+    return query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit)
+
+
+def serialize_inbox_notification(notif: Notification) -> Dict:
+    """Même forme que les éléments de GET /notifications/user/{user_id}"""
+    return {
+        "id": notif.id,
+        "type_notification_id": notif.type_notification_id,
+        "event_id": notif.event_id,
+        "title": notif.title,
+        "body": notif.body,
+        "is_read": notif.is_read,
+        "is_global": notif.for_user_id is None,
+        "created_at": notif.created_at.strftime("%d/%m/%Y %H:%M:%S"),
+    }
+
+
+async def fetch_inbox_page(db: AsyncSession, user_id: int, limit: int, cursor: Optional[str] = None) -> Dict:
+    """
+    Une page de la boîte de réception
+
+    Returns:
+        {"notifications", "next_cursor", "has_more"} ; next_cursor vaut None en fin de liste
+
+    Raises:
+        ValueError: curseur invalide
+    """
+    after = decode_cursor(cursor) if cursor else None
+    # Une ligne de plus pour savoir s'il reste une page sans COUNT
+    rows = (await db.execute(inbox_page_query(user_id, limit + 1, after))).scalars().all()
+    has_more = len(rows) > limit
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if has_more else None
+    return {
+        "notifications": [serialize_inbox_notification(notif) for notif in page],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
+
+
+async def count_unread_from_db(db: AsyncSession, user_id: int) -> Tuple[int, int]:
+    """Non lues (adressées à l'utilisateur, globales) comptées en base"""
+    personal, global_ = (await db.execute(
+        select(
+            func.count().filter(and_(Notification.for_user_id == user_id, Notification.is_read.is_(False))),
+            func.count().filter(and_(Notification.for_user_id.is_(None), Notification.is_read.is_(False))),
+        ).where(inbox_filter(user_id))
+    )).one()
+    return int(personal), int(global_)
+
+
+async def get_unread_count(db: AsyncSession, user_id: int) -> int:
+    """
+    Nombre de non lues : lecture O(1) des deux compteurs Redis, reconstruction
+    depuis PostgreSQL de ceux qui manquent (Redis indisponible : comptage en base)
+    """
+    keys = [unread_key(user_id), unread_key(None)]
+    try:
+        client = get_redis()
+        cached = await client.mget(keys)
+    except Exception as e:
+        logger.warning(f"Unread counter unavailable for user {user_id}: {str(e)}")
+        return sum(await count_unread_from_db(db, user_id))
+
+    if all(value is not None for value in cached):
+        return sum(max(int(value), 0) for value in cached)
+
+    counts = await count_unread_from_db(db, user_id)
+    try:
+        ttl = CACHE_TTL["NOTIFICATIONS_UNREAD"]
+        for key, value, count in zip(keys, cached, counts):
+            if value is None:
+                # nx : ne pas écraser un compteur reconstruit entre-temps par une autre requête
+                await client.set(key, count, ex=ttl, nx=True)
+    except Exception as e:
+        logger.warning(f"Unread counter rebuild failed for user {user_id}: {str(e)}")
+    return sum(counts)
+
+
+async def adjust_unread(user_id: Optional[int], delta: int) -> None:
+    """Ajuste le compteur d'un utilisateur (None = compteur global) s'il existe déjà"""
+    await adjust_unread_many([user_id], delta)
+
+
+async def adjust_unread_many(user_ids: Iterable[Optional[int]], delta: int) -> None:
+    """Ajuste les compteurs de plusieurs utilisateurs en un aller-retour (création en lot)"""
+    await adjust_unread_counts({
+        user_id: count * delta for user_id, count in Counter(user_ids).items()
+    })
+
+
+async def adjust_unread_counts(deltas: Dict[Optional[int], int]) -> None:
+    """Ajuste chaque compteur de son propre delta, en un aller-retour"""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        for user_id, delta in deltas.items():
+            pipe.eval(_ADJUST_IF_EXISTS, 1, unread_key(user_id), delta)
+        await pipe.execute()
+    except Exception as e:
+        # Compteur non ajusté : il sera corrigé à expiration (reconstruction depuis la base)
+        logger.warning(f"Unread counter update failed ({len(deltas)} keys): {str(e)}")
+
+
+def bulk_scope(ids: Optional[List[int]] = None, user_id: Optional[int] = None, before: Optional[datetime] = None):
+    """
+    Condition d'un traitement en lot, toujours restreinte aux notifications de user_id
+
+    - ids : ces notifications, si elles sont adressées à l'utilisateur ;
+    - sinon : toutes celles adressées à l'utilisateur, créées avant `before`.
+    Les notifications globales, partagées par tous, ne sont jamais concernées.
+
+    Raises:
+        ValueError: user_id absent, ou liste d'ids vide (rien de sélectionné)
+    """
+    if user_id is None:
+        raise ValueError("user_id requis")
+    condition = Notification.for_user_id == user_id
+    if ids is not None:
+        # Liste vide : aucune sélection, et non "toutes les notifications de l'utilisateur"
+        if not ids:
+            raise ValueError("Aucune notification sélectionnée")
+        return and_(condition, Notification.id.in_(ids))
+    if before is not None:
+        condition = and_(condition, Notification.created_at <= before)
+    return condition
+
+
+def _group_by_user(rows) -> Dict[Optional[int], List[int]]:
+    grouped = defaultdict(list)
+    for notification_id, for_user_id in rows:
+        grouped[for_user_id].append(notification_id)
+    return dict(grouped)
+
+
+async def bulk_mark_read(db: AsyncSession, condition) -> Dict[Optional[int], List[int]]:
+    """
+    Marque comme lues, en une requête, les notifications non lues de la sélection
+
+    Returns:
+        Ids réellement passés à lu, par destinataire (None = notifications globales)
+    """
+    result = await db.execute(
+        update(Notification)
+        .where(and_(condition, Notification.is_read.is_(False)))
+        .values(is_read=True, updated_at=datetime.now())
+        .returning(Notification.id, Notification.for_user_id)
+        .execution_options(synchronize_session=False)
+    )
+    changed = _group_by_user(result.all())
+    await db.commit()
+    await adjust_unread_counts({user_id: -len(ids) for user_id, ids in changed.items()})
+    return changed
+
+
+async def bulk_delete(db: AsyncSession, condition) -> Dict[Optional[int], List[int]]:
+    """
+    Supprime, en une requête, les notifications de la sélection
+
+    Returns:
+        Ids supprimés, par destinataire (None = notifications globales)
+    """
+    result = await db.execute(
+        delete(Notification)
+        .where(condition)
+        .returning(Notification.id, Notification.for_user_id, Notification.is_read)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    await db.commit()
+    await adjust_unread_many((for_user_id for _, for_user_id, is_read in rows if not is_read), -1)
+    return _group_by_user((notification_id, for_user_id) for notification_id, for_user_id, _ in rows)
+
+
+async def invalidate_notification_caches(user_ids: Iterable[Optional[int]]) -> None:
+    """
+    Invalide la liste complète et les listes des utilisateurs concernés, par tags
+    (None : notification globale, toutes les listes d'utilisateurs sont invalidées)
+    """
+    tags = {NOTIFICATIONS_CACHE_TAG} | {notification_list_tag(user_id) for user_id in user_ids}
+    await invalidate_tags(*sorted(tags))
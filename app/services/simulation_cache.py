@@ -0,0 +1,142 @@
+"""
+Cache des simulations d'achat woyofal (TrialCreditVendRequest)
+
+Une simulation est un aller-retour SOAP mTLS complet vers le serveur de
+vente ; dans l'application mobile, le même montant est souvent simulé
+plusieurs fois de suite pour le même compteur. Si SIMULATEUR_CACHE_ENABLED,
+le résultat parsé est gardé SIMULATEUR_CACHE_TTL secondes, par compteur,
+montant et jour tarifaire :
+- les demandes identiques simultanées ne font qu'un appel (cache_get_or_set),
+- seules les simulations réussies sont gardées,
+- un achat réel invalide les simulations du compteur (tranches, dette et
+  crédit changent) : la tâche périodique invalidate_simulations_from_sic
+  relève dans SIC les compteurs ayant un achat depuis le dernier passage.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.cache import CACHE_TAG_KEY, cache_get_or_set, cache_tag
+from app.config import CACHE_KEYS, SIMULATEUR_CACHE_ENABLED, SIMULATEUR_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Date du dernier achat SIC traité (reprise de la recherche au passage suivant)
+SIC_WATERMARK_KEY = "simulateur:sic_watermark"
+
+_stats = {"hits": 0, "misses": 0, "uncached": 0}
+
+
+class SimulationFailed(Exception):
+    """Simulation en échec : renvoyée à l'appelant sans être mise en cache"""
+
+    def __init__(self, result: Dict[str, Any]):
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+def simulation_cache_key(meter_no: str, amount: float, day: Optional[date] = None) -> str:
+    # Montant arrondi comme dans la requête SOAP (int(amount))
+    return CACHE_KEYS["SIMULATEUR_TRIAL"].format(meter=meter_no, amount=int(amount), day=(day or date.today()).isoformat())
+
+
+def simulation_cache_tag(meter_no: str) -> str:
+    return cache_tag("simulateur", meter=meter_no)
+
+
+async def cached_simulation(
+    meter_no: str,
+    amount: float,
+    simulate: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    (résultat, trouvé en cache) ; simulate() n'est appelé qu'en cas d'absence
+    (une fois pour toutes les demandes identiques en cours).
+    """
+    if not SIMULATEUR_CACHE_ENABLED:
+        return await simulate(), False
+
+    computed = False
+
+    async def compute() -> Dict[str, Any]:
+        nonlocal computed
+        computed = True
+        result = await simulate()
+        if not result.get("success"):
+            raise SimulationFailed(result)
+        return result
+
+    try:
+        result = await cache_get_or_set(
+            simulation_cache_key(meter_no, amount),
+            compute,
+            SIMULATEUR_CACHE_TTL,
+            tags=[simulation_cache_tag(meter_no)],
+        )
+    except SimulationFailed as e:
+        _stats["uncached"] += 1
+        return e.result, False
+
+    # Une demande qui a attendu le calcul d'une autre compte comme un succès de cache
+    _stats["misses" if computed else "hits"] += 1
+    return result, not computed
+
+
+def get_simulation_cache_stats() -> Dict[str, Any]:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "enabled": SIMULATEUR_CACHE_ENABLED,
+        "ttl_seconds": SIMULATEUR_CACHE_TTL,
+        **_stats,
+        "hit_rate_percent": round(_stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+    }
+
+
+# ── Invalidation par les achats réels (workers Celery, client Redis synchrone) ──
+
+def invalidate_meters_sync(client, meters: Iterable[str]) -> int:
+    """Supprime les simulations en cache des compteurs ; renvoie le nombre d'entrées supprimées"""
+    tag_keys = [CACHE_TAG_KEY.format(tag=simulation_cache_tag(meter)) for meter in meters]
+    if not tag_keys:
+        return 0
+    members = list(client.sunion(tag_keys))
+    pipe = client.pipeline(transaction=True)
+    if members:
+        pipe.delete(*members)
+    pipe.delete(*tag_keys)
+    pipe.execute()
+    return len(members)
+
+
+def invalidate_from_sic_purchases(
+    client,
+    fetch_purchases: Callable[[datetime], List[Dict[str, Any]]],
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Invalide les simulations des compteurs ayant un achat réel dans SIC depuis le
+    dernier passage.
+
+    Args:
+        client: Client Redis synchrone (app.cache.get_sync_redis)
+        fetch_purchases: since -> lignes (NUMERO_COMPTEUR, DERNIERE_TRANSACTION)
+                         des achats datés de since ou après (borne incluse : un
+                         achat validé plus tard avec le même horodatage que le
+                         filigrane n'est pas perdu ; réinvalider est sans effet)
+        now: Heure courante (tests)
+    """
+    watermark = client.get(SIC_WATERMARK_KEY)
+    if watermark:
+        since = datetime.fromisoformat(watermark)
+    else:
+        # Premier passage : une simulation en cache a au plus SIMULATEUR_CACHE_TTL secondes
+        since = (now or datetime.now()) - timedelta(seconds=SIMULATEUR_CACHE_TTL)
+
+    rows = fetch_purchases(since)
+    meters = {str(row["NUMERO_COMPTEUR"]).strip() for row in rows if row.get("NUMERO_COMPTEUR")}
+    invalidated = invalidate_meters_sync(client, meters)
+
+    # Filigrane pris dans les données SIC (pas d'écart d'horloge avec le serveur de base)
+    latest = max((row["DERNIERE_TRANSACTION"] for row in rows if row.get("DERNIERE_TRANSACTION")), default=since)
+    client.set(SIC_WATERMARK_KEY, latest.isoformat())
+    return {"meters": len(meters), "invalidated": invalidated, "since": since.isoformat(), "watermark": latest.isoformat()}
@@ -0,0 +1,166 @@
+"""
+Client SOAP persistant pour la passerelle Orange SMS Pro
+
+Construire un zeep.Client télécharge et analyse le WSDL : fait à chaque SMS,
+c'est l'essentiel du temps de l'appel. Le client est donc créé une seule fois
+par processus (au premier envoi), avec :
+- le WSDL en cache disque (SqliteCache, partagé entre processus et redémarrages),
+- une session HTTP dont le pool garde les connexions ouvertes,
+- des délais de connexion et d'opération bornés.
+
+zeep est synchrone : côté API, les envois passent par un pool de threads
+borné (send_async) pour ne pas bloquer la boucle asyncio. Les workers Celery
+appellent send directement.
+"""
+import ast
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from zeep import Client
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
+
+from app.config import SMS_POOL_SIZE, SMS_TIMEOUT, SMS_WSDL_CACHE_PATH, SMS_WSDL_CACHE_TTL, SMS_WSDL_URL
+
+logger = logging.getLogger(__name__)
+
+
+class SmsGatewayError(Exception):
+    """Réponse de la passerelle SMS illisible"""
+
+
+@dataclass
+class SmsResult:
+    raw: str
+    status_code: Optional[str]
+    status_text: Optional[str]
+
+    def as_response(self) -> Dict[str, Any]:
+        """Forme historique de la réponse de /sms/sendsms/"""
+        return {
+            "response": self.raw.replace("\\", ""),
+            "status_code": self.status_code,
+            "status_text": self.status_text,
+        }
+
+
+def parse_sms_response(raw: Any) -> Dict[str, Any]:
+    """
+    Document renvoyé par sendOneSMS : JSON, ou littéral Python (guillemets
+    simples) selon la version de la passerelle. Jamais évalué comme du code.
+    """
+    text = str(raw).strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        try:
+            data = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            raise SmsGatewayError(f"Réponse SMS illisible: {text[:200]}")
+    if not isinstance(data, dict):
+        raise SmsGatewayError(f"Réponse SMS inattendue: {text[:200]}")
+    return data
+
+
+def extract_sms_status(data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """(status_CODE, status_TEXT) de la première réponse, None si absente"""
+    responses = (data.get("responses") or {}).get("response") or []
+    if isinstance(responses, dict):
+        responses = [responses]
+    if not responses:
+        return None, None
+    status = responses[0].get("status") or {}
+    return status.get("status_CODE"), status.get("status_TEXT")
+
+
+class SmsGateway:
+    """Client zeep unique (créé au premier envoi) et pool de threads d'envoi"""
+
+    def __init__(
+        self,
+        wsdl_url: str = SMS_WSDL_URL,
+        cache_path: Optional[str] = SMS_WSDL_CACHE_PATH,
+        cache_ttl: int = SMS_WSDL_CACHE_TTL,
+        pool_size: int = SMS_POOL_SIZE,
+        timeout: float = SMS_TIMEOUT,
+        client_factory: Callable[..., Client] = Client,
+    ):
+        self.wsdl_url = wsdl_url
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._client_factory = client_factory
+        self._client: Optional[Client] = None
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _build_client(self) -> Client:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        cache = SqliteCache(path=self.cache_path, timeout=self.cache_ttl) if self.cache_path else None
+        transport = Transport(cache=cache, session=session, timeout=self.timeout, operation_timeout=self.timeout)
+        client = self._client_factory(self.wsdl_url, transport=transport)
+        self._session = session
+        logger.info(f"📨 Client SMS initialisé ({self.wsdl_url})")
+        return client
+
+    @property
+    def client(self) -> Client:
+        # En cas d'échec (WSDL injoignable) rien n'est gardé : le prochain envoi réessaie
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    def send(self, telephone: str, message: str) -> SmsResult:
+        """Envoi synchrone d'un SMS (sendOneSMS)"""
+        response = self.client.service.sendOneSMS(telephone, message)
+        raw = str(response)
+        status_code, status_text = extract_sms_status(parse_sms_response(raw))
+        return SmsResult(raw=raw, status_code=status_code, status_text=status_text)
+
+    async def send_async(self, telephone: str, message: str) -> SmsResult:
+        """Envoi hors de la boucle asyncio, au plus pool_size en parallèle"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sms")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.send, telephone, message)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        self._client = None
+
+
+_gateway: Optional[SmsGateway] = None
+
+
+def get_sms_gateway() -> SmsGateway:
+    """Passerelle SMS du processus"""
+    global _gateway
+    if _gateway is None:
+        _gateway = SmsGateway()
+    return _gateway
+
+
+def close_sms_gateway() -> None:
+    global _gateway
+    if _gateway is not None:
+        _gateway.close()
+        _gateway = None
@@ -0,0 +1,145 @@
+"""
+Exécution des requêtes pyodbc bloquantes hors de la boucle asyncio
+
+pyodbc est synchrone : un cursor.execute() dans une coroutine gèle toute la boucle
+uvicorn (WebSockets, lectures Redis...) le temps de l'aller-retour SQL Server.
+Chaque source dispose donc de son propre pool de threads borné, avec une limite
+de requêtes en attente et un délai maximal : au-delà, la requête est refusée
+immédiatement (SqlServerUnavailableError → 503) au lieu de s'empiler.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import pyodbc
+
+from app.services.sqlserver_pool import SqlServerPool, SqlServerUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturatedError(SqlServerUnavailableError):
+    """Trop de requêtes en attente pour cette source"""
+
+
+class ExecutorTimeoutError(SqlServerUnavailableError):
+    """La requête n'a pas abouti dans le délai imparti"""
+
+
+class SqlServerExecutor:
+    """Pool de threads borné exécutant des fonctions `fn(conn, *args)` avec une connexion poolée"""
+
+    def __init__(
+        self,
+        pool: SqlServerPool,
+        max_workers: int = 10,
+        max_queue: int = 50,
+        timeout: float = 30.0,
+    ):
+        """
+        Args:
+            pool: Pool de connexions de la source
+            max_workers: Nombre de threads (requêtes SQL simultanées)
+            max_queue: Nombre de requêtes pouvant attendre un thread libre
+            timeout: Délai maximal (secondes) d'une requête, attente comprise
+        """
+        self.pool = pool
+        self.name = pool.name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"sqlserver-{self.name}")
+
+        # Compteur partagé avec les threads (décrémenté à la fin réelle de la requête)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "max_pending": 0,
+            "latency_ms_total": 0.0,
+        }
+
+    def _call(self, fn: Callable[..., Any], args: tuple) -> Any:
+        try:
+            conn = self.pool.acquire()
+        except pyodbc.Error as e:
+            raise SqlServerUnavailableError(f"Connexion à '{self.name}' impossible: {e}") from e
+
+        discard = False
+        try:
+            # Délai côté serveur : la requête ne survit pas au timeout côté API
+            conn.timeout = int(self.timeout)
+            return fn(conn, *args)
+        except (pyodbc.OperationalError, pyodbc.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.pool.release(conn, discard=discard)
+
+    def _done(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Exécute `fn(conn, *args)` dans un thread de la source et attend son résultat.
+
+        Raises:
+            ExecutorSaturatedError: file d'attente pleine
+            ExecutorTimeoutError: délai dépassé
+            SqlServerUnavailableError: pool saturé ou connexion impossible
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise ExecutorSaturatedError(
+                    f"Source '{self.name}' saturée ({self._pending} requêtes en cours/en attente)"
+                )
+            self._pending += 1
+            self._stats["submitted"] += 1
+            self._stats["max_pending"] = max(self._stats["max_pending"], self._pending)
+
+        start = time.monotonic()
+        future = self._executor.submit(self._call, fn, args)
+        future.add_done_callback(self._done)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            logger.warning(f"Requête SQL Server '{self.name}' abandonnée après {self.timeout}s")
+            raise ExecutorTimeoutError(f"Source '{self.name}' : délai de {self.timeout}s dépassé")
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["latency_ms_total"] += (time.monotonic() - start) * 1000
+        return result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._pending
+        latency_total = stats.pop("latency_ms_total")
+        stats["avg_latency_ms"] = round(latency_total / stats["completed"], 2) if stats["completed"] else 0.0
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            "pending": pending,
+            **stats,
+        }
@@ -0,0 +1,241 @@
+"""
+Pool de connexions pyodbc pour les sources SQL Server externes (SIC, HISTH2MC, BI_ODS)
+
+Chaque source possède son propre pool borné. Les connexions sont vérifiées à la
+sortie du pool (SELECT 1 si inactives depuis un moment) et recyclées après
+`recycle_seconds` pour éviter les connexions coupées côté serveur / pare-feu.
+Le pool est thread-safe : il peut être utilisé depuis les threads d'exécution
+des requêtes bloquantes.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Tuple
+
+import pyodbc
+
+logger = logging.getLogger(__name__)
+
+
+class SqlServerUnavailableError(Exception):
+    """La source SQL Server ne peut pas servir la requête (saturation, délai, connexion impossible)"""
+
+
+class PoolTimeoutError(SqlServerUnavailableError):
+    """Aucune connexion disponible dans le délai imparti (pool saturé)"""
+
+
+class SqlServerPool:
+    """Pool borné de connexions pyodbc pour une source SQL Server"""
+
+    def __init__(
+        self,
+        name: str,
+        conn_str: str,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        recycle_seconds: int = 1800,
+        ping_idle_seconds: int = 30,
+    ):
+        """
+        Args:
+            name: Nom de la source (utilisé dans les logs et les statistiques)
+            conn_str: Chaîne de connexion ODBC
+            max_size: Nombre maximum de connexions ouvertes simultanément
+            timeout: Attente maximale (secondes) pour obtenir une connexion
+            recycle_seconds: Âge maximum d'une connexion avant fermeture
+            ping_idle_seconds: Inactivité au-delà de laquelle la connexion est testée avant usage
+        """
+        self.name = name
+        self._conn_str = conn_str
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle_seconds = recycle_seconds
+        self.ping_idle_seconds = ping_idle_seconds
+
+        # File des connexions libres : (connexion, créée_à, rendue_à)
+        self._idle: Deque[Tuple[pyodbc.Connection, float, float]] = deque()
+        # Date de création des connexions empruntées (clé = id de la connexion)
+        self._created_at: Dict[int, float] = {}
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_ms_total": 0.0,
+            "wait_time_ms_max": 0.0,
+            "timeouts": 0,
+            "connects": 0,
+            "connect_errors": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "discarded": 0,
+        }
+
+    # ── Cycle de vie des connexions ──────────────────────────────────────────
+
+    def _connect(self) -> pyodbc.Connection:
+        try:
+            conn = pyodbc.connect(self._conn_str)
+        except pyodbc.Error:
+            with self._cond:
+                self._stats["connect_errors"] += 1
+            raise
+        with self._cond:
+            self._stats["connects"] += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn: pyodbc.Connection) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn: pyodbc.Connection) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    # ── API publique ──────────────────────────────────────────────────────────
+
+    def acquire(self) -> pyodbc.Connection:
+        """
+        Emprunte une connexion au pool.
+
+        Raises:
+            PoolTimeoutError: si aucune connexion n'est libérée avant `timeout`
+            pyodbc.Error: si l'ouverture d'une nouvelle connexion échoue
+        """
+        start = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                    reuse = True
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    reuse = False
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Pool '{self.name}' saturé ({self.max_size} connexions) après {self.timeout}s"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_ms = (time.monotonic() - start) * 1000
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_ms_total"] += wait_ms
+                self._stats["wait_time_ms_max"] = max(self._stats["wait_time_ms_max"], wait_ms)
+
+        now = time.monotonic()
+        if reuse:
+            if now - created_at > self.recycle_seconds:
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats["recycled"] += 1
+                reuse = False
+            elif now - returned_at > self.ping_idle_seconds and not self._is_alive(conn):
+                logger.warning(f"Connexion SQL Server '{self.name}' morte détectée, reconnexion")
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                reuse = False
+
+        if not reuse:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._release_slot()
+                raise
+            created_at = now
+
+        with self._cond:
+            self._created_at[id(conn)] = created_at
+        return conn
+
+    def release(self, conn: pyodbc.Connection, discard: bool = False) -> None:
+        """Rend une connexion au pool (ou la ferme si `discard` ou si elle est inutilisable)"""
+        with self._cond:
+            created_at = self._created_at.pop(id(conn), time.monotonic())
+
+        if not discard:
+            try:
+                # Termine la transaction implicite ouverte par les SELECT
+                conn.rollback()
+            except pyodbc.Error:
+                discard = True
+
+        if discard:
+            self._close_quietly(conn)
+            with self._cond:
+                self._stats["discarded"] += 1
+            self._release_slot()
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[pyodbc.Connection]:
+        """Emprunte une connexion le temps du bloc `with`, puis la rend au pool"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (pyodbc.OperationalError, pyodbc.InterfaceError):
+            # Connexion potentiellement cassée : ne pas la remettre dans le pool
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self) -> None:
+        """Ferme toutes les connexions libres (à l'arrêt de l'application)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict:
+        """Statistiques instantanées du pool"""
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            size = self._size
+        waits = stats["waits"]
+        stats["avg_wait_time_ms"] = round(stats["wait_time_ms_total"] / waits, 2) if waits else 0.0
+        stats["wait_time_ms_total"] = round(stats["wait_time_ms_total"], 2)
+        stats["wait_time_ms_max"] = round(stats["wait_time_ms_max"], 2)
+        return {
+            "name": self.name,
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "checked_out": size - idle,
+            **stats,
+        }
@@ -0,0 +1,333 @@
+"""
+Backplane Redis pub/sub pour les WebSockets
+
+Chaque processus uvicorn (plusieurs par serveur, SRV-MOBAPP1/2) ne détient que
+ses propres sockets. Le backplane permet de joindre un utilisateur quel que soit
+le processus auquel il est connecté, y compris depuis un worker Celery :
+
+- chaque processus (nœud) s'abonne une fois à `ws:broadcast` et à son canal
+  `ws:node:{node_id}`, et remet les messages reçus à ses sockets locales ;
+- le registre de présence indique, pour chaque utilisateur, les nœuds où il a
+  des connexions (`ws:presence:user:{user_id}`), et pour chaque nœud le nombre
+  de connexions par utilisateur (`ws:presence:node:{node_id}`) ;
+- un battement de cœur (`ws:node:{node_id}:alive`, TTL) signale les nœuds
+  vivants : la présence d'un nœud arrêté brutalement expire d'elle-même.
+
+Un message destiné à des utilisateurs n'est publié que vers les nœuds qui les
+hébergent. Sans Redis, l'appelant retombe sur la remise locale.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from app.config import WS_BACKPLANE_ENABLED, WS_HEARTBEAT_INTERVAL, WS_PRESENCE_TTL
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHANNEL = "ws:broadcast"
+NODE_CHANNEL = "ws:node:{node_id}"
+NODE_ALIVE_KEY = "ws:node:{node_id}:alive"
+NODES_KEY = "ws:nodes"
+NODE_PRESENCE_KEY = "ws:presence:node:{node_id}"
+USER_PRESENCE_KEY = "ws:presence:user:{user_id}"
+
+
+def make_node_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def build_envelope(message: dict, user_ids: Optional[List[int]] = None) -> str:
+    """Message publié : sérialisé une fois, user_ids=None pour tous les connectés"""
+    return json.dumps({"user_ids": user_ids, "message": message}, default=str)
+
+
+def route_by_node(user_ids: Iterable[int], nodes_per_user: Iterable[Iterable[str]]) -> Dict[str, List[int]]:
+    """Regroupe les destinataires par nœud hébergeant au moins une de leurs connexions"""
+    routes: Dict[str, List[int]] = defaultdict(list)
+    for user_id, nodes in zip(user_ids, nodes_per_user):
+        for node in nodes or ():
+            routes[node].append(user_id)
+    return dict(routes)
+
+
+def build_notification_message(title: str, body: str, notification_id: int = None, event_id: int = None) -> dict:
+    """Message "new_notification" attendu par les clients mobiles"""
+    return {
+        "type": "new_notification",
+        "notification": {
+            "id": notification_id,
+            "title": title,
+            "body": body,
+            "event_id": event_id,
+            "created_at": datetime.utcnow().strftime("%d/%m/%Y %H:%M:%S")
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def publish_sync(client, message: dict, user_ids: Optional[List[int]] = None) -> int:
+    """
+    Publication depuis un contexte synchrone (workers Celery)
+
+    Args:
+        client: Client Redis synchrone (app.cache.get_sync_redis)
+        user_ids: Destinataires, None pour tous les utilisateurs connectés
+
+    Returns:
+        Nombre de nœuds ayant reçu le message
+    """
+    if user_ids is None:
+        return client.publish(BROADCAST_CHANNEL, build_envelope(message))
+
+    user_ids = list(user_ids)
+    pipe = client.pipeline()
+    for user_id in user_ids:
+        pipe.smembers(USER_PRESENCE_KEY.format(user_id=user_id))
+    routes = route_by_node(user_ids, pipe.execute())
+
+    delivered = 0
+    for node_id, node_users in routes.items():
+        if client.publish(NODE_CHANNEL.format(node_id=node_id), build_envelope(message, node_users)):
+            delivered += 1
+        else:
+            # Nœud arrêté : retirer sa présence obsolète
+            for user_id in node_users:
+                client.srem(USER_PRESENCE_KEY.format(user_id=user_id), node_id)
+    return delivered
+
+
+def notify_users_from_worker(user_ids: Optional[List[int]], title: str, body: str,
+                             notification_id: int = None, event_id: int = None) -> int:
+    """
+    Notification WebSocket depuis un worker Celery (sans boucle asyncio ni socket locale)
+
+    Args:
+        user_ids: Destinataires, None pour tous les utilisateurs connectés
+    """
+    from app.cache import get_sync_redis
+
+    try:
+        return publish_sync(get_sync_redis(), build_notification_message(title, body, notification_id, event_id), user_ids)
+    except Exception as e:
+        logger.warning(f"Notification WebSocket depuis le worker échouée: {e}")
+        return 0
+
+
+class WebSocketBackplane:
+    """Abonnement pub/sub et registre de présence d'un processus"""
+
+    def __init__(self, manager, node_id: Optional[str] = None):
+        """
+        Args:
+            manager: ConnectionManager local (remise aux sockets de ce processus)
+        """
+        self.manager = manager
+        self.node_id = node_id or make_node_id()
+        self.redis = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def active(self) -> bool:
+        return self.redis is not None
+
+    async def start(self, redis_client) -> None:
+        """Démarre l'écoute et le battement de cœur (au démarrage de l'application)"""
+        if not WS_BACKPLANE_ENABLED or self.active:
+            return
+        self.redis = redis_client
+        await self._heartbeat_once()
+        self._tasks = [
+            asyncio.create_task(self._listen(), name="ws-backplane-listen"),
+            asyncio.create_task(self._heartbeat(), name="ws-backplane-heartbeat"),
+        ]
+        logger.info(f"Backplane WebSocket démarré (nœud {self.node_id})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+        if self.redis is not None:
+            try:
+                await self._drop_node(self.node_id)
+            except Exception as e:
+                logger.warning(f"Nettoyage de la présence du nœud {self.node_id} échoué: {e}")
+        self.redis = None
+
+    # ── Présence ────────────────────────────────────────────────────────────
+
+    async def register(self, user_id: int) -> None:
+        """Une connexion de plus pour user_id sur ce nœud"""
+        if not self.active:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(NODE_PRESENCE_KEY.format(node_id=self.node_id), user_id, 1)
+            pipe.expire(NODE_PRESENCE_KEY.format(node_id=self.node_id), WS_PRESENCE_TTL)
+            pipe.sadd(USER_PRESENCE_KEY.format(user_id=user_id), self.node_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Présence WebSocket non enregistrée pour user {user_id}: {e}")
+
+    async def unregister(self, user_id: int) -> None:
+        """Une connexion de moins pour user_id sur ce nœud"""
+        if not self.active:
+            return
+        try:
+            key = NODE_PRESENCE_KEY.format(node_id=self.node_id)
+            remaining = await self.redis.hincrby(key, user_id, -1)
+            if remaining <= 0:
+                pipe = self.redis.pipeline()
+                pipe.hdel(key, user_id)
+                pipe.srem(USER_PRESENCE_KEY.format(user_id=user_id), self.node_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Présence WebSocket non retirée pour user {user_id}: {e}")
+
+    async def _heartbeat_once(self) -> None:
+        pipe = self.redis.pipeline()
+        pipe.set(NODE_ALIVE_KEY.format(node_id=self.node_id), 1, ex=WS_PRESENCE_TTL)
+        pipe.expire(NODE_PRESENCE_KEY.format(node_id=self.node_id), WS_PRESENCE_TTL)
+        pipe.sadd(NODES_KEY, self.node_id)
+        await pipe.execute()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+            try:
+                await self._heartbeat_once()
+            except Exception as e:
+                logger.warning(f"Battement de cœur du backplane échoué: {e}")
+
+    async def _drop_node(self, node_id: str) -> None:
+        """Supprime la présence d'un nœud (arrêt propre ou nœud expiré)"""
+        presence = await self.redis.hgetall(NODE_PRESENCE_KEY.format(node_id=node_id))
+        pipe = self.redis.pipeline()
+        for user_id in presence:
+            pipe.srem(USER_PRESENCE_KEY.format(user_id=user_id), node_id)
+        pipe.delete(NODE_PRESENCE_KEY.format(node_id=node_id), NODE_ALIVE_KEY.format(node_id=node_id))
+        pipe.srem(NODES_KEY, node_id)
+        await pipe.execute()
+
+    # ── Publication / réception ─────────────────────────────────────────────
+
+    async def publish(self, message: dict, user_ids: Optional[List[int]] = None) -> bool:
+        """
+        Publie vers les nœuds concernés
+
+        Returns:
+            False si le backplane est indisponible (l'appelant remet alors localement)
+        """
+        if not self.active:
+            return False
+        try:
+            if user_ids is None:
+                await self.redis.publish(BROADCAST_CHANNEL, build_envelope(message))
+                return True
+
+            user_ids = list(user_ids)
+            pipe = self.redis.pipeline()
+            for user_id in user_ids:
+                pipe.smembers(USER_PRESENCE_KEY.format(user_id=user_id))
+            routes = route_by_node(user_ids, await pipe.execute())
+            for node_id, node_users in routes.items():
+                receivers = await self.redis.publish(NODE_CHANNEL.format(node_id=node_id), build_envelope(message, node_users))
+                if not receivers:
+                    for user_id in node_users:
+                        await self.redis.srem(USER_PRESENCE_KEY.format(user_id=user_id), node_id)
+            return True
+        except Exception as e:
+            logger.warning(f"Publication backplane échouée, remise locale: {e}")
+            return False
+
+    async def dispatch(self, raw: str) -> None:
+        """
+        Remet un message reçu du backplane aux sockets locales
+
+        Une seule mise en file pour tous les destinataires de l'enveloppe, sans
+        attendre les envois : une socket lente ne retarde pas l'écoute (ni les
+        messages suivants du nœud), le rapport de remise est journalisé à part.
+        """
+        envelope = json.loads(raw)
+        self.manager.deliver_nowait(envelope["message"], envelope.get("user_ids"))
+
+    async def _listen(self) -> None:
+        """Écoute les canaux du nœud, avec reconnexion en cas de coupure Redis"""
+        channels = [BROADCAST_CHANNEL, NODE_CHANNEL.format(node_id=self.node_id)]
+        delay = 1
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(*channels)
+                delay = 1
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        await self.dispatch(item["data"])
+                    except Exception as e:
+                        logger.error(f"Message backplane non remis: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Abonnement backplane interrompu ({e}), nouvel essai dans {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    # ── Statut du cluster ───────────────────────────────────────────────────
+
+    async def cluster_status(self) -> Optional[Dict]:
+        """Connexions agrégées sur tous les nœuds vivants (None si indisponible)"""
+        if not self.active:
+            return None
+        try:
+            nodes = sorted(await self.redis.smembers(NODES_KEY))
+            pipe = self.redis.pipeline()
+            for node_id in nodes:
+                pipe.exists(NODE_ALIVE_KEY.format(node_id=node_id))
+                pipe.hgetall(NODE_PRESENCE_KEY.format(node_id=node_id))
+            results = await pipe.execute()
+
+            per_user: Dict[int, int] = defaultdict(int)
+            per_node: Dict[str, int] = {}
+            for node_id, alive, presence in zip(nodes, results[0::2], results[1::2]):
+                if not alive:
+                    await self._drop_node(node_id)
+                    continue
+                per_node[node_id] = sum(int(count) for count in presence.values())
+                for user_id, count in presence.items():
+                    per_user[int(user_id)] += int(count)
+
+            return {
+                "nodes": len(per_node),
+                "connections_per_node": per_node,
+                "total_connections": sum(per_user.values()),
+                "connected_users": len(per_user),
+                "connected_user_ids": sorted(per_user),
+                "connections_per_user": dict(per_user),
+            }
+        except Exception as e:
+            logger.warning(f"Statut cluster WebSocket indisponible: {e}")
+            return None
+
+    async def connected_user_ids(self) -> List[int]:
+        """Utilisateurs connectés sur l'ensemble du cluster (repli : ce processus)"""
+        status = await self.cluster_status()
+        if status is None:
+            return self.manager.get_connected_users()
+        return status["connected_user_ids"]
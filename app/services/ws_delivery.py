@@ -0,0 +1,180 @@
+"""
+Remise des messages WebSocket : file sortante bornée par connexion
+
+Auparavant un broadcast attendait chaque send_json l'un après l'autre : un
+client mobile lent bloquait tous ceux qui suivaient. Désormais :
+- le message est sérialisé une seule fois (même encodage que send_json) ;
+- chaque connexion a sa file sortante bornée et sa tâche d'écriture, avec un
+  délai maximal par envoi : les écritures se font en parallèle ;
+- file pleine (consommateur lent) : on abandonne le plus ancien message en
+  attente ("drop_oldest") ou on ferme la connexion ("disconnect") ;
+- chaque remise est suivie (DeliveryTracker) pour mesurer les latences
+  (p50/p95/p99) d'un broadcast.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DISCONNECT = "disconnect"
+
+# Code de fermeture WebSocket "Try Again Later"
+CLOSE_SLOW_CONSUMER = 1013
+
+
+def serialize_message(message: dict) -> str:
+    """Encodage identique à WebSocket.send_json de Starlette"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Percentile par rang le plus proche"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class DeliveryTracker:
+    """Suivi d'un envoi vers plusieurs connexions (latence, remis, abandonnés, échecs)"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.started = time.perf_counter()
+        self.latencies: List[float] = []
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self._done = asyncio.Event()
+        if expected == 0:
+            self._done.set()
+
+    def _settle(self) -> None:
+        if self.delivered + self.dropped + self.failed >= self.expected:
+            self._done.set()
+
+    def mark_delivered(self) -> None:
+        self.delivered += 1
+        self.latencies.append(time.perf_counter() - self.started)
+        self._settle()
+
+    def mark_dropped(self) -> None:
+        self.dropped += 1
+        self._settle()
+
+    def mark_failed(self) -> None:
+        self.failed += 1
+        self._settle()
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def report(self) -> Dict:
+        to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "recipients": self.expected,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self.expected - self.delivered - self.dropped - self.failed,
+            "p50_ms": to_ms(percentile(self.latencies, 50)),
+            "p95_ms": to_ms(percentile(self.latencies, 95)),
+            "p99_ms": to_ms(percentile(self.latencies, 99)),
+            "max_ms": to_ms(max(self.latencies) if self.latencies else None),
+        }
+
+
+class Outbox:
+    """File sortante bornée et tâche d'écriture d'une connexion WebSocket"""
+
+    def __init__(
+        self,
+        websocket,
+        on_failure: Callable[[], None],
+        max_queue: int = 100,
+        send_timeout: float = 5.0,
+        policy: str = POLICY_DROP_OLDEST,
+    ):
+        """
+        Args:
+            websocket: Connexion acceptée
+            on_failure: Appelé quand la connexion est abandonnée (échec, délai, consommateur lent)
+            max_queue: Messages en attente au maximum
+            send_timeout: Délai maximal d'un envoi (secondes)
+            policy: "drop_oldest" ou "disconnect" quand la file est pleine
+        """
+        self.websocket = websocket
+        self.on_failure = on_failure
+        self.send_timeout = send_timeout
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
+        self._task = asyncio.create_task(self._run())
+
+    def offer(self, text: str, tracker: DeliveryTracker) -> None:
+        """Met un message en file sans attendre (jamais bloquant pour l'appelant)"""
+        if self.closed:
+            tracker.mark_failed()
+            return
+        if self.queue.full():
+            if self.policy == POLICY_DISCONNECT:
+                tracker.mark_dropped()
+                self._abandon("file sortante pleine")
+                return
+            _, oldest_tracker = self.queue.get_nowait()
+            oldest_tracker.mark_dropped()
+            self.dropped += 1
+        self.queue.put_nowait((text, tracker))
+
+    async def _run(self) -> None:
+        while True:
+            text, tracker = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                tracker.mark_delivered()
+            except asyncio.CancelledError:
+                tracker.mark_failed()
+                raise
+            except Exception as e:
+                tracker.mark_failed()
+                self._abandon(f"envoi échoué: {e!r}")
+                return
+
+    def _abandon(self, reason: str) -> None:
+        """Connexion abandonnée : messages en attente en échec, fermeture et retrait du gestionnaire"""
+        if self.closed:
+            return
+        logger.warning(f"Connexion WebSocket abandonnée ({reason})")
+        self.close()
+        self.on_failure()
+        try:
+            asyncio.get_running_loop().create_task(self._close_socket())
+        except RuntimeError:
+            pass
+
+    async def _close_socket(self) -> None:
+        try:
+            await self.websocket.close(code=CLOSE_SLOW_CONSUMER)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """Arrête la tâche d'écriture (déconnexion)"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        while not self.queue.empty():
+            _, tracker = self.queue.get_nowait()
+            tracker.mark_failed()
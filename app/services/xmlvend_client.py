@@ -0,0 +1,345 @@
+"""
+Client XMLVend mTLS (PFX) réutilisable pour le simulateur
+
+Chaque appel construisait une session, déchiffrait le PFX, retéléchargeait
+le WSDL et résolvait l'endpoint avant l'unique POST SOAP. Ici :
+- le contexte SSL et le pool keep-alive sont construits une fois et partagés,
+- l'endpoint SOAP (WSDL → sanitize → fallback) est mis en cache XMLVEND_ENDPOINT_TTL secondes,
+- le PFX est relu si le fichier change (renouvellement du certificat sans redémarrage) ;
+  l'ancienne session n'est fermée qu'une fois ses requêtes en cours terminées,
+- les appels (bloquants, requests) passent par un pool de threads borné.
+"""
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Tuple
+from urllib.parse import urlparse, urlunparse
+from xml.etree import ElementTree as ET
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.ssl_ import create_urllib3_context
+
+from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, NoEncryption
+from cryptography.hazmat.primitives.serialization.pkcs12 import load_key_and_certificates
+
+from app.config import XMLVEND_ENDPOINT_TTL, XMLVEND_POOL_SIZE, XMLVEND_TIMEOUT, XMLVEND_WSDL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------
+# Adapter HTTPS : TLS1.2 + SECLEVEL=0 + PFX
+# -----------------------------------------------------------------------------
+class Pkcs12TLS12LegacyAdapter(HTTPAdapter):
+    __slots__ = ("_ssl_context",)
+
+    def __init__(self, pkcs12_filename: str, pkcs12_password: str, **kwargs):
+        self._ssl_context = self._build_ssl_context(pkcs12_filename, pkcs12_password)
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def _pfx_to_pems(pkcs12_filename: str, pkcs12_password: str) -> Tuple[bytes, bytes]:
+        """(chaîne de certificats, clé privée) du PFX, en PEM"""
+        with open(pkcs12_filename, "rb") as f:
+            pfx = f.read()
+        key, cert, add_certs = load_key_and_certificates(pfx, pkcs12_password.encode("utf-8"))
+        if cert is None or key is None:
+            raise RuntimeError("PFX invalide: certificat ou clé absents")
+        chain = cert.public_bytes(Encoding.PEM) + b"".join(c.public_bytes(Encoding.PEM) for c in add_certs or [])
+        return chain, key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+
+    @classmethod
+    def _build_ssl_context(cls, pkcs12_filename: str, pkcs12_password: str) -> ssl.SSLContext:
+        ctx = create_urllib3_context()
+        # Permettre TLS 1.0+ pour compatibilité avec les vieux serveurs XMLVend
+        if hasattr(ssl, "TLSVersion"):
+            try:
+                ctx.minimum_version = ssl.TLSVersion.TLSv1
+            except (AttributeError, ssl.SSLError):
+                # TLSv1 peut être désactivé à la compile — fallback TLS 1.2
+                ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+        # OpenSSL 3.0: autoriser la renégociation legacy (vieux serveurs Java/C++)
+        if hasattr(ssl, "OP_LEGACY_SERVER_CONNECT"):
+            ctx.options |= ssl.OP_LEGACY_SERVER_CONNECT
+        # Algorithmes très permissifs pour serveurs legacy
+        for ciphers in ("ALL:!NULL:!eNULL:@SECLEVEL=0", "DEFAULT:@SECLEVEL=0"):
+            try:
+                ctx.set_ciphers(ciphers)
+                break
+            except ssl.SSLError:
+                continue
+
+        # load_cert_chain n'accepte que des fichiers : PEM temporaires supprimés
+        # dès le chargement (le contexte garde la clé en mémoire)
+        chain, key = cls._pfx_to_pems(pkcs12_filename, pkcs12_password)
+        tmp_files = []
+        try:
+            for content in (chain, key):
+                fd, path = tempfile.mkstemp(suffix=".pem")
+                tmp_files.append(path)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+            ctx.load_cert_chain(certfile=tmp_files[0], keyfile=tmp_files[1])
+        finally:
+            for path in tmp_files:
+                Path(path).unlink(missing_ok=True)
+
+        # DEV: pas de vérif serveur; PROD: fournissez un CA bundle (session.verify=...).
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        return ctx
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        if "ssl_context" not in kwargs:
+            kwargs["ssl_context"] = self._ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
+
+# -----------------------------------------------------------------------------
+# Endpoint SOAP : WSDL → sanitize → fallback
+# -----------------------------------------------------------------------------
+def _extract_endpoint_from_wsdl(wsdl_xml: str) -> Optional[str]:
+    try:
+        ns = {
+            "wsdl": "http://schemas.xmlsoap.org/wsdl/",
+            "soap": "http://schemas.xmlsoap.org/wsdl/soap/",
+            "soap12": "http://schemas.xmlsoap.org/wsdl/soap12/",
+        }
+        root = ET.fromstring(wsdl_xml)
+        for addr in root.findall(".//wsdl:service/wsdl:port/soap:address", ns):
+            loc = addr.get("location")
+            if loc:
+                return loc
+        for addr in root.findall(".//wsdl:service/wsdl:port/soap12:address", ns):
+            loc = addr.get("location")
+            if loc:
+                return loc
+    except Exception:
+        pass
+    return None
+
+_PLACEHOLDER_TOKENS = ("manufacturer", "placeholder", "example", "changeme")
+
+def _is_resolvable(hostname: str) -> bool:
+    try:
+        socket.getaddrinfo(hostname, None)
+        return True
+    except Exception:
+        return False
+
+def _compute_fallback_endpoint(wsdl_url: str, endpoint_override: str = "") -> str:
+    """
+    Fallback robuste:
+    - si l'override (XMLVEND_ENDPOINT) est défini, on l'utilise,
+    - sinon: on prend schéma+netloc du WSDL et on force le path '/xmlvend'
+    """
+    if endpoint_override:
+        return endpoint_override
+    pu = urlparse(wsdl_url)
+    base = pu._replace(path="/xmlvend", params="", query="", fragment="")
+    return urlunparse(base)
+
+def _sanitize_endpoint(wsdl_endpoint: Optional[str], wsdl_url: str, endpoint_override: str = "") -> str:
+    """
+    Si le WSDL fournit un endpoint "clean" et résoluble → le garder.
+    Sinon → fallback (override XMLVEND_ENDPOINT, ou base du WSDL /xmlvend).
+    """
+    # 1) priorité à l'override si fourni
+    if endpoint_override:
+        return endpoint_override
+
+    if not wsdl_endpoint:
+        return _compute_fallback_endpoint(wsdl_url)
+
+    ep = urlparse(wsdl_endpoint)
+    host = (ep.hostname or "").lower()
+
+    # bloquer hosts manifestement placeholders ou non résolubles
+    if any(tok in host for tok in _PLACEHOLDER_TOKENS) or not _is_resolvable(host):
+        return _compute_fallback_endpoint(wsdl_url)
+
+    return wsdl_endpoint
+
+
+# -----------------------------------------------------------------------------
+# Client
+# -----------------------------------------------------------------------------
+class XmlVendClient:
+    """Session mTLS partagée, endpoint en cache et pool de threads d'appel"""
+
+    def __init__(
+        self,
+        wsdl_url: str,
+        pfx_path: Path,
+        pfx_password: str,
+        endpoint_override: str = "",
+        endpoint_ttl: float = XMLVEND_ENDPOINT_TTL,
+        pool_size: int = XMLVEND_POOL_SIZE,
+        timeout: float = XMLVEND_TIMEOUT,
+        wsdl_timeout: float = XMLVEND_WSDL_TIMEOUT,
+    ):
+        self.wsdl_url = wsdl_url
+        self.pfx_path = Path(pfx_path)
+        self.pfx_password = pfx_password
+        self.endpoint_override = endpoint_override
+        self.endpoint_ttl = endpoint_ttl
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.wsdl_timeout = wsdl_timeout
+
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._cert_signature: Optional[Tuple[int, int]] = None
+        self._endpoint: Optional[str] = None
+        self._endpoint_expires_at = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Requêtes en cours par session, et sessions remplacées à fermer quand elles sont libres
+        self._in_use: Dict[requests.Session, int] = {}
+        self._retired: Set[requests.Session] = set()
+        self._stats = {"sessions_built": 0, "cert_reloads": 0, "endpoint_resolutions": 0, "requests": 0}
+
+    def _read_cert_signature(self) -> Tuple[int, int]:
+        st = self.pfx_path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        session.verify = False  # PROD: mettre un CA bundle ici
+        session.mount("https://", Pkcs12TLS12LegacyAdapter(
+            pkcs12_filename=str(self.pfx_path),
+            pkcs12_password=self.pfx_password,
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+        ))
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """Session partagée ; reconstruite si le PFX a changé sur disque (un stat par appel)"""
+        if not self.pfx_path.exists():
+            raise FileNotFoundError(f"Client certificate not found: {self.pfx_path}")
+        signature = self._read_cert_signature()
+        if self._session is not None and signature == self._cert_signature:
+            return self._session
+        idle_previous = None
+        with self._lock:
+            if self._session is None or signature != self._cert_signature:
+                previous = self._session
+                self._session = self._build_session()
+                self._cert_signature = signature
+                self._stats["sessions_built"] += 1
+                if previous is not None:
+                    # Nouveau certificat : l'endpoint est aussi re-résolu avec la nouvelle identité
+                    self._stats["cert_reloads"] += 1
+                    self._endpoint = None
+                    # D'autres threads peuvent encore être dans post() avec l'ancienne session :
+                    # elle est fermée par le dernier d'entre eux
+                    if self._in_use.get(previous):
+                        self._retired.add(previous)
+                    else:
+                        idle_previous = previous
+                    logger.info(f"🔐 Certificat XMLVend rechargé ({self.pfx_path})")
+            session = self._session
+        if idle_previous is not None:
+            idle_previous.close()
+        return session
+
+    @contextmanager
+    def _borrow(self) -> Iterator[requests.Session]:
+        """Session courante, comptée comme utilisée jusqu'à la fin du bloc `with`"""
+        self.session  # recharge le certificat si besoin
+        with self._lock:
+            session = self._session
+            self._in_use[session] = self._in_use.get(session, 0) + 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                remaining = self._in_use.pop(session) - 1
+                if remaining:
+                    self._in_use[session] = remaining
+                drained = not remaining and session in self._retired
+                if drained:
+                    self._retired.discard(session)
+            if drained:
+                session.close()
+
+    def endpoint(self) -> str:
+        """Endpoint SOAP, résolu au plus une fois par endpoint_ttl secondes"""
+        if self.endpoint_override:
+            return self.endpoint_override
+        # Session d'abord : un certificat rechargé invalide l'endpoint en cache
+        with self._borrow() as session:
+            if self._endpoint is not None and time.monotonic() < self._endpoint_expires_at:
+                return self._endpoint
+            with self._lock:
+                if self._endpoint is None or time.monotonic() >= self._endpoint_expires_at:
+                    wsdl_resp = session.get(self.wsdl_url, timeout=self.wsdl_timeout)
+                    wsdl_resp.raise_for_status()
+                    endpoint_raw = _extract_endpoint_from_wsdl(wsdl_resp.text)
+                    self._endpoint = _sanitize_endpoint(endpoint_raw, self.wsdl_url, self.endpoint_override)
+                    self._endpoint_expires_at = time.monotonic() + self.endpoint_ttl
+                    self._stats["endpoint_resolutions"] += 1
+                    logger.info(f"SOAP endpoint selected: {self._endpoint}")
+                return self._endpoint
+
+    def invalidate_endpoint(self) -> None:
+        self._endpoint = None
+
+    def post(self, soap_xml: str, headers: Dict[str, str]) -> Tuple[requests.Response, str]:
+        """POST SOAP sur la connexion keep-alive ; (réponse, endpoint utilisé)"""
+        endpoint_url = self.endpoint()
+        self._stats["requests"] += 1
+        try:
+            with self._borrow() as session:
+                resp = session.post(endpoint_url, data=soap_xml, headers=headers, timeout=self.timeout)
+        except requests.ConnectionError:
+            # Endpoint peut-être déplacé : le prochain appel relit le WSDL
+            self.invalidate_endpoint()
+            raise
+        return resp, endpoint_url
+
+    async def post_async(self, soap_xml: str, headers: Dict[str, str]) -> Tuple[requests.Response, str]:
+        """post hors de la boucle asyncio, au plus pool_size en parallèle"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="xmlvend")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.post, soap_xml, headers)
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "endpoint": self.endpoint_override or self._endpoint,
+            "endpoint_expires_in": (
+                round(max(self._endpoint_expires_at - time.monotonic(), 0), 1)
+                if self._endpoint and not self.endpoint_override else None
+            ),
+            "pool_size": self.pool_size,
+            "retired_sessions": len(self._retired),
+        }
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        for session in self._retired:
+            session.close()
+        self._retired.clear()
+        self._cert_signature = None
+        self._endpoint = None
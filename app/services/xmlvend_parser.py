@@ -0,0 +1,516 @@
+"""
+Parsing des réponses XMLVend trialCreditVendResp
+
+Le parseur historique (xmltodict) construit tout l'envelope en dictionnaires
+imbriqués puis sonde des dizaines de clés "ns2:..."/"@attr" et parcourt la
+liste des transactions plusieurs fois. Ici l'envelope est analysé par lxml
+(une passe C) puis chaque niveau n'est parcouru qu'une fois : les enfants
+sont indexés par nom local et les transactions réparties par xsi:type en un
+seul passage.
+
+Le résultat a exactement le schéma historique (mêmes clés, même ordre,
+mêmes valeurs par défaut) ; parse_trial_credit_vend_xmltodict reste la
+référence utilisée par les tests d'équivalence et le benchmark
+(scripts/bench_xmlvend_parser.py).
+"""
+from typing import Any, Dict, List, Optional, TypedDict, Union
+
+import xmltodict
+from lxml import etree
+
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+
+# Réponses d'un serveur de confiance, mais jamais d'entités ni d'accès réseau
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True, encoding="utf-8")
+
+
+# -----------------------------------------------------------------------------
+# Schéma du résultat
+# -----------------------------------------------------------------------------
+class Amount(TypedDict):
+    value: float
+    currency: Optional[str]
+
+
+class Units(TypedDict):
+    value: float
+    unit: Optional[str]
+
+
+class Tariff(TypedDict):
+    name: Optional[str]
+
+
+class CreditStep(TypedDict):
+    step_begin: int
+    step_end: Optional[int]
+    price_per_unit: float
+    amount: Amount
+    units: Units
+
+
+class ServiceCharge(TypedDict):
+    type: str
+    account_no: Optional[str]
+    description: Optional[str]
+    amount: Amount
+    tariff: Tariff
+
+
+class DebtRecovery(TypedDict):
+    account_no: Optional[str]
+    description: Optional[str]
+    amount: Amount
+    balance: Amount
+    tariff: Tariff
+
+
+class TrialCreditVendResult(TypedDict, total=False):
+    success: bool
+    http_status: int
+    error: Optional[str]
+    device_info: Dict[str, Dict[str, Optional[str]]]
+    transaction_info: Dict[str, Optional[str]]
+    utility: Dict[str, Optional[str]]
+    vendor: Dict[str, Optional[str]]
+    client: Dict[str, Any]
+    meter: Dict[str, Any]               # si transaction CreditVendTx
+    purchase: Dict[str, Any]            # si transaction CreditVendTx
+    token: Dict[str, Optional[str]]     # si jeton STS émis
+    credit_steps: List[CreditStep]      # si détail des tranches
+    debt_recovery: DebtRecovery         # si transaction DebtRecoveryTx
+    service_charges: List[ServiceCharge]
+    transaction_totals: Dict[str, Amount]
+    raw: str                            # en cas d'erreur de parsing
+
+
+# -----------------------------------------------------------------------------
+# Accès aux éléments (sémantique de xmltodict : texte nettoyé, vide → None)
+# -----------------------------------------------------------------------------
+# Nom local de chaque tag rencontré ("{uri}meterDetail" → "meterDetail") : le
+# vocabulaire XMLVend est petit, la table se remplit aux premières réponses
+_LOCAL_NAMES: Dict[str, str] = {}
+
+
+def _local(tag: str) -> str:
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = _LOCAL_NAMES[tag] = tag[tag.rfind("}") + 1:]
+    return name
+
+
+def _children(element) -> Dict[str, Any]:
+    """Enfants indexés par nom local (le premier de chaque nom)"""
+    index: Dict[str, Any] = {}
+    local_names = _LOCAL_NAMES
+    for child in element:
+        tag = child.tag
+        name = local_names.get(tag)
+        if name is None:
+            name = _local(tag)
+        if name not in index:
+            index[name] = child
+    return index
+
+
+def _required(index: Dict[str, Any], name: str, key: str):
+    # KeyError nommée comme la clé xmltodict : message d'erreur inchangé
+    element = index.get(name)
+    if element is None:
+        raise KeyError(key)
+    return element
+
+
+def _required_attr(element, name: str) -> str:
+    value = element.get(name)
+    if value is None:
+        raise KeyError(f"@{name}")
+    return value
+
+
+def _text(element) -> Optional[str]:
+    if element is None:
+        return None
+    text = element.text
+    if text:
+        text = text.strip()
+    return text or None
+
+
+def _attr(element, name: str, default=None):
+    if element is None:
+        return default
+    return element.get(name, default)
+
+
+def _amount(element) -> Amount:
+    return {"value": float(_required_attr(element, "value")), "currency": _required_attr(element, "symbol")}
+
+
+def _optional_amount(element) -> Amount:
+    return {"value": float(_attr(element, "value", 0)), "currency": _attr(element, "symbol")}
+
+
+def _tariff(index: Dict[str, Any]) -> Tariff:
+    tariff = index.get("tariff")
+    return {"name": _text(_children(tariff).get("name")) if tariff is not None else None}
+
+
+# -----------------------------------------------------------------------------
+# Parseur
+# -----------------------------------------------------------------------------
+def _parse(xml_content: Union[str, bytes], request_date_time: str, unique_number: str, http_status: int) -> TrialCreditVendResult:
+    data = xml_content.encode("utf-8") if isinstance(xml_content, str) else xml_content
+    root = etree.fromstring(data, _PARSER)
+    if _local(root.tag) != "Envelope":
+        raise KeyError("SOAP-ENV:Envelope")
+    envelope = _required(_children(root), "Body", "SOAP-ENV:Body")
+    body = _children(_required(_children(envelope), "trialCreditVendResp", "ns3:trialCreditVendResp"))
+
+    client_id = body.get("clientID")
+    server_id = body.get("serverID")
+    terminal_id = body.get("terminalID")
+    utility = body.get("utility")
+    vendor = body.get("vendor")
+    receipt = _required(body, "creditVendReceipt", "ns3:creditVendReceipt")
+    cust = _required(body, "custVendDetail", "ns2:custVendDetail")
+    avail_credit = _required(_children(_required(body, "clientStatus", "ns2:clientStatus")), "availCredit", "ns2:availCredit")
+
+    result: TrialCreditVendResult = {
+        "success": http_status == 200,
+        "http_status": http_status,
+        "error": None,
+        "device_info": {
+            "client_id": {"ean": _attr(client_id, "ean"), "type": _attr(client_id, XSI_TYPE)},
+            "server_id": {"ean": _attr(server_id, "ean"), "type": _attr(server_id, XSI_TYPE)},
+            "terminal_id": {"id": _attr(terminal_id, "id"), "type": _attr(terminal_id, XSI_TYPE)},
+        },
+        "transaction_info": {
+            "response_date_time": _text(_required(body, "respDateTime", "ns2:respDateTime")),
+            "request_date_time": request_date_time,
+            "unique_number": unique_number,
+            "receipt_no": _required_attr(receipt, "receiptNo"),
+            "display_header": _text(body.get("dispHeader")),
+        },
+        "utility": {"name": _attr(utility, "name"), "address": _attr(utility, "address")},
+        "vendor": {"name": _attr(vendor, "name"), "address": _attr(vendor, "address")},
+        "client": {
+            "account_no": _required_attr(cust, "accNo"),
+            "name": _required_attr(cust, "name").strip(),
+            "address": _required_attr(cust, "address"),
+            "location_ref": _required_attr(cust, "locRef"),
+            "days_since_last_purchase": int(_required_attr(cust, "daysLastPurchase")),
+            "available_credit": {
+                "currency": _required_attr(avail_credit, "symbol"),
+                "value": float(_required_attr(avail_credit, "value")),
+            },
+        },
+    }
+
+    # Une passe sur les transactions : répartition par xsi:type, totaux au passage
+    transactions = _required(_children(receipt), "transactions", "ns3:transactions")
+    credit_tx = debt_recovery_tx = None
+    service_charges = []
+    totals: Dict[str, Any] = {}
+    has_tx = False
+    for element in transactions:
+        name = _local(element.tag)
+        if name != "tx":
+            totals.setdefault(name, element)
+            continue
+        has_tx = True
+        tx_type = _required_attr(element, XSI_TYPE)
+        if credit_tx is None and "CreditVendTx" in tx_type:
+            credit_tx = element
+        if debt_recovery_tx is None and "DebtRecoveryTx" in tx_type:
+            debt_recovery_tx = element
+        if "ServiceChrgTx" in tx_type:
+            service_charges.append(element)
+    if not has_tx:
+        raise KeyError("ns3:tx")
+
+    if credit_tx is not None:
+        credit = _children(credit_tx)
+        token_issue_element = _required(credit, "creditTokenIssue", "ns3:creditTokenIssue")
+        token_issue = _children(token_issue_element)
+        meter_detail = _required(token_issue, "meterDetail", "ns2:meterDetail")
+        meter = _children(meter_detail)
+        meter_type = meter.get("meterType")
+        result["meter"] = {
+            "number": _required_attr(meter_detail, "msno"),
+            "sgc": _required_attr(meter_detail, "sgc"),
+            "krn": _required_attr(meter_detail, "krn"),
+            "ti": _required_attr(meter_detail, "ti"),
+            "meter_type": {"at": _attr(meter_type, "at"), "tt": _attr(meter_type, "tt")},
+            "max_vend_amount": float(_text(_required(meter, "maxVendAmt", "ns2:maxVendAmt"))),
+            "min_vend_amount": float(_text(_required(meter, "minVendAmt", "ns2:minVendAmt"))),
+            "max_vend_energy": float(_text(_required(meter, "maxVendEng", "ns2:maxVendEng"))),
+            "min_vend_energy": float(_text(_required(meter, "minVendEng", "ns2:minVendEng"))),
+        }
+
+        units = _required(token_issue, "units", "ns2:units")
+        result["purchase"] = {
+            "receipt_no": credit_tx.get("receiptNo"),
+            "amount": _amount(_required(credit, "amt", "ns3:amt")),
+            "units": {"value": float(_required_attr(units, "value")), "unit": _required_attr(units, "siUnit")},
+            "tariff": _tariff(credit),
+            "resource_type": _attr(token_issue.get("resource"), XSI_TYPE),
+        }
+
+        # Jeton STS
+        token = token_issue.get("token")
+        if token is not None:
+            cipher = _children(token).get("stsCipher")
+            result["token"] = {
+                "type": token.get(XSI_TYPE),
+                "sts_cipher": _text(cipher) if cipher is not None else "",
+                "description": _text(token_issue.get("desc")),
+            }
+
+        # Détail des tranches tarifaires
+        credit_step = credit.get("creditStep")
+        if credit_step is not None:
+            steps = [s for s in credit_step if _local(s.tag) == "creditStepTx"]
+            if not steps:
+                raise KeyError("ns3:creditStepTx")
+            result["credit_steps"] = []
+            for step_element in steps:
+                step = _children(step_element)
+                step_end = _text(step.get("stepE"))
+                step_begin = _text(step.get("stepB"))
+                price = step.get("price")
+                result["credit_steps"].append({
+                    "step_begin": int(step_begin) if step_begin else 0,
+                    "step_end": int(step_end) if step_end else None,  # None : dernière tranche illimitée
+                    "price_per_unit": float(_text(price)) if price is not None else 0.0,
+                    "amount": _optional_amount(step.get("amt")),
+                    "units": {"value": float(_attr(step.get("units"), "value", 0)), "unit": _attr(step.get("units"), "siUnit")},
+                })
+
+    # Recouvrement de dette (avec le solde restant)
+    if debt_recovery_tx is not None:
+        debt = _children(debt_recovery_tx)
+        result["debt_recovery"] = {
+            "account_no": _text(debt.get("accNo")),
+            "description": _text(debt.get("accDesc")),
+            "amount": _amount(_required(debt, "amt", "ns3:amt")),
+            "balance": _optional_amount(debt.get("balance")),
+            "tariff": _tariff(debt),
+        }
+
+    result["service_charges"] = []
+    for tx in service_charges:
+        charge = _children(tx)
+        result["service_charges"].append({
+            "type": "ServiceCharge",
+            "account_no": _text(charge.get("accNo")),
+            "description": _text(charge.get("accDesc")),
+            "amount": _amount(_required(charge, "amt", "ns3:amt")),
+            "tariff": _tariff(charge),
+        })
+
+    result["transaction_totals"] = {
+        "less_round": _optional_amount(totals.get("lessRound")),
+        "tender_amount": _optional_amount(totals.get("tenderAmt")),
+        "change": _optional_amount(totals.get("change")),
+    }
+    return result
+
+
+def parse_trial_credit_vend_response(xml_content: Union[str, bytes], request_date_time: str, unique_number: str, http_status: int) -> TrialCreditVendResult:
+    try:
+        return _parse(xml_content, request_date_time, unique_number, http_status)
+    except Exception as e:
+        raw = xml_content.decode("utf-8", "replace") if isinstance(xml_content, bytes) else xml_content
+        return {"success": False, "http_status": http_status, "error": f"parse error: {e}", "raw": raw}
+
+
+# -----------------------------------------------------------------------------
+# Référence : parseur historique (xmltodict), pour les tests et le benchmark
+# -----------------------------------------------------------------------------
+def parse_trial_credit_vend_xmltodict(xml_content: str, request_date_time: str, unique_number: str, http_status: int) -> dict:
+    try:
+        parsed_xml = xmltodict.parse(xml_content)
+        body = parsed_xml["SOAP-ENV:Envelope"]["SOAP-ENV:Body"]["ns3:trialCreditVendResp"]
+        json_result = {
+            "success": http_status == 200,
+            "http_status": http_status,
+            "error": None,
+            "device_info": {
+                "client_id": {
+                    "ean": body.get("ns2:clientID", {}).get("@ean"),
+                    "type": body.get("ns2:clientID", {}).get("@xsi:type")
+                },
+                "server_id": {
+                    "ean": body.get("ns2:serverID", {}).get("@ean"),
+                    "type": body.get("ns2:serverID", {}).get("@xsi:type")
+                },
+                "terminal_id": {
+                    "id": body.get("ns2:terminalID", {}).get("@id"),
+                    "type": body.get("ns2:terminalID", {}).get("@xsi:type")
+                }
+            },
+            "transaction_info": {
+                "response_date_time": body["ns2:respDateTime"],
+                "request_date_time": request_date_time,
+                "unique_number": unique_number,
+                "receipt_no": body["ns3:creditVendReceipt"]["@receiptNo"],
+                "display_header": body.get("ns2:dispHeader")
+            },
+            "utility": {
+                "name": body.get("ns2:utility", {}).get("@name"),
+                "address": body.get("ns2:utility", {}).get("@address")
+            },
+            "vendor": {
+                "name": body.get("ns2:vendor", {}).get("@name"),
+                "address": body.get("ns2:vendor", {}).get("@address")
+            },
+            "client": {
+                "account_no": body["ns2:custVendDetail"]["@accNo"],
+                "name": body["ns2:custVendDetail"]["@name"].strip(),
+                "address": body["ns2:custVendDetail"]["@address"],
+                "location_ref": body["ns2:custVendDetail"]["@locRef"],
+                "days_since_last_purchase": int(body["ns2:custVendDetail"]["@daysLastPurchase"]),
+                "available_credit": {
+                    "currency": body["ns2:clientStatus"]["ns2:availCredit"]["@symbol"],
+                    "value": float(body["ns2:clientStatus"]["ns2:availCredit"]["@value"])
+                }
+            }
+        }
+
+        # Extract transaction list
+        tx_list = body["ns3:creditVendReceipt"]["ns3:transactions"]["ns3:tx"]
+        if isinstance(tx_list, dict):
+            tx_list = [tx_list]  # Force list if single element
+
+        # Find different transaction types
+        credit_tx = next((tx for tx in tx_list if "CreditVendTx" in tx["@xsi:type"]), None)
+        debt_recovery_tx = next((tx for tx in tx_list if "DebtRecoveryTx" in tx["@xsi:type"]), None)
+        service_charges = [tx for tx in tx_list if "ServiceChrgTx" in tx["@xsi:type"]]
+
+        # Extract meter and purchase details
+        if credit_tx:
+            meter_detail = credit_tx["ns3:creditTokenIssue"]["ns2:meterDetail"]
+            json_result["meter"] = {
+                "number": meter_detail["@msno"],
+                "sgc": meter_detail["@sgc"],
+                "krn": meter_detail["@krn"],
+                "ti": meter_detail["@ti"],
+                "meter_type": {
+                    "at": meter_detail.get("ns2:meterType", {}).get("@at"),
+                    "tt": meter_detail.get("ns2:meterType", {}).get("@tt")
+                },
+                "max_vend_amount": float(meter_detail["ns2:maxVendAmt"]),
+                "min_vend_amount": float(meter_detail["ns2:minVendAmt"]),
+                "max_vend_energy": float(meter_detail["ns2:maxVendEng"]),
+                "min_vend_energy": float(meter_detail["ns2:minVendEng"])
+            }
+
+            units = credit_tx["ns3:creditTokenIssue"]["ns2:units"]
+            json_result["purchase"] = {
+                "receipt_no": credit_tx.get("@receiptNo"),
+                "amount": {
+                    "value": float(credit_tx["ns3:amt"]["@value"]),
+                    "currency": credit_tx["ns3:amt"]["@symbol"]
+                },
+                "units": {
+                    "value": float(units["@value"]),
+                    "unit": units["@siUnit"]
+                },
+                "tariff": {
+                    "name": credit_tx.get("ns3:tariff", {}).get("ns2:name")
+                },
+                "resource_type": credit_tx["ns3:creditTokenIssue"].get("ns2:resource", {}).get("@xsi:type")
+            }
+
+            # Extract STS token (the real token!)
+            token_issue = credit_tx["ns3:creditTokenIssue"]
+            if "ns2:token" in token_issue:
+                token = token_issue["ns2:token"]
+                json_result["token"] = {
+                    "type": token.get("@xsi:type"),
+                    "sts_cipher": token.get("ns2:stsCipher", ""),
+                    "description": token_issue.get("ns2:desc")
+                }
+
+            # Extract credit steps (tariff breakdown)
+            if "ns3:creditStep" in credit_tx:
+                json_result["credit_steps"] = []
+                steps = credit_tx["ns3:creditStep"]["ns3:creditStepTx"]
+                if isinstance(steps, dict):
+                    steps = [steps]
+                for step in steps:
+                    # Handle empty/None values for stepE (can be empty for last step)
+                    step_end_value = step.get("ns2:stepE")
+                    step_end = None if not step_end_value or step_end_value == "" else int(step_end_value)
+
+                    step_begin_value = step.get("ns2:stepB", 0)
+                    step_begin = 0 if not step_begin_value or step_begin_value == "" else int(step_begin_value)
+
+                    json_result["credit_steps"].append({
+                        "step_begin": step_begin,
+                        "step_end": step_end,  # Can be None for unlimited last step
+                        "price_per_unit": float(step.get("ns2:price", 0)),
+                        "amount": {
+                            "value": float(step.get("ns2:amt", {}).get("@value", 0)),
+                            "currency": step.get("ns2:amt", {}).get("@symbol")
+                        },
+                        "units": {
+                            "value": float(step.get("ns2:units", {}).get("@value", 0)),
+                            "unit": step.get("ns2:units", {}).get("@siUnit")
+                        }
+                    })
+
+        # Extract debt recovery (includes BALANCE!)
+        if debt_recovery_tx:
+            json_result["debt_recovery"] = {
+                "account_no": debt_recovery_tx.get("ns3:accNo"),
+                "description": debt_recovery_tx.get("ns3:accDesc"),
+                "amount": {
+                    "value": float(debt_recovery_tx["ns3:amt"]["@value"]),
+                    "currency": debt_recovery_tx["ns3:amt"]["@symbol"]
+                },
+                "balance": {
+                    "value": float(debt_recovery_tx.get("ns3:balance", {}).get("@value", 0)),
+                    "currency": debt_recovery_tx.get("ns3:balance", {}).get("@symbol")
+                },
+                "tariff": {
+                    "name": debt_recovery_tx.get("ns3:tariff", {}).get("ns2:name")
+                }
+            }
+
+        # Extract service charges
+        json_result["service_charges"] = []
+        for tx in service_charges:
+            json_result["service_charges"].append({
+                "type": "ServiceCharge",
+                "account_no": tx.get("ns3:accNo"),
+                "description": tx.get("ns3:accDesc"),
+                "amount": {
+                    "value": float(tx["ns3:amt"]["@value"]),
+                    "currency": tx["ns3:amt"]["@symbol"]
+                },
+                "tariff": {
+                    "name": tx.get("ns3:tariff", {}).get("ns2:name")
+                }
+            })
+
+        # Extract transaction totals
+        transactions = body["ns3:creditVendReceipt"]["ns3:transactions"]
+        json_result["transaction_totals"] = {
+            "less_round": {
+                "value": float(transactions.get("ns3:lessRound", {}).get("@value", 0)),
+                "currency": transactions.get("ns3:lessRound", {}).get("@symbol")
+            },
+            "tender_amount": {
+                "value": float(transactions.get("ns3:tenderAmt", {}).get("@value", 0)),
+                "currency": transactions.get("ns3:tenderAmt", {}).get("@symbol")
+            },
+            "change": {
+                "value": float(transactions.get("ns3:change", {}).get("@value", 0)),
+                "currency": transactions.get("ns3:change", {}).get("@symbol")
+            }
+        }
+        return json_result
+    except Exception as e:
+        return {"success": False, "http_status": http_status, "error": f"parse error: {e}", "raw": xml_content}
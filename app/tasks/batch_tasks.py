@@ -1,5 +1,18 @@
 from app.celery_app import celery_app
 from app.firebase import send_batch_pushNotifications
+from app.cache import get_sync_redis
+from app.services.broadcast_scheduler import (
+    AdaptiveBroadcastScheduler,
+    WavePlan,
+    read_counters,
+    record_all_scheduled,
+    record_chunk_done,
+    record_scheduled,
+    start_progress,
+)
+from app.services.fcm_token_service import deactivate_fcm_tokens, record_pruning_metrics
+from app.services.ws_backplane import notify_users_from_worker
+from itertools import islice
 from typing import List, Dict, Any
 import logging
 from datetime import datetime
@@ -19,9 +32,11 @@ def send_batch_notifications(self, batch_data: Dict[str, Any]):
         batch_data: {
             "notifications": [{"token": "...", "title": "...", "body": "...", "user_id": 123}],
             "batch_id": "batch_123",
-            "priority": 5
+            "priority": 5,
+            "broadcast_id": "..."   # optionnel : progression du broadcast parent
         }
     """
+    broadcast_id = batch_data.get("broadcast_id")
     try:
         notifications = batch_data.get("notifications", [])
         batch_id = batch_data.get("batch_id", f"batch_{datetime.utcnow().timestamp()}")
@@ -37,16 +52,30 @@ def send_batch_notifications(self, batch_data: Dict[str, Any]):
 
         logger.info(f"✅ Batch {batch_id} terminé: {result['success_count']} succès, {result['failure_count']} échecs")
 
+        if broadcast_id:
+            _record_progress(
+                record_chunk_done, broadcast_id,
+                result["success_count"], result["failure_count"], result.get("throttled_count", 0)
+            )
+
+        # Hygiène : désactivation groupée des tokens signalés morts par FCM
+        dead_tokens = result.get("dead_tokens") or {}
+        sessions_deactivated = _prune_dead_tokens(batch_id, dead_tokens) if dead_tokens else 0
+
         return {
             "status": "completed",
             "batch_id": batch_id,
             "total_notifications": len(notifications),
             "success_count": result["success_count"],
-            "failure_count": result["failure_count"]
+            "failure_count": result["failure_count"],
+            "dead_tokens": len(dead_tokens),
+            "sessions_deactivated": sessions_deactivated
         }
 
     except Exception as e:
         logger.error(f"❌ Erreur traitement batch: {e}")
+        if broadcast_id:
+            _record_progress(record_chunk_done, broadcast_id, 0, len(batch_data.get("notifications", [])), 0)
         raise
 
 @celery_app.task(
@@ -55,17 +84,33 @@ def send_batch_notifications(self, batch_data: Dict[str, Any]):
 )
 def send_broadcast_notifications(self, broadcast_data: Dict[str, Any]):
     """
-    Diffusion massive (10K+ utilisateurs) avec chunking intelligent
-    
+    Diffusion massive (10K+ utilisateurs) avec chunking adaptatif
+
+    Les chunks sont publiés par vagues : la taille des chunks et le délai entre
+    vagues suivent les 429 FCM, le taux de succès et la profondeur de la file
+    (AdaptiveBroadcastScheduler). La progression est suivie dans Redis sous
+    l'id de la première tâche (voir /notifications/tasks/{task_id}/status).
+
     Args:
-        broadcast_data: {
+        broadcast_data: descripteur publié par les routes (voir build_broadcast_descriptor) :
+        {
             "title": "Titre broadcast",
             "body": "Message broadcast",
+            "audience": {"type": "all_users"},
+            "page_size": 500
+        }
+        ou, pour les petits envois (agence), la liste explicite des destinataires :
+        {
+            "title": "...", "body": "...",
             "user_tokens": [{"user_id": 1, "tokens": ["token1", "token2"]}],
             "chunk_size": 100
         }
     """
     try:
+        if "audience" in broadcast_data:
+            return _broadcast_wave(self.request.id, broadcast_data)
+
+        broadcast_id = self.request.id
         user_tokens = broadcast_data.get("user_tokens", [])
         chunk_size = broadcast_data.get("chunk_size", 100)
         title = broadcast_data["title"]
@@ -78,6 +123,11 @@ def send_broadcast_notifications(self, broadcast_data: Dict[str, Any]):
             user_tokens[i:i + chunk_size] 
             for i in range(0, len(user_tokens), chunk_size)
         ]
+
+        # Liste connue d'avance : un seul plan, espacement par vagues selon la file
+        scheduler = AdaptiveBroadcastScheduler()
+        plan = scheduler.plan(chunk_size, 0, 0, 0, 0, _queue_depth("low_priority"))
+        _record_progress(start_progress, broadcast_id, sum(len(u.get("tokens", [])) for u in user_tokens))
         
         batch_jobs = []
         for idx, chunk in enumerate(chunks):
@@ -94,22 +144,15 @@ def send_broadcast_notifications(self, broadcast_data: Dict[str, Any]):
                         })
             
             if chunk_notifications:
-                # Délai progressif pour étaler la charge
-                delay_seconds = idx * 10  # 10s entre chaque chunk
-                
-                batch_job = send_batch_notifications.apply_async(
-                    args=[{
-                        "notifications": chunk_notifications,
-                        "batch_id": f"broadcast_chunk_{idx}",
-                        "priority": 3
-                    }],
-                    countdown=delay_seconds,
-                    queue="low_priority"
-                )
-                batch_jobs.append(batch_job.id)
+                delay_seconds = (idx // scheduler.wave_chunks) * plan.delay
+                batch_jobs.append(_schedule_chunk(
+                    chunk_notifications, broadcast_id, f"broadcast_chunk_{idx}", delay_seconds, chunk_size
+                ))
+        _record_progress(record_all_scheduled, broadcast_id)
         
         return {
             "status": "scheduled",
+            "broadcast_id": broadcast_id,
             "total_chunks": len(chunks),
             "total_users": len(user_tokens),
             "batch_job_ids": batch_jobs
@@ -119,6 +162,144 @@ def send_broadcast_notifications(self, broadcast_data: Dict[str, Any]):
         logger.error(f"❌ Erreur broadcast: {e}")
         raise
 
+def _prune_dead_tokens(batch_id: str, dead_tokens: Dict[str, str]) -> int:
+    """Un seul UPDATE pour les tokens morts du chunk, puis métriques (best effort)"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        deactivated = deactivate_fcm_tokens(db, dead_tokens.keys())
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ Désactivation des tokens morts échouée (batch {batch_id}): {e}")
+        return 0
+    finally:
+        db.close()
+
+    logger.info(f"🗑️ Batch {batch_id}: {len(dead_tokens)} tokens morts, {deactivated} sessions désactivées")
+    try:
+        record_pruning_metrics(get_sync_redis(), dead_tokens, deactivated)
+    except Exception as e:
+        logger.warning(f"⚠️ Métriques d'hygiène FCM non enregistrées: {e}")
+    return deactivated
+
+def _record_progress(fn, broadcast_id: str, *args) -> None:
+    """Mise à jour de la progression Redis (best effort : ne bloque jamais l'envoi)"""
+    try:
+        fn(get_sync_redis(), broadcast_id, *args)
+    except Exception as e:
+        logger.warning(f"⚠️ Progression broadcast {broadcast_id} non enregistrée: {e}")
+
+def _queue_depth(queue: str) -> int:
+    """Messages en attente dans une file Celery (0 si le broker ne répond pas)"""
+    try:
+        with celery_app.connection_or_acquire() as conn:
+            return conn.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception as e:
+        logger.warning(f"⚠️ Profondeur de la file {queue} indisponible: {e}")
+        return 0
+
+def _schedule_chunk(chunk_notifications: List[Dict], broadcast_id: str, batch_id: str,
+                    delay_seconds: float, chunk_size: int) -> str:
+    """Publie un chunk vers send_batch_notifications et retourne l'id de la tâche"""
+    batch_job = send_batch_notifications.apply_async(
+        args=[{
+            "notifications": chunk_notifications,
+            "batch_id": batch_id,
+            "priority": 3,
+            "broadcast_id": broadcast_id
+        }],
+        countdown=delay_seconds,
+        queue="low_priority"
+    )
+    _record_progress(record_scheduled, broadcast_id, len(chunk_notifications), chunk_size, delay_seconds)
+    return batch_job.id
+
+def _broadcast_wave(task_id: str, broadcast_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Publie une vague de chunks (pagination keyset sur user_session) puis se reprogramme
+    avec le curseur et l'état de l'ordonnanceur. Seule la vague courante est en mémoire.
+    """
+    from app.database import SessionLocal
+    from app.services.broadcast_service import AUDIENCE_ALL_USERS, count_recipients, iter_recipient_pages
+
+    audience = broadcast_data["audience"]
+    title = broadcast_data["title"]
+    body = broadcast_data["body"]
+    broadcast_id = broadcast_data.get("broadcast_id") or task_id
+    state = broadcast_data.get("state")
+    scheduler = AdaptiveBroadcastScheduler()
+
+    db = SessionLocal()
+    try:
+        if state is None:
+            # Première vague : initialisation de la progression
+            _record_progress(start_progress, broadcast_id, count_recipients(db, audience))
+            chunk_size = min(scheduler.max_chunk, max(scheduler.min_chunk, broadcast_data.get("page_size", scheduler.min_chunk)))
+            plan = WavePlan(chunk_size=chunk_size, chunks=scheduler.wave_chunks, delay=scheduler.base_interval, reason="initial")
+            state = {"cursor": 0, "wave": 0, "chunk_index": 0, "observed": {"sent": 0, "failed": 0, "throttled": 0}}
+            logger.info(f"📡 Broadcast {broadcast_id} vers l'audience {audience.get('type')}")
+            if audience.get("type") == AUDIENCE_ALL_USERS:
+                # Notification globale : poussée une fois à tous les connectés, tous processus
+                # confondus (all_agences : la route notifie déjà les connectés des agences)
+                notify_users_from_worker(
+                    None, title, body, broadcast_data.get("notification_id"), broadcast_data.get("event_id")
+                )
+        else:
+            try:
+                counters = read_counters(get_sync_redis(), broadcast_id)
+            except Exception:
+                counters = state["observed"]
+            plan = scheduler.plan(
+                state["chunk_size"], state["delay"],
+                sent=counters["sent"] - state["observed"]["sent"],
+                failed=counters["failed"] - state["observed"]["failed"],
+                throttled=counters["throttled"] - state["observed"]["throttled"],
+                queue_depth=_queue_depth("low_priority"),
+            )
+            state["observed"] = counters
+
+        pages = list(islice(iter_recipient_pages(db, audience, plan.chunk_size, after_id=state["cursor"]), plan.chunks))
+    finally:
+        db.close()
+
+    batch_jobs = []
+    for page in pages:
+        chunk_notifications = [
+            {"token": r["token"], "title": title, "body": body, "user_id": r["user_id"]}
+            for r in page
+        ]
+        batch_jobs.append(_schedule_chunk(
+            chunk_notifications, broadcast_id, f"broadcast_{broadcast_id}_chunk_{state['chunk_index']}", 0, plan.chunk_size
+        ))
+        state["chunk_index"] += 1
+        state["cursor"] = page[-1]["session_id"]
+
+    # Plus de destinataires si la vague n'a pas été remplie
+    finished = len(pages) < plan.chunks or len(pages[-1]) < plan.chunk_size
+    if finished:
+        _record_progress(record_all_scheduled, broadcast_id)
+        logger.info(f"📡 Broadcast {broadcast_id}: {state['chunk_index']} chunks publiés")
+    else:
+        state.update(wave=state["wave"] + 1, chunk_size=plan.chunk_size, delay=plan.delay)
+        send_broadcast_notifications.apply_async(
+            args=[{**broadcast_data, "broadcast_id": broadcast_id, "state": state}],
+            countdown=plan.delay,
+            queue="low_priority"
+        )
+
+    return {
+        "status": "scheduled" if finished else "scheduling",
+        "broadcast_id": broadcast_id,
+        "audience": audience,
+        "wave": state["wave"],
+        "chunks_in_wave": len(pages),
+        "chunk_size": plan.chunk_size,
+        "next_wave_in": None if finished else plan.delay,
+        "reason": plan.reason,
+        "batch_job_ids": batch_jobs
+    }
+
 @celery_app.task(name="batch_summary_callback")
 def batch_summary_callback(results: List[Dict], batch_id: str):
     """Callback exécuté après completion d'un batch"""
@@ -0,0 +1,27 @@
+from app.celery_app import celery_app
+from app.database import SessionLocal
+from app.services.dashboard_service import reconcile_dashboard_counters
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    bind=True,
+    name="reconcile_dashboard_counters"
+)
+def reconcile_dashboard_counters_task(self):
+    """
+    Recalcul périodique des compteurs du dashboard depuis user_compteur
+    Corrige toute dérive des deltas appliqués par les routes (écriture hors API, échec partiel...)
+    """
+    db = SessionLocal()
+    try:
+        result = reconcile_dashboard_counters(db)
+        logger.info(f"📊 Compteurs dashboard recalculés: {result['scopes']} périmètres, {result['drifted']} corrigés")
+        return {"status": "completed", **result}
+    except Exception as e:
+        logger.error(f"❌ Erreur recalcul compteurs dashboard: {e}")
+        raise
+    finally:
+        db.close()
@@ -4,8 +4,8 @@ from app.celery_app import celery_app
 from app.firebase import send_pushNotification
 from app.schemas.notification_schemas import PushNotification
 from app.database import get_db_samaconso
-from app.models.models import UserSession, Notification
-from sqlalchemy import and_
+from app.models.models import Notification
+from app.services.fcm_token_service import deactivate_fcm_tokens
 import asyncio
 import logging
 from datetime import datetime
@@ -145,20 +145,10 @@ def _update_notification_status(notification_id: int, status: str, task_id: str)
         logger.error(f"❌ Erreur mise à jour statut notification: {e}")
 
 def _mark_token_invalid(user_id: int, invalid_token: str):
-    """Marquer un token FCM comme invalide"""
+    """Marquer un token FCM comme invalide (même UPDATE groupé que le chemin batch)"""
     try:
         with next(get_db_samaconso()) as db:
-            session = db.query(UserSession).filter(
-                and_(
-                    UserSession.user_id == user_id,
-                    UserSession.fcm_token == invalid_token
-                )
-            ).first()
-            
-            if session:
-                session.is_active = False
-                # session.invalidated_at = datetime.utcnow()
-                db.commit()
+            if deactivate_fcm_tokens(db, [invalid_token]):
                 logger.info(f"🗑️ Token marqué comme invalide pour user {user_id}")
                 
     except Exception as e:
@@ -0,0 +1,32 @@
+from app.celery_app import celery_app
+from app.cache import get_sync_redis
+from app.database import fetch_all, sqlserver_pools
+from app.queries import woyofalPurchasesSinceQuery
+from app.services.simulation_cache import invalidate_from_sic_purchases
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch_sic_purchases(since):
+    with sqlserver_pools["sic"].connection() as conn:
+        return fetch_all(conn, woyofalPurchasesSinceQuery, (since,))
+
+
+@celery_app.task(
+    bind=True,
+    name="invalidate_simulations_from_sic"
+)
+def invalidate_simulations_from_sic_task(self):
+    """
+    Invalide les simulations d'achat en cache des compteurs ayant un achat réel
+    dans SIC depuis le passage précédent (tranches, dette et crédit ont changé)
+    """
+    try:
+        result = invalidate_from_sic_purchases(get_sync_redis(), _fetch_sic_purchases)
+        if result["meters"]:
+            logger.info(f"🧮 Simulations invalidées: {result['meters']} compteurs, {result['invalidated']} entrées")
+        return {"status": "completed", **result}
+    except Exception as e:
+        logger.error(f"❌ Erreur invalidation des simulations depuis SIC: {e}")
+        raise
@@ -0,0 +1,50 @@
+from app.celery_app import celery_app
+from app.config import SMS_RATE_LIMIT
+from app.services.sms_gateway import get_sms_gateway
+import logging
+from typing import Dict, List
+
+import requests
+from zeep.exceptions import TransportError
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    bind=True,
+    autoretry_for=(requests.RequestException, TransportError),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 3},
+    rate_limit=SMS_RATE_LIMIT,
+    name="send_sms"
+)
+def send_sms(self, telephone: str, message: str):
+    """
+    Envoi d'un SMS en file (OTP, envois groupés)
+
+    rate_limit borne le débit par worker : une rafale d'OTP est lissée dans la
+    file au lieu d'arriver d'un coup sur la passerelle. Les erreurs réseau sont
+    réessayées avec backoff, une réponse illisible ne l'est pas.
+    """
+    result = get_sms_gateway().send(telephone, message)
+    logger.info(f"📨 SMS {telephone}: {result.status_code} {result.status_text}")
+    return {"telephone": telephone, "status_code": result.status_code, "status_text": result.status_text}
+
+
+@celery_app.task(
+    bind=True,
+    name="send_bulk_sms"
+)
+def send_bulk_sms(self, messages: List[Dict[str, str]]):
+    """
+    Répartit un envoi groupé en tâches send_sms (une par destinataire)
+
+    Args:
+        messages: [{"telephone": "77...", "message": "..."}]
+    """
+    task_ids = [
+        send_sms.apply_async(args=[m["telephone"], m["message"]]).id
+        for m in messages
+    ]
+    logger.info(f"📨 Envoi groupé: {len(task_ids)} SMS en file")
+    return {"status": "queued", "queued": len(task_ids), "task_ids": task_ids}
@@ -0,0 +1,60 @@
+"""
+Micro-benchmark du parsing des réponses XMLVend (trialCreditVendResp)
+
+Compare, sur les réponses enregistrées de tests/fixtures/xmlvend, le parseur
+lxml en une passe (parse_trial_credit_vend_response) au parseur historique
+xmltodict, et vérifie au passage que les deux résultats sont identiques.
+
+Usage :
+    python scripts/bench_xmlvend_parser.py [--number 2000] [--repeat 5] [fixture.xml ...]
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.xmlvend_parser import (  # noqa: E402
+    parse_trial_credit_vend_response,
+    parse_trial_credit_vend_xmltodict,
+)
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "xmlvend"
+
+
+def bench(parser, xml_content: str, number: int, repeat: int) -> float:
+    """Meilleur temps moyen par appel (µs) sur `repeat` séries de `number` appels"""
+    timings = timeit.repeat(lambda: parser(xml_content, "202410171030", "48213", 200), number=number, repeat=repeat)
+    return min(timings) / number * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("fixtures", nargs="*", type=Path, help="réponses XML (défaut : tests/fixtures/xmlvend/*.xml)")
+    parser.add_argument("--number", type=int, default=2000, help="appels par série")
+    parser.add_argument("--repeat", type=int, default=5, help="nombre de séries")
+    args = parser.parse_args()
+
+    fixtures = args.fixtures or sorted(FIXTURES_DIR.glob("*.xml"))
+    print(f"{'fixture':<42} {'octets':>7} {'xmltodict µs':>13} {'lxml µs':>9} {'gain':>6}  identique")
+    mismatches = 0
+    for path in fixtures:
+        xml_content = path.read_text(encoding="utf-8")
+        reference = parse_trial_credit_vend_xmltodict(xml_content, "202410171030", "48213", 200)
+        result = parse_trial_credit_vend_response(xml_content, "202410171030", "48213", 200)
+        identical = json.dumps(reference) == json.dumps(result)
+        mismatches += not identical
+
+        legacy_us = bench(parse_trial_credit_vend_xmltodict, xml_content, args.number, args.repeat)
+        lxml_us = bench(parse_trial_credit_vend_response, xml_content, args.number, args.repeat)
+        print(
+            f"{path.name:<42} {len(xml_content.encode()):>7} {legacy_us:>13.1f} {lxml_us:>9.1f} "
+            f"{legacy_us / lxml_us:>5.1f}x  {'oui' if identical else 'NON'}"
+        )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@
 Fixtures partagées pour la suite de tests SamaConso.
 
 Stratégie :
-- BDD de test : SQLite en mémoire (override de get_db_samaconso)
+- BDD de test : SQLite en mémoire (override de get_db_samaconso et get_async_db_samaconso)
 - Services externes mockés : Redis, RabbitMQ, MinIO (non disponibles hors réseau Senelec)
 - Firebase : ignoré si le fichier credentials est absent (comportement natif)
 """
@@ -10,7 +10,9 @@ Stratégie :
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 
 # ── Base de données SQLite pour les tests ────────────────────────────────────
@@ -22,10 +24,19 @@ engine_test = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
 
+# Même fichier SQLite côté async (aiosqlite) : les deux sessions voient les mêmes données.
+# NullPool : pas de connexion réutilisée entre les boucles asyncio du TestClient.
+async_engine_test = create_async_engine(
+    "sqlite+aiosqlite:///./tests/test_samaconso.db",
+    poolclass=NullPool,
+)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine_test, expire_on_commit=False, autoflush=False)
+
 # Import anticipé de l'app pour que le module app.main soit résolu
 # avant les patches (les fonctions mockées sont résolues à l'appel, pas à l'import)
 import app.main as _main_module  # noqa: E402
-from app.database import Base, get_db_samaconso  # noqa: E402
+from app.database import Base, get_db_samaconso, get_async_db_samaconso  # noqa: E402
+from tests.fakes import FakeRedis  # noqa: E402
 
 
 # ── Fixtures BDD ─────────────────────────────────────────────────────────────
@@ -51,19 +62,25 @@ def db_session():
 def client(db_session):
     """
     Client HTTP FastAPI avec :
-    - BDD SQLite (override de get_db_samaconso)
+    - BDD SQLite (override de get_db_samaconso et get_async_db_samaconso)
     - Redis / RabbitMQ / MinIO mockés au niveau du module app.main
     """
 
     def override_get_db():
         yield db_session
 
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     _main_module.app.dependency_overrides[get_db_samaconso] = override_get_db
+    _main_module.app.dependency_overrides[get_async_db_samaconso] = override_get_async_db
 
     # Patch des services au niveau de app.main (là où on_startup les appelle)
-    with patch("app.main.init_redis", new=AsyncMock(return_value=None)), \
+    # Sessions ouvertes hors dépendance (app.database.detached_async_session) : même base SQLite
+    with patch("app.database.AsyncSessionLocal", TestingAsyncSessionLocal), \
+         patch("app.main.init_redis", new=AsyncMock(return_value=None)), \
          patch("app.main.close_redis", new=AsyncMock(return_value=None)), \
-         patch("app.main.init_rabbitmq", new=AsyncMock(return_value=None)), \
          patch("app.main.init_minio_service", new=MagicMock(return_value=None)):
 
         with TestClient(_main_module.app, raise_server_exceptions=True) as test_client:
@@ -72,6 +89,20 @@ def client(db_session):
     _main_module.app.dependency_overrides.clear()
 
 
+# ── Fixture Redis ─────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def fake_redis():
+    """
+    Redis en mémoire (tests/fakes.py) derrière app.cache.get_redis et get_redis_bytes.
+    Les modules qui importent get_redis directement sont patchés par leurs tests.
+    """
+    fake = FakeRedis()
+    with patch("app.cache.get_redis", return_value=fake), \
+         patch("app.cache.get_redis_bytes", return_value=fake):
+        yield fake
+
+
 # ── Fixtures données de test ──────────────────────────────────────────────────
 
 @pytest.fixture
@@ -0,0 +1,258 @@
+"""
+Faux Redis en mémoire partagé par les suites de tests
+
+Sous-ensemble de redis.asyncio utilisé par app.cache et les services :
+chaînes, sets, TTL, pipeline transactionnel, WATCH (transaction), scripts
+Lua émulés, pub/sub (publication seulement) et SCAN. FakeSyncRedis expose
+les mêmes données avec l'API synchrone des workers Celery.
+
+La fixture fake_redis (tests/conftest.py) l'installe à la place de
+app.cache.get_redis / get_redis_bytes.
+"""
+
+import time
+from collections import defaultdict
+from fnmatch import fnmatchcase
+
+import orjson
+
+from app.cache import _RELEASE_LOCK
+from app.services.fcm_sender import _TAKE_TOKENS
+from app.services.notification_inbox import _ADJUST_IF_EXISTS
+
+
+class FakePipeline:
+    """Commandes enregistrées puis appliquées à execute() (MULTI / EXEC)"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def _queue(self, name, *args, **kwargs):
+        self.ops.append((name, args, kwargs))
+        return self
+
+    def set(self, key, value, ex=None, nx=False):
+        return self._queue("set", key, value, ex=ex, nx=nx)
+
+    def sadd(self, key, *members):
+        return self._queue("sadd", key, *members)
+
+    def expire(self, key, ttl):
+        return self._queue("expire", key, ttl)
+
+    def delete(self, *keys):
+        return self._queue("delete", *keys)
+
+    def eval(self, script, numkeys, *args):
+        return self._queue("eval", script, numkeys, *args)
+
+    def ttl(self, key):
+        return self._queue("ttl", key)
+
+    def strlen(self, key):
+        return self._queue("strlen", key)
+
+    def getrange(self, key, start, end):
+        return self._queue("getrange", key, start, end)
+
+    def multi(self):
+        # Lectures faites sous WATCH avant multi() : seules les commandes suivantes sont exécutées
+        self.ops = []
+
+    async def sunion(self, keys):
+        return await self.redis.sunion(keys)
+
+    async def execute(self, raise_on_error=True):
+        return self.redis.run(self.ops, raise_on_error)
+
+
+class FakeRedis:
+    """
+    Redis asynchrone en mémoire
+
+    Attributs inspectés par les tests : strings, sets, ttls, published
+    (canal, message décodé), deleted (clés de chaque DEL / UNLINK),
+    watched (clés surveillées par transaction), gets, pipelines, scans.
+    """
+
+    def __init__(self, strings=None):
+        self.strings = dict(strings or {})
+        self.sets = defaultdict(set)
+        self.hashes = defaultdict(dict)
+        self.ttls = {}
+        self.published = []
+        self.deleted = []
+        self.watched = []
+        self.gets = 0
+        self.pipelines = 0
+        self.scans = 0
+        # Ordre de parcours de SCAN (figé comme un curseur Redis) ; None = clés présentes, triées
+        self.universe = None
+        self.scripts = {
+            _RELEASE_LOCK: self._release_lock,
+            _ADJUST_IF_EXISTS: self._adjust_if_exists,
+            _TAKE_TOKENS: self._take_tokens,
+        }
+
+    # ── Commandes, appliquées immédiatement ou depuis un pipeline ──
+
+    def run(self, ops, raise_on_error=True):
+        """Exécute les commandes d'un pipeline ; erreurs renvoyées en place si raise_on_error=False"""
+        self.pipelines += 1
+        results = []
+        for name, args, kwargs in ops:
+            try:
+                results.append(getattr(self, f"_{name}")(*args, **kwargs))
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                results.append(e)
+        return results
+
+    def _set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    def _sadd(self, key, *members):
+        before = len(self.sets[key])
+        self.sets[key].update(members)
+        return len(self.sets[key]) - before
+
+    def _expire(self, key, ttl):
+        self.ttls[key] = ttl
+        return True
+
+    def _delete(self, *keys):
+        self.deleted.append(keys)
+        removed = 0
+        for key in keys:
+            found = self.strings.pop(key, None) is not None
+            found = self.sets.pop(key, None) is not None or found
+            self.ttls.pop(key, None)
+            removed += found
+        return removed
+
+    def _eval(self, script, numkeys, *args):
+        return self.scripts[script](list(args[:numkeys]), list(args[numkeys:]))
+
+    def _ttl(self, key):
+        return self.ttls.get(key, -1)
+
+    def _strlen(self, key):
+        self._check_string(key)
+        value = self.strings.get(key)
+        return len(value) if value else 0
+
+    def _getrange(self, key, start, end):
+        self._check_string(key)
+        value = self.strings.get(key) or ""
+        return (value.encode() if isinstance(value, str) else value)[start:end + 1]
+
+    def _check_string(self, key):
+        if key in self.sets:
+            raise Exception("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+    # ── Scripts Lua émulés ──
+
+    def _release_lock(self, keys, argv):
+        if self.strings.get(keys[0]) == argv[0]:
+            del self.strings[keys[0]]
+            return 1
+        return 0
+
+    def _adjust_if_exists(self, keys, argv):
+        if keys[0] not in self.strings:
+            return None
+        self.strings[keys[0]] = max(int(self.strings[keys[0]]) + int(argv[0]), 0)
+        return self.strings[keys[0]]
+
+    def _take_tokens(self, keys, argv):
+        rate, capacity, wanted = float(argv[0]), float(argv[1]), int(argv[2])
+        now = time.monotonic()
+        state = self.hashes[keys[0]]
+        tokens = min(capacity, state.get("tokens", capacity) + max(0, now - state.get("updated", now)) * rate)
+        granted = min(wanted, int(tokens))
+        state.update(tokens=tokens - granted, updated=now)
+        return [granted, "0"] if granted else [0, str((1 - tokens) / rate)]
+
+    # ── API asynchrone ──
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        self.gets += 1
+        return self.strings.get(key)
+
+    async def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, nx=False):
+        return self._set(key, value, ex=ex, nx=nx)
+
+    async def delete(self, *keys):
+        return self._delete(*keys)
+
+    async def unlink(self, *keys):
+        return self._delete(*keys)
+
+    async def sunion(self, keys):
+        return set().union(*(self.sets.get(key, set()) for key in keys))
+
+    async def eval(self, script, numkeys, *args):
+        return self._eval(script, numkeys, *args)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, orjson.loads(message)))
+        return 1
+
+    async def transaction(self, func, *watches, value_from_callable=False):
+        self.watched.append(watches)
+        pipe = FakePipeline(self)
+        value = await func(pipe)
+        results = await pipe.execute()
+        return value if value_from_callable else results
+
+    async def scan(self, cursor=0, match=None, count=None):
+        self.scans += 1
+        universe = self.universe if self.universe is not None else sorted(set(self.strings) | set(self.sets))
+        batch = universe[cursor:cursor + count]
+        next_cursor = cursor + count if cursor + count < len(universe) else 0
+        live = [key for key in batch if key in self.strings or key in self.sets]
+        return next_cursor, [key for key in live if match is None or fnmatchcase(key, match)]
+
+
+class FakeSyncPipeline(FakePipeline):
+    def execute(self, raise_on_error=True):
+        return self.redis.run(self.ops, raise_on_error)
+
+
+class FakeSyncRedis:
+    """Client synchrone (workers Celery) sur les données d'un FakeRedis"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def pipeline(self, transaction=True):
+        return FakeSyncPipeline(self.redis)
+
+    def get(self, key):
+        return self.redis.strings.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        return self.redis._set(key, value, ex=ex, nx=nx)
+
+    def delete(self, *keys):
+        return self.redis._delete(*keys)
+
+    def sunion(self, keys):
+        return set().union(*(self.redis.sets.get(key, set()) for key in keys))
+
+    def publish(self, channel, message):
+        self.redis.published.append((channel, orjson.loads(message)))
+        return 1
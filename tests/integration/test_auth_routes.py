@@ -268,6 +268,29 @@ class TestRefreshToken:
         response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
         assert response.status_code == 401
 
+    def test_refresh_refuse_ne_consomme_pas_le_token(self, client, test_user, auth_tokens, db_session):
+        """Rotation annulée si l'utilisateur est inactif : le token reste utilisable après réactivation."""
+        _, refresh_token = auth_tokens
+        test_user.is_activate = False
+        db_session.commit()
+        assert client.post("/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+        test_user.is_activate = True
+        db_session.commit()
+        assert client.post("/auth/refresh", json={"refresh_token": refresh_token}).status_code == 200
+
+    def test_refresh_met_a_jour_le_hash_en_base(self, client, test_user, auth_tokens, db_session):
+        """Le hash stocké est celui du nouveau refresh token."""
+        from app.auth import hash_refresh_token
+        from app.models.models import UserSession
+        _, old_refresh = auth_tokens
+        new_refresh = client.post("/auth/refresh", json={"refresh_token": old_refresh}).json()["refresh_token"]
+
+        db_session.expire_all()
+        hashes = {s.refresh_token_hash for s in db_session.query(UserSession).filter_by(user_id=test_user.id)}
+        assert hash_refresh_token(new_refresh) in hashes
+        assert hash_refresh_token(old_refresh) not in hashes
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #  POST /auth/logout  — Déconnexion
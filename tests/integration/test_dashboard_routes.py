@@ -0,0 +1,160 @@
+"""
+Tests d'intégration pour les endpoints /dashboard/*
+
+Vérifie que les statistiques agrégées en SQL correspondent aux comptages
+attendus, globalement (admin) et restreintes à l'agence (chef d'agence),
+et que les compteurs maintenus suivent les écritures sur user_compteur.
+
+Endpoints couverts :
+  GET /dashboard/            — Statistiques globales
+  GET /dashboard/{user_id}   — Statistiques selon le rôle de l'utilisateur
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.models.models import Agence, DashboardCompteurStats, User, UserCompteur
+from app.services.dashboard_service import GLOBAL_SCOPE, _lock_counter_tables, reconcile_dashboard_counters
+
+
+@pytest.fixture
+def dashboard_data(db_session):
+    """
+    Deux agences, un admin, un chef d'agence et quatre liaisons user_compteur :
+    - Dakar : woyofal actif propriétaire (user 1), woyofal inactif non propriétaire (user 2, état 14)
+    - Thiès : classique actif propriétaire (user 1, état 13), classique actif propriétaire (user 2)
+    """
+    dakar = Agence(nom="DAKAR", nom_corrige="Dakar")
+    thies = Agence(nom="THIES", nom_corrige="Thiès")
+    db_session.add_all([dakar, thies])
+    db_session.commit()
+
+    admin = User(firstName="Admin", login="admin", role=2, is_activate=True)
+    chef = User(firstName="Chef", login="chef", role=3, id_agence=thies.id, is_activate=True)
+    client1 = User(firstName="Client1", login="client1", role=1, is_activate=True)
+    client2 = User(firstName="Client2", login="client2", role=1, is_activate=True)
+    db_session.add_all([admin, chef, client1, client2])
+    db_session.commit()
+
+    db_session.add_all([
+        UserCompteur(user_id=client1.id, type_compteur=1, est_active=True, est_proprietaire=True,
+                     nom_agence="Dakar", numero_compteur="W1"),
+        UserCompteur(user_id=client2.id, type_compteur=1, est_active=False, est_proprietaire=False,
+                     nom_agence="Dakar", numero_compteur="W1", etat_id=14),
+        UserCompteur(user_id=client1.id, type_compteur=2, est_active=True, est_proprietaire=True,
+                     nom_agence="Thiès", numero_compteur="C1", etat_id=13),
+        UserCompteur(user_id=client2.id, type_compteur=2, est_active=True, est_proprietaire=True,
+                     nom_agence="Thiès", numero_compteur="C2"),
+    ])
+    db_session.commit()
+    return {"admin": admin, "chef": chef}
+
+
+class TestDashboard:
+
+    def test_statistiques_globales(self, client, dashboard_data):
+        """Les compteurs sont agrégés sur l'ensemble de la table."""
+        data = client.get("/dashboard/").json()
+        assert data["status_code"] == 200
+        assert data["total_compteurs"] == 4
+        assert data["compteurs_actifs"] == 3
+        assert data["compteurs_inactifs"] == 1
+        assert data["compteurs_woyofal"] == 2
+        assert data["compteurs_classique"] == 2
+        assert data["demandes_traites"] == 1
+        assert data["demandes_en_cours"] == 1
+        assert data["owners"] == 2
+        assert data["not_owners"] == 1
+        assert data["total_users"] == 4
+
+    def test_admin_voit_toutes_les_agences(self, client, dashboard_data):
+        """Rôle 2 : mêmes statistiques que le dashboard global."""
+        data = client.get(f"/dashboard/{dashboard_data['admin'].id}").json()
+        assert data["total_compteurs"] == 4
+        assert data["owners"] == 2
+
+    def test_chef_agence_limite_a_son_agence(self, client, dashboard_data):
+        """Rôle 3 : seuls les compteurs de l'agence du chef sont comptés."""
+        data = client.get(f"/dashboard/{dashboard_data['chef'].id}").json()
+        assert data["total_compteurs"] == 2
+        assert data["compteurs_woyofal"] == 0
+        assert data["compteurs_classique"] == 2
+        assert data["demandes_traites"] == 1
+        assert data["owners"] == 2
+        assert data["not_owners"] == 0
+        assert data["total_users"] == 4
+
+    def test_utilisateur_inexistant(self, client):
+        data = client.get("/dashboard/9999").json()
+        assert data["status_code"] == 404
+
+
+def _user_compteur_payload(**values):
+    payload = {field: None for field in (
+        "compteur_id", "user_id", "est_proprietaire", "autorise_par", "active_par", "etat_id",
+        "est_active", "id_client", "num_compte_contrat", "poc", "default", "nom_client",
+        "numero_compteur", "id_agence", "nom_agence", "adresse", "tarif", "type_compteur",
+    )}
+    payload.update(values)
+    return payload
+
+
+class TestDashboardCounters:
+    """Compteurs maintenus dans dashboard_compteur_stats par les écritures sur user_compteur"""
+
+    def test_recalcul_initialise_les_compteurs(self, client, db_session, dashboard_data):
+        """Après recalcul, le dashboard lit la ligne maintenue (mêmes valeurs que l'agrégat)."""
+        result = reconcile_dashboard_counters(db_session)
+        assert result["drifted"] == 3  # global, Dakar, Thiès absents avant recalcul
+
+        row = db_session.get(DashboardCompteurStats, GLOBAL_SCOPE)
+        assert row.total_compteurs == 4
+        assert row.owners == 2
+
+        data = client.get(f"/dashboard/{dashboard_data['chef'].id}").json()
+        assert data["total_compteurs"] == 2
+        assert data["total_users"] == 4
+
+    def test_ecritures_maintiennent_les_compteurs(self, client, db_session, dashboard_data):
+        """Création, modification et suppression appliquent leur delta sans dérive."""
+        reconcile_dashboard_counters(db_session)
+        chef_id = dashboard_data["chef"].id
+
+        created = client.post("/user_compteur/", json=_user_compteur_payload(
+            user_id=chef_id, est_proprietaire=True, est_active=False, type_compteur=1,
+            nom_agence="Thiès", numero_compteur="W9", etat_id=14,
+        )).json()
+        data = client.get("/dashboard/").json()
+        assert data["total_compteurs"] == 5
+        assert data["compteurs_inactifs"] == 2
+        assert data["owners"] == 3
+
+        client.put(f"/user_compteur/{created['id']}", json=_user_compteur_payload(
+            user_id=chef_id, est_proprietaire=True, est_active=True, type_compteur=1,
+            nom_agence="Thiès", numero_compteur="W9", etat_id=13,
+        ))
+        db_session.expire_all()
+        thies = db_session.get(DashboardCompteurStats, "Thiès")
+        assert thies.compteurs_actifs == 3
+        assert thies.demandes_traites == 2
+        assert thies.compteurs_woyofal == 1
+
+        client.delete(f"/user_compteur/{created['id']}")
+        db_session.expire_all()
+        assert db_session.get(DashboardCompteurStats, GLOBAL_SCOPE).owners == 2
+
+        assert reconcile_dashboard_counters(db_session)["drifted"] == 0
+
+    def test_recalcul_sous_verrou_des_tables_de_compteurs(self):
+        """PostgreSQL : verrou EXCLUSIVE pris avant l'agrégat, dans l'ordre des écritures par delta."""
+        db = MagicMock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+        _lock_counter_tables(db)
+        sql = str(db.execute.call_args.args[0])
+        assert sql == "LOCK TABLE dashboard_owner_ref, dashboard_compteur_stats IN EXCLUSIVE MODE"
+
+        db.reset_mock()
+        db.get_bind.return_value.dialect.name = "sqlite"
+        _lock_counter_tables(db)
+        db.execute.assert_not_called()
@@ -0,0 +1,70 @@
+"""
+Tests d'intégration pour les broadcasts /notifications/all_users et /notifications/all_agences
+
+La route ne publie que le descripteur du broadcast (titre, corps, audience) :
+aucun token n'est chargé ni transmis dans le message Celery.
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.models import Agence, Notification, User, UserSession
+from app.routers.websocket_routers import backplane
+
+
+@pytest.fixture
+def delay():
+    task = MagicMock()
+    task.delay.return_value = MagicMock(id="task-123")
+    with patch("app.routers.notification_routers.send_broadcast_notifications", task):
+        yield task.delay
+
+
+@pytest.fixture
+def users(db_session):
+    agence = Agence(nom="DAKAR", nom_corrige="Dakar")
+    db_session.add(agence)
+    db_session.commit()
+    u1 = User(login="u1", is_activate=True, id_agence=agence.id)
+    u2 = User(login="u2", is_activate=True, id_agence=agence.id)
+    u3 = User(login="u3", is_activate=True)
+    db_session.add_all([u1, u2, u3])
+    db_session.commit()
+    db_session.add_all([UserSession(user_id=u.id, fcm_token=f"tok{u.id}", is_active=True) for u in (u1, u2, u3)])
+    db_session.commit()
+    return [u1, u2, u3]
+
+
+class TestBroadcastRoutes:
+
+    def test_all_users_publie_un_descripteur(self, client, db_session, users, delay):
+        data = client.post("/notifications/all_users", json={"title": "Coupure", "body": "Travaux"}).json()
+        assert data["status"] == 202
+        assert data["batch_task_id"] == "task-123"
+        payload = delay.call_args.args[0]
+        assert payload["audience"] == {"type": "all_users"}
+        assert payload["notification_id"] == data["global_notification_id"]
+        assert "user_tokens" not in payload
+
+    def test_all_agences_insere_les_notifications(self, client, db_session, users, delay):
+        data = client.post("/notifications/all_agences", json={"title": "Info", "body": "Agence"}).json()
+        assert data["status"] == 201
+        assert data["total_users"] == 2
+        assert data["agences_processed"] == ["DAKAR"]
+        assert delay.call_args.args[0]["audience"] == {"type": "all_agences"}
+        rows = db_session.query(Notification).filter(Notification.title == "Info").all()
+        assert sorted(n.for_user_id for n in rows) == sorted([users[0].id, users[1].id])
+        assert all(n.is_read is False for n in rows)
+
+    def test_all_agences_une_seule_publication_websocket(self, client, db_session, users, delay):
+        """Connectés des agences : une seule publication backplane pour tous"""
+        connected = [users[0].id, users[1].id, users[2].id]
+        with patch.object(backplane, "connected_user_ids", AsyncMock(return_value=connected)), \
+             patch.object(backplane, "publish", AsyncMock(return_value=True)) as publish:
+            client.post("/notifications/all_agences", json={"title": "Info", "body": "Agence"})
+
+        publish.assert_awaited_once()
+        message, user_ids = publish.call_args.args
+        assert message["type"] == "new_notification"
+        assert sorted(user_ids) == sorted([users[0].id, users[1].id])
@@ -0,0 +1,235 @@
+"""
+Tests d'intégration pour la boîte de réception paginée et le compteur de non lues
+
+- /notifications/user/{user_id}/inbox : pagination keyset (created_at, id),
+  notifications globales incluses, curseur invalide refusé ;
+- /notifications/user/{user_id}/unread-count : compteur Redis reconstruit
+  depuis la base s'il manque, incrémenté à la création, décrémenté au marquage ;
+- /notifications/bulk/read et /notifications/bulk/delete : une requête, un
+  événement WebSocket par utilisateur, une invalidation de cache par tags ;
+- listes /notifications/ et /notifications/user/{user_id} en cache, taguées.
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.cache import CACHE_TAG_KEY
+from app.models.models import Notification, User
+
+
+@pytest.fixture
+def redis(fake_redis):
+    with patch("app.services.notification_inbox.get_redis", return_value=fake_redis):
+        yield fake_redis
+
+
+def unread_counters(redis):
+    return {key: value for key, value in redis.strings.items() if key.startswith("notifications:unread:")}
+
+
+@pytest.fixture
+def ws_event():
+    with patch("app.routers.notification_routers.notify_notifications_updated_via_websocket",
+               new=AsyncMock()) as mock:
+        yield mock
+
+
+@pytest.fixture
+def inbox(db_session):
+    """25 notifications pour l'utilisateur (même created_at pour 10 d'entre elles), 1 globale, 1 d'un autre"""
+    user = User(login="inbox", is_activate=True)
+    other = User(login="other", is_activate=True)
+    db_session.add_all([user, other])
+    db_session.commit()
+
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    notifs = [
+        Notification(for_user_id=user.id, title=f"n{i}", body="b", is_read=i < 5,
+                     created_at=base + timedelta(minutes=min(i, 15)))
+        for i in range(25)
+    ]
+    notifs.append(Notification(for_user_id=None, title="global", body="b", is_read=False, created_at=base))
+    notifs.append(Notification(for_user_id=other.id, title="autre", body="b", is_read=False, created_at=base))
+    db_session.add_all(notifs)
+    db_session.commit()
+    return user
+
+
+class TestInboxPagination:
+
+    def test_parcours_complet_sans_doublon(self, client, inbox):
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {"limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            data = client.get(f"/notifications/user/{inbox.id}/inbox", params=params).json()
+            assert data["status"] == 200
+            seen.extend(data["notifications"])
+            pages += 1
+            cursor = data["next_cursor"]
+            assert data["has_more"] is (cursor is not None)
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert len(seen) == 26  # 25 personnelles + 1 globale, pas celle de l'autre utilisateur
+        assert len({n["id"] for n in seen}) == 26
+        assert sum(n["is_global"] for n in seen) == 1
+        # Du plus récent au plus ancien, départage par id décroissant
+        assert seen[0]["title"] == "n24"
+        ids_same_minute = [n["id"] for n in seen if n["title"] in {f"n{i}" for i in range(15, 25)}]
+        assert ids_same_minute == sorted(ids_same_minute, reverse=True)
+
+    def test_curseur_invalide(self, client, inbox):
+        data = client.get(f"/notifications/user/{inbox.id}/inbox", params={"cursor": "pas-un-curseur"}).json()
+        assert data["status"] == 400
+
+    def test_limite_bornee(self, client, inbox):
+        response = client.get(f"/notifications/user/{inbox.id}/inbox", params={"limit": 1000})
+        assert response.status_code == 422
+
+
+class TestUnreadCounter:
+
+    def test_sans_redis_compte_en_base(self, client, inbox):
+        data = client.get(f"/notifications/user/{inbox.id}/unread-count").json()
+        assert data["unread_count"] == 21  # 20 personnelles non lues + 1 globale
+
+    def test_reconstruit_puis_maintenu(self, client, db_session, inbox, redis):
+        assert client.get(f"/notifications/user/{inbox.id}/unread-count").json()["unread_count"] == 21
+        assert unread_counters(redis) == {
+            f"notifications:unread:user:{inbox.id}": 20,
+            "notifications:unread:global": 1,
+        }
+
+        with patch("app.routers.notification_routers.send_single_notification"):
+            client.post("/notifications/", json={"for_user_id": inbox.id, "title": "nouvelle", "body": "b"})
+        assert db_session.query(Notification).filter(Notification.title == "nouvelle").count() == 1
+        assert redis.strings[f"notifications:unread:user:{inbox.id}"] == 21
+
+        unread = db_session.query(Notification).filter(
+            Notification.for_user_id == inbox.id, Notification.is_read.is_(False)
+        ).first()
+        client.put(f"/notifications/{unread.id}/read")
+        client.put(f"/notifications/{unread.id}/read")  # déjà lue : pas de second décrément
+        global_notif = db_session.query(Notification).filter(Notification.for_user_id.is_(None)).one()
+        client.put(f"/notifications/{global_notif.id}/read")
+
+        data = client.get(f"/notifications/user/{inbox.id}/unread-count").json()
+        assert data["unread_count"] == 20
+        assert redis.strings["notifications:unread:global"] == 0
+
+    def test_compteur_absent_non_incremente(self, client, inbox, redis):
+        with patch("app.routers.notification_routers.send_single_notification"):
+            client.post("/notifications/", json={"for_user_id": inbox.id, "title": "x", "body": "b"})
+        # Pas de clé créée par l'incrément : la prochaine lecture reconstruit depuis la base
+        assert unread_counters(redis) == {}
+        assert client.get(f"/notifications/user/{inbox.id}/unread-count").json()["unread_count"] == 22
+
+
+class TestBulkOperations:
+
+    def test_tout_marquer_comme_lu(self, client, db_session, inbox, redis, ws_event):
+        client.get(f"/notifications/user/{inbox.id}/unread-count")  # compteurs construits
+        data = client.put("/notifications/bulk/read", json={"user_id": inbox.id}).json()
+
+        assert data["status"] == 200
+        assert data["updated"] == 20
+        assert data["users"] == 1
+        # Un seul événement WebSocket, avec tous les ids
+        ws_event.assert_awaited_once()
+        action, changed = ws_event.await_args.args
+        assert action == "read"
+        assert len(changed[inbox.id]) == 20
+        # Invalidation par tags : liste complète et listes de l'utilisateur, en une transaction
+        assert redis.watched == [(
+            CACHE_TAG_KEY.format(tag="notifications"),
+            CACHE_TAG_KEY.format(tag=f"notifications:user_id={inbox.id}"),
+        )]
+        # Les globales ne sont pas concernées par "tout marquer" d'un utilisateur
+        assert client.get(f"/notifications/user/{inbox.id}/unread-count").json()["unread_count"] == 1
+        assert db_session.query(Notification).filter(
+            Notification.for_user_id == inbox.id, Notification.is_read.is_(False)
+        ).count() == 0
+
+    def test_marquer_avant_une_date(self, client, inbox, ws_event):
+        data = client.put("/notifications/bulk/read", json={
+            "user_id": inbox.id, "before": "2026-01-01T12:09:00"
+        }).json()
+        assert data["updated"] == 5  # n5 à n9 (n0 à n4 déjà lues)
+
+    def test_par_ids(self, client, db_session, inbox, redis, ws_event):
+        client.get(f"/notifications/user/{inbox.id}/unread-count")
+        rows = db_session.query(Notification).filter(Notification.for_user_id == inbox.id).order_by(Notification.id).all()
+        ids = [n.id for n in rows[3:8]]  # 2 lues, 3 non lues
+
+        data = client.post("/notifications/bulk/delete", json={"ids": ids, "user_id": inbox.id}).json()
+        assert data["deleted"] == 5
+        assert ws_event.await_args.args == ("deleted", {inbox.id: ids})
+        assert redis.strings[f"notifications:unread:user:{inbox.id}"] == 17
+        assert db_session.query(Notification).filter(Notification.id.in_(ids)).count() == 0
+
+    def test_selection_requise(self, client, inbox, ws_event):
+        assert client.put("/notifications/bulk/read", json={}).json()["status"] == 400
+        ws_event.assert_not_awaited()
+
+    def test_liste_d_ids_vide_ne_touche_rien(self, client, db_session, inbox, ws_event):
+        """Rien de sélectionné : 400, et non toute la boîte de l'utilisateur"""
+        assert client.put("/notifications/bulk/read", json={"ids": [], "user_id": inbox.id}).json()["status"] == 400
+        assert client.post("/notifications/bulk/delete", json={"ids": [], "user_id": inbox.id}).json()["status"] == 400
+        ws_event.assert_not_awaited()
+        assert db_session.query(Notification).filter(Notification.for_user_id == inbox.id).count() == 25
+        assert db_session.query(Notification).filter(
+            Notification.for_user_id == inbox.id, Notification.is_read.is_(False)
+        ).count() == 20
+
+    def test_ids_sans_user_id_refuses(self, client, db_session, inbox, ws_event):
+        ids = [n.id for n in db_session.query(Notification).all()]
+        assert client.post("/notifications/bulk/delete", json={"ids": ids}).json()["status"] == 400
+        assert db_session.query(Notification).count() == 27
+
+    def test_ids_restreints_aux_notifications_de_l_utilisateur(self, client, db_session, inbox, ws_event):
+        """Les ids d'un autre utilisateur et les globales sont ignorés"""
+        foreign = [n.id for n in db_session.query(Notification).filter(
+            (Notification.for_user_id != inbox.id) | Notification.for_user_id.is_(None)
+        )]
+        own = db_session.query(Notification).filter(Notification.for_user_id == inbox.id).first().id
+
+        data = client.post("/notifications/bulk/delete", json={"ids": foreign + [own], "user_id": inbox.id}).json()
+        assert data["deleted"] == 1
+        db_session.expire_all()
+        assert db_session.query(Notification).filter(Notification.id.in_(foreign)).count() == len(foreign) == 2
+
+
+class TestListCache:
+
+    def test_liste_utilisateur_invalidee_par_le_marquage(self, client, db_session, inbox, redis, ws_event):
+        key = f"notifications:user:{inbox.id}"
+        assert client.get(f"/notifications/user/{inbox.id}").json()["results"] == 26
+        assert key in redis.strings
+        assert client.get("/notifications/").json()["results"] == 27
+        assert "notifications:all" in redis.strings
+
+        client.put("/notifications/bulk/read", json={"user_id": inbox.id})
+        assert key not in redis.strings
+        assert "notifications:all" not in redis.strings
+
+    def test_globale_invalide_toutes_les_listes(self, client, db_session, inbox, redis):
+        other = db_session.query(User).filter(User.login == "other").one()
+        client.get(f"/notifications/user/{inbox.id}")
+        client.get(f"/notifications/user/{other.id}")
+
+        global_notif = db_session.query(Notification).filter(Notification.for_user_id.is_(None)).one()
+        client.delete(f"/notifications/{global_notif.id}")
+        assert f"notifications:user:{inbox.id}" not in redis.strings
+        assert f"notifications:user:{other.id}" not in redis.strings
+
+    def test_autre_utilisateur_non_invalide(self, client, db_session, inbox, redis):
+        other = db_session.query(User).filter(User.login == "other").one()
+        client.get(f"/notifications/user/{other.id}")
+        own = db_session.query(Notification).filter(Notification.for_user_id == inbox.id).first()
+        client.put(f"/notifications/{own.id}/read")
+        assert f"notifications:user:{other.id}" in redis.strings
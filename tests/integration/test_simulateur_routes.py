@@ -0,0 +1,141 @@
+"""
+Tests d'intégration pour les endpoints /simulateur/*
+
+Le client XMLVend est remplacé par un faux renvoyant la réponse SOAP de
+tests/fixtures/xmlvend : seuls la construction de la requête, le parsing et
+la mise en forme des réponses (JSON, NDJSON) sont vérifiés.
+
+Endpoints couverts :
+  POST /simulateur/trial-credit-vend-request  — Simulation d'un achat
+  POST /simulateur/trial-credit-vend-batch    — Simulations en lot (NDJSON)
+  GET  /simulateur/                           — Informations (client XMLVend, cache)
+"""
+
+import asyncio
+import json
+import re
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import app.routers.simulateur_routers as simulateur
+
+FIXTURE = (Path(__file__).parent.parent / "fixtures" / "xmlvend" / "trial_credit_vend_resp.xml").read_text()
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+class FakeXmlVendClient:
+    """Réponse de la fixture ; échoue pour les compteurs de `failing`, retarde ceux de `delays`"""
+
+    def __init__(self, failing=(), delays=None):
+        self.failing = set(failing)
+        self.delays = delays or {}
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def post_async(self, soap_xml, headers):
+        meter_no = re.search(r'msno="([^"]+)"', soap_xml).group(1)
+        self.requests.append(soap_xml)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(meter_no, 0.01))
+            if meter_no in self.failing:
+                raise ConnectionError(f"XMLVend injoignable pour {meter_no}")
+            return FakeResponse(FIXTURE), "https://xmlvend.test/xmlvend"
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {"requests": len(self.requests)}
+
+
+@pytest.fixture
+def xmlvend(tmp_path):
+    pfx = tmp_path / "487.pfx"
+    pfx.write_bytes(b"pfx")
+    fake = FakeXmlVendClient()
+    with patch.object(simulateur, "CERTIFICATE_PATH", pfx), \
+         patch.object(simulateur, "get_xmlvend_client", return_value=fake):
+        yield fake
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+class TestTrialCreditVend:
+
+    def test_simulation_unitaire(self, client, xmlvend):
+        response = client.post("/simulateur/trial-credit-vend-request", json={"meter_no": "14123456789", "amount": 5000})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+        assert data["endpoint_used"] == "https://xmlvend.test/xmlvend"
+        assert data["purchase"]["units"] == {"value": 38.7, "unit": "kWh"}
+        assert data["cache_hit"] is False
+
+    def test_certificat_absent(self, client, tmp_path):
+        with patch.object(simulateur, "CERTIFICATE_PATH", tmp_path / "absent.pfx"):
+            response = client.post("/simulateur/trial-credit-vend-request", json={"meter_no": "1", "amount": 5000})
+        assert response.status_code == 500
+        assert response.json()["detail"]["error_type"] == "FileNotFoundError"
+
+
+class TestTrialCreditVendBatch:
+
+    def test_lot_streame_en_ndjson(self, client, xmlvend):
+        items = [{"meter_no": f"1412345678{i}", "amount": 1000 * (i + 1)} for i in range(4)]
+        response = client.post("/simulateur/trial-credit-vend-batch", json={"items": items})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = read_ndjson(response)
+        assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+        assert all(line["success"] for line in lines)
+        assert {line["meter_no"] for line in lines} == {item["meter_no"] for item in items}
+
+    def test_ordre_d_arrivee(self, client, xmlvend):
+        xmlvend.delays = {"LENT": 0.2}
+        items = [{"meter_no": "LENT", "amount": 1000}, {"meter_no": "RAPIDE", "amount": 1000}]
+        lines = read_ndjson(client.post("/simulateur/trial-credit-vend-batch", json={"items": items}))
+        assert [line["meter_no"] for line in lines] == ["RAPIDE", "LENT"]
+
+    def test_echec_partiel(self, client, xmlvend):
+        xmlvend.failing = {"PANNE"}
+        items = [{"meter_no": "OK1", "amount": 1000}, {"meter_no": "PANNE", "amount": 1000}, {"meter_no": "OK2", "amount": 1000}]
+        lines = {line["meter_no"]: line for line in read_ndjson(client.post("/simulateur/trial-credit-vend-batch", json={"items": items}))}
+        assert lines["OK1"]["success"] and lines["OK2"]["success"]
+        assert lines["PANNE"]["success"] is False
+        assert lines["PANNE"]["error_type"] == "ConnectionError"
+        assert lines["PANNE"]["index"] == 1
+
+    def test_concurrence_bornee(self, client, xmlvend):
+        items = [{"meter_no": f"M{i}", "amount": 1000} for i in range(8)]
+        client.post("/simulateur/trial-credit-vend-batch", json={"items": items, "concurrency": 2})
+        assert xmlvend.max_in_flight == 2
+
+    def test_numeros_uniques_distincts(self, client, xmlvend):
+        items = [{"meter_no": f"M{i}", "amount": 1000} for i in range(20)]
+        client.post("/simulateur/trial-credit-vend-batch", json={"items": items})
+        numbers = [re.search(r'uniqueNumber="(\d+)"', xml).group(1) for xml in xmlvend.requests]
+        assert len(set(numbers)) == 20
+
+    def test_validation(self, client, xmlvend):
+        assert client.post("/simulateur/trial-credit-vend-batch", json={"items": []}).status_code == 422
+        items = [{"meter_no": "M", "amount": 1000}]
+        assert client.post("/simulateur/trial-credit-vend-batch", json={"items": items, "concurrency": 0}).status_code == 422
+
+
+class TestInfo:
+
+    def test_statistiques_du_cache(self, client, xmlvend):
+        data = client.get("/simulateur/").json()
+        assert data["xmlvend_client"] == {"requests": 0}
+        assert set(data["simulation_cache"]) >= {"enabled", "hits", "misses", "hit_rate_percent"}
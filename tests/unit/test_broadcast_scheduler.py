@@ -0,0 +1,110 @@
+"""
+Tests unitaires pour app/services/broadcast_scheduler.py et les vagues de send_broadcast_notifications
+
+Vérifie l'ajustement des chunks (429, file chargée, succès), le calcul de
+progression/ETA et l'enchaînement des vagues par curseur keyset.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.models import User, UserSession
+from app.services.broadcast_scheduler import AdaptiveBroadcastScheduler, summarize_progress
+from app.tasks import batch_tasks
+
+
+@pytest.fixture
+def scheduler():
+    return AdaptiveBroadcastScheduler(min_chunk=100, max_chunk=1000, wave_chunks=5,
+                                      base_interval=2, max_interval=60, target_queue_depth=20)
+
+
+class TestAdaptiveBroadcastScheduler:
+
+    def test_throttling_halves_chunks_and_doubles_delay(self, scheduler):
+        plan = scheduler.plan(chunk_size=400, delay=4, sent=380, failed=20, throttled=15, queue_depth=0)
+        assert plan.chunk_size == 200
+        assert plan.delay == 8
+        assert plan.reason == "throttled"
+
+    def test_queue_backlog_spaces_waves(self, scheduler):
+        plan = scheduler.plan(chunk_size=400, delay=2, sent=400, failed=0, throttled=0, queue_depth=100)
+        assert plan.chunk_size == 400
+        assert plan.delay == 10
+
+    def test_healthy_run_grows_chunks_up_to_max(self, scheduler):
+        plan = scheduler.plan(chunk_size=800, delay=8, sent=990, failed=10, throttled=0, queue_depth=0)
+        assert plan.chunk_size == 1000
+        assert plan.delay == 2
+
+    def test_bounds(self, scheduler):
+        plan = scheduler.plan(chunk_size=100, delay=50, sent=0, failed=0, throttled=3, queue_depth=0)
+        assert plan.chunk_size == 100
+        assert plan.delay == 60
+
+
+class TestSummarizeProgress:
+
+    def test_eta_from_observed_rate(self):
+        raw = {"started_at": "1000", "estimated_tokens": "1000", "tokens_scheduled": "500",
+               "chunks_scheduled": "5", "chunks_done": "2", "sent": "190", "failed": "10",
+               "throttled": "0", "all_scheduled": "0", "status": "running"}
+        progress = summarize_progress(raw, now=1020)
+        assert progress["status"] == "running"
+        assert progress["total_tokens"] == 1000
+        assert progress["eta_seconds"] == 80  # 800 restants à 10/s
+
+    def test_completed(self):
+        raw = {"started_at": "1000", "estimated_tokens": "300", "tokens_scheduled": "300",
+               "chunks_scheduled": "3", "chunks_done": "3", "sent": "300", "failed": "0",
+               "all_scheduled": "1", "status": "running"}
+        progress = summarize_progress(raw, now=1030)
+        assert progress["status"] == "completed"
+        assert progress["eta_seconds"] == 0
+
+    def test_unknown_broadcast(self):
+        assert summarize_progress({}) is None
+
+
+class TestBroadcastWaves:
+
+    def test_waves_follow_keyset_cursor(self, db_session):
+        """5 destinataires, chunks de 2, vagues de 2 chunks : 2 chunks puis 1, une reprogrammation"""
+        users = [User(login=f"u{i}", is_activate=True) for i in range(5)]
+        db_session.add_all(users)
+        db_session.commit()
+        db_session.add_all([UserSession(user_id=u.id, fcm_token=f"tok{u.id}", is_active=True) for u in users])
+        db_session.commit()
+        expected = sorted(f"tok{u.id}" for u in users)
+
+        small = AdaptiveBroadcastScheduler(min_chunk=2, max_chunk=4, wave_chunks=2, base_interval=1)
+        descriptor = {"title": "T", "body": "B", "audience": {"type": "all_users"}, "page_size": 2, "notification_id": 9}
+
+        with patch("app.database.SessionLocal", return_value=db_session), \
+             patch.object(batch_tasks, "AdaptiveBroadcastScheduler", return_value=small), \
+             patch.object(batch_tasks, "_record_progress"), \
+             patch.object(batch_tasks, "_queue_depth", return_value=0), \
+             patch.object(batch_tasks, "get_sync_redis", return_value=MagicMock(hmget=MagicMock(return_value=[4, 0, 0]))), \
+             patch.object(batch_tasks.send_batch_notifications, "apply_async", return_value=MagicMock(id="job")) as chunk, \
+             patch.object(batch_tasks, "notify_users_from_worker") as notify_ws, \
+             patch.object(batch_tasks.send_broadcast_notifications, "apply_async") as wave:
+
+            first = batch_tasks._broadcast_wave("b1", descriptor)
+            assert first["status"] == "scheduling"
+            assert chunk.call_count == 2
+            assert wave.call_args.kwargs["countdown"] == 1
+            continuation = wave.call_args.kwargs["args"][0]
+            assert continuation["broadcast_id"] == "b1"
+
+            second = batch_tasks._broadcast_wave("b2", continuation)
+            assert second["status"] == "scheduled"
+            assert second["chunk_size"] == 3  # taux de succès de la vague 1 : chunks agrandis
+            assert wave.call_count == 1
+
+        # Notification globale poussée une seule fois en WebSocket (première vague), à tous les connectés
+        notify_ws.assert_called_once_with(None, "T", "B", 9, None)
+
+        tokens = [n["token"] for call in chunk.call_args_list for n in call.kwargs["args"][0]["notifications"]]
+        assert sorted(tokens) == expected
+        assert all(call.kwargs["args"][0]["broadcast_id"] == "b1" for call in chunk.call_args_list)
@@ -0,0 +1,76 @@
+"""
+Tests unitaires pour app/services/broadcast_service.py
+
+Vérifie la pagination keyset des destinataires, le filtre d'audience et la
+déduplication des tokens FCM.
+"""
+
+import pytest
+
+from app.models.models import User, UserSession
+from app.services.broadcast_service import (
+    AUDIENCE_ALL_AGENCES,
+    AUDIENCE_ALL_USERS,
+    build_broadcast_descriptor,
+    iter_recipient_pages,
+)
+
+
+@pytest.fixture
+def sessions(db_session):
+    """
+    Trois utilisateurs :
+    - u1 activé, avec agence : tokens t1 (deux sessions), t2
+    - u2 activé, sans agence : token t3, et une session inactive t4
+    - u3 désactivé, avec agence : token t5
+    """
+    u1 = User(login="u1", is_activate=True, id_agence=1)
+    u2 = User(login="u2", is_activate=True)
+    u3 = User(login="u3", is_activate=False, id_agence=1)
+    db_session.add_all([u1, u2, u3])
+    db_session.commit()
+    db_session.add_all([
+        UserSession(user_id=u1.id, fcm_token="t1", is_active=True),
+        UserSession(user_id=u1.id, fcm_token="t2", is_active=True),
+        UserSession(user_id=u1.id, fcm_token="t1", is_active=True),
+        UserSession(user_id=u2.id, fcm_token="t3", is_active=True),
+        UserSession(user_id=u2.id, fcm_token="t4", is_active=False),
+        UserSession(user_id=u2.id, fcm_token="", is_active=True),
+        UserSession(user_id=u3.id, fcm_token="t5", is_active=True),
+    ])
+    db_session.commit()
+    return {"u1": u1, "u2": u2, "u3": u3}
+
+
+def tokens(pages):
+    return [r["token"] for page in pages for r in page]
+
+
+class TestRecipientPages:
+
+    def test_all_users_deduplicated(self, db_session, sessions):
+        pages = list(iter_recipient_pages(db_session, {"type": AUDIENCE_ALL_USERS}))
+        assert sorted(tokens(pages)) == ["t1", "t2", "t3"]
+
+    def test_all_agences_audience(self, db_session, sessions):
+        pages = list(iter_recipient_pages(db_session, {"type": AUDIENCE_ALL_AGENCES}))
+        assert sorted(tokens(pages)) == ["t1", "t2", "t5"]
+
+    def test_keyset_pages(self, db_session, sessions):
+        pages = list(iter_recipient_pages(db_session, {"type": AUDIENCE_ALL_USERS}, page_size=2))
+        assert [len(page) for page in pages] == [2, 1]
+        ids = [r["session_id"] for page in pages for r in page]
+        assert ids == sorted(ids)
+
+    def test_unknown_audience(self, db_session):
+        with pytest.raises(ValueError):
+            list(iter_recipient_pages(db_session, {"type": "inconnue"}))
+
+
+class TestBroadcastDescriptor:
+
+    def test_descriptor_has_no_recipients(self):
+        descriptor = build_broadcast_descriptor("Titre", "Message", AUDIENCE_ALL_USERS, event_id=7)
+        assert descriptor["audience"] == {"type": AUDIENCE_ALL_USERS}
+        assert descriptor["event_id"] == 7
+        assert "user_tokens" not in descriptor
@@ -0,0 +1,97 @@
+"""
+Tests unitaires pour le codec des valeurs de cache (app/cache_codec.py)
+
+En-tête format / compression, compression au-delà du seuil, anciennes
+entrées sans en-tête, et corps JSON servi sans décodage.
+"""
+
+import json
+import zlib
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+import app.cache_codec as codec
+from app.cache_codec import (
+    FORMAT_MSGPACK,
+    CodecError,
+    cache_json,
+    cached_json,
+    decode,
+    encode,
+    mark_cache_hit,
+    to_json_bytes,
+)
+
+VALUE = {"status": 200, "results": 2, "users": [{"id": 1, "nom": "Diop"}, {"id": 2, "nom": "Ndiaye"}]}
+
+
+@pytest.fixture
+def zlib_compression():
+    # Compresseur de test : zstd / lz4 sont optionnels
+    with patch.dict(codec.COMPRESSORS, {"zlib": (b"Z", zlib.compress, zlib.decompress)}), \
+         patch.object(codec, "CACHE_COMPRESSION", "zlib"), \
+         patch.object(codec, "CACHE_COMPRESSION_THRESHOLD", 64):
+        yield
+
+
+class TestCodec:
+
+    def test_aller_retour_json(self):
+        data = encode(VALUE)
+        assert data[:3] == b"\x00j-"
+        assert decode(data) == VALUE
+
+    def test_aller_retour_msgpack(self):
+        data = encode(VALUE, FORMAT_MSGPACK)
+        assert data[:2] == b"\x00m"
+        assert decode(data) == VALUE
+        assert json.loads(to_json_bytes(data)) == VALUE
+
+    def test_types_non_json(self):
+        assert decode(encode({"at": datetime(2024, 5, 1, 8, 30)})) == {"at": "2024-05-01T08:30:00"}
+
+    def test_ancienne_entree_sans_en_tete(self):
+        with pytest.raises(CodecError):
+            decode(json.dumps(VALUE).encode())
+
+    def test_compression_au_dela_du_seuil(self, zlib_compression):
+        small = encode({"id": 1})
+        large = encode({"rows": ["x" * 50] * 100})
+        assert small[2:3] == b"-"
+        assert large[2:3] == b"Z"
+        assert len(large) < len(json.dumps({"rows": ["x" * 50] * 100}))
+        assert decode(large) == {"rows": ["x" * 50] * 100}
+
+    def test_compression_indisponible_a_la_lecture(self, zlib_compression):
+        data = encode({"rows": ["x" * 50] * 100})
+        with patch.dict(codec.COMPRESSORS, clear=True):
+            with pytest.raises(CodecError):
+                decode(data)
+
+    def test_mark_cache_hit(self):
+        body = json.dumps({"users": [], "cache_hit": False}, separators=(",", ":")).encode()
+        assert json.loads(mark_cache_hit(body)) == {"users": [], "cache_hit": True}
+        assert mark_cache_hit(b"[1,2]") == b"[1,2]"
+
+
+class TestPassthrough:
+
+    async def test_corps_json_servi_tel_quel(self, fake_redis, zlib_compression):
+        big = {"users": [{"id": i, "nom": "utilisateur"} for i in range(50)]}
+        body = await cache_json("users:all", big, ttl_seconds=60)
+        assert json.loads(body) == big
+        assert fake_redis.strings["users:all"][2:3] == b"Z"
+        assert await cached_json("users:all") == body
+
+    async def test_entree_absente_ou_ancienne(self, fake_redis):
+        assert await cached_json("users:all") is None
+        fake_redis.strings["users:all"] = b'[{"id": 1}]'
+        assert await cached_json("users:all") is None
+
+    async def test_redis_indisponible(self):
+        with patch("app.cache.get_redis_bytes", side_effect=RuntimeError("Redis client not initialized")):
+            body = await cache_json("users:all", VALUE)
+            assert json.loads(body) == VALUE
+            assert await cached_json("users:all") is None
@@ -0,0 +1,91 @@
+"""
+Tests unitaires pour le parcours des clés par SCAN (app/cache_utils.py)
+
+Pagination par curseur sur plusieurs motifs, travail borné par appel,
+inspection en un pipeline et flush par UNLINK. Le faux Redis n'a pas de
+méthode keys (tests/fakes.py) : tout appel à KEYS échouerait.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.cache_utils import flush_cache_by_pattern, get_cache_keys_by_pattern, inspect_cache_keys, scan_keys
+from tests.fakes import FakeRedis
+
+
+@pytest.fixture
+def redis():
+    keys = [f"compteur:id:{i}" for i in range(30)] + [f"compteurs:all:{i}" for i in range(5)] + ["users:all"]
+    fake = FakeRedis({key: f"valeur de {key}" for key in keys})
+    # Ordre de parcours fixe : comme le curseur Redis, il ne bouge pas avec les suppressions
+    fake.universe = sorted(keys)
+    fake.ttls = {key: 60 for key in keys}
+    with patch("app.cache_utils.get_redis", return_value=fake), \
+         patch("app.cache_utils.get_redis_bytes", return_value=fake), \
+         patch("app.cache_utils.CACHE_SCAN_COUNT", 10), \
+         patch("app.cache.get_redis", side_effect=RuntimeError("Redis client not initialized")):
+        yield fake
+
+
+class TestScanKeys:
+
+    async def test_pagination_sur_plusieurs_motifs(self, redis):
+        patterns = ["compteurs:*", "compteur:*"]
+        seen, cursor, pages = [], None, 0
+        while True:
+            keys, cursor = await scan_keys(patterns, cursor, limit=8)
+            seen.extend(keys)
+            pages += 1
+            if cursor is None:
+                break
+        assert pages > 1
+        assert set(seen) == {k for k in redis.strings if k.startswith(("compteur:", "compteurs:"))}
+
+    async def test_travail_borne(self, redis):
+        with patch("app.cache_utils.CACHE_SCAN_MAX_CALLS", 2):
+            keys, cursor = await scan_keys(["aucune:*"], limit=100)
+        assert keys == []
+        assert redis.scans == 2
+        assert cursor == "0:20"  # reprise là où le parcours s'est arrêté
+
+    async def test_curseur_invalide(self, redis):
+        with pytest.raises(ValueError):
+            await scan_keys(["a:*"], "abc")
+        with pytest.raises(ValueError):
+            await scan_keys(["a:*"], "3:0")
+        assert (await get_cache_keys_by_pattern("a:*", "abc"))["error"].startswith("Curseur invalide")
+
+
+class TestInspect:
+
+    async def test_page_avec_apercu_en_un_pipeline(self, redis):
+        redis.sets["compteur:tags"] = {"compteur:id:1"}
+        redis.universe = sorted(redis.universe + ["compteur:tags"])
+        page = await inspect_cache_keys(["compteur:*"], limit=1000, preview_chars=5)
+        assert page["complete"] is True and page["next_cursor"] is None
+        assert redis.pipelines == 1
+        assert page["contents"]["compteur:id:3"] == {"ttl_seconds": 60, "size_bytes": len("valeur de compteur:id:3"), "preview": "valeu"}
+        assert "error" in page["contents"]["compteur:tags"]
+
+    async def test_contenu_masque(self, redis):
+        page = await inspect_cache_keys(["users:*"], preview_chars=0)
+        assert page["contents"] == {"users:all": {"ttl_seconds": 60, "size_bytes": 19, "has_content": True}}
+
+
+class TestFlush:
+
+    async def test_flush_par_unlink_et_par_lots(self, redis):
+        with patch("app.cache_utils.CACHE_SCAN_MAX_PAGE_SIZE", 12):
+            first = await flush_cache_by_pattern("compteur:*")
+            assert first["complete"] is False
+            total = first["deleted"]
+            cursor = first["next_cursor"]
+            while cursor:
+                page = await flush_cache_by_pattern("compteur:*", cursor)
+                total += page["deleted"]
+                cursor = page["next_cursor"]
+        assert total == 30
+        assert not any(key.startswith("compteur:") for key in redis.strings)
+        assert all(len(batch) <= 10 for batch in redis.deleted)
+        assert "users:all" in redis.strings
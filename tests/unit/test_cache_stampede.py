@@ -0,0 +1,129 @@
+"""
+Tests unitaires pour cache_get_or_set (app/cache.py)
+
+Recalcul unique sous forte concurrence (coalescence dans le processus, verrou
+Redis entre processus), stale-while-revalidate et TTL décalés.
+"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.cache import CACHE_FRESH_KEY, CACHE_LOCK_KEY, cache_get_or_set, jittered_ttl
+
+
+def counting(value, delay=0.05):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value
+    return compute, calls
+
+
+class TestSingleFlight:
+
+    async def test_un_seul_calcul_pour_les_requetes_concurrentes(self, fake_redis):
+        compute, calls = counting({"customer": [1]})
+        results = await asyncio.gather(*(cache_get_or_set("sic:k", compute, 60) for _ in range(50)))
+        assert len(calls) == 1
+        assert all(r == {"customer": [1]} for r in results)
+        assert json.loads(fake_redis.strings["sic:k"]) == {"customer": [1]}
+        assert CACHE_LOCK_KEY.format(key="sic:k") not in fake_redis.strings  # verrou libéré
+
+    async def test_attend_la_valeur_calculee_par_un_autre_processus(self, fake_redis):
+        fake_redis.strings[CACHE_LOCK_KEY.format(key="k")] = "autre-processus"
+        compute, calls = counting("local")
+
+        async def other_process():
+            await asyncio.sleep(0.1)
+            fake_redis.strings["k"] = json.dumps("distant")
+
+        result, _ = await asyncio.gather(cache_get_or_set("k", compute, 60), other_process())
+        assert result == "distant"
+        assert calls == []
+
+    async def test_erreur_non_mise_en_cache(self, fake_redis):
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise LookupError("introuvable")
+
+        results = await asyncio.gather(
+            *(cache_get_or_set("k", failing, 60) for _ in range(5)), return_exceptions=True
+        )
+        assert len(calls) == 1
+        assert all(isinstance(r, LookupError) for r in results)
+        assert "k" not in fake_redis.strings
+
+    async def test_calcul_poursuivi_si_le_premier_appelant_est_annule(self, fake_redis):
+        compute, calls = counting("v", delay=0.05)
+        first = asyncio.create_task(cache_get_or_set("k", compute, 60))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache_get_or_set("k", compute, 60))
+        first.cancel()
+
+        assert await second == "v"
+        assert len(calls) == 1
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    async def test_redis_indisponible(self):
+        compute, calls = counting("v", delay=0)
+        with patch("app.cache.get_redis", side_effect=RuntimeError("Redis client not initialized")):
+            assert await cache_get_or_set("k", compute, 60) == "v"
+        assert len(calls) == 1
+
+
+class TestStaleWhileRevalidate:
+
+    async def test_sert_la_valeur_perimee_et_rafraichit_une_fois(self, fake_redis):
+        fake_redis.strings["k"] = json.dumps("ancienne")  # marqueur de fraîcheur expiré
+        compute, calls = counting("nouvelle")
+
+        results = await asyncio.gather(*(cache_get_or_set("k", compute, 60, stale_ttl=600) for _ in range(20)))
+        assert results == ["ancienne"] * 20
+
+        await asyncio.sleep(0.1)
+        assert len(calls) == 1
+        assert json.loads(fake_redis.strings["k"]) == "nouvelle"
+        assert fake_redis.strings[CACHE_FRESH_KEY.format(key="k")] == "1"
+        # L'entrée vit au-delà de son TTL "soft" pour pouvoir être servie périmée
+        assert fake_redis.ttls["k"] > fake_redis.ttls[CACHE_FRESH_KEY.format(key="k")]
+
+    async def test_entree_fraiche(self, fake_redis):
+        fake_redis.strings["k"] = json.dumps("v")
+        fake_redis.strings[CACHE_FRESH_KEY.format(key="k")] = "1"
+        compute, calls = counting("autre")
+        assert await cache_get_or_set("k", compute, 60, stale_ttl=600) == "v"
+        await asyncio.sleep(0)
+        assert calls == []
+
+
+class TestJitter:
+
+    def test_ttl_decale_dans_les_bornes(self):
+        with patch("app.cache.CACHE_TTL_JITTER", 0.1):
+            ttls = {jittered_ttl(1000) for _ in range(200)}
+        assert min(ttls) >= 900 and max(ttls) <= 1100
+        assert len(ttls) > 1
+
+    def test_sans_jitter(self):
+        with patch("app.cache.CACHE_TTL_JITTER", 0):
+            assert jittered_ttl(300) == 300
+
+
+class TestRaw:
+
+    async def test_json_renvoye_sans_decodage(self, fake_redis):
+        compute, calls = counting({"notifications": [1, 2]}, delay=0)
+        first = await cache_get_or_set("k", compute, 60, raw=True)
+        second = await cache_get_or_set("k", compute, 60, raw=True)
+        assert first == second == fake_redis.strings["k"]
+        assert json.loads(first) == {"notifications": [1, 2]}
+        assert len(calls) == 1
@@ -0,0 +1,85 @@
+"""
+Tests unitaires pour l'invalidation par tags (app/cache.py, app/cache_decorators.py)
+
+Le Redis en mémoire de tests/fakes.py (sets, pipeline transactionnel, WATCH) vérifie
+l'enregistrement des entrées sous leurs tags, l'invalidation groupée et la
+reconstruction des décorateurs cached / cache_invalidate.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.cache import CACHE_TAG_KEY, cache_set_tagged, cache_tag, invalidate_tags
+from app.cache_decorators import cache_invalidate, cached
+
+
+@pytest.fixture
+def redis(fake_redis):
+    with patch("app.cache_decorators.get_redis", return_value=fake_redis):
+        yield fake_redis
+
+
+class TestCacheTag:
+
+    def test_noms(self):
+        assert cache_tag("user_compteur") == "user_compteur"
+        assert cache_tag("user_compteur", user_id=12) == "user_compteur:user_id=12"
+        assert cache_tag("compteur", user_id=1, agence_id=3) == "compteur:agence_id=3:user_id=1"
+
+
+class TestInvalidateTags:
+
+    async def test_invalide_les_entrees_dependantes(self, redis):
+        await cache_set_tagged("uc:all", "[]", [cache_tag("user_compteur")], ttl_seconds=60)
+        await cache_set_tagged("uc:user:1", "[]", [cache_tag("user_compteur", user_id=1)], ttl_seconds=60)
+        await cache_set_tagged("uc:active:1", "[]", [cache_tag("user_compteur", user_id=1)], ttl_seconds=60)
+        await cache_set_tagged("uc:user:2", "[]", [cache_tag("user_compteur", user_id=2)], ttl_seconds=60)
+
+        deleted = await invalidate_tags(cache_tag("user_compteur"), cache_tag("user_compteur", user_id=1))
+
+        assert deleted == 3
+        assert set(redis.strings) == {"uc:user:2"}
+        assert CACHE_TAG_KEY.format(tag="user_compteur:user_id=1") not in redis.sets
+        # Lecture des membres sous WATCH des sets de tags (transaction rejouée si un set change)
+        assert redis.watched == [(
+            CACHE_TAG_KEY.format(tag="user_compteur"),
+            CACHE_TAG_KEY.format(tag="user_compteur:user_id=1"),
+        )]
+
+    async def test_set_de_tag_survit_a_ses_entrees(self, redis):
+        await cache_set_tagged("k", "v", ["t"], ttl_seconds=60)
+        assert redis.ttls[CACHE_TAG_KEY.format(tag="t")] >= 60
+
+    async def test_sans_tag(self, redis):
+        assert await invalidate_tags() == 0
+
+
+class TestDecorators:
+
+    async def test_cached_enregistre_les_tags(self, redis):
+        calls = []
+
+        @cached("user_compteurs", ttl_seconds=60, tags=["user_compteur:user_id={user_id}"])
+        async def list_for_user(user_id: int, active: bool = False):
+            calls.append(user_id)
+            return [{"user_id": user_id}]
+
+        assert await list_for_user(7) == [{"user_id": 7}]
+        assert await list_for_user(7) == [{"user_id": 7}]
+        assert calls == [7]
+        assert len(redis.sets[CACHE_TAG_KEY.format(tag="user_compteur:user_id=7")]) == 1
+
+    async def test_cache_invalidate_par_tag(self, redis):
+        @cached("user_compteurs", tags=["user_compteur:user_id={user_id}"])
+        async def list_for_user(user_id: int):
+            return [user_id]
+
+        @cache_invalidate("users:all", tags=["user_compteur:user_id={user_id}"])
+        async def update(user_id: int, data: dict):
+            return True
+
+        redis.strings["users:all"] = "[]"
+        await list_for_user(user_id=3)
+        assert await update(3, {}) is True
+        assert redis.strings == {}
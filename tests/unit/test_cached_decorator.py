@@ -0,0 +1,163 @@
+"""
+Tests unitaires pour le décorateur cached (app/cache_decorators.py)
+
+Clés stables (encodage canonique haché en BLAKE2b, indépendant du processus),
+sélection des arguments, sérialiseurs, cache négatif et métriques par préfixe.
+"""
+
+import datetime
+import hashlib
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+import app.cache as cache
+from app.cache_decorators import SERIALIZERS, _prefix_stats, cached, get_cached_stats, make_cache_key
+
+
+@pytest.fixture
+def redis(fake_redis):
+    _prefix_stats.clear()
+    with patch("app.cache.CACHE_TTL_JITTER", 0), \
+         patch.object(cache, "LOCAL_CACHE_ENABLED", False):
+        yield fake_redis
+
+
+class TestCacheKey:
+
+    def test_cle_stable(self):
+        # Valeur figée : la clé ne doit changer ni d'un processus ni d'une version à l'autre
+        expected = hashlib.blake2b(b'{"active":true,"user_id":7}', digest_size=16).hexdigest()
+        assert make_cache_key("uc", {"user_id": 7, "active": True}) == f"uc:{expected}"
+        assert make_cache_key("uc", {"active": True, "user_id": 7}) == f"uc:{expected}"
+
+    def test_types_normalises(self):
+        a = make_cache_key("k", {"d": datetime.date(2024, 1, 31), "s": {3, 1, 2}})
+        b = make_cache_key("k", {"d": datetime.date(2024, 1, 31), "s": {2, 3, 1}})
+        assert a == b
+        assert make_cache_key("k", {"v": 1}) != make_cache_key("k", {"v": "1"})
+
+    def test_sans_argument(self):
+        assert make_cache_key("type_demande:all", {}) == "type_demande:all"
+
+
+class TestCached:
+
+    async def test_arguments_positionnels_ou_nommes_et_session_ignoree(self, redis):
+        calls = []
+
+        @cached("uc")
+        async def list_for_user(user_id: int, db: Session, active: bool = False):
+            calls.append(user_id)
+            return [user_id]
+
+        await list_for_user(7, MagicMock(spec=Session))
+        await list_for_user(user_id=7, db=MagicMock(spec=Session), active=False)
+        assert calls == [7]
+        assert list(redis.strings) == [make_cache_key("uc", {"user_id": 7, "active": False})]
+
+    async def test_include_exclude(self, redis):
+        @cached("a", include=["numero"])
+        async def by_numero(numero: str, trace_id: str):
+            return numero
+
+        @cached("b", exclude=["trace_id"])
+        async def by_numero_b(numero: str, trace_id: str):
+            return numero
+
+        await by_numero("123", "t1")
+        await by_numero_b("123", "t2")
+        assert set(redis.strings) == {
+            make_cache_key("a", {"numero": "123"}),
+            make_cache_key("b", {"numero": "123"}),
+        }
+
+    def test_argument_inconnu(self):
+        with pytest.raises(ValueError):
+            @cached("a", exclude=["inexistant"])
+            async def f(x: int):
+                return x
+
+    async def test_argument_sans_encodage_stable(self, redis):
+        calls = []
+
+        @cached("u")
+        async def for_user(current_user):
+            calls.append(1)
+            return 1
+
+        await for_user(object())
+        await for_user(object())
+        assert len(calls) == 2
+        assert redis.strings == {}
+        assert get_cached_stats()["u"]["errors"] == 2
+
+    @pytest.mark.parametrize("serializer", sorted(SERIALIZERS))
+    async def test_serialiseurs(self, redis, serializer):
+        value = {"bills": [{"id": 1, "montant": 12.5, "label": "é"}], "results": 1}
+
+        @cached("s", serializer=serializer)
+        async def compute():
+            return value
+
+        assert await compute() == value
+        assert await compute() == value
+        assert get_cached_stats()["s"]["hits"] == 1
+
+
+class TestNegativeCache:
+
+    async def test_none_mis_en_cache(self, redis):
+        calls = []
+
+        @cached("n", ttl_seconds=600, negative_ttl=30)
+        async def find(numero: str):
+            calls.append(numero)
+            return None
+
+        assert await find("x") is None
+        assert await find("x") is None
+        assert calls == ["x"]
+        assert redis.ttls[make_cache_key("n", {"numero": "x"})] == 30
+
+    async def test_404_rejoue(self, redis):
+        calls = []
+
+        @cached("n", negative_ttl=30)
+        async def find(numero: str):
+            calls.append(numero)
+            raise HTTPException(status_code=404, detail="Bills not found")
+
+        for _ in range(3):
+            with pytest.raises(HTTPException) as exc:
+                await find("x")
+            assert exc.value.status_code == 404 and exc.value.detail == "Bills not found"
+        assert calls == ["x"]
+        assert get_cached_stats()["n"]["negative_hits"] == 2
+
+    async def test_sans_cache_negatif(self, redis):
+        @cached("n")
+        async def find(numero: str):
+            raise HTTPException(status_code=404, detail="absent")
+
+        with pytest.raises(HTTPException):
+            await find("x")
+        assert redis.strings == {}
+
+
+class TestStats:
+
+    async def test_compteurs_par_prefixe(self, redis):
+        @cached("p")
+        async def compute(x: int):
+            return x
+
+        await compute(1)
+        await compute(1)
+        await compute(1)
+        stats = get_cached_stats()["p"]
+        assert (stats["hits"], stats["misses"]) == (2, 1)
+        assert stats["hit_rate_percent"] == 66.67
+        assert stats["avg_miss_ms"] >= 0
@@ -0,0 +1,177 @@
+"""
+Tests unitaires pour app/services/fcm_sender.py
+
+Un serveur FCM simulé (httpx.MockTransport avec latence) vérifie la forme du
+résultat, les réessais 429/5xx, le quota (local et partagé dans Redis), la
+réutilisation du client HTTP et le gain de débit face à l'envoi séquentiel
+historique.
+"""
+
+import asyncio
+import json
+import time
+
+from unittest.mock import AsyncMock
+
+import httpx
+
+from app.services.fcm_sender import FcmSender, RedisTokenBucket, TokenBucket
+from tests.fakes import FakeRedis
+
+SEND_URL = "https://fcm.test/v1/projects/samaconso/messages:send"
+LATENCY = 0.02
+
+
+def stub_fcm(statuses=None, latency=LATENCY):
+    """
+    Serveur FCM simulé : `statuses` associe un token à la liste des codes
+    successivement renvoyés (200 ensuite). Retourne (transport, appels par token).
+    """
+    statuses = statuses or {}
+    calls = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        token = json.loads(request.content)["message"]["token"]
+        calls[token] = calls.get(token, 0) + 1
+        codes = statuses.get(token, [])
+        code = codes[calls[token] - 1] if calls[token] <= len(codes) else 200
+        return httpx.Response(code, json={"name": f"projects/samaconso/messages/{token}"} if code == 200 else {"error": {"code": code}})
+
+    return httpx.MockTransport(handler), calls
+
+
+def notifications(n):
+    return [{"token": f"tok{i}", "title": "Titre", "body": "Message"} for i in range(n)]
+
+
+async def no_sleep(_delay):
+    return None
+
+
+class TestFcmSender:
+
+    async def test_result_shape_and_order(self):
+        transport, _ = stub_fcm({"tok1": [404]})
+        sender = FcmSender(SEND_URL, "jeton", transport=transport, rate_limit=0)
+        result = await sender.send_all(notifications(3))
+        assert result["success_count"] == 2
+        assert result["failure_count"] == 1
+        assert result["responses"][0] == {"status": "success", "code": 200}
+        assert result["responses"][1]["status"] == "failed"
+        assert result["responses"][1]["code"] == 404
+
+    async def test_retries_429_and_5xx(self):
+        transport, calls = stub_fcm({"tok0": [429, 503], "tok1": [500, 500, 500]})
+        sender = FcmSender(SEND_URL, "jeton", transport=transport, rate_limit=0,
+                           max_retries=2, sleep=no_sleep)
+        result = await sender.send_all(notifications(2))
+        assert result["responses"][0]["status"] == "success"
+        assert calls["tok0"] == 3
+        assert result["responses"][1]["status"] == "failed"
+        assert result["responses"][1]["code"] == 500
+        assert calls["tok1"] == 3
+        assert result["throttled_count"] == 1
+
+    async def test_dead_tokens_reported(self):
+        def handler(request):
+            token = json.loads(request.content)["message"]["token"]
+            if token == "tok0":
+                return httpx.Response(404, json={"error": {"status": "NOT_FOUND", "details": [{"errorCode": "UNREGISTERED"}]}})
+            return httpx.Response(200, json={})
+
+        sender = FcmSender(SEND_URL, "jeton", transport=httpx.MockTransport(handler), rate_limit=0)
+        result = await sender.send_all(notifications(2))
+        assert result["dead_tokens"] == {"tok0": "UNREGISTERED"}
+        assert result["responses"][0]["error_code"] == "UNREGISTERED"
+
+    async def test_client_errors_are_not_retried(self):
+        transport, calls = stub_fcm({"tok0": [400]})
+        sender = FcmSender(SEND_URL, "jeton", transport=transport, rate_limit=0, sleep=no_sleep)
+        result = await sender.send_all(notifications(1))
+        assert result["failure_count"] == 1
+        assert calls["tok0"] == 1
+
+    async def test_network_error_reported(self):
+        def handler(request):
+            raise httpx.ConnectError("connexion refusée", request=request)
+
+        sender = FcmSender(SEND_URL, "jeton", transport=httpx.MockTransport(handler),
+                           rate_limit=0, max_retries=1, sleep=no_sleep)
+        result = await sender.send_all(notifications(1))
+        assert result["responses"][0]["status"] == "error"
+        assert "connexion refusée" in result["responses"][0]["error"]
+
+    async def test_empty_batch(self):
+        result = await FcmSender(SEND_URL, "jeton").send_all([])
+        assert result["success_count"] == 0
+        assert result["responses"] == []
+
+    async def test_client_reused_across_batches(self):
+        """Une seule connexion (TLS + HTTP/2) pour les lots successifs d'un worker"""
+        transport, _ = stub_fcm()
+        sender = FcmSender(SEND_URL, "jeton", transport=transport, rate_limit=0)
+        await sender.send_all(notifications(2))
+        client = sender._client
+        sender.access_token = "jeton-2"
+        await sender.send_all(notifications(2))
+        assert sender._client is client
+        assert sender.headers["Authorization"] == "Bearer jeton-2"
+        await sender.aclose()
+        assert client.is_closed
+
+    async def test_throughput_versus_sequential_loop(self):
+        """200 messages à 20 ms : ~4 s en série, une fraction en concurrent"""
+        n = 200
+        transport, _ = stub_fcm()
+        sender = FcmSender(SEND_URL, "jeton", transport=transport, concurrency=50, rate_limit=0)
+        started = time.perf_counter()
+        result = await sender.send_all(notifications(n))
+        elapsed = time.perf_counter() - started
+        assert result["success_count"] == n
+        assert elapsed < (n * LATENCY) / 10
+
+
+class TestTokenBucket:
+
+    async def test_rate_is_enforced_after_burst(self):
+        bucket = TokenBucket(rate=100, capacity=5)
+        started = time.perf_counter()
+        for _ in range(15):
+            await bucket.acquire()
+        # 5 jetons en rafale puis 10 à 100/s : au moins ~0.1 s
+        assert time.perf_counter() - started >= 0.09
+
+
+class TestRedisTokenBucket:
+
+    async def test_quota_shared_between_workers(self):
+        """Deux workers sur le même seau : le débit cumulé reste sous le quota"""
+        redis = FakeRedis()
+        workers = [RedisTokenBucket(redis, "fcm:ratelimit:samaconso", rate=100, capacity=5, batch=1) for _ in range(2)]
+
+        async def send(bucket, n):
+            for _ in range(n):
+                await bucket.acquire()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(bucket, 10) for bucket in workers))
+        # 5 jetons en rafale puis 15 à 100/s pour les deux workers : au moins ~0.15 s
+        assert time.perf_counter() - started >= 0.14
+
+    async def test_tokens_reserved_by_batch(self):
+        redis = FakeRedis()
+        bucket = RedisTokenBucket(redis, "fcm:ratelimit:samaconso", rate=500)
+        redis.eval = AsyncMock(wraps=redis.eval)
+        for _ in range(50):
+            await bucket.acquire()
+        assert redis.eval.await_count == 2  # paquets de 25 jetons (1/20 s de débit)
+
+    async def test_local_quota_when_redis_is_down(self):
+        redis = FakeRedis()
+        redis.eval = AsyncMock(side_effect=ConnectionError("redis indisponible"))
+        bucket = RedisTokenBucket(redis, "fcm:ratelimit:samaconso", rate=100, capacity=5)
+        started = time.perf_counter()
+        for _ in range(15):
+            await bucket.acquire()
+        assert time.perf_counter() - started >= 0.09
@@ -0,0 +1,74 @@
+"""
+Tests unitaires pour app/services/fcm_token_service.py et la classification des erreurs FCM
+
+Vérifie que seuls les tokens morts sont signalés et qu'ils sont désactivés
+en une requête.
+"""
+
+import httpx
+
+from app.models.models import UserSession
+from app.services.fcm_sender import classify_fcm_error
+from app.services.fcm_token_service import deactivate_fcm_tokens, summarize_pruning_metrics
+
+
+def fcm_error(status_code, status, error_code=None, message="", field=None):
+    details = []
+    if error_code or field:
+        detail = {"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError"}
+        if error_code:
+            detail["errorCode"] = error_code
+        if field:
+            detail["fieldViolations"] = [{"field": field, "description": "invalide"}]
+        details.append(detail)
+    return httpx.Response(status_code, json={"error": {"code": status_code, "message": message,
+                                                       "status": status, "details": details}})
+
+
+class TestClassifyFcmError:
+
+    def test_unregistered(self):
+        assert classify_fcm_error(fcm_error(404, "NOT_FOUND", "UNREGISTERED")) == ("UNREGISTERED", True)
+
+    def test_invalid_registration_token(self):
+        response = fcm_error(400, "INVALID_ARGUMENT", "INVALID_ARGUMENT",
+                             message="The registration token is not a valid FCM registration token")
+        assert classify_fcm_error(response) == ("INVALID_ARGUMENT", True)
+
+    def test_invalid_payload_keeps_token(self):
+        response = fcm_error(400, "INVALID_ARGUMENT", "INVALID_ARGUMENT",
+                             message="Invalid value at 'message.android.priority'")
+        assert classify_fcm_error(response) == ("INVALID_ARGUMENT", False)
+
+    def test_other_errors(self):
+        assert classify_fcm_error(fcm_error(503, "UNAVAILABLE")) == ("UNAVAILABLE", False)
+        assert classify_fcm_error(httpx.Response(502, text="Bad Gateway")) == (None, False)
+
+
+class TestDeactivateFcmTokens:
+
+    def test_single_update_for_all_sessions(self, db_session):
+        db_session.add_all([
+            UserSession(user_id=1, fcm_token="mort1", is_active=True),
+            UserSession(user_id=1, fcm_token="mort1", is_active=True),
+            UserSession(user_id=2, fcm_token="mort2", is_active=True),
+            UserSession(user_id=3, fcm_token="vivant", is_active=True),
+        ])
+        db_session.commit()
+
+        assert deactivate_fcm_tokens(db_session, ["mort1", "mort2", "mort2", ""]) == 3
+        active = {s.fcm_token for s in db_session.query(UserSession).filter(UserSession.is_active.is_(True))}
+        assert active == {"vivant"}
+
+    def test_empty(self, db_session):
+        assert deactivate_fcm_tokens(db_session, []) == 0
+
+
+class TestPruningMetrics:
+
+    def test_summary(self):
+        raw = {"chunks_pruned": "2", "dead_tokens": "5", "sessions_deactivated": "6",
+               "code:UNREGISTERED": "4", "code:INVALID_ARGUMENT": "1", "last_pruned_at": "1000.5"}
+        summary = summarize_pruning_metrics(raw)
+        assert summary["by_error_code"] == {"UNREGISTERED": 4, "INVALID_ARGUMENT": 1}
+        assert summary["sessions_deactivated"] == 6
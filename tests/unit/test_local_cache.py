@@ -0,0 +1,128 @@
+"""
+Tests unitaires pour le cache local devant Redis (app/cache.py)
+
+LRU borné avec expiration, lecture des données de référence sans aller-retour
+Redis, invalidation entre processus par pub/sub et métriques par niveau.
+"""
+
+import json
+
+import pytest
+
+import app.cache as cache
+from app.cache import (
+    LocalCache,
+    apply_invalidation,
+    cache_delete,
+    cache_get,
+    cache_get_bytes,
+    cache_set,
+    cache_set_bytes,
+    get_cache_tier_stats,
+)
+
+
+@pytest.fixture
+def redis(fake_redis):
+    cache._clear_local_caches()
+    for counters in cache._tier_stats.values():
+        for name in counters:
+            counters[name] = 0
+    yield fake_redis
+    cache._clear_local_caches()
+
+
+class TestLocalCache:
+
+    def test_lru_borne(self):
+        local = LocalCache(max_entries=2, ttl_seconds=60)
+        local.set("a", "1")
+        local.set("b", "2")
+        assert local.get("a") == "1"  # "a" devient le plus récent
+        local.set("c", "3")
+        assert local.get("b") is None
+        assert local.get("a") == "1" and local.get("c") == "3"
+        assert local.evictions == 1
+
+    def test_expiration(self):
+        now = [100.0]
+        local = LocalCache(max_entries=10, ttl_seconds=5, clock=lambda: now[0])
+        local.set("a", "1")
+        now[0] = 104.9
+        assert local.get("a") == "1"
+        now[0] = 105.0
+        assert local.get("a") is None
+        assert len(local) == 0
+
+
+class TestTwoTierRead:
+
+    async def test_donnee_de_reference_servie_localement(self, redis):
+        redis.strings["roles:all"] = '[{"id": 1}]'
+        assert await cache_get("roles:all") == '[{"id": 1}]'
+        for _ in range(10):
+            assert await cache_get("roles:all") == '[{"id": 1}]'
+        assert redis.gets == 1
+
+        stats = get_cache_tier_stats()
+        assert stats["local"]["hits"] == 10
+        assert stats["local"]["misses"] == 1
+        assert stats["redis"]["hits"] == 1
+        assert stats["local"]["entries"] == 1
+
+    async def test_autres_cles_toujours_lues_dans_redis(self, redis):
+        redis.strings["notifications:all"] = "{}"
+        await cache_get("notifications:all")
+        await cache_get("notifications:all")
+        assert redis.gets == 2
+        assert len(cache.local_cache) == 0
+
+    async def test_str_et_bytes_dans_des_caches_locaux_distincts(self, redis):
+        await cache_set("agences:all", "[1]", ttl_seconds=60)
+        await cache_set_bytes("roles:all", b"\x92\x01", ttl_seconds=60)
+        # Une clé écrite par une API n'est jamais servie localement par l'autre
+        await cache_get_bytes("agences:all")
+        await cache_get("roles:all")
+        assert redis.gets == 2
+        assert cache.local_cache.get("agences:all") == "[1]"
+        assert cache.local_bytes_cache.get("roles:all") == b"\x92\x01"
+
+        apply_invalidation(json.dumps({"origin": "autre", "keys": ["agences:all", "roles:all"]}))
+        assert len(cache.local_cache) == 0 and len(cache.local_bytes_cache) == 0
+
+    async def test_absence_non_memorisee(self, redis):
+        assert await cache_get("agences:all") is None
+        redis.strings["agences:all"] = "[]"
+        assert await cache_get("agences:all") == "[]"
+
+
+class TestInvalidation:
+
+    async def test_ecriture_publiee_aux_autres_processus(self, redis):
+        await cache_set("agences:all", "[1]", ttl_seconds=60)
+        channel, message = redis.published[0]
+        assert channel == "cache:invalidate"
+        assert message == {"origin": cache.CACHE_NODE_ID, "keys": ["agences:all"]}
+        assert await cache_get("agences:all") == "[1]"
+        assert redis.gets == 0  # valeur écrite gardée localement
+
+    async def test_suppression(self, redis):
+        await cache_set("role:label:admin", "{}", ttl_seconds=60)
+        await cache_delete("role:label:admin")
+        assert await cache_get("role:label:admin") is None
+        assert [m["keys"] for _, m in redis.published] == [["role:label:admin"], ["role:label:admin"]]
+
+    async def test_message_d_un_autre_processus(self, redis):
+        cache.local_cache.set("agences:all", "[ancien]")
+        assert apply_invalidation(json.dumps({"origin": "autre", "keys": ["agences:all"]})) == 1
+        assert cache.local_cache.get("agences:all") is None
+
+    async def test_message_du_processus_ignore(self, redis):
+        cache.local_cache.set("agences:all", "[1]")
+        assert apply_invalidation(json.dumps({"origin": cache.CACHE_NODE_ID, "keys": ["agences:all"]})) == 0
+        assert cache.local_cache.get("agences:all") == "[1]"
+
+    async def test_cles_hors_reference_non_publiees(self, redis):
+        await cache_set("notifications:all", "{}", ttl_seconds=60)
+        await cache_delete("notifications:all")
+        assert redis.published == []
@@ -0,0 +1,150 @@
+"""
+Tests unitaires pour le cache des simulations d'achat (app/services/simulation_cache.py)
+
+Clé compteur / montant / jour, simulations en échec non gardées, demandes
+identiques coalescées, invalidation par les achats réels relevés dans SIC.
+"""
+
+import asyncio
+from datetime import date, datetime
+from unittest.mock import patch
+
+import pytest
+
+import app.services.simulation_cache as simulation_cache
+from app.cache import CACHE_TAG_KEY
+from app.queries import woyofalPurchasesSinceQuery
+from app.services.simulation_cache import (
+    SIC_WATERMARK_KEY,
+    cached_simulation,
+    get_simulation_cache_stats,
+    invalidate_from_sic_purchases,
+    simulation_cache_key,
+    simulation_cache_tag,
+)
+from tests.fakes import FakeSyncRedis
+
+
+SUCCESS = {"success": True, "purchase": {"units": {"value": 38.7, "unit": "kWh"}}}
+
+
+@pytest.fixture
+def redis(fake_redis):
+    with patch.object(simulation_cache, "SIMULATEUR_CACHE_ENABLED", True), \
+         patch.dict(simulation_cache._stats, {"hits": 0, "misses": 0, "uncached": 0}):
+        yield fake_redis
+
+
+def simulator(result=SUCCESS, delay=0.01):
+    calls = []
+
+    async def simulate():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return simulate, calls
+
+
+class TestCle:
+
+    def test_compteur_montant_jour(self):
+        assert simulation_cache_key("14123456789", 5000.0, date(2024, 10, 17)) == "simulateur:trial:14123456789:5000:2024-10-17"
+        # Montant arrondi comme dans la requête SOAP
+        assert simulation_cache_key("1", 5000.9, date(2024, 10, 17)) == simulation_cache_key("1", 5000, date(2024, 10, 17))
+
+
+class TestCachedSimulation:
+
+    async def test_desactive_par_defaut(self):
+        simulate, calls = simulator()
+        with patch.object(simulation_cache, "SIMULATEUR_CACHE_ENABLED", False):
+            await cached_simulation("M1", 5000, simulate)
+            await cached_simulation("M1", 5000, simulate)
+        assert len(calls) == 2
+
+    async def test_simulation_repetee_servie_depuis_le_cache(self, redis):
+        simulate, calls = simulator()
+        first = await cached_simulation("M1", 5000, simulate)
+        second = await cached_simulation("M1", 5000, simulate)
+        assert first == (SUCCESS, False)
+        assert second == (SUCCESS, True)
+        assert len(calls) == 1
+        assert get_simulation_cache_stats()["hit_rate_percent"] == 50.0
+
+    async def test_montant_different_non_partage(self, redis):
+        simulate, calls = simulator()
+        await cached_simulation("M1", 5000, simulate)
+        await cached_simulation("M1", 10000, simulate)
+        assert len(calls) == 2
+
+    async def test_demandes_simultanees_coalescees(self, redis):
+        simulate, calls = simulator(delay=0.05)
+        results = await asyncio.gather(*(cached_simulation("M1", 5000, simulate) for _ in range(10)))
+        assert len(calls) == 1
+        assert all(result == SUCCESS for result, _ in results)
+
+    async def test_echec_non_mis_en_cache(self, redis):
+        failure = {"success": False, "http_status": 500, "error": "parse error: 'ns3:trialCreditVendResp'"}
+        simulate, calls = simulator(failure)
+        assert await cached_simulation("M1", 5000, simulate) == (failure, False)
+        assert await cached_simulation("M1", 5000, simulate) == (failure, False)
+        assert len(calls) == 2
+        assert get_simulation_cache_stats()["uncached"] == 2
+
+    async def test_entree_taguee_par_compteur(self, redis):
+        simulate, _ = simulator()
+        await cached_simulation("M1", 5000, simulate)
+        assert redis.sets[CACHE_TAG_KEY.format(tag=simulation_cache_tag("M1"))] == {simulation_cache_key("M1", 5000)}
+
+
+class TestInvalidationSic:
+
+    async def test_achat_reel_invalide_le_compteur(self, redis):
+        simulate, calls = simulator()
+        await cached_simulation("M1", 5000, simulate)
+        await cached_simulation("M2", 5000, simulate)
+
+        purchases = [{"NUMERO_COMPTEUR": "M1 ", "DERNIERE_TRANSACTION": datetime(2024, 10, 17, 10, 31)}]
+        result = invalidate_from_sic_purchases(FakeSyncRedis(redis), lambda since: purchases)
+        assert result["meters"] == 1 and result["invalidated"] == 1
+
+        await cached_simulation("M1", 5000, simulate)
+        await cached_simulation("M2", 5000, simulate)
+        assert len(calls) == 3  # M1 recalculé, M2 toujours en cache
+
+    async def test_filigrane(self, redis):
+        client = FakeSyncRedis(redis)
+        seen = []
+
+        def fetch(since):
+            seen.append(since)
+            return [{"NUMERO_COMPTEUR": "M1", "DERNIERE_TRANSACTION": datetime(2024, 10, 17, 10, 31)}]
+
+        invalidate_from_sic_purchases(client, fetch, now=datetime(2024, 10, 17, 10, 35))
+        # Premier passage : fenêtre d'un TTL de cache
+        assert seen[0] == datetime(2024, 10, 17, 10, 30)
+        assert redis.strings[SIC_WATERMARK_KEY] == "2024-10-17T10:31:00"
+
+        invalidate_from_sic_purchases(client, lambda since: seen.append(since) or [])
+        assert seen[1] == datetime(2024, 10, 17, 10, 31)
+        assert redis.strings[SIC_WATERMARK_KEY] == "2024-10-17T10:31:00"
+
+    async def test_achat_valide_apres_coup_au_meme_horodatage(self, redis):
+        client = FakeSyncRedis(redis)
+        simulate, calls = simulator()
+        table = [("M1", datetime(2024, 10, 17, 10, 31))]
+        # Borne incluse, comme dans la requête SIC
+        assert "DATE_TRANSACTION >= ?" in woyofalPurchasesSinceQuery
+
+        def fetch(since):
+            return [{"NUMERO_COMPTEUR": m, "DERNIERE_TRANSACTION": d} for m, d in table if d >= since]
+
+        invalidate_from_sic_purchases(client, fetch, now=datetime(2024, 10, 17, 10, 35))
+        await cached_simulation("M2", 5000, simulate)
+        # Achat de M2 validé après le passage, à la même seconde que le filigrane
+        table.append(("M2", datetime(2024, 10, 17, 10, 31)))
+        result = invalidate_from_sic_purchases(client, fetch)
+        assert result["invalidated"] == 1
+
+        await cached_simulation("M2", 5000, simulate)
+        assert len(calls) == 2
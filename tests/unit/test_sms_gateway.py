@@ -0,0 +1,133 @@
+"""
+Tests unitaires pour la passerelle SMS (app/services/sms_gateway.py)
+
+Lecture des réponses sans eval, client zeep construit une seule fois,
+envoi hors de la boucle asyncio.
+"""
+
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.sms_gateway import (
+    SmsGateway,
+    SmsGatewayError,
+    extract_sms_status,
+    parse_sms_response,
+)
+
+RESPONSE_JSON = '{"responses": {"response": [{"status": {"status_CODE": "200", "status_TEXT": "OK"}}]}}'
+RESPONSE_PYTHON = "{'responses': {'response': [{'status': {'status_CODE': '200', 'status_TEXT': 'OK'}}]}}"
+
+
+class FakeService:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def sendOneSMS(self, telephone, message):
+        self.calls.append((telephone, message))
+        return self.response
+
+
+class FakeClientFactory:
+    def __init__(self, response=RESPONSE_JSON):
+        self.service = FakeService(response)
+        self.builds = 0
+        self.transports = []
+
+    def __call__(self, wsdl_url, transport=None):
+        self.builds += 1
+        self.transports.append(transport)
+        client = MagicMock()
+        client.service = self.service
+        return client
+
+
+def make_gateway(factory, pool_size=4):
+    return SmsGateway(wsdl_url="http://sms.test/wsdl", cache_path=None, pool_size=pool_size, timeout=5, client_factory=factory)
+
+
+class TestParsing:
+
+    def test_json(self):
+        assert extract_sms_status(parse_sms_response(RESPONSE_JSON)) == ("200", "OK")
+
+    def test_litteral_python(self):
+        assert extract_sms_status(parse_sms_response(RESPONSE_PYTHON)) == ("200", "OK")
+
+    def test_pas_evalue_comme_du_code(self):
+        with pytest.raises(SmsGatewayError):
+            parse_sms_response("__import__('os').getcwd()")
+
+    def test_reponse_non_objet(self):
+        with pytest.raises(SmsGatewayError):
+            parse_sms_response("[1, 2]")
+
+    def test_sans_reponse(self):
+        assert extract_sms_status({"responses": {"response": []}}) == (None, None)
+        assert extract_sms_status({}) == (None, None)
+
+    def test_reponse_unique(self):
+        data = {"responses": {"response": {"status": {"status_CODE": "400", "status_TEXT": "KO"}}}}
+        assert extract_sms_status(data) == ("400", "KO")
+
+
+class TestGateway:
+
+    def test_client_construit_une_fois(self):
+        factory = FakeClientFactory()
+        gateway = make_gateway(factory)
+        gateway.send("771234567", "a")
+        gateway.send("771234567", "b")
+        assert factory.builds == 1
+        assert factory.service.calls == [("771234567", "a"), ("771234567", "b")]
+
+    def test_construction_concurrente(self):
+        factory = FakeClientFactory()
+        gateway = make_gateway(factory)
+        threads = [threading.Thread(target=lambda: gateway.client) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert factory.builds == 1
+
+    def test_transport_pool_et_delais(self):
+        factory = FakeClientFactory()
+        gateway = make_gateway(factory, pool_size=7)
+        gateway.client
+        transport = factory.transports[0]
+        assert transport.operation_timeout == 5
+        adapter = transport.session.get_adapter("http://sms.test/")
+        assert adapter._pool_maxsize == 7
+
+    def test_reponse_historique(self):
+        gateway = make_gateway(FakeClientFactory())
+        result = gateway.send("771234567", "code 1234")
+        assert result.as_response() == {"response": RESPONSE_JSON, "status_code": "200", "status_text": "OK"}
+
+    def test_echec_de_construction_reessaye(self):
+        factory = FakeClientFactory()
+        calls = {"n": 0}
+
+        def flaky(wsdl_url, transport=None):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise ConnectionError("WSDL injoignable")
+            return factory(wsdl_url, transport)
+
+        gateway = make_gateway(flaky)
+        with pytest.raises(ConnectionError):
+            gateway.send("771234567", "a")
+        assert gateway.send("771234567", "a").status_code == "200"
+
+    async def test_send_async(self):
+        factory = FakeClientFactory()
+        gateway = make_gateway(factory)
+        result = await gateway.send_async("771234567", "a")
+        assert result.status_code == "200"
+        assert factory.builds == 1
+        gateway.close()
+        assert gateway._client is None
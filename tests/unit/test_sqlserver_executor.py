@@ -0,0 +1,76 @@
+"""
+Tests unitaires pour app/services/sqlserver_executor.py
+
+Vérifie que les requêtes bloquantes tournent hors de la boucle asyncio et que
+la saturation / les délais sont signalés immédiatement.
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.sqlserver_pool import SqlServerPool
+from app.services.sqlserver_executor import (
+    SqlServerExecutor,
+    ExecutorSaturatedError,
+    ExecutorTimeoutError,
+)
+
+
+@pytest.fixture
+def pool():
+    with patch("app.services.sqlserver_pool.pyodbc.connect", side_effect=lambda *_: MagicMock()):
+        yield SqlServerPool("test", "DSN=x", max_size=2)
+
+
+class TestSqlServerExecutor:
+
+    async def test_runs_in_worker_thread_with_pooled_connection(self, pool):
+        executor = SqlServerExecutor(pool, max_workers=2)
+        loop_thread = threading.get_ident()
+
+        def query(conn, value):
+            return threading.get_ident(), conn, value
+
+        thread_id, conn, value = await executor.run(query, 42)
+        assert thread_id != loop_thread
+        assert value == 42
+        assert pool.stats()["checked_out"] == 0
+        assert executor.stats()["completed"] == 1
+
+    async def test_event_loop_stays_responsive(self, pool):
+        executor = SqlServerExecutor(pool, max_workers=2)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        await executor.run(lambda conn: time.sleep(0.2))
+        task.cancel()
+        assert ticks >= 5
+
+    async def test_rejects_when_queue_is_full(self, pool):
+        executor = SqlServerExecutor(pool, max_workers=1, max_queue=0, timeout=2)
+        release = threading.Event()
+        first = asyncio.create_task(executor.run(lambda conn: release.wait()))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(lambda conn: None)
+        release.set()
+        await first
+        assert executor.stats()["rejected"] == 1
+
+    async def test_timeout_raises_quickly(self, pool):
+        executor = SqlServerExecutor(pool, max_workers=1, timeout=0.05)
+        release = threading.Event()
+        with pytest.raises(ExecutorTimeoutError):
+            await executor.run(lambda conn: release.wait())
+        release.set()
+        assert executor.stats()["timeouts"] == 1
@@ -0,0 +1,89 @@
+"""
+Tests unitaires pour app/services/sqlserver_pool.py
+
+pyodbc.connect est mocké : aucune connexion SQL Server réelle n'est ouverte.
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pyodbc
+import pytest
+
+from app.services.sqlserver_pool import SqlServerPool, PoolTimeoutError
+
+
+@pytest.fixture
+def fake_connect():
+    with patch("app.services.sqlserver_pool.pyodbc.connect", side_effect=lambda *_: MagicMock()) as mock:
+        yield mock
+
+
+class TestSqlServerPool:
+
+    def test_connection_is_reused(self, fake_connect):
+        pool = SqlServerPool("test", "DSN=x", max_size=2)
+        with pool.connection() as c1:
+            pass
+        with pool.connection() as c2:
+            pass
+        assert c1 is c2
+        assert fake_connect.call_count == 1
+        assert pool.stats()["checkouts"] == 2
+
+    def test_pool_is_bounded_and_times_out(self, fake_connect):
+        pool = SqlServerPool("test", "DSN=x", max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+        pool.release(conn)
+        stats = pool.stats()
+        assert stats["timeouts"] == 1
+        assert stats["checked_out"] == 0
+
+    def test_waiter_gets_released_connection(self, fake_connect):
+        pool = SqlServerPool("test", "DSN=x", max_size=1, timeout=2)
+        conn = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(conn,)).start()
+        assert pool.acquire() is conn
+        assert pool.stats()["waits"] == 1
+
+    def test_connection_recycled_after_max_age(self, fake_connect):
+        pool = SqlServerPool("test", "DSN=x", max_size=1, recycle_seconds=0)
+        with pool.connection() as c1:
+            pass
+        time.sleep(0.01)
+        with pool.connection() as c2:
+            pass
+        assert c1 is not c2
+        c1.close.assert_called_once()
+        assert pool.stats()["recycled"] == 1
+
+    def test_dead_connection_replaced_on_checkout(self, fake_connect):
+        pool = SqlServerPool("test", "DSN=x", max_size=1, ping_idle_seconds=0)
+        with pool.connection() as c1:
+            pass
+        c1.cursor.return_value.execute.side_effect = pyodbc.OperationalError("gone")
+        time.sleep(0.01)
+        with pool.connection() as c2:
+            pass
+        assert c1 is not c2
+        assert pool.stats()["ping_failures"] == 1
+
+    def test_operational_error_discards_connection(self, fake_connect):
+        pool = SqlServerPool("test", "DSN=x", max_size=1)
+        with pytest.raises(pyodbc.OperationalError):
+            with pool.connection():
+                raise pyodbc.OperationalError("link failure")
+        stats = pool.stats()
+        assert stats["size"] == 0
+        assert stats["discarded"] == 1
+
+    def test_connect_error_frees_slot(self):
+        pool = SqlServerPool("test", "DSN=x", max_size=1)
+        with patch("app.services.sqlserver_pool.pyodbc.connect", side_effect=pyodbc.Error("login failed")):
+            with pytest.raises(pyodbc.Error):
+                pool.acquire()
+        assert pool.stats()["size"] == 0
+        assert pool.stats()["connect_errors"] == 1
@@ -0,0 +1,198 @@
+"""
+Tests unitaires pour app/services/ws_backplane.py
+
+Un Redis en mémoire (hash, set, publish) vérifie le routage par nœud, le
+registre de présence, le statut agrégé du cluster et le repli local.
+"""
+
+import json
+from collections import defaultdict
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.ws_backplane import (
+    BROADCAST_CHANNEL,
+    WebSocketBackplane,
+    notify_users_from_worker,
+    publish_sync,
+    route_by_node,
+)
+
+
+class FakeRedis:
+    """Sous-ensemble asynchrone de redis utilisé par le backplane"""
+
+    def __init__(self, subscribers=None):
+        self.hashes = defaultdict(dict)
+        self.sets = defaultdict(set)
+        self.strings = {}
+        self.published = []
+        self.subscribers = subscribers or {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    async def hincrby(self, key, field, amount):
+        field = str(field)
+        self.hashes[key][field] = int(self.hashes[key].get(field, 0)) + amount
+        return self.hashes[key][field]
+
+    async def hdel(self, key, field):
+        self.hashes[key].pop(str(field), None)
+
+    async def hgetall(self, key):
+        return {k: str(v) for k, v in self.hashes.get(key, {}).items()}
+
+    async def sadd(self, key, member):
+        self.sets[key].add(member)
+
+    async def srem(self, key, member):
+        self.sets[key].discard(member)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def set(self, key, value, ex=None):
+        self.strings[key] = value
+
+    async def exists(self, key):
+        return int(key in self.strings)
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.strings.pop(key, None)
+
+    async def publish(self, channel, data):
+        self.published.append((channel, json.loads(data)))
+        return self.subscribers.get(channel, 1)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return command
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def manager():
+    m = MagicMock()
+    m.send_personal_message = AsyncMock()
+    m.send_broadcast_message = AsyncMock()
+    m.deliver_nowait = MagicMock()
+    m.get_connected_users.return_value = [99]
+    return m
+
+
+def node(manager, redis, node_id):
+    backplane = WebSocketBackplane(manager, node_id=node_id)
+    backplane.redis = redis
+    return backplane
+
+
+class TestRouting:
+
+    def test_route_by_node(self):
+        routes = route_by_node([1, 2, 3], [{"a"}, {"a", "b"}, set()])
+        assert sorted(routes["a"]) == [1, 2]
+        assert routes["b"] == [2]
+
+
+class TestWebSocketBackplane:
+
+    async def test_publish_targets_only_hosting_nodes(self, manager):
+        redis = FakeRedis()
+        a, b = node(manager, redis, "a"), node(manager, redis, "b")
+        await a.register(1)
+        await b.register(2)
+
+        assert await a.publish({"type": "new_notification"}, [2])
+        assert redis.published == [("ws:node:b", {"user_ids": [2], "message": {"type": "new_notification"}})]
+
+    async def test_dead_node_presence_is_pruned(self, manager):
+        redis = FakeRedis(subscribers={"ws:node:mort": 0})
+        await node(manager, redis, "mort").register(5)
+        await node(manager, redis, "a").publish({"type": "x"}, [5])
+        assert redis.sets["ws:presence:user:5"] == set()
+
+    async def test_unregister_last_connection(self, manager):
+        redis = FakeRedis()
+        a = node(manager, redis, "a")
+        await a.register(1)
+        await a.register(1)
+        await a.unregister(1)
+        assert redis.sets["ws:presence:user:1"] == {"a"}
+        await a.unregister(1)
+        assert redis.sets["ws:presence:user:1"] == set()
+        assert "1" not in redis.hashes["ws:presence:node:a"]
+
+    async def test_dispatch_to_local_sockets(self, manager):
+        backplane = WebSocketBackplane(manager, node_id="a")
+        await backplane.dispatch(json.dumps({"user_ids": [1, 2], "message": {"type": "x"}}))
+        await backplane.dispatch(json.dumps({"user_ids": None, "message": {"type": "y"}}))
+        # Une remise par enveloppe, sans attente des envois
+        assert [c.args for c in manager.deliver_nowait.call_args_list] == [
+            ({"type": "x"}, [1, 2]),
+            ({"type": "y"}, None),
+        ]
+        manager.send_personal_message.assert_not_awaited()
+
+    async def test_cluster_status_aggregates_live_nodes(self, manager):
+        redis = FakeRedis()
+        a, b, dead = node(manager, redis, "a"), node(manager, redis, "b"), node(manager, redis, "dead")
+        for backplane in (a, b, dead):
+            await backplane._heartbeat_once()
+        await a.register(1)
+        await a.register(2)
+        await b.register(2)
+        await dead.register(3)
+        del redis.strings["ws:node:dead:alive"]
+
+        status = await a.cluster_status()
+        assert status["nodes"] == 2
+        assert status["total_connections"] == 3
+        assert status["connected_user_ids"] == [1, 2]
+        assert "dead" not in redis.sets["ws:nodes"]
+
+    async def test_inactive_backplane_falls_back(self, manager):
+        backplane = WebSocketBackplane(manager, node_id="a")
+        assert await backplane.publish({"type": "x"}, [1]) is False
+        assert await backplane.cluster_status() is None
+        assert await backplane.connected_user_ids() == [99]
+
+
+class TestPublishSync:
+
+    def test_worker_broadcast(self):
+        client = MagicMock()
+        client.publish.return_value = 3
+        assert publish_sync(client, {"type": "x"}) == 3
+        assert client.publish.call_args.args[0] == BROADCAST_CHANNEL
+
+    def test_worker_notification_to_all_connected(self):
+        client = MagicMock()
+        client.publish.return_value = 2
+        with patch("app.cache.get_sync_redis", return_value=client):
+            assert notify_users_from_worker(None, "Coupure", "Travaux", notification_id=9) == 2
+        channel, raw = client.publish.call_args.args
+        envelope = json.loads(raw)
+        assert channel == BROADCAST_CHANNEL
+        assert envelope["user_ids"] is None
+        assert envelope["message"]["notification"]["id"] == 9
+
+    def test_worker_notification_without_redis(self):
+        with patch("app.cache.get_sync_redis", side_effect=ConnectionError("redis indisponible")):
+            assert notify_users_from_worker([1], "T", "B") == 0
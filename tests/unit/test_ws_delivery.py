@@ -0,0 +1,160 @@
+"""
+Tests unitaires pour app/services/ws_delivery.py et ConnectionManager (broadcast, remise sans attente)
+
+Vérifie qu'un client lent ne retarde pas les autres, la politique des files
+pleines et le rapport de latence d'un broadcast.
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.routers.websocket_routers import ConnectionManager
+from app.services.ws_delivery import (
+    POLICY_DISCONNECT,
+    POLICY_DROP_OLDEST,
+    DeliveryTracker,
+    Outbox,
+    percentile,
+    serialize_message,
+)
+
+
+def fake_socket(delay=0.0):
+    ws = MagicMock()
+    ws.accept = AsyncMock()
+    ws.close = AsyncMock()
+
+    async def send_text(text):
+        await asyncio.sleep(delay)
+
+    ws.send_text = AsyncMock(side_effect=send_text)
+    return ws
+
+
+class TestPercentile:
+
+    def test_nearest_rank(self):
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) is None
+
+
+class TestOutbox:
+
+    async def test_drop_oldest_when_full(self):
+        ws = fake_socket(delay=0.2)
+        outbox = Outbox(ws, on_failure=MagicMock(), max_queue=1, send_timeout=1, policy=POLICY_DROP_OLDEST)
+        tracker = DeliveryTracker(3)
+        for text in ("a", "b", "c"):
+            outbox.offer(text, tracker)
+            await asyncio.sleep(0)  # "a" part immédiatement vers la socket
+        await tracker.wait(1)
+        assert (tracker.delivered, tracker.dropped) == (2, 1)
+        assert [c.args[0] for c in ws.send_text.call_args_list] == ["a", "c"]
+        outbox.close()
+
+    async def test_disconnect_policy(self):
+        ws = fake_socket(delay=0.2)
+        on_failure = MagicMock()
+        outbox = Outbox(ws, on_failure=on_failure, max_queue=1, send_timeout=1, policy=POLICY_DISCONNECT)
+        tracker = DeliveryTracker(3)
+        for text in ("a", "b", "c"):
+            outbox.offer(text, tracker)
+            await asyncio.sleep(0)
+        on_failure.assert_called_once()
+        assert outbox.closed
+        await asyncio.sleep(0)
+        ws.close.assert_awaited()
+
+
+class TestConnectionManagerBroadcast:
+
+    async def test_slow_client_does_not_stall_broadcast(self):
+        manager = ConnectionManager()
+        fast = [fake_socket() for _ in range(20)]
+        slow = fake_socket(delay=5)
+        with patch("app.routers.websocket_routers.WS_SEND_TIMEOUT", 0.2):
+            await manager.connect(slow, 0)
+            for user_id, ws in enumerate(fast, start=1):
+                await manager.connect(ws, user_id)
+
+            started = time.perf_counter()
+            report = await manager.send_broadcast_message({"type": "broadcast_notification", "titre": "Coupure"})
+            elapsed = time.perf_counter() - started
+
+        assert elapsed < 1
+        assert report["recipients"] == 21
+        assert report["delivered"] == 20
+        assert report["failed"] == 1
+        assert report["p95_ms"] < 100
+        assert manager.get_connected_users() == list(range(1, 21))  # client lent retiré
+        assert manager.last_broadcast["delivered"] == 20
+
+        # Sérialisation unique, même encodage que send_json
+        expected = serialize_message({"type": "broadcast_notification", "titre": "Coupure"})
+        assert {ws.send_text.call_args.args[0] for ws in fast} == {expected}
+
+        for user_id, ws in enumerate(fast, start=1):
+            manager.disconnect(ws, user_id)
+
+    async def test_deliver_nowait_does_not_wait_for_slow_socket(self):
+        """Écoute du backplane : la mise en file rend la main avant la fin des envois"""
+        manager = ConnectionManager()
+        fast, slow = fake_socket(), fake_socket(delay=5)
+        with patch("app.routers.websocket_routers.WS_SEND_TIMEOUT", 0.2):
+            await manager.connect(slow, 1)
+            await manager.connect(fast, 2)
+
+            started = time.perf_counter()
+            tracker = manager.deliver_nowait({"type": "new_notification"}, [1, 2])
+            assert time.perf_counter() - started < 0.05
+            assert tracker.expected == 2
+
+            await asyncio.gather(*manager._reports)
+
+        assert (tracker.delivered, tracker.failed) == (1, 1)
+        assert manager.get_connected_users() == [2]
+        assert manager.last_broadcast is None
+        manager.disconnect(fast, 2)
+
+    async def test_deliver_nowait_broadcast_records_report(self):
+        manager = ConnectionManager()
+        ws = fake_socket()
+        await manager.connect(ws, 3)
+        manager.deliver_nowait({"type": "broadcast_notification"})
+        await asyncio.gather(*manager._reports)
+        assert manager.last_broadcast["delivered"] == 1
+        manager.disconnect(ws, 3)
+
+    async def test_reply_goes_through_outbox_in_order(self):
+        """Réponses de l'endpoint (pong, confirmation) : file sortante de la connexion, ordre conservé"""
+        manager = ConnectionManager()
+        ws = fake_socket()
+        await manager.connect(ws, 4)
+        manager.reply(ws, {"type": "connection_confirmed"})
+        await manager.send_personal_message({"type": "new_notification"}, 4)
+        manager.reply(ws, {"type": "pong"})
+        await asyncio.sleep(0.01)
+
+        assert [c.args[0] for c in ws.send_text.call_args_list] == [
+            serialize_message({"type": "connection_confirmed"}),
+            serialize_message({"type": "new_notification"}),
+            serialize_message({"type": "pong"}),
+        ]
+        manager.disconnect(ws, 4)
+        manager.reply(ws, {"type": "pong"})  # connexion fermée : ignoré
+        assert ws.send_text.call_count == 3
+
+    async def test_personal_message(self):
+        manager = ConnectionManager()
+        ws = fake_socket()
+        await manager.connect(ws, 7)
+        report = await manager.send_personal_message({"type": "new_notification"}, 7)
+        assert report["delivered"] == 1
+        assert await manager.send_personal_message({"type": "x"}, 8) is None
+        manager.disconnect(ws, 7)
@@ -0,0 +1,202 @@
+"""
+Tests unitaires pour le client XMLVend du simulateur (app/services/xmlvend_client.py)
+
+Contexte SSL construit depuis le PFX sans PEM laissé sur disque, session
+partagée rechargée au changement de certificat, endpoint mis en cache.
+"""
+
+import datetime
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import BestAvailableEncryption
+from cryptography.hazmat.primitives.serialization.pkcs12 import serialize_key_and_certificates
+from cryptography.x509.oid import NameOID
+
+from app.services.xmlvend_client import Pkcs12TLS12LegacyAdapter, XmlVendClient
+
+PASSWORD = "secret"
+WSDL_URL = "https://xmlvend.test:8443/xmlvend/xmlvend.wsdl"
+WSDL = """<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/">
+  <wsdl:service name="XMLVend"><wsdl:port name="p">
+    <soap:address location="https://placeholder.manufacturer.com/xmlvend"/>
+  </wsdl:port></wsdl:service>
+</wsdl:definitions>"""
+
+
+def write_pfx(path, common_name="487"):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    path.write_bytes(serialize_key_and_certificates(b"487", key, cert, None, BestAvailableEncryption(PASSWORD.encode())))
+
+
+class FakeResponse:
+    def __init__(self, text="", status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.gets = 0
+        self.posts = []
+        self.closed = False
+        self.fail_post = False
+        self.during_post = None
+
+    def get(self, url, timeout=None):
+        self.gets += 1
+        return FakeResponse(WSDL)
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        if self.fail_post:
+            raise requests.ConnectionError("reset")
+        if self.during_post is not None:
+            hook, self.during_post = self.during_post, None
+            hook()
+        self.posts.append(url)
+        return FakeResponse("<ok/>")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pfx(tmp_path):
+    path = tmp_path / "487.pfx"
+    write_pfx(path)
+    return path
+
+
+@pytest.fixture
+def sessions():
+    built = []
+
+    def build(self):
+        built.append(FakeSession())
+        return built[-1]
+
+    with patch.object(XmlVendClient, "_build_session", build):
+        yield built
+
+
+def renew_pfx(pfx):
+    write_pfx(pfx, common_name="487-renouvele")
+    os.utime(pfx, ns=(0, pfx.stat().st_mtime_ns + 1_000_000_000))
+
+
+def make_client(pfx, **kwargs):
+    return XmlVendClient(wsdl_url=WSDL_URL, pfx_path=pfx, pfx_password=PASSWORD, **kwargs)
+
+
+class TestAdapter:
+
+    def test_aucun_pem_laisse_sur_disque(self, pfx, tmp_path):
+        pem_dir = tmp_path / "pem"
+        pem_dir.mkdir()
+        with patch.object(tempfile, "tempdir", str(pem_dir)):
+            adapter = Pkcs12TLS12LegacyAdapter(str(pfx), PASSWORD)
+        assert os.listdir(pem_dir) == []
+        assert adapter._ssl_context is not None
+
+    def test_pfx_mauvais_mot_de_passe(self, pfx):
+        with pytest.raises(ValueError):
+            Pkcs12TLS12LegacyAdapter(str(pfx), "faux")
+
+    def test_session_reelle_pool(self, pfx):
+        client = make_client(pfx, pool_size=4)
+        adapter = client.session.get_adapter("https://xmlvend.test/")
+        assert isinstance(adapter, Pkcs12TLS12LegacyAdapter)
+        assert adapter._pool_maxsize == 4
+        client.close()
+
+
+class TestClient:
+
+    def test_session_et_endpoint_reutilises(self, pfx, sessions):
+        client = make_client(pfx)
+        for _ in range(3):
+            client.post("<xml/>", {})
+        assert len(sessions) == 1
+        assert sessions[0].gets == 1
+        # Hôte placeholder du WSDL : fallback sur la base du WSDL
+        assert sessions[0].posts == ["https://xmlvend.test:8443/xmlvend"] * 3
+
+    def test_endpoint_expire(self, pfx, sessions):
+        client = make_client(pfx, endpoint_ttl=0)
+        client.post("<xml/>", {})
+        client.post("<xml/>", {})
+        assert sessions[0].gets == 2
+
+    def test_override_sans_wsdl(self, pfx, sessions):
+        client = make_client(pfx, endpoint_override="https://override.test/xmlvend")
+        resp, endpoint = client.post("<xml/>", {})
+        assert endpoint == "https://override.test/xmlvend"
+        assert sessions[0].gets == 0
+
+    def test_rechargement_du_certificat(self, pfx, sessions):
+        client = make_client(pfx)
+        client.post("<xml/>", {})
+        renew_pfx(pfx)
+        client.post("<xml/>", {})
+        assert len(sessions) == 2
+        assert sessions[0].closed
+        assert sessions[1].gets == 1
+        assert client.stats()["cert_reloads"] == 1
+
+    def test_rechargement_pendant_une_requete(self, pfx, sessions):
+        client = make_client(pfx)
+        client.post("<xml/>", {})
+
+        def reload_from_other_thread():
+            # Un autre appel voit le nouveau certificat pendant que ce POST est en cours
+            renew_pfx(pfx)
+            client.post("<xml/>", {})
+            assert not sessions[0].closed
+            assert client.stats()["retired_sessions"] == 1
+
+        sessions[0].during_post = reload_from_other_thread
+        client.post("<xml/>", {})
+        # Dernière requête de l'ancienne session terminée : fermée
+        assert sessions[0].closed
+        assert client.stats()["retired_sessions"] == 0
+        assert not sessions[1].closed
+
+    def test_erreur_de_connexion_invalide_l_endpoint(self, pfx, sessions):
+        client = make_client(pfx)
+        client.post("<xml/>", {})
+        sessions[0].fail_post = True
+        with pytest.raises(requests.ConnectionError):
+            client.post("<xml/>", {})
+        sessions[0].fail_post = False
+        client.post("<xml/>", {})
+        assert sessions[0].gets == 2
+
+    def test_certificat_absent(self, tmp_path, sessions):
+        client = make_client(tmp_path / "absent.pfx")
+        with pytest.raises(FileNotFoundError):
+            client.post("<xml/>", {})
+
+    async def test_post_async(self, pfx, sessions):
+        client = make_client(pfx)
+        resp, endpoint = await client.post_async("<xml/>", {})
+        assert resp.text == "<ok/>"
+        client.close()
+        assert sessions[0].closed
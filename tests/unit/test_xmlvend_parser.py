@@ -0,0 +1,81 @@
+"""
+Tests unitaires pour le parsing des réponses XMLVend (app/services/xmlvend_parser.py)
+
+Le parseur lxml doit produire exactement le résultat du parseur historique
+(xmltodict) sur chaque réponse enregistrée de tests/fixtures/xmlvend :
+mêmes clés, même ordre, mêmes valeurs, mêmes erreurs.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.services.xmlvend_parser import (
+    parse_trial_credit_vend_response,
+    parse_trial_credit_vend_xmltodict,
+)
+
+FIXTURES = sorted((Path(__file__).parent.parent / "fixtures" / "xmlvend").glob("*.xml"))
+
+
+def load(name):
+    return (Path(__file__).parent.parent / "fixtures" / "xmlvend" / name).read_text(encoding="utf-8")
+
+
+class TestEquivalence:
+
+    @pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+    @pytest.mark.parametrize("http_status", [200, 500])
+    def test_identique_au_parseur_historique(self, fixture, http_status):
+        xml_content = fixture.read_text(encoding="utf-8")
+        expected = parse_trial_credit_vend_xmltodict(xml_content, "202410171030", "48213", http_status)
+        result = parse_trial_credit_vend_response(xml_content, "202410171030", "48213", http_status)
+        # json.dumps compare aussi l'ordre des clés
+        assert json.dumps(result) == json.dumps(expected)
+
+    def test_bytes_acceptes(self):
+        xml_content = load("trial_credit_vend_resp.xml")
+        assert parse_trial_credit_vend_response(xml_content.encode("utf-8"), "d", "u", 200) == \
+            parse_trial_credit_vend_response(xml_content, "d", "u", 200)
+
+
+class TestContenu:
+
+    def test_reponse_complete(self):
+        result = parse_trial_credit_vend_response(load("trial_credit_vend_resp.xml"), "d", "u", 200)
+        assert result["success"] is True
+        assert result["client"]["name"] == "DIOP MAMADOU"
+        assert result["token"]["sts_cipher"] == "12345678901234567890"
+        assert [step["step_end"] for step in result["credit_steps"]] == [150, None]
+        assert result["debt_recovery"]["balance"] == {"value": 2500.0, "currency": "XOF"}
+        assert [charge["account_no"] for charge in result["service_charges"]] == ["RED-01", "TCO-01"]
+
+    def test_sections_optionnelles_absentes(self):
+        result = parse_trial_credit_vend_response(load("trial_credit_vend_resp_minimal.xml"), "d", "u", 200)
+        assert "token" not in result and "credit_steps" not in result and "debt_recovery" not in result
+        assert result["device_info"]["server_id"] == {"ean": None, "type": None}
+        assert result["transaction_totals"]["change"] == {"value": 0.0, "currency": None}
+
+    def test_textes_nettoyes_et_vides(self):
+        result = parse_trial_credit_vend_response(load("trial_credit_vend_resp_single_step.xml"), "d", "u", 200)
+        assert result["transaction_info"]["response_date_time"] == "2024-10-17T12:15:00.000Z"
+        assert result["transaction_info"]["display_header"] is None
+        assert result["token"]["sts_cipher"] is None
+        assert result["purchase"]["tariff"]["name"] == "DMP - Domestique Moyenne Puissance"
+
+    def test_soap_fault(self):
+        xml_content = load("soap_fault.xml")
+        result = parse_trial_credit_vend_response(xml_content, "d", "u", 500)
+        assert result == {
+            "success": False,
+            "http_status": 500,
+            "error": "parse error: 'ns3:trialCreditVendResp'",
+            "raw": xml_content,
+        }
+
+    def test_xml_invalide(self):
+        result = parse_trial_credit_vend_response("<html>502 Bad Gateway", "d", "u", 502)
+        assert result["success"] is False
+        assert result["error"].startswith("parse error:")
+        assert result["raw"] == "<html>502 Bad Gateway"